@@ -14,7 +14,7 @@ from PyQt5.QtCore import (
 )
 
 from ui.main_window import MainWindow
-from database.db import get_connection
+from database.db import get_connection, check_password
 from config.version import APP_VERSION, APP_NAME
 
 class LoginWindow(QWidget):
@@ -391,7 +391,7 @@ class LoginWindow(QWidget):
             cur.execute("SELECT * FROM usuarios WHERE username = ? AND is_active = 1", (user,))
             user_data = cur.fetchone()
 
-            if user_data and user_data["password_text"] == password:
+            if user_data and check_password(user, user_data["password_text"], password):
                 user_id = user_data["id"]
                 theme_color = user_data["theme_color"]
 
@@ -3,17 +3,140 @@
 import sqlite3
 import os
 import json
+import hmac
+import hashlib
+import logging
+import functools
+import threading
+from contextlib import contextmanager
 from config.permissions import PERMISSION_SCHEMA
 
+logger = logging.getLogger(__name__)
+
 DB_NAME = "bluesys.db"
 DB_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(DB_DIR, DB_NAME)
 
+# --- POOL DE CONEXÕES ---
+# Cada thread mantém suas próprias conexões de longa duração (o sqlite3 não
+# compartilha conexões entre threads). As PRAGMAs são aplicadas uma única vez,
+# na criação da conexão, e conn.close() apenas devolve a conexão ao pool.
+
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -32000",       # ~32 MB de cache de páginas
+    "PRAGMA mmap_size = 268435456",     # 256 MB mapeados em memória
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA foreign_keys = ON",
+)
+
+class PooledConnection(sqlite3.Connection):
+    """Conexão do pool: close() devolve ao pool; dispose() fecha de fato."""
+    pool = None
+    in_use = False
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.release(self)
+        else:
+            super().close()
+
+    def dispose(self):
+        self.pool = None
+        super().close()
+
+class ConnectionPool:
+    """Pool por thread de conexões pré-configuradas para um arquivo de banco."""
+    def __init__(self, db_path, max_idle=4):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self._local = threading.local()
+
+    def _idle(self):
+        idle = getattr(self._local, "idle", None)
+        if idle is None:
+            idle = self._local.idle = []
+        return idle
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=5.0, factory=PooledConnection, cached_statements=256)
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        idle = self._idle()
+        conn = idle.pop() if idle else self._connect()
+        conn.row_factory = sqlite3.Row
+        conn.pool = self
+        conn.in_use = True
+        return conn
+
+    def release(self, conn):
+        if not conn.in_use:
+            return # close() chamado duas vezes
+        conn.in_use = False
+        if conn.in_transaction:
+            # Transação esquecida aberta (ex.: return antes do commit): descarta
+            conn.rollback()
+        idle = self._idle()
+        if len(idle) < self.max_idle:
+            idle.append(conn)
+        else:
+            conn.dispose()
+
+    def close_all(self):
+        """Fecha as conexões ociosas da thread atual."""
+        idle = self._idle()
+        while idle:
+            idle.pop().dispose()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.db_path != DB_PATH:
+            _pool = ConnectionPool(DB_PATH)
+        return _pool
+
 def get_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row 
-    conn.execute("PRAGMA foreign_keys = ON;")
-    return conn
+    return get_pool().acquire()
+
+@contextmanager
+def use_database(path):
+    """
+    Aponta as conexões do processo para o banco 'path' dentro do bloco
+    (verificações em banco temporário); o banco anterior volta ao sair.
+    """
+    global DB_PATH
+    anterior, DB_PATH = DB_PATH, path
+    try:
+        yield
+    finally:
+        get_pool().close_all()
+        DB_PATH = anterior
+
+@contextmanager
+def transaction(immediate=True):
+    """
+    Abre uma transação em uma conexão do pool: commit ao sair do bloco,
+    rollback em caso de exceção. 'immediate' reserva a escrita já no BEGIN,
+    evitando SQLITE_BUSY na promoção de leitura para escrita.
+    """
+    conn = get_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
 
 # --- NOVA FUNÇÃO PARA POPULAR DADOS INICIAIS ---
 def populate_initial_data(cursor):
@@ -120,6 +243,1417 @@ def populate_initial_data(cursor):
         print(f"Erro ao popular dados iniciais: {e}")
 
 
+# --- MIGRAÇÕES VERSIONADAS ---
+# Cada passo roda uma única vez, em ordem, dentro de sua própria transação.
+# A versão aplicada fica registrada em 'schema_version'. Para alterar o
+# esquema, adicione um novo passo ao final de MIGRATIONS (nunca edite um
+# passo já publicado).
+
+def _add_column_if_not_exists(cursor, table, column, definition):
+    try:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        print(f"Coluna '{column}' adicionada à tabela '{table}'.")
+    except sqlite3.OperationalError as e:
+        if "duplicate column name" in str(e) or "no such table" in str(e):
+            pass
+        else:
+            raise e
+
+def _migration_001_colunas_legadas(cursor):
+    """Colunas adicionadas nas versões anteriores (antigo bloco ALTER TABLE)."""
+    colunas = [
+        ("clientes", "tipo_cadastro", "TEXT DEFAULT 'Cliente'"),
+        ("clientes", "categoria", "TEXT DEFAULT 'Padrão'"),
+        
+        ("vendas_pagamentos", "tipo_pagamento", "TEXT"),
+        ("vendas_pagamentos", "nsu", "TEXT"),
+        ("vendas_pagamentos", "doc", "TEXT"),
+        ("vendas_pagamentos", "tipo_cartao", "TEXT"),
+        ("vendas_pagamentos", "parcelas", "INTEGER DEFAULT 1"),
+        
+        ("vendas", "terminal_id", "INTEGER"),
+        ("vendas", "numero_venda_terminal", "INTEGER"),
+        ("vendas", "prevenda_origem_id", "INTEGER"),
+        ("vendas", "empresa_id", "INTEGER"),
+        ("vendas", "local_id", "INTEGER"),
+        ("vendas", "tipo_documento", "TEXT DEFAULT 'FISCAL'"),
+        ("vendas_itens", "sku_id", "INTEGER"),
+        ("prevendas_itens", "sku_id", "INTEGER"),
+        
+        ("caixa_sessoes", "terminal_id", "INTEGER"),
+        ("caixa_sessoes", "valor_final_calculado", "REAL"),
+        ("caixa_sessoes", "valor_final_informado", "REAL"),
+        ("caixa_sessoes", "diferenca", "REAL"),
+        ("caixa_sessoes", "autorizador_id", "INTEGER"),
+        
+        ("permissoes", "formularios", "TEXT"),
+        
+        ("terminais_pdv", "price_list_id_padrao", "INTEGER"),
+        ("terminais_pdv", "deposito_id_padrao", "INTEGER"),
+
+        ("empresas", "status", "INTEGER DEFAULT 1"),
+        ("locais_escrituracao", "status", "INTEGER DEFAULT 1"),
+        
+        ("terminais_pdv", "conta_financeira_id", "INTEGER REFERENCES contas_financeiras(id)"),
+        ("terminais_pdv", "conta_destino_dinheiro_id", "INTEGER REFERENCES contas_financeiras(id)"),
+        ("terminais_pdv", "conta_destino_cartao_id", "INTEGER REFERENCES contas_financeiras(id)"),
+        ("terminais_pdv", "conta_destino_pix_id", "INTEGER REFERENCES contas_financeiras(id)"),
+        ("terminais_pdv", "conta_destino_outros_id", "INTEGER REFERENCES contas_financeiras(id)"),
+        
+        ("produtos", "data_validade", "DATE"),
+        ("produtos", "caminho_imagem", "TEXT"),
+    ]
+    for table, column, definition in colunas:
+        _add_column_if_not_exists(cursor, table, column, definition)
+
+    cursor.execute("UPDATE empresas SET status = 1 WHERE status IS NULL")
+    cursor.execute("UPDATE locais_escrituracao SET status = 1 WHERE status IS NULL")
+
+def _migration_002_indices(cursor):
+    """
+    Índices secundários derivados dos WHERE/JOIN/ORDER BY do PDV, do
+    Relatório Z, dos relatórios e do financeiro. Os índices com colunas
+    extras (forma/valor, tipo/valor) cobrem as agregações sem tocar na tabela.
+    """
+    indices = [
+        # PDV / Relatório Z / Fechamento / Cancelamento
+        "CREATE INDEX IF NOT EXISTS idx_vendas_caixa ON vendas (caixa_id, status)",
+        "CREATE INDEX IF NOT EXISTS idx_vendas_terminal_numero ON vendas (terminal_id, numero_venda_terminal)",
+        "CREATE INDEX IF NOT EXISTS idx_vendas_data ON vendas (data_venda)",
+        "CREATE INDEX IF NOT EXISTS idx_vendas_itens_venda ON vendas_itens (venda_id)",
+        "CREATE INDEX IF NOT EXISTS idx_vendas_pagamentos_venda ON vendas_pagamentos (venda_id, forma, valor)",
+        "CREATE INDEX IF NOT EXISTS idx_caixa_mov_caixa ON caixa_movimentacoes (caixa_id, tipo, valor)",
+        "CREATE INDEX IF NOT EXISTS idx_caixa_sessoes_user_terminal ON caixa_sessoes (user_id, terminal_id, status)",
+        "CREATE INDEX IF NOT EXISTS idx_caixa_sessoes_abertura ON caixa_sessoes (data_abertura)",
+        
+        # Catálogo (busca por código, listagens ordenadas por nome)
+        "CREATE INDEX IF NOT EXISTS idx_produtos_ean ON produtos (ean)",
+        "CREATE INDEX IF NOT EXISTS idx_produtos_nome ON produtos (nome)",
+        "CREATE INDEX IF NOT EXISTS idx_produtos_categoria ON produtos (categoria_id)",
+        "CREATE INDEX IF NOT EXISTS idx_produtos_fornecedor ON produtos (id_fornecedor)",
+        "CREATE INDEX IF NOT EXISTS idx_ptp_tabela ON produto_tabela_preco (id_tabela, id_produto)",
+        "CREATE INDEX IF NOT EXISTS idx_pca_produto ON produto_codigos_alternativos (id_produto)",
+        "CREATE INDEX IF NOT EXISTS idx_clientes_cnpj ON clientes (cnpj)",
+        "CREATE INDEX IF NOT EXISTS idx_categorias_empresa ON categorias (empresa_id, parent_id)",
+        
+        # Financeiro (Dashboard, Lançamentos, Extrato, DRE, Fluxo de Caixa)
+        "CREATE INDEX IF NOT EXISTS idx_lancamentos_vencimento ON lancamentos_financeiros (data_vencimento)",
+        "CREATE INDEX IF NOT EXISTS idx_lancamentos_titulo ON lancamentos_financeiros (titulo_id)",
+        "CREATE INDEX IF NOT EXISTS idx_lancamentos_pagamento ON lancamentos_financeiros (status, data_pagamento)",
+        "CREATE INDEX IF NOT EXISTS idx_titulos_empresa ON titulos_financeiros (empresa_id)",
+        "CREATE INDEX IF NOT EXISTS idx_mov_contas_conta_data ON movimentacoes_contas (conta_id, data_movimento)",
+        "CREATE INDEX IF NOT EXISTS idx_mov_contas_lancamento ON movimentacoes_contas (lancamento_id)",
+    ]
+    for sql in indices:
+        cursor.execute(sql)
+    cursor.execute("ANALYZE")
+
+def _migration_003_catalogo_alteracoes(cursor):
+    """
+    Log de alterações do catálogo usado pelo índice de códigos do PDV
+    (modules/product_lookup.py). Os gatilhos registram o id do produto
+    afetado sempre que produto, preço ou código alternativo mudam.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS catalogo_alteracoes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            produto_id INTEGER NOT NULL,
+            alterado_em TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    gatilhos = [
+        ("trg_cat_produtos_ins", "AFTER INSERT ON produtos", "NEW.id"),
+        ("trg_cat_produtos_upd", "AFTER UPDATE OF nome, active, ean, codigo_interno, unidade, caminho_imagem ON produtos", "NEW.id"),
+        ("trg_cat_produtos_del", "AFTER DELETE ON produtos", "OLD.id"),
+        ("trg_cat_ptp_ins", "AFTER INSERT ON produto_tabela_preco", "NEW.id_produto"),
+        ("trg_cat_ptp_upd", "AFTER UPDATE OF preco_vendadecimal, id_tabela, id_produto ON produto_tabela_preco", "NEW.id_produto"),
+        ("trg_cat_ptp_del", "AFTER DELETE ON produto_tabela_preco", "OLD.id_produto"),
+        ("trg_cat_pca_ins", "AFTER INSERT ON produto_codigos_alternativos", "NEW.id_produto"),
+        ("trg_cat_pca_upd", "AFTER UPDATE ON produto_codigos_alternativos", "NEW.id_produto"),
+        ("trg_cat_pca_del", "AFTER DELETE ON produto_codigos_alternativos", "OLD.id_produto"),
+    ]
+    for nome, evento, produto in gatilhos:
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {nome} {evento}
+            BEGIN
+                INSERT INTO catalogo_alteracoes (produto_id) VALUES ({produto});
+            END
+        """)
+    
+    # Troca de produto em um código/preço: o produto antigo também muda
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_cat_pca_upd_old AFTER UPDATE OF id_produto ON produto_codigos_alternativos
+        WHEN OLD.id_produto <> NEW.id_produto
+        BEGIN
+            INSERT INTO catalogo_alteracoes (produto_id) VALUES (OLD.id_produto);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_cat_ptp_upd_old AFTER UPDATE OF id_produto ON produto_tabela_preco
+        WHEN OLD.id_produto <> NEW.id_produto
+        BEGIN
+            INSERT INTO catalogo_alteracoes (produto_id) VALUES (OLD.id_produto);
+        END
+    """)
+
+PRODUTOS_BUSCA_CODIGOS_SQL = """
+    TRIM(COALESCE({p}.ean, '') || ' ' || COALESCE({p}.codigo_interno, '') || ' ' ||
+         COALESCE((SELECT group_concat(pca.codigo, ' ') FROM produto_codigos_alternativos pca
+                   WHERE pca.id_produto = {p}.id), ''))
+"""
+
+def rebuild_produtos_busca(cursor):
+    """Recarrega todo o índice de busca textual a partir de 'produtos'."""
+    cursor.execute("DELETE FROM produtos_busca")
+    cursor.execute(f"""
+        INSERT INTO produtos_busca (rowid, nome, marca, modelo, codigos)
+        SELECT p.id, p.nome, COALESCE(p.marca, ''), COALESCE(p.modelo, ''),
+               {PRODUTOS_BUSCA_CODIGOS_SQL.format(p='p')}
+        FROM produtos p
+    """)
+
+def ensure_produtos_busca(cursor):
+    """
+    Índice textual (FTS5) de produtos: nome, marca, modelo e códigos
+    (EAN, código interno e alternativos). O tokenizador unicode61 com
+    remove_diacritics 2 ignora acentos e maiúsculas ("pao" encontra "Pão").
+    Mantido por gatilhos; usado por modules/product_search.py.
+
+    Cria o índice se ainda não existe. Com SQLite sem FTS5 não cria nada
+    (a busca segue via LIKE) e é tentado de novo a cada create_tables(),
+    até o SQLite ganhar o FTS5. Retorna True se o índice existe.
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'produtos_busca'")
+    if cursor.fetchone():
+        return True
+    try:
+        cursor.execute("""
+            CREATE VIRTUAL TABLE produtos_busca USING fts5(
+                nome, marca, modelo, codigos,
+                tokenize = 'unicode61 remove_diacritics 2'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        logger.warning(f"FTS5 indisponível, busca textual de produtos via LIKE até o SQLite ter FTS5 ({e}).")
+        return False
+    
+    rebuild_produtos_busca(cursor)
+    
+    codigos_new = PRODUTOS_BUSCA_CODIGOS_SQL.format(p='NEW')
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_busca_produtos_ins AFTER INSERT ON produtos
+        BEGIN
+            INSERT INTO produtos_busca (rowid, nome, marca, modelo, codigos)
+            VALUES (NEW.id, NEW.nome, COALESCE(NEW.marca, ''), COALESCE(NEW.modelo, ''), {codigos_new});
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_busca_produtos_upd AFTER UPDATE OF nome, marca, modelo, ean, codigo_interno ON produtos
+        BEGIN
+            UPDATE produtos_busca SET
+                nome = NEW.nome, marca = COALESCE(NEW.marca, ''), modelo = COALESCE(NEW.modelo, ''),
+                codigos = {codigos_new}
+            WHERE rowid = NEW.id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_busca_produtos_del AFTER DELETE ON produtos
+        BEGIN
+            DELETE FROM produtos_busca WHERE rowid = OLD.id;
+        END
+    """)
+    
+    # Códigos alternativos: recalcula a coluna 'codigos' do produto afetado
+    for nome, evento, ref in [
+        ("trg_busca_pca_ins", "AFTER INSERT ON produto_codigos_alternativos", "NEW"),
+        ("trg_busca_pca_upd", "AFTER UPDATE ON produto_codigos_alternativos", "NEW"),
+        ("trg_busca_pca_upd_old", "AFTER UPDATE OF id_produto ON produto_codigos_alternativos", "OLD"),
+        ("trg_busca_pca_del", "AFTER DELETE ON produto_codigos_alternativos", "OLD"),
+    ]:
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {nome} {evento}
+            BEGIN
+                UPDATE produtos_busca SET codigos = (
+                    SELECT {PRODUTOS_BUSCA_CODIGOS_SQL.format(p='p')} FROM produtos p WHERE p.id = {ref}.id_produto
+                )
+                WHERE rowid = {ref}.id_produto;
+            END
+        """)
+    logger.info("Índice de busca textual de produtos (FTS5) criado.")
+    return True
+
+def _migration_004_produtos_busca(cursor):
+    """
+    Índice de busca textual de produtos (ensure_produtos_busca; sem FTS5,
+    fica para as próximas aberturas) e gatilho de preços do log do catálogo.
+    """
+    ensure_produtos_busca(cursor)
+    
+    # Salvar a grade de preços regrava todas as linhas; só registra no log
+    # do catálogo (migração 3) as que de fato mudaram de preço.
+    cursor.execute("DROP TRIGGER IF EXISTS trg_cat_ptp_upd")
+    cursor.execute("""
+        CREATE TRIGGER trg_cat_ptp_upd AFTER UPDATE OF preco_vendadecimal, id_tabela, id_produto ON produto_tabela_preco
+        WHEN OLD.preco_vendadecimal IS NOT NEW.preco_vendadecimal
+          OR OLD.id_tabela IS NOT NEW.id_tabela
+          OR OLD.id_produto IS NOT NEW.id_produto
+        BEGIN
+            INSERT INTO catalogo_alteracoes (produto_id) VALUES (NEW.id_produto);
+        END
+    """)
+
+def _migration_005_gravacao_assincrona(cursor):
+    """
+    Gravação assíncrona de vendas (modules/sale_journal.py): opção por
+    terminal e identificador do diário local em 'vendas', único, para que
+    a reaplicação do diário após uma queda nunca duplique uma venda.
+    """
+    _add_column_if_not_exists(cursor, "terminais_pdv", "gravacao_assincrona", "INTEGER DEFAULT 0")
+    _add_column_if_not_exists(cursor, "vendas", "journal_id", "TEXT")
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_vendas_journal ON vendas (journal_id)
+        WHERE journal_id IS NOT NULL
+    """)
+
+def rebuild_caixa_totais(cursor, caixa_id=None):
+    """
+    Recalcula 'caixa_totais' e 'caixa_totais_formas' a partir das vendas,
+    pagamentos e movimentações (todas as sessões, ou apenas 'caixa_id').
+    """
+    if caixa_id is None:
+        filtro_sessao, filtro, params = "", "", ()
+        cursor.execute("DELETE FROM caixa_totais")
+        cursor.execute("DELETE FROM caixa_totais_formas")
+    else:
+        filtro_sessao, filtro, params = "WHERE s.id = ?", "AND caixa_id = ?", (caixa_id,)
+        cursor.execute("DELETE FROM caixa_totais WHERE caixa_id = ?", params)
+        cursor.execute("DELETE FROM caixa_totais_formas WHERE caixa_id = ?", params)
+
+    cursor.execute(f"""
+        INSERT INTO caixa_totais (
+            caixa_id, qtd_vendas, total_bruto, total_descontos, total_liquido,
+            qtd_canceladas, total_cancelado, total_suprimentos, total_sangrias
+        )
+        SELECT s.id,
+               COALESCE(v.qtd_vendas, 0), COALESCE(v.total_bruto, 0), COALESCE(v.total_descontos, 0),
+               COALESCE(v.total_liquido, 0), COALESCE(v.qtd_canceladas, 0), COALESCE(v.total_cancelado, 0),
+               COALESCE(m.total_suprimentos, 0), COALESCE(m.total_sangrias, 0)
+        FROM caixa_sessoes s
+        LEFT JOIN (
+            SELECT caixa_id,
+                   SUM(status = 'FINALIZADA') AS qtd_vendas,
+                   ROUND(SUM(CASE WHEN status = 'FINALIZADA' THEN subtotal ELSE 0 END), 2) AS total_bruto,
+                   ROUND(SUM(CASE WHEN status = 'FINALIZADA' THEN COALESCE(desconto_itens, 0) + COALESCE(desconto_geral, 0) ELSE 0 END), 2) AS total_descontos,
+                   ROUND(SUM(CASE WHEN status = 'FINALIZADA' THEN total_final ELSE 0 END), 2) AS total_liquido,
+                   SUM(status = 'CANCELADA') AS qtd_canceladas,
+                   ROUND(SUM(CASE WHEN status = 'CANCELADA' THEN total_final ELSE 0 END), 2) AS total_cancelado
+            FROM vendas WHERE caixa_id IS NOT NULL {filtro}
+            GROUP BY caixa_id
+        ) v ON v.caixa_id = s.id
+        LEFT JOIN (
+            SELECT caixa_id,
+                   ROUND(SUM(CASE WHEN tipo = 'SUPRIMENTO' THEN valor ELSE 0 END), 2) AS total_suprimentos,
+                   ROUND(SUM(CASE WHEN tipo = 'SANGRIA' THEN valor ELSE 0 END), 2) AS total_sangrias
+            FROM caixa_movimentacoes WHERE caixa_id IS NOT NULL {filtro}
+            GROUP BY caixa_id
+        ) m ON m.caixa_id = s.id
+        {filtro_sessao}
+    """, params * 3)
+
+    cursor.execute(f"""
+        INSERT INTO caixa_totais_formas (caixa_id, forma, qtd, total)
+        SELECT v.caixa_id, vp.forma, COUNT(*), ROUND(SUM(vp.valor), 2)
+        FROM vendas v
+        JOIN vendas_pagamentos vp ON vp.venda_id = v.id
+        WHERE v.status = 'FINALIZADA' AND v.caixa_id IS NOT NULL {filtro.replace('caixa_id', 'v.caixa_id')}
+        GROUP BY v.caixa_id, vp.forma
+    """, params)
+
+def _migration_006_caixa_totais(cursor):
+    """
+    Totais acumulados por sessão de caixa (modules/session_totals.py),
+    atualizados na mesma transação da venda, do cancelamento e da
+    sangria/suprimento. O fechamento e o Relatório Z leem estes totais em
+    vez de reagregar todas as vendas da sessão.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS caixa_totais (
+            caixa_id INTEGER PRIMARY KEY REFERENCES caixa_sessoes (id),
+            qtd_vendas INTEGER NOT NULL DEFAULT 0,
+            total_bruto REAL NOT NULL DEFAULT 0,
+            total_descontos REAL NOT NULL DEFAULT 0,
+            total_liquido REAL NOT NULL DEFAULT 0,
+            qtd_canceladas INTEGER NOT NULL DEFAULT 0,
+            total_cancelado REAL NOT NULL DEFAULT 0,
+            total_suprimentos REAL NOT NULL DEFAULT 0,
+            total_sangrias REAL NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS caixa_totais_formas (
+            caixa_id INTEGER NOT NULL REFERENCES caixa_sessoes (id),
+            forma TEXT NOT NULL,
+            qtd INTEGER NOT NULL DEFAULT 0,
+            total REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (caixa_id, forma)
+        ) WITHOUT ROWID
+    """)
+    rebuild_caixa_totais(cursor)
+
+def _migration_007_fila_impressao(cursor):
+    """
+    Fila persistente de impressão do PDV (modules/print_spooler.py). Cada
+    trabalho guarda os dados do documento (JSON), não o arquivo gerado:
+    a renderização acontece na thread de impressão.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS fila_impressao (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            terminal_id INTEGER,
+            tipo TEXT NOT NULL,
+            dados TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'PENDENTE',
+            tentativas INTEGER NOT NULL DEFAULT 0,
+            erro TEXT,
+            criado_em TEXT DEFAULT CURRENT_TIMESTAMP,
+            atualizado_em TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (terminal_id) REFERENCES terminais_pdv (id)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_fila_impressao_status ON fila_impressao (terminal_id, status, id)")
+
+def rebuild_vendas_diarias(cursor, dia_inicio=None, dia_fim=None):
+    """
+    Recalcula 'vendas_diarias' a partir dos itens das vendas FINALIZADAS
+    (todo o histórico, ou apenas os dias entre dia_inicio e dia_fim,
+    no formato 'AAAA-MM-DD').
+    """
+    if dia_inicio is None:
+        filtro, params = "", ()
+        cursor.execute("DELETE FROM vendas_diarias")
+    else:
+        filtro, params = "AND v.data_venda >= ? AND v.data_venda < date(?, '+1 day')", (dia_inicio, dia_fim or dia_inicio)
+        cursor.execute("DELETE FROM vendas_diarias WHERE dia BETWEEN ? AND ?", (dia_inicio, dia_fim or dia_inicio))
+
+    cursor.execute(f"""
+        INSERT INTO vendas_diarias (
+            dia, empresa_id, local_id, terminal_id, produto_id, codigo_barras,
+            descricao, quantidade, total_bruto, total_descontos, total_liquido, linhas
+        )
+        SELECT date(v.data_venda), COALESCE(v.empresa_id, 0), COALESCE(v.local_id, 0),
+               COALESCE(v.terminal_id, 0), COALESCE(vi.produto_id, 0), vi.codigo_barras,
+               MAX(vi.descricao), ROUND(SUM(vi.quantidade), 3),
+               ROUND(SUM(vi.preco_unitario * vi.quantidade), 2),
+               ROUND(SUM(COALESCE(vi.desconto_item, 0)), 2),
+               ROUND(SUM(vi.total_item), 2), COUNT(*)
+        FROM vendas_itens vi
+        JOIN vendas v ON v.id = vi.venda_id
+        WHERE v.status = 'FINALIZADA' {filtro}
+        GROUP BY 1, 2, 3, 4, 5, 6
+    """, params)
+
+def _migration_008_vendas_diarias(cursor):
+    """
+    Fato diário de vendas (modules/sales_facts.py): dia x empresa x local
+    x terminal x produto/código vendido, atualizado na transação da venda
+    e do cancelamento. O resumo do Relatório de Vendas por Produto lê
+    esta tabela em vez de varrer vendas_itens. Ids nulos são gravados
+    como 0 para que a chave primária identifique a linha.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS vendas_diarias (
+            dia TEXT NOT NULL,
+            empresa_id INTEGER NOT NULL,
+            local_id INTEGER NOT NULL,
+            terminal_id INTEGER NOT NULL,
+            produto_id INTEGER NOT NULL,
+            codigo_barras TEXT NOT NULL,
+            descricao TEXT,
+            quantidade REAL NOT NULL DEFAULT 0,
+            total_bruto REAL NOT NULL DEFAULT 0,
+            total_descontos REAL NOT NULL DEFAULT 0,
+            total_liquido REAL NOT NULL DEFAULT 0,
+            linhas INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dia, empresa_id, local_id, terminal_id, produto_id, codigo_barras)
+        ) WITHOUT ROWID
+    """)
+    rebuild_vendas_diarias(cursor)
+
+# Aplica uma movimentação ({r} = NEW/OLD) com sinal {s} (+1/-1) aos saldos mensais:
+# cria o mês (herdando o acumulado do mês anterior), soma entradas/saídas
+# e propaga o valor ao acumulado do mês e dos meses seguintes. Datas nulas
+# ou fora do formato ISO ficam de fora, como no filtro por período do extrato.
+SALDOS_MENSAIS_APLICAR_SQL = """
+    INSERT INTO saldos_mensais (conta_id, mes, saldo_acumulado)
+    SELECT {r}.conta_id, strftime('%Y-%m', {r}.data_movimento), COALESCE((
+        SELECT sm.saldo_acumulado FROM saldos_mensais sm
+        WHERE sm.conta_id = {r}.conta_id AND sm.mes < strftime('%Y-%m', {r}.data_movimento)
+        ORDER BY sm.mes DESC LIMIT 1
+    ), 0)
+    WHERE strftime('%Y-%m', {r}.data_movimento) IS NOT NULL
+    ON CONFLICT (conta_id, mes) DO NOTHING;
+    UPDATE saldos_mensais SET
+        entradas = ROUND(entradas + CASE WHEN {r}.tipo_movimento = 'ENTRADA' THEN {s} * {r}.valor ELSE 0 END, 2),
+        saidas = ROUND(saidas + CASE WHEN {r}.tipo_movimento = 'ENTRADA' THEN 0 ELSE {s} * {r}.valor END, 2)
+    WHERE conta_id = {r}.conta_id AND mes = strftime('%Y-%m', {r}.data_movimento);
+    UPDATE saldos_mensais SET
+        saldo_acumulado = ROUND(saldo_acumulado + {s} * CASE WHEN {r}.tipo_movimento = 'ENTRADA' THEN {r}.valor ELSE -{r}.valor END, 2)
+    WHERE conta_id = {r}.conta_id AND mes >= strftime('%Y-%m', {r}.data_movimento);
+"""
+
+def rebuild_saldos_mensais(cursor, conta_id=None):
+    """
+    Recalcula 'saldos_mensais' a partir de 'movimentacoes_contas' (todas
+    as contas, ou apenas 'conta_id').
+    """
+    if conta_id is None:
+        filtro, params = "", ()
+        cursor.execute("DELETE FROM saldos_mensais")
+    else:
+        filtro, params = "WHERE conta_id = ?", (conta_id,)
+        cursor.execute("DELETE FROM saldos_mensais WHERE conta_id = ?", params)
+
+    cursor.execute(f"""
+        INSERT INTO saldos_mensais (conta_id, mes, entradas, saidas, saldo_acumulado)
+        SELECT conta_id, mes, entradas, saidas,
+               ROUND(SUM(entradas - saidas) OVER (PARTITION BY conta_id ORDER BY mes), 2)
+        FROM (
+            SELECT conta_id, strftime('%Y-%m', data_movimento) AS mes,
+                   ROUND(SUM(CASE WHEN tipo_movimento = 'ENTRADA' THEN valor ELSE 0 END), 2) AS entradas,
+                   ROUND(SUM(CASE WHEN tipo_movimento = 'ENTRADA' THEN 0 ELSE valor END), 2) AS saidas
+            FROM movimentacoes_contas {filtro}
+            GROUP BY conta_id, mes
+            HAVING mes IS NOT NULL
+        )
+    """, params)
+
+def _migration_009_saldos_mensais(cursor):
+    """
+    Saldos mensais por conta financeira (modules/account_balances.py):
+    entradas e saídas do mês e o saldo acumulado das movimentações até o
+    fim do mês (sem o saldo_inicial da conta, que pode ser editado).
+    Mantidos por gatilhos em 'movimentacoes_contas' (inclusão, estorno,
+    edição e exclusão), de modo que o saldo anterior de um período é o
+    acumulado do mês anterior mais as movimentações do próprio mês.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS saldos_mensais (
+            conta_id INTEGER NOT NULL REFERENCES contas_financeiras (id),
+            mes TEXT NOT NULL,
+            entradas REAL NOT NULL DEFAULT 0,
+            saidas REAL NOT NULL DEFAULT 0,
+            saldo_acumulado REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (conta_id, mes)
+        ) WITHOUT ROWID
+    """)
+    rebuild_saldos_mensais(cursor)
+
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_saldos_mov_ins AFTER INSERT ON movimentacoes_contas
+        BEGIN
+            {SALDOS_MENSAIS_APLICAR_SQL.format(r='NEW', s='1')}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_saldos_mov_upd
+        AFTER UPDATE OF conta_id, tipo_movimento, valor, data_movimento ON movimentacoes_contas
+        BEGIN
+            {SALDOS_MENSAIS_APLICAR_SQL.format(r='OLD', s='-1')}
+            {SALDOS_MENSAIS_APLICAR_SQL.format(r='NEW', s='1')}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_saldos_mov_del AFTER DELETE ON movimentacoes_contas
+        BEGIN
+            {SALDOS_MENSAIS_APLICAR_SQL.format(r='OLD', s='-1')}
+        END
+    """)
+
+# Aplica um lançamento ({r} = NEW/OLD) com sinal {s} (+1/-1) ao resumo mensal do
+# DRE: só lançamentos PAGOS com categoria, no mês do pagamento e na empresa do título.
+DRE_MENSAL_APLICAR_SQL = """
+    INSERT INTO dre_mensal (mes, empresa_id, categoria_id, total, lancamentos)
+    SELECT strftime('%Y-%m', {r}.data_pagamento), t.empresa_id, {r}.categoria_id,
+           ROUND({s} * COALESCE({r}.valor_pago, 0), 2), {s}
+    FROM titulos_financeiros t
+    WHERE t.id = {r}.titulo_id AND {r}.status = 'PAGO' AND {r}.categoria_id IS NOT NULL
+      AND strftime('%Y-%m', {r}.data_pagamento) IS NOT NULL
+    ON CONFLICT (mes, empresa_id, categoria_id) DO UPDATE SET
+        total = ROUND(total + excluded.total, 2),
+        lancamentos = lancamentos + excluded.lancamentos;
+"""
+
+def rebuild_categorias_fechamento(cursor):
+    """Recalcula o fechamento transitivo de 'categorias_financeiras' (parent_id)."""
+    cursor.execute("DELETE FROM categorias_fechamento")
+    cursor.execute("""
+        INSERT INTO categorias_fechamento (ancestral_id, descendente_id, profundidade)
+        WITH RECURSIVE arvore (ancestral_id, descendente_id, profundidade) AS (
+            SELECT id, id, 0 FROM categorias_financeiras
+            UNION ALL
+            SELECT a.ancestral_id, c.id, a.profundidade + 1
+            FROM arvore a
+            JOIN categorias_financeiras c ON c.parent_id = a.descendente_id
+            WHERE a.profundidade < 32 -- proteção contra ciclos gravados antes dos gatilhos
+        )
+        SELECT ancestral_id, descendente_id, MIN(profundidade)
+        FROM arvore GROUP BY ancestral_id, descendente_id
+    """)
+
+def rebuild_dre_mensal(cursor):
+    """Recalcula 'dre_mensal' a partir dos lançamentos PAGOS."""
+    cursor.execute("DELETE FROM dre_mensal")
+    cursor.execute("""
+        INSERT INTO dre_mensal (mes, empresa_id, categoria_id, total, lancamentos)
+        SELECT strftime('%Y-%m', l.data_pagamento), t.empresa_id, l.categoria_id,
+               ROUND(SUM(COALESCE(l.valor_pago, 0)), 2), COUNT(*)
+        FROM lancamentos_financeiros l
+        JOIN titulos_financeiros t ON t.id = l.titulo_id
+        WHERE l.status = 'PAGO' AND l.categoria_id IS NOT NULL
+          AND strftime('%Y-%m', l.data_pagamento) IS NOT NULL
+        GROUP BY 1, 2, 3
+    """)
+
+def _migration_010_dre(cursor):
+    """
+    Estruturas do DRE hierárquico (modules/dre_engine.py):
+    - categorias_fechamento: todos os pares ancestral/descendente do plano
+      de contas (incluindo a própria categoria, profundidade 0), mantidos
+      por gatilhos em 'categorias_financeiras'; um BEFORE UPDATE recusa
+      mover uma categoria para baixo de si mesma.
+    - dre_mensal: total pago por mês x empresa x categoria, mantido por
+      gatilhos em 'lancamentos_financeiros' (baixa, estorno, edição e
+      exclusão).
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS categorias_fechamento (
+            ancestral_id INTEGER NOT NULL,
+            descendente_id INTEGER NOT NULL,
+            profundidade INTEGER NOT NULL,
+            PRIMARY KEY (ancestral_id, descendente_id)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_categorias_fechamento_desc
+        ON categorias_fechamento (descendente_id, ancestral_id)
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS dre_mensal (
+            mes TEXT NOT NULL,
+            empresa_id INTEGER NOT NULL,
+            categoria_id INTEGER NOT NULL,
+            total REAL NOT NULL DEFAULT 0,
+            lancamentos INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (mes, empresa_id, categoria_id)
+        ) WITHOUT ROWID
+    """)
+    rebuild_categorias_fechamento(cursor)
+    rebuild_dre_mensal(cursor)
+
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_catfin_ins AFTER INSERT ON categorias_financeiras
+        BEGIN
+            INSERT INTO categorias_fechamento (ancestral_id, descendente_id, profundidade)
+            VALUES (NEW.id, NEW.id, 0);
+            INSERT INTO categorias_fechamento (ancestral_id, descendente_id, profundidade)
+            SELECT ancestral_id, NEW.id, profundidade + 1
+            FROM categorias_fechamento WHERE descendente_id = NEW.parent_id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_catfin_ciclo BEFORE UPDATE OF parent_id ON categorias_financeiras
+        WHEN NEW.parent_id IS NOT NULL AND EXISTS (
+            SELECT 1 FROM categorias_fechamento
+            WHERE ancestral_id = NEW.id AND descendente_id = NEW.parent_id
+        )
+        BEGIN
+            SELECT RAISE(ABORT, 'Uma categoria não pode ser subcategoria de si mesma ou de suas subcategorias.');
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_catfin_upd AFTER UPDATE OF parent_id ON categorias_financeiras
+        WHEN OLD.parent_id IS NOT NEW.parent_id
+        BEGIN
+            -- Desliga a subárvore dos antigos ancestrais...
+            DELETE FROM categorias_fechamento
+            WHERE descendente_id IN (SELECT descendente_id FROM categorias_fechamento WHERE ancestral_id = NEW.id)
+              AND ancestral_id IN (SELECT ancestral_id FROM categorias_fechamento
+                                   WHERE descendente_id = NEW.id AND ancestral_id != NEW.id);
+            -- ...e a liga aos ancestrais do novo pai
+            INSERT INTO categorias_fechamento (ancestral_id, descendente_id, profundidade)
+            SELECT sup.ancestral_id, sub.descendente_id, sup.profundidade + sub.profundidade + 1
+            FROM categorias_fechamento sup, categorias_fechamento sub
+            WHERE sup.descendente_id = NEW.parent_id AND sub.ancestral_id = NEW.id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_catfin_del AFTER DELETE ON categorias_financeiras
+        BEGIN
+            DELETE FROM categorias_fechamento
+            WHERE descendente_id IN (SELECT descendente_id FROM categorias_fechamento WHERE ancestral_id = OLD.id)
+              AND ancestral_id IN (SELECT ancestral_id FROM categorias_fechamento WHERE descendente_id = OLD.id);
+        END
+    """)
+
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_dre_lanc_ins AFTER INSERT ON lancamentos_financeiros
+        BEGIN
+            {DRE_MENSAL_APLICAR_SQL.format(r='NEW', s='1')}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_dre_lanc_upd
+        AFTER UPDATE OF titulo_id, categoria_id, status, data_pagamento, valor_pago ON lancamentos_financeiros
+        BEGIN
+            {DRE_MENSAL_APLICAR_SQL.format(r='OLD', s='-1')}
+            {DRE_MENSAL_APLICAR_SQL.format(r='NEW', s='1')}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_dre_lanc_del AFTER DELETE ON lancamentos_financeiros
+        BEGIN
+            {DRE_MENSAL_APLICAR_SQL.format(r='OLD', s='-1')}
+        END
+    """)
+
+def _migration_011_versoes_dados(cursor):
+    """
+    Contadores de versão por assunto ('versoes_dados'), incrementados por
+    gatilhos a cada gravação nas tabelas de origem. Caches em memória
+    (ex.: modules/financial_kpis.py) comparam a versão com uma leitura de
+    chave primária e descartam o valor guardado quando ela muda, inclusive
+    se a gravação veio de outro processo ou terminal.
+    Inclui o índice (status, data_vencimento) que cobre a passada única
+    dos KPIs pelos lançamentos em aberto.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS versoes_dados (
+            nome TEXT PRIMARY KEY,
+            versao INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("INSERT OR IGNORE INTO versoes_dados (nome, versao) VALUES ('financeiro', 0)")
+
+    for tabela in ("lancamentos_financeiros", "titulos_financeiros", "contas_financeiras"):
+        for evento in ("INSERT", "UPDATE", "DELETE"):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_versao_{tabela}_{evento.lower()}
+                AFTER {evento} ON {tabela}
+                BEGIN
+                    UPDATE versoes_dados SET versao = versao + 1 WHERE nome = 'financeiro';
+                END
+            """)
+
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_lancamentos_status_vencimento
+        ON lancamentos_financeiros (status, data_vencimento, tipo, titulo_id, valor_previsto, valor_pago)
+    """)
+    cursor.execute("ANALYZE lancamentos_financeiros")
+
+# Status de um lançamento em aberto conforme o vencimento (data local)
+SQL_STATUS_POR_VENCIMENTO = "CASE WHEN {r}.data_vencimento < date('now', 'localtime') THEN 'VENCIDO' ELSE 'PENDENTE' END"
+
+def _migration_012_lancamentos_vencidos(cursor):
+    """
+    Status VENCIDO gravado em 'lancamentos_financeiros' (modules/overdue_sweeper.py):
+    - gatilhos corrigem PENDENTE/VENCIDO na inclusão e quando o status ou o
+      vencimento mudam (baixa parcial, estorno, edição);
+    - a passagem dos dias é tratada pela varredura diária;
+    - o índice parcial dos lançamentos em aberto substitui o índice
+      (status, data_vencimento) da migração 11, sem o histórico pago.
+    As consultas usam o mesmo termo do índice, "status IN ('PENDENTE',
+    'VENCIDO')", para que o SQLite possa escolhê-lo.
+    """
+    for nome, evento in (("ins", "INSERT"), ("upd", "UPDATE OF status, data_vencimento")):
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_lanc_vencimento_{nome}
+            AFTER {evento} ON lancamentos_financeiros
+            WHEN NEW.status IN ('PENDENTE', 'VENCIDO') AND NEW.status != {SQL_STATUS_POR_VENCIMENTO.format(r='NEW')}
+            BEGIN
+                UPDATE lancamentos_financeiros
+                SET status = {SQL_STATUS_POR_VENCIMENTO.format(r='NEW')}
+                WHERE id = NEW.id;
+            END
+        """)
+
+    cursor.execute(f"""
+        UPDATE lancamentos_financeiros
+        SET status = {SQL_STATUS_POR_VENCIMENTO.format(r='lancamentos_financeiros')}
+        WHERE status IN ('PENDENTE', 'VENCIDO')
+          AND status != {SQL_STATUS_POR_VENCIMENTO.format(r='lancamentos_financeiros')}
+    """)
+
+    cursor.execute("DROP INDEX IF EXISTS idx_lancamentos_status_vencimento")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_lancamentos_abertos
+        ON lancamentos_financeiros (status, data_vencimento, tipo, titulo_id, valor_previsto, valor_pago)
+        WHERE status IN ('PENDENTE', 'VENCIDO')
+    """)
+    cursor.execute("ANALYZE lancamentos_financeiros")
+
+# Tabelas de cadastro com nomes em cache (modules/name_cache.py): tabela -> coluna do nome
+TABELAS_NOMES = {
+    "clientes": "nome_razao",
+    "fornecedores": "nome",
+    "categorias_financeiras": "nome",
+    "centros_de_custo": "nome",
+}
+
+def _migration_013_versoes_nomes(cursor):
+    """
+    Versões em 'versoes_dados' para os caches de nomes por id
+    (modules/name_cache.py): uma por tabela, incrementada quando o nome
+    muda ou o registro é excluído. Inclusões não invalidam o cache (um id
+    novo nunca está nele). Descarta a estatística antiga dessas tabelas.
+    """
+    for tabela, coluna in TABELAS_NOMES.items():
+        cursor.execute("INSERT OR IGNORE INTO versoes_dados (nome, versao) VALUES (?, 0)", (tabela,))
+        for nome, evento in (("upd", f"UPDATE OF {coluna}"), ("del", "DELETE")):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_versao_nome_{tabela}_{nome}
+                AFTER {evento} ON {tabela}
+                BEGIN
+                    UPDATE versoes_dados SET versao = versao + 1 WHERE nome = '{tabela}';
+                END
+            """)
+
+    # O ANALYZE da migração 2 costuma rodar com os cadastros ainda vazios: com
+    # a estatística de "1 linha" o SQLite varre a tabela em vez de buscar os
+    # ids do "WHERE id IN (...)" pela chave. Sem estatística ele usa a chave.
+    tabelas = ", ".join(f"'{t}'" for t in TABELAS_NOMES)
+    if cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+        cursor.execute(f"DELETE FROM sqlite_stat1 WHERE tbl IN ({tabelas})")
+
+# Recalcula level (0 = raiz) e path ('/raiz/.../id/') das classes de produto
+# cujo id satisfaz {filtro}, a partir do fechamento.
+CATEGORIAS_NIVEL_CAMINHO_SQL = """
+    UPDATE categorias SET
+        level = (SELECT MAX(profundidade) FROM categorias_produto_fechamento
+                 WHERE descendente_id = categorias.id),
+        path = (SELECT '/' || group_concat(ancestral_id, '/') || '/'
+                FROM (SELECT ancestral_id FROM categorias_produto_fechamento
+                      WHERE descendente_id = categorias.id
+                      ORDER BY profundidade DESC))
+    WHERE {filtro};
+"""
+
+def rebuild_categorias_produto_fechamento(cursor):
+    """Recalcula o fechamento transitivo de 'categorias' (classes de produto), level e path."""
+    cursor.execute("DELETE FROM categorias_produto_fechamento")
+    cursor.execute("""
+        INSERT INTO categorias_produto_fechamento (ancestral_id, descendente_id, profundidade)
+        WITH RECURSIVE arvore (ancestral_id, descendente_id, profundidade) AS (
+            SELECT id, id, 0 FROM categorias
+            UNION ALL
+            SELECT a.ancestral_id, c.id, a.profundidade + 1
+            FROM arvore a
+            JOIN categorias c ON c.parent_id = a.descendente_id
+            WHERE a.profundidade < 32 -- proteção contra ciclos gravados antes dos gatilhos
+        )
+        SELECT ancestral_id, descendente_id, MIN(profundidade)
+        FROM arvore GROUP BY ancestral_id, descendente_id
+    """)
+    cursor.execute(CATEGORIAS_NIVEL_CAMINHO_SQL.format(filtro="1"))
+
+def _migration_014_categorias_produto_fechamento(cursor):
+    """
+    Hierarquia das classes de produto ('categorias', modules/category_tree.py):
+    - categorias_produto_fechamento: pares ancestral/descendente (incluindo
+      a própria classe, profundidade 0), como 'categorias_fechamento' do
+      plano de contas (migração 10);
+    - level e path de 'categorias' passam a ser mantidos pelos gatilhos
+      (inclusão, mudança de pai e exclusão), para toda a subárvore movida.
+    Um BEFORE UPDATE recusa mover uma classe para baixo de si mesma.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS categorias_produto_fechamento (
+            ancestral_id INTEGER NOT NULL,
+            descendente_id INTEGER NOT NULL,
+            profundidade INTEGER NOT NULL,
+            PRIMARY KEY (ancestral_id, descendente_id)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_categorias_produto_fechamento_desc
+        ON categorias_produto_fechamento (descendente_id, ancestral_id)
+    """)
+    rebuild_categorias_produto_fechamento(cursor)
+
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_catprod_ins AFTER INSERT ON categorias
+        BEGIN
+            INSERT INTO categorias_produto_fechamento (ancestral_id, descendente_id, profundidade)
+            VALUES (NEW.id, NEW.id, 0);
+            INSERT INTO categorias_produto_fechamento (ancestral_id, descendente_id, profundidade)
+            SELECT ancestral_id, NEW.id, profundidade + 1
+            FROM categorias_produto_fechamento WHERE descendente_id = NEW.parent_id;
+            {CATEGORIAS_NIVEL_CAMINHO_SQL.format(filtro="id = NEW.id")}
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_catprod_ciclo BEFORE UPDATE OF parent_id ON categorias
+        WHEN NEW.parent_id IS NOT NULL AND EXISTS (
+            SELECT 1 FROM categorias_produto_fechamento
+            WHERE ancestral_id = NEW.id AND descendente_id = NEW.parent_id
+        )
+        BEGIN
+            SELECT RAISE(ABORT, 'Uma classe não pode ser subclasse de si mesma ou de suas subclasses.');
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_catprod_upd AFTER UPDATE OF parent_id ON categorias
+        WHEN OLD.parent_id IS NOT NEW.parent_id
+        BEGIN
+            -- Desliga a subárvore dos antigos ancestrais...
+            DELETE FROM categorias_produto_fechamento
+            WHERE descendente_id IN (SELECT descendente_id FROM categorias_produto_fechamento WHERE ancestral_id = NEW.id)
+              AND ancestral_id IN (SELECT ancestral_id FROM categorias_produto_fechamento
+                                   WHERE descendente_id = NEW.id AND ancestral_id != NEW.id);
+            -- ...e a liga aos ancestrais do novo pai
+            INSERT INTO categorias_produto_fechamento (ancestral_id, descendente_id, profundidade)
+            SELECT sup.ancestral_id, sub.descendente_id, sup.profundidade + sub.profundidade + 1
+            FROM categorias_produto_fechamento sup, categorias_produto_fechamento sub
+            WHERE sup.descendente_id = NEW.parent_id AND sub.ancestral_id = NEW.id;
+            {CATEGORIAS_NIVEL_CAMINHO_SQL.format(
+                filtro="id IN (SELECT descendente_id FROM categorias_produto_fechamento WHERE ancestral_id = NEW.id)")}
+        END
+    """)
+    # Subclasses de uma classe excluída ficam como raízes (como no plano de contas);
+    # o path antigo ainda contém o id excluído e identifica a subárvore
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_catprod_del AFTER DELETE ON categorias
+        BEGIN
+            DELETE FROM categorias_produto_fechamento
+            WHERE descendente_id IN (SELECT descendente_id FROM categorias_produto_fechamento WHERE ancestral_id = OLD.id)
+              AND ancestral_id IN (SELECT ancestral_id FROM categorias_produto_fechamento WHERE descendente_id = OLD.id);
+            {CATEGORIAS_NIVEL_CAMINHO_SQL.format(filtro="parent_id = OLD.id OR path LIKE '%/' || OLD.id || '/%'")}
+        END
+    """)
+
+# Tipos de lançamento do razão de estoque (modules/stock_ledger.py)
+ESTOQUE_TIPOS_MOVIMENTO = ('VENDA', 'CANCELAMENTO', 'AJUSTE', 'TRANSFERENCIA', 'COMPRA')
+
+def rebuild_estoque(cursor, deposito_id=None):
+    """
+    Recalcula 'estoque.quantidade' somando o razão 'estoque_movimentos'
+    (todos os depósitos, ou apenas 'deposito_id'). custo_medio e as
+    linhas existentes são preservados; lançamentos de produtos ou
+    depósitos excluídos ficam só no razão.
+    """
+    filtro, params = ("AND m.id_deposito = ?", (deposito_id,)) if deposito_id is not None else ("", ())
+    cursor.execute(f"""
+        INSERT INTO estoque (id_produto, id_deposito, quantidade, updated_at)
+        SELECT m.id_produto, m.id_deposito, ROUND(SUM(m.quantidade), 3), MAX(m.data_movimento)
+        FROM estoque_movimentos m
+        WHERE m.id_produto IN (SELECT id FROM produtos)
+          AND m.id_deposito IN (SELECT id FROM depositos) {filtro}
+        GROUP BY m.id_produto, m.id_deposito
+        ON CONFLICT (id_produto, id_deposito) DO UPDATE SET quantidade = excluded.quantidade
+        WHERE quantidade IS NOT excluded.quantidade
+    """, params)
+    filtro = "AND id_deposito = ?" if deposito_id is not None else ""
+    cursor.execute(f"""
+        UPDATE estoque SET quantidade = 0
+        WHERE quantidade != 0 {filtro} AND NOT EXISTS (
+            SELECT 1 FROM estoque_movimentos m
+            WHERE m.id_produto = estoque.id_produto AND m.id_deposito = estoque.id_deposito
+        )
+    """, params)
+
+def rebuild_estoque_saldos(cursor):
+    """Recalcula as linhas de todos os cortes de 'estoque_saldos' a partir do razão."""
+    cursor.execute("DELETE FROM estoque_saldos")
+    cursor.execute("""
+        INSERT INTO estoque_saldos (id_deposito, data_corte, id_produto, quantidade)
+        SELECT c.id_deposito, c.data_corte, m.id_produto, ROUND(SUM(m.quantidade), 3)
+        FROM estoque_saldos_cortes c
+        JOIN estoque_movimentos m
+          ON m.id_deposito = c.id_deposito AND m.data_movimento < date(c.data_corte, '+1 day')
+        GROUP BY c.id_deposito, c.data_corte, m.id_produto
+        HAVING ROUND(SUM(m.quantidade), 3) != 0
+    """)
+
+def _migration_015_razao_estoque(cursor):
+    """
+    Razão de estoque (modules/stock_ledger.py):
+    - estoque_movimentos: lançamentos somente de inclusão (venda,
+      cancelamento, ajuste, transferência, compra), com o documento de
+      origem; UPDATE e DELETE são recusados por gatilhos;
+    - estoque_saldos_cortes / estoque_saldos: saldos por depósito no fim
+      de uma data de corte (mensal), para que o estoque numa data seja o
+      corte anterior mais os lançamentos desde então;
+    - 'estoque' passa a ser um cache derivado do razão: o gatilho de
+      inclusão soma o lançamento ao estoque atual e aos cortes iguais ou
+      posteriores à data do lançamento (lançamentos retroativos, ex.:
+      vendas do diário local gravadas depois da virada do mês).
+    O saldo atual de cada produto/depósito entra no razão como um AJUSTE
+    de abertura, datado da última atualização da linha.
+    """
+    tipos = ", ".join(f"'{t}'" for t in ESTOQUE_TIPOS_MOVIMENTO)
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS estoque_movimentos (
+            id INTEGER PRIMARY KEY,
+            data_movimento TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            id_produto INTEGER NOT NULL,
+            id_deposito INTEGER NOT NULL,
+            quantidade REAL NOT NULL,
+            tipo TEXT NOT NULL CHECK (tipo IN ({tipos})),
+            documento_tipo TEXT,
+            documento_id INTEGER,
+            user_id INTEGER,
+            observacao TEXT
+        )
+    """)
+    # Sem chaves estrangeiras: o histórico sobrevive à exclusão do produto/depósito.
+    # Os dois primeiros índices cobrem as somas por produto e por depósito.
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_estoque_movimentos_produto
+        ON estoque_movimentos (id_produto, id_deposito, data_movimento, quantidade)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_estoque_movimentos_deposito
+        ON estoque_movimentos (id_deposito, data_movimento, id_produto, quantidade)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_estoque_movimentos_documento
+        ON estoque_movimentos (documento_tipo, documento_id)
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS estoque_saldos_cortes (
+            id_deposito INTEGER NOT NULL,
+            data_corte TEXT NOT NULL,
+            criado_em TEXT DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id_deposito, data_corte)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS estoque_saldos (
+            id_deposito INTEGER NOT NULL,
+            data_corte TEXT NOT NULL,
+            id_produto INTEGER NOT NULL,
+            quantidade REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (id_deposito, data_corte, id_produto)
+        ) WITHOUT ROWID
+    """)
+
+    cursor.execute("""
+        INSERT INTO estoque_movimentos (data_movimento, id_produto, id_deposito, quantidade, tipo, observacao)
+        SELECT COALESCE(updated_at, CURRENT_TIMESTAMP), id_produto, id_deposito, quantidade,
+               'AJUSTE', 'Saldo de abertura do razão'
+        FROM estoque
+        WHERE quantidade != 0 AND id_produto IS NOT NULL AND id_deposito IS NOT NULL
+        ORDER BY updated_at, id
+    """)
+
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_estoque_mov_ins AFTER INSERT ON estoque_movimentos
+        BEGIN
+            INSERT INTO estoque (id_produto, id_deposito, quantidade, updated_at)
+            VALUES (NEW.id_produto, NEW.id_deposito, NEW.quantidade, CURRENT_TIMESTAMP)
+            ON CONFLICT (id_produto, id_deposito) DO UPDATE SET
+                quantidade = ROUND(COALESCE(quantidade, 0) + excluded.quantidade, 3),
+                updated_at = CURRENT_TIMESTAMP;
+            INSERT INTO estoque_saldos (id_deposito, data_corte, id_produto, quantidade)
+            SELECT id_deposito, data_corte, NEW.id_produto, NEW.quantidade
+            FROM estoque_saldos_cortes
+            WHERE id_deposito = NEW.id_deposito AND data_corte >= date(NEW.data_movimento)
+            ON CONFLICT (id_deposito, data_corte, id_produto) DO UPDATE SET
+                quantidade = ROUND(quantidade + excluded.quantidade, 3);
+        END
+    """)
+    for operacao in ("UPDATE", "DELETE"):
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_estoque_mov_{operacao.lower()} BEFORE {operacao} ON estoque_movimentos
+            BEGIN
+                SELECT RAISE(ABORT, 'Lançamentos de estoque não podem ser alterados; registre um ajuste.');
+            END
+        """)
+
+def _migration_016_sequencias_blocos(cursor):
+    """
+    Numeração por blocos (modules/sequence_service.py):
+    - sequencias_blocos: faixas reservadas de uma numeração fiscal (a
+      numeração de vendas de cada terminal), com o último número usado
+      quando o bloco é encerrado; a conferência posterior registra os
+      números sem documento;
+    - sequencias_lacunas: faixas de números sem documento, pendentes de
+      inutilização até receberem data e protocolo.
+    O contador de cada numeração (terminais_pdv.numero_nfe_atual,
+    sequencias.valor) passa a avançar um bloco por vez.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sequencias_blocos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sequencia TEXT NOT NULL,
+            inicio INTEGER NOT NULL,
+            fim INTEGER NOT NULL,
+            usado_ate INTEGER,
+            status TEXT NOT NULL DEFAULT 'ABERTO' CHECK (status IN ('ABERTO', 'FECHADO', 'CONFERIDO')),
+            dono TEXT,
+            reservado_em TEXT DEFAULT CURRENT_TIMESTAMP,
+            fechado_em TEXT
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_sequencias_blocos_status
+        ON sequencias_blocos (sequencia, status, id)
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sequencias_lacunas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sequencia TEXT NOT NULL,
+            serie INTEGER,
+            numero_inicio INTEGER NOT NULL,
+            numero_fim INTEGER NOT NULL,
+            motivo TEXT,
+            registrada_em TEXT DEFAULT CURRENT_TIMESTAMP,
+            inutilizada_em TEXT,
+            protocolo TEXT
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_sequencias_lacunas_pendentes
+        ON sequencias_lacunas (sequencia, numero_inicio) WHERE inutilizada_em IS NULL
+    """)
+
+def _migration_017_replicacao(cursor):
+    """
+    Modo servidor da loja (modules/store_server.py, modules/store_replica.py):
+    - replicacao_saida: no terminal em modo réplica, eventos (vendas,
+      cancelamentos, movimentações e fechamento de caixa, lacunas) gravados
+      na mesma transação do documento local e enviados ao servidor em lote;
+    - replicacao_estado: no terminal, posição da cópia local (seq do
+      catálogo, digestos das páginas de cada cadastro);
+    - replicacao_recebidos: no servidor, eventos já aplicados (reenvios
+      de um lote sem confirmação são ignorados);
+    - replicacao_conflitos: no servidor, eventos aceitos com conflito de
+      numeração ou de estoque e eventos rejeitados, para conferência.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS replicacao_saida (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            evento_id TEXT NOT NULL UNIQUE,
+            tipo TEXT NOT NULL,
+            dados TEXT NOT NULL,
+            criado_em TEXT DEFAULT CURRENT_TIMESTAMP,
+            enviado_em TEXT
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_replicacao_saida_pendentes
+        ON replicacao_saida (id) WHERE enviado_em IS NULL
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS replicacao_estado (
+            chave TEXT PRIMARY KEY,
+            valor TEXT
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS replicacao_recebidos (
+            evento_id TEXT PRIMARY KEY,
+            terminal_id INTEGER,
+            tipo TEXT,
+            recebido_em TEXT DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS replicacao_conflitos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            terminal_id INTEGER,
+            evento_id TEXT,
+            tipo TEXT NOT NULL,
+            detalhe TEXT,
+            registrado_em TEXT DEFAULT CURRENT_TIMESTAMP,
+            resolvido_em TEXT
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_replicacao_conflitos_pendentes
+        ON replicacao_conflitos (terminal_id, id) WHERE resolvido_em IS NULL
+    """)
+
+# --- SENHAS NA CÓPIA DOS TERMINAIS ---
+# O servidor da loja não envia a senha dos usuários aos terminais em modo
+# réplica: a cópia local recebe em 'password_text' um hash PBKDF2 (sal =
+# usuário), conferido no login por check_password().
+HASH_SENHA = "pbkdf2_sha256"
+ITERACOES_SENHA = 200000
+
+def _derivar_senha(username, senha, iteracoes):
+    return hashlib.pbkdf2_hmac("sha256", senha.encode("utf-8"), f"bluesys:{username}".encode("utf-8"), iteracoes).hex()
+
+@functools.lru_cache(maxsize=1024)
+def hash_password(username, senha):
+    """Hash da senha enviado à cópia do terminal (guardado em memória: o servidor recalcula os digestos)."""
+    return f"{HASH_SENHA}${ITERACOES_SENHA}${_derivar_senha(username, senha, ITERACOES_SENHA)}"
+
+def check_password(username, armazenada, digitada):
+    """Confere a senha digitada com a gravada: texto no banco central, hash na cópia do terminal."""
+    if not armazenada:
+        return False
+    if armazenada.startswith(HASH_SENHA + "$"):
+        _, iteracoes, esperado = armazenada.split("$")
+        return hmac.compare_digest(_derivar_senha(username, digitada, int(iteracoes)), esperado)
+    return armazenada == digitada
+
+# --- LOG DE ALTERAÇÕES (CDC) ---
+# Tabelas acompanhadas pelo log 'cdc_alteracoes' (chave = coluna id)
+CDC_TABELAS = (
+    "produtos",
+    "produto_tabela_preco",
+    "produto_codigos_alternativos",
+    "clientes",
+    "vendas",
+    "estoque",
+)
+CDC_RETIDAS = 100000  # últimas versões mantidas mesmo sem consumidor registrado
+CDC_HORIZONTE = "cdc_horizonte"  # versoes_dados: versões até aqui foram descartadas
+
+class ChangeCursorExpired(Exception):
+    """A posição do consumidor é anterior às versões descartadas do log: recarregar tudo."""
+
+def _migration_018_cdc(cursor):
+    """
+    Log de alterações por linha (CDC) para caches e cópias incrementais
+    (modules/change_log.py, modules/store_replica.py):
+    - cdc_alteracoes: (versao, tabela, chave, op) gravado por gatilhos em
+      cada inclusão (I), alteração (U) e exclusão (D) das CDC_TABELAS. A
+      versão é a posição no log, crescente: é também a versão da linha
+      após a alteração e a posição (cursor) dos consumidores;
+    - cdc_consumidores: última versão lida por consumidor registrado;
+      a compactação não descarta o que algum deles ainda não leu.
+    O registro não leva os dados da linha: o consumidor relê a linha pela
+    chave (se não existir mais, foi excluída). Linhas anteriores à
+    migração não entram no log; o consumidor faz a carga inicial depois
+    de ler a posição atual (changes_position).
+    Sem AUTOINCREMENT (a tabela sqlite_sequence seria gravada a cada
+    alteração): a compactação nunca descarta a versão mais recente, então
+    uma versão não é reutilizada.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS cdc_alteracoes (
+            versao INTEGER PRIMARY KEY,
+            tabela TEXT NOT NULL,
+            chave INTEGER NOT NULL,
+            op TEXT NOT NULL CHECK (op IN ('I', 'U', 'D'))
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS cdc_consumidores (
+            nome TEXT PRIMARY KEY,
+            versao INTEGER NOT NULL,
+            atualizado_em TEXT DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("INSERT OR IGNORE INTO versoes_dados (nome, versao) VALUES (?, 0)", (CDC_HORIZONTE,))
+
+    for tabela in CDC_TABELAS:
+        for op, evento, linha in (("I", "INSERT", "NEW"), ("U", "UPDATE", "NEW"), ("D", "DELETE", "OLD")):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_cdc_{tabela}_{evento.lower()}
+                AFTER {evento} ON {tabela}
+                BEGIN
+                    INSERT INTO cdc_alteracoes (tabela, chave, op) VALUES ('{tabela}', {linha}.id, '{op}');
+                END
+            """)
+        # Troca de id: a chave antiga deixa de existir
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_cdc_{tabela}_update_id
+            AFTER UPDATE OF id ON {tabela}
+            WHEN OLD.id <> NEW.id
+            BEGIN
+                INSERT INTO cdc_alteracoes (tabela, chave, op) VALUES ('{tabela}', OLD.id, 'D');
+            END
+        """)
+
+def changes_position(cursor):
+    """Versão mais recente do log (0 se vazio): o ponto de partida após uma carga completa."""
+    cursor.execute("""
+        SELECT COALESCE(MAX(versao), (SELECT versao FROM versoes_dados WHERE nome = ?), 0)
+        FROM cdc_alteracoes
+    """, (CDC_HORIZONTE,))
+    return cursor.fetchone()[0]
+
+def get_changes(cursor, desde, tabelas=None, limite=1000):
+    """
+    Alterações com versão maior que 'desde', em ordem:
+    [{"versao", "tabela", "chave", "op"}] (até 'limite'; a próxima
+    posição é a versão do último item). Após a compactação resta só a
+    alteração mais recente de cada linha, então 'op' é a última operação.
+    Levanta ChangeCursorExpired se 'desde' é anterior às versões descartadas.
+    """
+    cursor.execute("SELECT versao FROM versoes_dados WHERE nome = ?", (CDC_HORIZONTE,))
+    horizonte = cursor.fetchone()[0]
+    if desde < horizonte:
+        raise ChangeCursorExpired(f"Posição {desde} anterior ao início do log de alterações ({horizonte}).")
+    query = "SELECT versao, tabela, chave, op FROM cdc_alteracoes WHERE versao > ?"
+    params = [desde]
+    if tabelas:
+        query += f" AND tabela IN ({', '.join('?' for _ in tabelas)})"
+        params.extend(tabelas)
+    cursor.execute(query + " ORDER BY versao LIMIT ?", (*params, limite))
+    return [dict(row) for row in cursor.fetchall()]
+
+def save_consumer_position(cursor, consumidor, versao):
+    """Registra a última versão lida por 'consumidor' (retém o log a partir dela)."""
+    cursor.execute("""
+        INSERT INTO cdc_consumidores (nome, versao) VALUES (?, ?)
+        ON CONFLICT (nome) DO UPDATE SET versao = excluded.versao, atualizado_em = CURRENT_TIMESTAMP
+        WHERE versao IS NOT excluded.versao
+    """, (consumidor, versao))
+
+def drop_consumer(cursor, consumidor):
+    """Remove um consumidor registrado (deixa de reter o log)."""
+    cursor.execute("DELETE FROM cdc_consumidores WHERE nome = ?", (consumidor,))
+    return cursor.rowcount > 0
+
+def _compact_log(cursor, log, posicao, grupo, consumidores, nome_horizonte, retidas):
+    """
+    Compactação comum aos logs de alterações ('log', com a posição na
+    coluna 'posicao'): descarta o que todos os consumidores registrados
+    já leram e está fora das últimas 'retidas' posições (a mais recente
+    sempre fica; o horizonte em versoes_dados só avança) e, do restante,
+    mantém só a posição mais recente de cada 'grupo'.
+    """
+    cursor.execute(f"SELECT MAX({posicao}) FROM {log}")
+    ultima = cursor.fetchone()[0] or 0
+    cursor.execute(f"SELECT MIN({posicao}) FROM {consumidores}")
+    lida = cursor.fetchone()[0]
+    horizonte = max(0, ultima - max(1, retidas))
+    if lida is not None:
+        horizonte = min(horizonte, lida)
+    cursor.execute("SELECT versao FROM versoes_dados WHERE nome = ?", (nome_horizonte,))
+    horizonte = max(horizonte, cursor.fetchone()[0])
+
+    cursor.execute(f"DELETE FROM {log} WHERE {posicao} <= ?", (horizonte,))
+    descartadas = cursor.rowcount
+    cursor.execute("UPDATE versoes_dados SET versao = ? WHERE nome = ?", (horizonte, nome_horizonte))
+    cursor.execute(f"""
+        DELETE FROM {log}
+        WHERE {posicao} NOT IN (SELECT MAX({posicao}) FROM {log} GROUP BY {grupo})
+    """)
+    return {"descartadas": descartadas, "compactadas": cursor.rowcount, "horizonte": horizonte}
+
+def compact_changes(cursor, retidas=CDC_RETIDAS):
+    """
+    Compacta o log de alterações:
+    - descarta as versões já lidas por todos os consumidores registrados
+      e fora das últimas 'retidas' (no mínimo a mais recente fica; o
+      horizonte avança e posições anteriores recebem ChangeCursorExpired);
+    - das restantes, mantém só a mais recente de cada linha.
+    Retorna {"descartadas", "compactadas", "horizonte"}.
+    """
+    return _compact_log(cursor, "cdc_alteracoes", "versao", "tabela, chave",
+                        "cdc_consumidores", CDC_HORIZONTE, retidas)
+
+# --- RETENÇÃO DO LOG DO CATÁLOGO ---
+CATALOGO_RETIDAS = 100000  # últimas posições de 'catalogo_alteracoes' mantidas sem consumidor registrado
+CATALOGO_HORIZONTE = "catalogo_horizonte"  # versoes_dados: posições até aqui foram descartadas
+
+def _migration_019_catalogo_retencao(cursor):
+    """
+    Retenção de 'catalogo_alteracoes' (migração 3), que crescia sem limite:
+    - catalogo_consumidores: última posição lida por consumidor registrado
+      (terminais em modo réplica, via servidor da loja);
+    - horizonte 'catalogo_horizonte' em versoes_dados: posições anteriores
+      foram descartadas e o consumidor recarrega o catálogo inteiro.
+    A compactação (compact_catalog_changes) roda com a do log de
+    alterações (modules/change_log.py).
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS catalogo_consumidores (
+            nome TEXT PRIMARY KEY,
+            seq INTEGER NOT NULL,
+            atualizado_em TEXT DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("INSERT OR IGNORE INTO versoes_dados (nome, versao) VALUES (?, 0)", (CATALOGO_HORIZONTE,))
+
+def catalog_changes_horizon(cursor):
+    """Posição até a qual 'catalogo_alteracoes' foi descartado (quem leu menos recarrega tudo)."""
+    cursor.execute("SELECT versao FROM versoes_dados WHERE nome = ?", (CATALOGO_HORIZONTE,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+def save_catalog_consumer_position(cursor, consumidor, seq):
+    """Registra a última posição de 'catalogo_alteracoes' lida por 'consumidor'."""
+    cursor.execute("""
+        INSERT INTO catalogo_consumidores (nome, seq) VALUES (?, ?)
+        ON CONFLICT (nome) DO UPDATE SET seq = excluded.seq, atualizado_em = CURRENT_TIMESTAMP
+        WHERE seq IS NOT excluded.seq
+    """, (consumidor, seq))
+
+def drop_catalog_consumer(cursor, consumidor):
+    """Remove um consumidor registrado de 'catalogo_alteracoes'."""
+    cursor.execute("DELETE FROM catalogo_consumidores WHERE nome = ?", (consumidor,))
+    return cursor.rowcount > 0
+
+def compact_catalog_changes(cursor, retidas=CATALOGO_RETIDAS):
+    """
+    Compacta 'catalogo_alteracoes': descarta as posições já lidas por todos
+    os consumidores registrados e fora das últimas 'retidas', e mantém só
+    a posição mais recente de cada produto.
+    Retorna {"descartadas", "compactadas", "horizonte"}.
+    """
+    return _compact_log(cursor, "catalogo_alteracoes", "seq", "produto_id",
+                        "catalogo_consumidores", CATALOGO_HORIZONTE, retidas)
+
+MIGRATIONS = [
+    (1, "Colunas legadas (antigo bloco ALTER TABLE)", _migration_001_colunas_legadas),
+    (2, "Índices de consulta (vendas, catálogo, financeiro)", _migration_002_indices),
+    (3, "Log de alterações do catálogo (índice de códigos do PDV)", _migration_003_catalogo_alteracoes),
+    (4, "Índice de busca textual de produtos (FTS5)", _migration_004_produtos_busca),
+    (5, "Gravação assíncrona de vendas (diário local)", _migration_005_gravacao_assincrona),
+    (6, "Totais acumulados por sessão de caixa", _migration_006_caixa_totais),
+    (7, "Fila persistente de impressão do PDV", _migration_007_fila_impressao),
+    (8, "Fato diário de vendas por produto", _migration_008_vendas_diarias),
+    (9, "Saldos mensais das contas financeiras", _migration_009_saldos_mensais),
+    (10, "DRE hierárquico (fechamento de categorias e resumo mensal)", _migration_010_dre),
+    (11, "Versões de dados (caches) e índice dos KPIs financeiros", _migration_011_versoes_dados),
+    (12, "Status VENCIDO gravado e índice parcial de lançamentos em aberto", _migration_012_lancamentos_vencidos),
+    (13, "Versões dos cadastros com nomes em cache (clientes, fornecedores, categorias, centros de custo)", _migration_013_versoes_nomes),
+    (14, "Hierarquia das classes de produto (fechamento, level e path)", _migration_014_categorias_produto_fechamento),
+    (15, "Razão de estoque (lançamentos, saldos por corte e estoque derivado)", _migration_015_razao_estoque),
+    (16, "Numeração por blocos reservados e lacunas para inutilização", _migration_016_sequencias_blocos),
+    (17, "Servidor da loja: saída de eventos do terminal, eventos recebidos e conflitos", _migration_017_replicacao),
+    (18, "Log de alterações por linha (CDC) e posições dos consumidores", _migration_018_cdc),
+    (19, "Retenção do log de alterações do catálogo (consumidores e horizonte)", _migration_019_catalogo_retencao),
+]
+
+def get_schema_version(conn):
+    """Retorna a última versão de migração aplicada (0 se nenhuma)."""
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+def run_migrations(conn):
+    """Aplica, em ordem, os passos de MIGRATIONS ainda não registrados."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            descricao TEXT,
+            aplicada_em TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.commit()
+    
+    current = get_schema_version(conn)
+    cursor = conn.cursor()
+    for version, descricao, step in MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            conn.execute("BEGIN")
+            step(cursor)
+            cursor.execute("INSERT INTO schema_version (version, descricao) VALUES (?, ?)", (version, descricao))
+            conn.commit()
+            logger.info(f"Migração {version} aplicada: {descricao}")
+        except Exception:
+            conn.rollback()
+            raise
+
+
 def create_tables():
     """Cria as tabelas necessárias se não existirem."""
     conn = get_connection()
@@ -592,66 +2126,17 @@ def create_tables():
     
     conn.commit()
     
-    # --- 10. BLOCO ALTER TABLE ---
-    def add_column_if_not_exists(table, column, definition):
-        try:
-            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
-            print(f"Coluna '{column}' adicionada à tabela '{table}'.")
-        except sqlite3.OperationalError as e:
-            if "duplicate column name" in str(e) or "no such table" in str(e):
-                pass
-            else:
-                raise e
-    
-    # Mantém os ALTER TABLE de migração (existentes nas versões anteriores)
-    add_column_if_not_exists("clientes", "tipo_cadastro", "TEXT DEFAULT 'Cliente'")
-    add_column_if_not_exists("clientes", "categoria", "TEXT DEFAULT 'Padrão'")
-    
-    add_column_if_not_exists("vendas_pagamentos", "tipo_pagamento", "TEXT")
-    add_column_if_not_exists("vendas_pagamentos", "nsu", "TEXT")
-    add_column_if_not_exists("vendas_pagamentos", "doc", "TEXT")
-    add_column_if_not_exists("vendas_pagamentos", "tipo_cartao", "TEXT")
-    add_column_if_not_exists("vendas_pagamentos", "parcelas", "INTEGER DEFAULT 1")
-    
-    add_column_if_not_exists("vendas", "terminal_id", "INTEGER")
-    add_column_if_not_exists("vendas", "numero_venda_terminal", "INTEGER")
-    add_column_if_not_exists("vendas", "prevenda_origem_id", "INTEGER")
-    add_column_if_not_exists("vendas", "empresa_id", "INTEGER")
-    add_column_if_not_exists("vendas", "local_id", "INTEGER")
-    add_column_if_not_exists("vendas", "tipo_documento", "TEXT DEFAULT 'FISCAL'")
-    add_column_if_not_exists("vendas_itens", "sku_id", "INTEGER")
-    add_column_if_not_exists("prevendas_itens", "sku_id", "INTEGER")
-    
-    add_column_if_not_exists("caixa_sessoes", "terminal_id", "INTEGER")
-    add_column_if_not_exists("caixa_sessoes", "valor_final_calculado", "REAL")
-    add_column_if_not_exists("caixa_sessoes", "valor_final_informado", "REAL")
-    add_column_if_not_exists("caixa_sessoes", "diferenca", "REAL")
-    add_column_if_not_exists("caixa_sessoes", "autorizador_id", "INTEGER")
-    
-    add_column_if_not_exists("permissoes", "formularios", "TEXT")
-    
-    add_column_if_not_exists("terminais_pdv", "price_list_id_padrao", "INTEGER")
-    add_column_if_not_exists("terminais_pdv", "deposito_id_padrao", "INTEGER")
-
-    add_column_if_not_exists("empresas", "status", "INTEGER DEFAULT 1")
-    add_column_if_not_exists("locais_escrituracao", "status", "INTEGER DEFAULT 1")
-    
-    add_column_if_not_exists("terminais_pdv", "conta_financeira_id", "INTEGER REFERENCES contas_financeiras(id)")
-    add_column_if_not_exists("terminais_pdv", "conta_destino_dinheiro_id", "INTEGER REFERENCES contas_financeiras(id)")
-    add_column_if_not_exists("terminais_pdv", "conta_destino_cartao_id", "INTEGER REFERENCES contas_financeiras(id)")
-    add_column_if_not_exists("terminais_pdv", "conta_destino_pix_id", "INTEGER REFERENCES contas_financeiras(id)")
-    add_column_if_not_exists("terminais_pdv", "conta_destino_outros_id", "INTEGER REFERENCES contas_financeiras(id)")
-    
-    add_column_if_not_exists("produtos", "data_validade", "DATE")
-    add_column_if_not_exists("produtos", "caminho_imagem", "TEXT")
+    # --- 10. MIGRAÇÕES VERSIONADAS (schema_version) ---
+    run_migrations(conn)
     
+    # Índice FTS5 de produtos que a migração 4 não pôde criar (SQLite sem FTS5)
+    conn.execute("BEGIN")
     try:
-        cursor.execute("UPDATE empresas SET status = 1 WHERE status IS NULL")
-        cursor.execute("UPDATE locais_escrituracao SET status = 1 WHERE status IS NULL")
-    except Exception as e:
-        print(f"Erro ao atualizar status antigos: {e}")
-    
-    conn.commit()
+        ensure_produtos_busca(cursor)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
     
     # --- 11. Popula os dados iniciais ---
     populate_initial_data(cursor)
@@ -3,10 +3,15 @@ import sys
 import os
 import logging
 import logging.handlers
+import multiprocessing
 from PyQt5.QtWidgets import QApplication
 from PyQt5.QtGui import QIcon 
 from auth.login_window import LoginWindow
 from database.db import create_tables
+from modules.overdue_sweeper import start_overdue_sweeper
+from modules.stock_ledger import start_stock_snapshots
+from modules.change_log import start_change_log_compaction
+from modules import store_replica
 
 # --- Importa o verificador de atualizações ---
 try:
@@ -63,10 +68,24 @@ def main():
             logging.warning("Módulo de atualização não encontrado. Continuando sem atualização automática.")
 
         # --- 2️⃣ Garante que as tabelas do banco de dados existam ---
+        # Terminal em modo réplica do servidor da loja (BLUESYS_SERVIDOR_LOJA): banco local
+        replica = store_replica.configure()
+
         logging.debug("Verificando/Criando tabelas no banco de dados...")
         create_tables()
         logging.debug("Tabelas verificadas com sucesso.")
 
+        if replica:
+            # Cópia inicial na primeira execução e sincronia em segundo plano
+            replica.start()
+
+        # Lançamentos PENDENTE -> VENCIDO agora e a cada virada de dia
+        start_overdue_sweeper()
+        # Corte mensal dos saldos de estoque (razão) ao iniciar e a cada virada de dia
+        start_stock_snapshots()
+        # Compactação do log de alterações (CDC) ao iniciar e a cada virada de dia
+        start_change_log_compaction()
+
         # --- 3️⃣ Inicializa a aplicação PyQt ---
         app = QApplication(sys.argv)
         app.setStyle("Fusion")
@@ -104,5 +123,7 @@ def main():
 
 
 if __name__ == '__main__':
+    # Necessário para os processos auxiliares (ex.: geração de PDF) no executável do Windows
+    multiprocessing.freeze_support()
     # Chamada corrigida para usar o código de saída retornado por main()
     sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,130 @@
+# modules/account_balances.py
+"""
+Saldos mensais das contas financeiras (tabela 'saldos_mensais',
+migração 9).
+
+Cada linha guarda, por conta e mês ('AAAA-MM'), as entradas e saídas do
+mês e o saldo acumulado de todas as movimentações até o fim do mês. Os
+valores são mantidos por gatilhos em 'movimentacoes_contas' (inclusão,
+baixa, estorno, edição e exclusão), na mesma transação da movimentação.
+O saldo_inicial da conta não entra no acumulado: é somado na consulta,
+de modo que editá-lo não invalida os saldos mensais.
+
+opening_balance() lê o último saldo mensal anterior ao período e soma
+só as movimentações do próprio mês, em vez de percorrer todo o histórico
+da conta.
+
+Verificação/correção a partir das movimentações:
+    python -m modules.account_balances [conta_id] [--check]
+"""
+import sys
+import logging
+from database.db import get_connection, rebuild_saldos_mensais
+
+logger = logging.getLogger(__name__)
+
+TOLERANCIA = 0.005  # centavo arredondado
+
+
+# --- CONSULTA ---
+
+def opening_balance(cur, conta_id, data_inicio):
+    """
+    Saldo da conta antes de 'data_inicio' ('AAAA-MM-DD'): saldo_inicial
+    + acumulado do último mês anterior + movimentações do mês de
+    'data_inicio' até a véspera.
+    """
+    cur.execute("SELECT saldo_inicial FROM contas_financeiras WHERE id = ?", (conta_id,))
+    row = cur.fetchone()
+    saldo_inicial = (row['saldo_inicial'] or 0.0) if row else 0.0
+
+    mes = data_inicio[:7]
+    cur.execute("""
+        SELECT saldo_acumulado FROM saldos_mensais
+        WHERE conta_id = ? AND mes < ?
+        ORDER BY mes DESC LIMIT 1
+    """, (conta_id, mes))
+    row = cur.fetchone()
+    acumulado = row['saldo_acumulado'] if row else 0.0
+
+    cur.execute("""
+        SELECT SUM(CASE WHEN tipo_movimento = 'ENTRADA' THEN valor ELSE -valor END) AS total
+        FROM movimentacoes_contas
+        WHERE conta_id = ? AND data_movimento >= ? AND data_movimento < ?
+    """, (conta_id, f"{mes}-01", data_inicio))
+    delta = cur.fetchone()['total'] or 0.0
+    return round(saldo_inicial + acumulado + delta, 2)
+
+
+# --- VERIFICAÇÃO DE CONSISTÊNCIA ---
+
+def _snapshot(cur, conta_id):
+    if conta_id is None:
+        cur.execute("SELECT conta_id, mes, entradas, saidas, saldo_acumulado FROM saldos_mensais")
+    else:
+        cur.execute("""
+            SELECT conta_id, mes, entradas, saidas, saldo_acumulado
+            FROM saldos_mensais WHERE conta_id = ?
+        """, (conta_id,))
+    return {(r['conta_id'], r['mes']): (r['entradas'], r['saidas'], r['saldo_acumulado'])
+            for r in cur.fetchall()}
+
+
+def check_balance_checkpoints(conta_id=None, repair=True):
+    """
+    Recalcula os saldos mensais (de uma conta ou de todas) a partir das
+    movimentações e compara com os mantidos pelos gatilhos.
+    Retorna {"success", "divergencias": {(conta_id, mes): (atual, recalculado)}}.
+    Com repair=True os saldos recalculados são gravados.
+    """
+    conn = get_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        cur = conn.cursor()
+        atual = _snapshot(cur, conta_id)
+        rebuild_saldos_mensais(cur, conta_id)
+        recalculado = _snapshot(cur, conta_id)
+
+        vazio = (0, 0, 0)
+        divergencias = {}
+        for chave in set(atual) | set(recalculado):
+            a, r = atual.get(chave), recalculado.get(chave)
+            if r is None and a[:2] == (0, 0) and abs(a[2] - _acumulado_anterior(recalculado, chave)) <= TOLERANCIA:
+                continue  # mês sem movimentações restantes (ex.: após exclusão)
+            if any(abs(x - y) > TOLERANCIA for x, y in zip(a or vazio, r or vazio)):
+                divergencias[chave] = (a, r)
+
+        if divergencias and repair:
+            conn.commit()
+            logger.warning(f"Saldos mensais divergentes, recalculados: {divergencias}")
+        else:
+            conn.rollback()
+            if divergencias:
+                logger.warning(f"Saldos mensais divergentes: {divergencias}")
+        return {"success": True, "divergencias": divergencias}
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Erro ao verificar saldos mensais: {e}", exc_info=True)
+        return {"success": False, "error": f"Erro ao verificar saldos mensais: {e}"}
+    finally:
+        conn.close()
+
+
+def _acumulado_anterior(saldos, chave):
+    """Acumulado do último mês anterior a 'chave' na mesma conta (0 se não houver)."""
+    conta_id, mes = chave
+    anteriores = [k for k in saldos if k[0] == conta_id and k[1] < mes]
+    return saldos[max(anteriores)][2] if anteriores else 0
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if a != "--check"]
+    resultado = check_balance_checkpoints(int(args[0]) if args else None,
+                                          repair="--check" not in sys.argv)
+    if not resultado["success"]:
+        print(resultado["error"])
+    elif resultado["divergencias"]:
+        for (conta, mes), (atual, recalculado) in sorted(resultado["divergencias"].items()):
+            print(f"Conta {conta} {mes}: {atual} -> {recalculado}")
+    else:
+        print("Saldos mensais conferem com as movimentações.")
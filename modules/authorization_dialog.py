@@ -1,7 +1,7 @@
 # modules/authorization_dialog.py
 import json
 from PyQt5.QtWidgets import QLineEdit, QMessageBox, QLabel
-from database.db import get_connection
+from database.db import get_connection, check_password
 from .custom_dialogs import FramelessDialog, CustomInputDialog
 
 class AuthorizationDialog(CustomInputDialog):
@@ -47,7 +47,7 @@ class AuthorizationDialog(CustomInputDialog):
             cur.execute("SELECT id, password_text FROM usuarios WHERE username = ? AND is_active = 1", (username,))
             user_data = cur.fetchone()
 
-            if not user_data or user_data["password_text"] != password:
+            if not user_data or not check_password(username, user_data["password_text"], password):
                 QMessageBox.critical(self, "Acesso Negado", "Usuário ou senha inválidos!")
                 return
 
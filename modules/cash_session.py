@@ -0,0 +1,121 @@
+# modules/cash_session.py
+"""
+Sessão de caixa do PDV: abertura, sangria/suprimento e fechamento.
+
+As funções gravam na transação aberta em 'cur' e recebem tudo o que
+precisam do terminal ('terminal' é a linha de terminais_pdv como dict),
+para que a mesma gravação sirva ao PDV (modules/pos_controller.py) e ao
+servidor da loja (modules/store_server.py), que aplica no banco central
+os eventos de caixa enviados pelos terminais em modo réplica.
+
+O fechamento tem duas partes: mark_closed() encerra a sessão e
+post_closing() lança no financeiro o recebimento de cada forma de
+pagamento (título, lançamentos, movimentações PDV -> conta de destino e
+saldos das contas). Em modo réplica o terminal só encerra a sessão
+local; o financeiro é lançado pelo servidor.
+"""
+from . import session_totals
+
+
+def open_session(cur, user_id, terminal_id, valor_inicial, caixa_id=None):
+    """Abre a sessão (com o id informado, quando atribuído pelo servidor) e retorna o id."""
+    cur.execute("""
+        INSERT INTO caixa_sessoes (id, user_id, valor_inicial, status, terminal_id)
+        VALUES (?, ?, ?, 'ABERTO', ?)
+    """, (caixa_id, user_id, valor_inicial, terminal_id))
+    return cur.lastrowid
+
+
+def record_movement(cur, caixa_id, user_id, terminal_id, tipo, valor, motivo, autorizador_id, data=None):
+    """Grava uma sangria/suprimento e soma aos totais da sessão."""
+    cur.execute("""
+        INSERT INTO caixa_movimentacoes
+        (caixa_id, user_id, terminal_id, tipo, valor, motivo, autorizador_id, data_movimento)
+        VALUES (?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+    """, (caixa_id, user_id, terminal_id, tipo, valor, motivo, autorizador_id, data))
+    session_totals.record_movement(cur, caixa_id, tipo, valor)
+
+
+def mark_closed(cur, caixa_id, data, autorizador_id, data_fechamento=None):
+    """Encerra a sessão com os valores da conferência ('calculado', 'informado', 'diferenca')."""
+    cur.execute("""
+        UPDATE caixa_sessoes
+        SET
+            status = 'FECHADO',
+            data_fechamento = COALESCE(?, CURRENT_TIMESTAMP),
+            valor_final_calculado = ?,
+            valor_final_informado = ?,
+            diferenca = ?,
+            autorizador_id = ?
+        WHERE id = ?
+    """, (data_fechamento, data["calculado"], data["informado"], data["diferenca"], autorizador_id, caixa_id))
+
+
+def _categoria_venda(cur):
+    cur.execute("SELECT id FROM categorias_financeiras WHERE nome = 'Receita de Vendas PDV' AND tipo = 'RECEITA'")
+    cat_venda = cur.fetchone()
+    if not cat_venda:
+        cur.execute("SELECT id FROM categorias_financeiras WHERE tipo = 'RECEITA' LIMIT 1")
+        cat_venda = cur.fetchone()
+    return cat_venda['id'] if cat_venda else None
+
+
+def _conta_destino(terminal, forma_pagamento):
+    if forma_pagamento == "Dinheiro":
+        return terminal['conta_destino_dinheiro_id']
+    if forma_pagamento == "Cartão":
+        return terminal['conta_destino_cartao_id']
+    if forma_pagamento == "Pix":
+        return terminal['conta_destino_pix_id']
+    return terminal['conta_destino_outros_id']
+
+
+def post_closing(cur, caixa_id, terminal, totais_esperados, valor_total):
+    """
+    Lança o fechamento no financeiro: um título PAGO de 'valor_total' e,
+    por forma de pagamento com valor, o lançamento, as movimentações da
+    conta do PDV para a conta de destino e os saldos das duas contas.
+    """
+    categoria_venda_id = _categoria_venda(cur)
+    conta_pdv_id = terminal['conta_financeira_id']
+
+    descricao_titulo = f"Fechamento Caixa #{caixa_id} - Terminal: {terminal['nome_terminal']}"
+    cur.execute("""
+        INSERT INTO titulos_financeiros
+        (empresa_id, tipo, categoria_id, data_emissao, descricao, valor_total, status)
+        VALUES (?, 'RECEBER', ?, CURRENT_TIMESTAMP, ?, ?, 'PAGO')
+    """, (terminal['empresa_id'], categoria_venda_id, descricao_titulo, valor_total))
+    titulo_id = cur.lastrowid
+
+    for forma_pagamento, valor in totais_esperados.items():
+        if valor == 0:
+            continue
+        destino_conta_id = _conta_destino(terminal, forma_pagamento)
+        desc_lancamento = f"Recebimento {forma_pagamento} - Fechamento Caixa #{caixa_id}"
+
+        cur.execute("""
+            INSERT INTO lancamentos_financeiros
+            (titulo_id, tipo, categoria_id, descricao, valor_previsto, data_vencimento, status, data_pagamento, valor_pago)
+            VALUES (?, 'RECEBER', ?, ?, ?, DATE('now'), 'PAGO', DATE('now'), ?)
+        """, (titulo_id, categoria_venda_id, desc_lancamento, valor, valor))
+        lancamento_id = cur.lastrowid
+
+        cur.execute("""
+            INSERT INTO movimentacoes_contas
+            (conta_id, lancamento_id, caixa_sessao_id, tipo_movimento, valor, descricao, conciliado)
+            VALUES (?, ?, ?, 'SAIDA', ?, ?, 1)
+        """, (conta_pdv_id, lancamento_id, caixa_id, valor, desc_lancamento))
+        cur.execute("""
+            INSERT INTO movimentacoes_contas
+            (conta_id, lancamento_id, caixa_sessao_id, tipo_movimento, valor, descricao, conciliado)
+            VALUES (?, ?, ?, 'ENTRADA', ?, ?, 1)
+        """, (destino_conta_id, lancamento_id, caixa_id, valor, desc_lancamento))
+
+        cur.execute("UPDATE contas_financeiras SET saldo_atual = saldo_atual - ? WHERE id = ?", (valor, conta_pdv_id))
+        cur.execute("UPDATE contas_financeiras SET saldo_atual = saldo_atual + ? WHERE id = ?", (valor, destino_conta_id))
+
+
+def close_session(cur, caixa_id, terminal, data, autorizador_id, totais_esperados, data_fechamento=None):
+    """Encerra a sessão e lança o fechamento no financeiro (mark_closed + post_closing)."""
+    mark_closed(cur, caixa_id, data, autorizador_id, data_fechamento)
+    post_closing(cur, caixa_id, terminal, totais_esperados, data["calculado"])
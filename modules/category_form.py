@@ -1,14 +1,19 @@
 # -*- coding: utf-8 -*-
 # modules/category_form.py
 import sqlite3
+from datetime import date, timedelta
 from PyQt5.QtWidgets import (
     QWidget, QLabel, QLineEdit, QPushButton, QVBoxLayout, QHBoxLayout, 
     QMessageBox, QGridLayout, QFrame, QTreeWidget, QTreeWidgetItem, 
-    QAbstractItemView, QStackedWidget, QComboBox
+    QAbstractItemView, QStackedWidget, QComboBox, QHeaderView
 )
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QColor
 from database.db import get_connection
+from . import category_tree
+
+DIAS_VENDAS = 30 # Período da coluna de vendas da árvore
+ROLE_CARREGADO = Qt.UserRole + 1 # Filhos do nó já lidos do banco
 
 class CategoryForm(QWidget):
     """
@@ -24,6 +29,7 @@ class CategoryForm(QWidget):
         
         self.company_map = {} # {id_empresa: razao_social}
         self.category_nodes = {} # {id_categoria: QTreeWidgetItem}
+        self.expanded_ids = set() # Ramos abertos (reabertos ao recarregar a árvore)
         
         self._setup_styles()
         self._build_ui()
@@ -85,8 +91,14 @@ class CategoryForm(QWidget):
         filter_layout.addWidget(self.empresa_combo, 0, 1)
         left_layout.addLayout(filter_layout)
         
+        # Árvore carregada sob demanda: cada ramo é lido ao ser aberto
         self.category_tree = QTreeWidget()
-        self.category_tree.setHeaderHidden(True) # Esconde cabeçalho
+        self.category_tree.setColumnCount(3)
+        self.category_tree.setHeaderLabels(["Classe", "Produtos", f"Vendas ({DIAS_VENDAS} dias)"])
+        self.category_tree.header().setStretchLastSection(False)
+        self.category_tree.header().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.category_tree.header().setSectionResizeMode(1, QHeaderView.ResizeToContents)
+        self.category_tree.header().setSectionResizeMode(2, QHeaderView.ResizeToContents)
         left_layout.addWidget(self.category_tree, 1)
         
         tree_btn_layout = QHBoxLayout()
@@ -147,6 +159,9 @@ class CategoryForm(QWidget):
     def _connect_signals(self):
         self.empresa_combo.currentIndexChanged.connect(self.load_categories)
         self.category_tree.itemSelectionChanged.connect(self._on_category_selected)
+        self.category_tree.itemExpanded.connect(self._on_item_expanded)
+        self.category_tree.itemCollapsed.connect(
+            lambda item: self.expanded_ids.discard(item.data(0, Qt.UserRole)))
         
         self.btn_add_root.clicked.connect(self._show_new_form_root)
         self.btn_add_sub.clicked.connect(self._show_new_form_sub)
@@ -185,7 +200,7 @@ class CategoryForm(QWidget):
             conn.close()
             
     def load_categories(self):
-        """Carrega as classes da empresa selecionada e constrói a árvore."""
+        """Carrega as classes raiz da empresa selecionada (os ramos são lidos ao abrir)."""
         self.category_tree.clear()
         self.category_nodes.clear()
         self.cancel_edit()
@@ -196,55 +211,63 @@ class CategoryForm(QWidget):
             return
             
         self.btn_add_root.setEnabled(True)
+        self._load_children(None, self.category_tree.invisibleRootItem())
+
+    def _load_children(self, parent_id, parent_item):
+        """Lê um nível da árvore (com os totais de cada subárvore) sob 'parent_item'."""
+        empresa_id = self.empresa_combo.currentData()
+        hoje = date.today()
         
         conn = get_connection()
         try:
             cur = conn.cursor()
-            query = "SELECT id, name, parent_id, code, active FROM categorias WHERE empresa_id = ? ORDER BY name"
-            cur.execute(query, (empresa_id,))
+            filhos = category_tree.children(cur, empresa_id, parent_id)
+            totais = category_tree.subtree_totals(
+                cur, empresa_id, parent_id,
+                (hoje - timedelta(days=DIAS_VENDAS - 1)).isoformat(), hoje.isoformat())
+        except Exception as e:
+            QMessageBox.critical(self, "Erro", f"Erro ao carregar classes: {e}")
+            return
+        finally:
+            conn.close()
+
+        a_expandir = []
+        for cat_data in filhos:
+            item = QTreeWidgetItem(parent_item)
+            item.setText(0, cat_data['name'])
+            item.setData(0, Qt.UserRole, cat_data['id'])
             
-            all_categories = cur.fetchall()
+            total = totais.get(cat_data['id'], {})
+            item.setText(1, str(total.get('produtos', 0)))
+            item.setText(2, f"R$ {total.get('total_liquido', 0.0):.2f}")
+            item.setTextAlignment(1, Qt.AlignRight | Qt.AlignVCenter)
+            item.setTextAlignment(2, Qt.AlignRight | Qt.AlignVCenter)
             
-            # Mapeia ID da categoria para o objeto de dados
-            category_data_map = {cat['id']: dict(cat) for cat in all_categories}
-            # Mapeia ID da categoria para o item da árvore
-            tree_item_map = {}
-            # Mapeia ID PAI para lista de IDs filhos
-            children_map = {}
+            if not cat_data['active']:
+                item.setForeground(0, QColor(Qt.gray))
+                item.setText(0, f"{cat_data['name']} (Inativa)")
             
-            for cat_id, cat_data in category_data_map.items():
-                parent_id = cat_data['parent_id']
-                if parent_id not in children_map:
-                    children_map[parent_id] = []
-                children_map[parent_id].append(cat_id)
-
-            # Função recursiva para construir a árvore
-            def build_tree(parent_id, parent_item):
-                if parent_id not in children_map:
-                    return # Não tem filhos
-                    
-                for cat_id in children_map[parent_id]:
-                    cat_data = category_data_map[cat_id]
-                    
-                    item = QTreeWidgetItem(parent_item)
-                    item.setText(0, cat_data['name'])
-                    item.setData(0, Qt.UserRole, cat_data['id'])
-                    
-                    if not cat_data['active']:
-                        item.setForeground(0, QColor(Qt.gray))
-                        item.setText(0, f"{cat_data['name']} (Inativa)")
-                        
-                    tree_item_map[cat_id] = item
-                    build_tree(cat_id, item) # Chama recursivamente
+            # Seta de expansão sem criar os filhos; lidos em _on_item_expanded
+            if cat_data['filhos']:
+                item.setChildIndicatorPolicy(QTreeWidgetItem.ShowIndicator)
+                item.setData(0, ROLE_CARREGADO, False)
+                if cat_data['id'] in self.expanded_ids:
+                    a_expandir.append(item)
+            else:
+                item.setChildIndicatorPolicy(QTreeWidgetItem.DontShowIndicatorWhenChildless)
+                item.setData(0, ROLE_CARREGADO, True)
+                
+            self.category_nodes[cat_data['id']] = item
 
-            # Inicia a construção a partir da raiz (None)
-            build_tree(None, self.category_tree.invisibleRootItem())
-            self.category_tree.expandAll()
+        for item in a_expandir:
+            item.setExpanded(True)
 
-        except Exception as e:
-            QMessageBox.critical(self, "Erro", f"Erro ao carregar classes: {e}")
-        finally:
-            conn.close()
+    def _on_item_expanded(self, item):
+        """Carrega os filhos do nó na primeira vez que ele é aberto."""
+        self.expanded_ids.add(item.data(0, Qt.UserRole))
+        if not item.data(0, ROLE_CARREGADO):
+            item.setData(0, ROLE_CARREGADO, True)
+            self._load_children(item.data(0, Qt.UserRole), item)
 
     def _on_category_selected(self):
         """Chamado quando um item da árvore é clicado."""
@@ -340,18 +363,6 @@ class CategoryForm(QWidget):
         self.btn_excluir.setEnabled(False)
         self.btn_add_sub.setEnabled(False) # Só habilita quando seleciona
 
-    def _get_parent_level(self, conn, parent_id):
-        """Busca o nível do pai para calcular o nível do filho."""
-        if parent_id is None:
-            return -1 # Raiz será 0
-        try:
-            cur = conn.cursor()
-            cur.execute("SELECT level FROM categorias WHERE id = ?", (parent_id,))
-            result = cur.fetchone()
-            return result['level'] if result else -1
-        except Exception:
-            return -1
-
     def save_category(self):
         empresa_id = self.empresa_combo.currentData()
         if empresa_id is None:
@@ -385,10 +396,7 @@ class CategoryForm(QWidget):
                 """
                 msg = "Classe atualizada com sucesso!"
             else:
-                # --- INSERT ---
-                level = self._get_parent_level(conn, self.current_parent_id) + 1
-                data["level"] = level
-                
+                # --- INSERT --- (level e path são gravados pelos gatilhos da migração 14)
                 fields = ", ".join(data.keys())
                 placeholders = ", ".join([f":{k}" for k in data.keys()])
                 query = f"INSERT INTO categorias ({fields}) VALUES ({placeholders})"
@@ -397,6 +405,8 @@ class CategoryForm(QWidget):
             cur.execute(query, data)
             conn.commit()
             
+            if self.current_parent_id:
+                self.expanded_ids.add(self.current_parent_id) # Reabre o ramo da nova classe
             QMessageBox.information(self, "Sucesso", msg)
             self.load_categories() # Recarrega a árvore
             self.cancel_edit()
@@ -413,16 +423,15 @@ class CategoryForm(QWidget):
             QMessageBox.warning(self, "Erro", "Nenhuma classe selecionada.")
             return
 
-        # 1. Verifica se tem filhos
-        item = self.category_tree.selectedItems()[0]
-        if item.childCount() > 0:
-            QMessageBox.critical(self, "Erro", "Não é possível excluir. Esta classe contém subclasses.")
-            return
-            
         conn = get_connection()
         try:
             cur = conn.cursor()
             
+            # 1. Verifica se tem filhos (no banco: os ramos fechados não estão na árvore)
+            if category_tree.has_children(cur, self.current_category_id):
+                QMessageBox.critical(self, "Erro", "Não é possível excluir. Esta classe contém subclasses.")
+                return
+            
             # 2. Verifica se está em uso por um produto
             cur.execute("SELECT id FROM produtos WHERE categoria_id = ?", (self.current_category_id,))
             produto_usando = cur.fetchone()
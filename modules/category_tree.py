@@ -0,0 +1,168 @@
+# modules/category_tree.py
+"""
+Hierarquia das classes de produto ('categorias').
+
+Usa 'categorias_produto_fechamento' (migração 14): um par por classe e
+cada um dos seus ancestrais, mantido por gatilhos em 'categorias' junto
+com as colunas level e path. Com isso "todos os produtos abaixo desta
+classe" e os totais de uma subárvore são uma única consulta (JOIN com
+o fechamento), sem percorrer a árvore em Python nem recursão no SQL.
+
+children() lê um nível da árvore (com o número de subclasses de cada
+nó), o suficiente para a CategoryForm carregar cada ramo só quando ele
+é aberto. subtree_totals() soma, para cada filho de um nó, os produtos
+e as vendas do fato diário (modules/sales_facts.py) de toda a subárvore.
+
+Verificação/correção a partir de parent_id:
+    python -m modules.category_tree [--check]
+"""
+import sys
+import logging
+from database.db import get_connection, rebuild_categorias_produto_fechamento
+
+logger = logging.getLogger(__name__)
+
+
+# --- CONSULTA ---
+
+def children(cur, empresa_id, parent_id=None):
+    """
+    Classes filhas de 'parent_id' (None = raízes) da empresa:
+    [{"id", "name", "code", "active", "filhos"}], por nome.
+    """
+    cur.execute("""
+        SELECT c.id, c.name, c.code, c.active,
+               (SELECT COUNT(*) FROM categorias f
+                WHERE f.empresa_id = c.empresa_id AND f.parent_id = c.id) AS filhos
+        FROM categorias c
+        WHERE c.empresa_id = ? AND c.parent_id IS ?
+        ORDER BY c.name
+    """, (empresa_id, parent_id))
+    return [dict(row) for row in cur.fetchall()]
+
+
+def has_children(cur, categoria_id):
+    cur.execute("SELECT 1 FROM categorias WHERE parent_id = ? LIMIT 1", (categoria_id,))
+    return cur.fetchone() is not None
+
+
+def subtree_ids(cur, categoria_id):
+    """Ids da classe e de todas as suas subclasses."""
+    cur.execute("""
+        SELECT descendente_id FROM categorias_produto_fechamento
+        WHERE ancestral_id = ?
+    """, (categoria_id,))
+    return [row['descendente_id'] for row in cur.fetchall()]
+
+
+def subtree_products_query(categoria_id, somente_ativos=True):
+    """(sql, params) dos produtos da classe e das subclasses: id, nome, categoria_id."""
+    query = """
+        SELECT p.id, p.nome, p.categoria_id
+        FROM categorias_produto_fechamento f
+        JOIN produtos p ON p.categoria_id = f.descendente_id
+        WHERE f.ancestral_id = ?
+    """
+    if somente_ativos:
+        query += " AND p.active = 1"
+    return query + " ORDER BY p.nome", (categoria_id,)
+
+
+def subtree_totals(cur, empresa_id, parent_id, dia_inicio, dia_fim):
+    """
+    Para cada filho de 'parent_id' (None = raízes), totais da subárvore:
+    {categoria_id: {"produtos", "quantidade", "total_liquido"}}, com as
+    vendas de 'vendas_diarias' entre dia_inicio e dia_fim ('AAAA-MM-DD').
+    """
+    totais = {}
+    cur.execute("""
+        SELECT f.ancestral_id AS categoria_id, COUNT(*) AS produtos
+        FROM categorias c
+        JOIN categorias_produto_fechamento f ON f.ancestral_id = c.id
+        JOIN produtos p ON p.categoria_id = f.descendente_id
+        WHERE c.empresa_id = ? AND c.parent_id IS ?
+        GROUP BY f.ancestral_id
+    """, (empresa_id, parent_id))
+    for row in cur.fetchall():
+        totais[row['categoria_id']] = {"produtos": row['produtos'], "quantidade": 0.0, "total_liquido": 0.0}
+
+    # Vendas somadas por produto no intervalo (chave primária do fato por dia) e
+    # depois subidas aos ancestrais pelo fechamento; CROSS JOIN fixa essa ordem
+    # (partindo das classes seriam N filhos x linhas do fato).
+    cur.execute("""
+        SELECT f.ancestral_id AS categoria_id,
+               ROUND(SUM(v.quantidade), 3) AS quantidade,
+               ROUND(SUM(v.total_liquido), 2) AS total_liquido
+        FROM (SELECT produto_id, SUM(quantidade) AS quantidade, SUM(total_liquido) AS total_liquido
+              FROM vendas_diarias WHERE dia BETWEEN ? AND ?
+              GROUP BY produto_id) AS v
+        CROSS JOIN produtos p ON p.id = v.produto_id
+        CROSS JOIN categorias_produto_fechamento f ON f.descendente_id = p.categoria_id
+        CROSS JOIN categorias c ON c.id = f.ancestral_id
+        WHERE c.empresa_id = ? AND c.parent_id IS ?
+        GROUP BY f.ancestral_id
+    """, (dia_inicio, dia_fim, empresa_id, parent_id))
+    for row in cur.fetchall():
+        t = totais.setdefault(row['categoria_id'], {"produtos": 0, "quantidade": 0.0, "total_liquido": 0.0})
+        t["quantidade"], t["total_liquido"] = row['quantidade'] or 0.0, row['total_liquido'] or 0.0
+    return totais
+
+
+# --- VERIFICAÇÃO DE CONSISTÊNCIA ---
+
+def _snapshot(cur):
+    cur.execute("SELECT ancestral_id, descendente_id, profundidade FROM categorias_produto_fechamento")
+    fechamento = {(r['ancestral_id'], r['descendente_id']): r['profundidade'] for r in cur.fetchall()}
+    cur.execute("SELECT id, level, path FROM categorias")
+    caminhos = {r['id']: (r['level'], r['path']) for r in cur.fetchall()}
+    return fechamento, caminhos
+
+
+def check_category_index(repair=True):
+    """
+    Recalcula o fechamento, level e path a partir de parent_id e compara
+    com os mantidos pelos gatilhos.
+    Retorna {"success", "divergencias": {chave: (atual, recalculado)}}.
+    Com repair=True os valores recalculados são gravados.
+    """
+    conn = get_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        cur = conn.cursor()
+        fechamento, caminhos = _snapshot(cur)
+        rebuild_categorias_produto_fechamento(cur)
+        fechamento_novo, caminhos_novos = _snapshot(cur)
+
+        divergencias = {}
+        for chave in set(fechamento) | set(fechamento_novo):
+            if fechamento.get(chave) != fechamento_novo.get(chave):
+                divergencias[("fechamento", *chave)] = (fechamento.get(chave), fechamento_novo.get(chave))
+        for cid in set(caminhos) | set(caminhos_novos):
+            if caminhos.get(cid) != caminhos_novos.get(cid):
+                divergencias[("categoria", cid)] = (caminhos.get(cid), caminhos_novos.get(cid))
+
+        if divergencias and repair:
+            conn.commit()
+            logger.warning(f"Hierarquia de classes divergente, recalculada: {divergencias}")
+        else:
+            conn.rollback()
+            if divergencias:
+                logger.warning(f"Hierarquia de classes divergente: {divergencias}")
+        return {"success": True, "divergencias": divergencias}
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Erro ao verificar a hierarquia de classes: {e}", exc_info=True)
+        return {"success": False, "error": f"Erro ao verificar a hierarquia de classes: {e}"}
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    resultado = check_category_index(repair="--check" not in sys.argv)
+    if not resultado["success"]:
+        print(resultado["error"])
+    elif resultado["divergencias"]:
+        for chave, (atual, recalculado) in sorted(resultado["divergencias"].items(), key=str):
+            print(f"{chave}: {atual} -> {recalculado}")
+    else:
+        print("Hierarquia de classes confere com parent_id.")
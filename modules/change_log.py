@@ -0,0 +1,147 @@
+# modules/change_log.py
+"""
+Compactação e situação do log de alterações por linha (CDC, migração 18)
+e do log do catálogo (migração 3).
+
+Os gatilhos de database/db.py gravam em 'cdc_alteracoes' uma linha
+(versao, tabela, chave, op) por inclusão, alteração ou exclusão em
+produtos, preços, códigos alternativos, clientes, vendas e estoque.
+Caches e cópias (p. ex. a cópia de clientes do terminal em modo réplica,
+modules/store_replica.py) leem com get_changes() o que mudou desde a
+última versão lida, em vez de reler a tabela inteira.
+
+ChangeLogCompactor roda compact_changes() ao iniciar e a cada virada de
+dia, numa thread em segundo plano: o log fica com no máximo a alteração
+mais recente de cada linha e descarta o que todos os consumidores
+registrados já leram (fora das últimas CDC_RETIDAS versões). Na mesma
+transação, compact_catalog_changes() faz o mesmo com o log do catálogo
+('catalogo_alteracoes', migração 3): a posição mais recente de cada
+produto, sem o que os terminais em modo réplica já leram.
+
+Situação do log / compactação manual / remover consumidor desativado:
+    python -m modules.change_log [--compactar] [--remover-consumidor NOME]
+"""
+import sys
+import logging
+import threading
+from datetime import datetime, timedelta
+from database.db import (
+    get_connection, changes_position, compact_changes, drop_consumer, CDC_HORIZONTE,
+    compact_catalog_changes, drop_catalog_consumer, catalog_changes_horizon,
+)
+
+logger = logging.getLogger(__name__)
+
+FOLGA_MEIA_NOITE = 5  # segundos após a virada do dia
+
+
+def compact_change_log():
+    """
+    Compacta o log de alterações e o do catálogo.
+    Retorna {"success", "descartadas", "compactadas", "horizonte", "catalogo": {idem}}.
+    """
+    conn = get_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        resultado = compact_changes(conn.cursor())
+        catalogo = compact_catalog_changes(conn.cursor())
+        conn.commit()
+        if resultado["descartadas"] or resultado["compactadas"]:
+            logger.info(f"Log de alterações compactado: {resultado['descartadas']} descartadas, "
+                        f"{resultado['compactadas']} substituídas (horizonte {resultado['horizonte']}).")
+        if catalogo["descartadas"] or catalogo["compactadas"]:
+            logger.info(f"Log do catálogo compactado: {catalogo['descartadas']} descartadas, "
+                        f"{catalogo['compactadas']} substituídas (horizonte {catalogo['horizonte']}).")
+        return {"success": True, **resultado, "catalogo": catalogo}
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Erro ao compactar o log de alterações: {e}", exc_info=True)
+        return {"success": False, "error": f"Erro ao compactar o log de alterações: {e}"}
+    finally:
+        conn.close()
+
+
+def change_log_status():
+    """
+    {"versao", "horizonte", "por_tabela": {tabela: linhas}, "consumidores": [{"nome", "versao", "atualizado_em"}],
+     "catalogo": {"linhas", "horizonte", "consumidores": [{"nome", "seq", "atualizado_em"}]}}.
+    """
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT versao FROM versoes_dados WHERE nome = ?", (CDC_HORIZONTE,))
+        horizonte = cur.fetchone()[0]
+        cur.execute("SELECT tabela, COUNT(*) FROM cdc_alteracoes GROUP BY tabela ORDER BY tabela")
+        por_tabela = {row[0]: row[1] for row in cur.fetchall()}
+        cur.execute("SELECT nome, versao, atualizado_em FROM cdc_consumidores ORDER BY nome")
+        consumidores = [dict(row) for row in cur.fetchall()]
+        cur.execute("SELECT COUNT(*) FROM catalogo_alteracoes")
+        linhas_catalogo = cur.fetchone()[0]
+        cur.execute("SELECT nome, seq, atualizado_em FROM catalogo_consumidores ORDER BY nome")
+        catalogo = {"linhas": linhas_catalogo, "horizonte": catalog_changes_horizon(cur),
+                    "consumidores": [dict(row) for row in cur.fetchall()]}
+        return {"versao": changes_position(cur), "horizonte": horizonte,
+                "por_tabela": por_tabela, "consumidores": consumidores, "catalogo": catalogo}
+    finally:
+        conn.close()
+
+
+class ChangeLogCompactor:
+    """Executa compact_change_log() agora e a cada virada de dia, até close()."""
+
+    def __init__(self):
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="ChangeLogCompactor", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while not self._parar.is_set():
+            compact_change_log()
+            agora = datetime.now()
+            amanha = datetime.combine(agora.date() + timedelta(days=1), datetime.min.time())
+            self._parar.wait((amanha - agora).total_seconds() + FOLGA_MEIA_NOITE)
+
+    def close(self):
+        self._parar.set()
+
+
+_compactor = None
+
+
+def start_change_log_compaction():
+    """Inicia a compactação diária do processo (uma única instância)."""
+    global _compactor
+    if _compactor is None:
+        _compactor = ChangeLogCompactor()
+    return _compactor
+
+
+if __name__ == "__main__":
+    if "--remover-consumidor" in sys.argv[1:-1]:
+        nome = sys.argv[sys.argv.index("--remover-consumidor") + 1]
+        conn = get_connection()
+        try:
+            removido = drop_consumer(conn.cursor(), nome)
+            removido = drop_catalog_consumer(conn.cursor(), nome) or removido
+            conn.commit()
+        finally:
+            conn.close()
+        print(f"Consumidor '{nome}' removido." if removido else f"Consumidor '{nome}' não encontrado.")
+    if "--compactar" in sys.argv[1:]:
+        resultado = compact_change_log()
+        if not resultado["success"]:
+            print(resultado["error"])
+            sys.exit(1)
+        print(f"{resultado['descartadas']} alterações descartadas, {resultado['compactadas']} substituídas.")
+        print(f"Catálogo: {resultado['catalogo']['descartadas']} descartadas, "
+              f"{resultado['catalogo']['compactadas']} substituídas.")
+    situacao = change_log_status()
+    print(f"Versão atual: {situacao['versao']}  (descartadas até {situacao['horizonte']})")
+    for tabela, linhas in situacao["por_tabela"].items():
+        print(f"  {tabela:<30} {linhas:>10} alterações")
+    for consumidor in situacao["consumidores"]:
+        print(f"  consumidor {consumidor['nome']}: versão {consumidor['versao']} ({consumidor['atualizado_em']})")
+    catalogo = situacao["catalogo"]
+    print(f"Log do catálogo: {catalogo['linhas']} posições (descartadas até {catalogo['horizonte']})")
+    for consumidor in catalogo["consumidores"]:
+        print(f"  consumidor {consumidor['nome']}: posição {consumidor['seq']} ({consumidor['atualizado_em']})")
@@ -7,7 +7,7 @@ from PyQt5.QtWidgets import (
 )
 from PyQt5.QtGui import QFont, QColor
 from PyQt5.QtCore import Qt, QPoint
-from database.db import get_connection
+from . import session_totals
 
 class CloseCashDialog(QDialog):
     def __init__(self, caixa_id, terminal_name, parent=None):
@@ -147,77 +147,24 @@ class CloseCashDialog(QDialog):
 
     def _load_expected_values(self):
         """Busca no DB os valores que o sistema espera (Valor Registrado)."""
-        conn = get_connection()
         try:
-            cur = conn.cursor()
+            # Totais acumulados da sessão (somente vendas FINALIZADAS;
+            # Dinheiro já ajustado com abertura, sangrias e suprimentos)
+            totais = session_totals.get_session_totals(self.caixa_id)
             
-            # 1. Busca Totais de Vendas por Pagamento (SOMENTE FINALIZADAS)
-            # --- CORREÇÃO: Filtra vendas CANCELADAS para não cobrar do operador ---
-            query_vendas = """
-                SELECT vp.forma, SUM(vp.valor) as total_forma
-                FROM vendas_pagamentos vp
-                JOIN vendas v ON vp.venda_id = v.id
-                WHERE v.caixa_id = ? AND v.status = 'FINALIZADA'
-                GROUP BY vp.forma
-            """
-            cur.execute(query_vendas, (self.caixa_id,))
-            rows_vendas = cur.fetchall()
-            
-            # --- NOVO: Busca Total Cancelado (apenas informativo) ---
-            cur.execute("SELECT SUM(total_final) as total_canc FROM vendas WHERE caixa_id = ? AND status = 'CANCELADA'", (self.caixa_id,))
-            total_cancelado = cur.fetchone()['total_canc'] or 0.0
+            # --- NOVO: Total Cancelado (apenas informativo) ---
+            total_cancelado = totais['total_cancelado']
             self.lbl_info_cancelado.setText(f"Vendas Canceladas neste caixa: R$ {total_cancelado:.2f}")
             if total_cancelado > 0:
                 self.lbl_info_cancelado.setVisible(True)
             else:
                 self.lbl_info_cancelado.setVisible(False)
             
-            # 2. Busca Saldo Inicial
-            cur.execute("SELECT valor_inicial FROM caixa_sessoes WHERE id = ?", (self.caixa_id,))
-            abertura = cur.fetchone()
-            suprimento_inicial = abertura['valor_inicial'] if abertura else 0.0
-
-            # 3. Busca Sangrias e Suprimentos
-            query_mov = """
-                SELECT tipo, SUM(valor) as total_mov
-                FROM caixa_movimentacoes
-                WHERE caixa_id = ?
-                GROUP BY tipo
-            """
-            cur.execute(query_mov, (self.caixa_id,))
-            movimentacoes = cur.fetchall()
-
-            suprimentos_mov = 0.0
-            sangrias_mov = 0.0
-            for mov in movimentacoes:
-                if mov['tipo'] == 'SUPRIMENTO':
-                    suprimentos_mov = mov['total_mov']
-                elif mov['tipo'] == 'SANGRIA':
-                    sangrias_mov = mov['total_mov']
-
-            # Inicializa formas de pagamento padrão
-            formas_pagamento = {"Dinheiro": 0.0, "Pix": 0.0, "Cartão": 0.0, "Doc. Crédito": 0.0, "Outros": 0.0}
-            
-            # Adiciona vendas
-            for row in rows_vendas:
-                forma = row['forma']
-                if forma in formas_pagamento:
-                    formas_pagamento[forma] += row['total_forma']
-                else:
-                    formas_pagamento[forma] = row['total_forma']
-            
-            # 4. Ajusta o Dinheiro com Abertura, Sangria e Suprimento
-            formas_pagamento["Dinheiro"] += suprimento_inicial
-            formas_pagamento["Dinheiro"] += suprimentos_mov
-            formas_pagamento["Dinheiro"] -= sangrias_mov
-            
-            self.expected_totals = formas_pagamento
+            self.expected_totals = session_totals.expected_closing_totals(totais)
             self._populate_table()
 
         except Exception as e:
             QMessageBox.critical(self, "Erro de DB", f"Erro ao calcular totais do caixa: {e}")
-        finally:
-            conn.close()
 
     def _populate_table(self):
         self.table.setRowCount(0)
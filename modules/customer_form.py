@@ -10,6 +10,9 @@ from PyQt5.QtWidgets import (
 )
 from PyQt5.QtCore import Qt, pyqtSignal
 from database.db import get_connection
+from .search_worker import BackgroundSearch
+from . import name_cache
+from . import store_replica
 
 class CustomerForm(QWidget):
     # Sinal emitido quando um cliente é salvo (para o PDV)
@@ -28,6 +31,13 @@ class CustomerForm(QWidget):
         self._load_field_permissions()
         self._setup_styles()
         self._build_ui()
+        
+        # Listagem/busca em segundo plano
+        self.customer_search = BackgroundSearch(self._build_customers_query, self)
+        self.customer_search.batchReady.connect(self._append_customers)
+        self.customer_search.failed.connect(
+            lambda msg: QMessageBox.critical(self, "Erro", f"Erro ao carregar clientes: {msg}"))
+        
         self._connect_signals()
         self._apply_field_permissions()
         
@@ -266,6 +276,7 @@ class CustomerForm(QWidget):
         self.btn_buscar_cep.clicked.connect(self.search_cep)
         self.btn_pesquisar.clicked.connect(self.load_customers)
         self.search_input.returnPressed.connect(self.load_customers)
+        self.search_input.textChanged.connect(self.customer_search.schedule)
         self.customer_table.itemDoubleClicked.connect(self._load_customer_for_edit)
         self.btn_buscar_doc.clicked.connect(self.search_document)
 
@@ -406,8 +417,15 @@ class CustomerForm(QWidget):
         conn = get_connection()
         try:
             cur = conn.cursor()
+            replica = store_replica.active()
             
-            if self.current_customer_id:
+            if replica:
+                # Modo réplica: gravado no servidor da loja (mesmo id no terminal e no banco central)
+                atualizando = bool(self.current_customer_id)
+                self.current_customer_id = replica.save_customer(data, self.current_customer_id)
+                msg = "Cliente atualizado com sucesso!" if atualizando else "Cliente salvo com sucesso!"
+                
+            elif self.current_customer_id:
                 fields = data.keys()
                 values = list(data.values())
                 values.append(self.current_customer_id)
@@ -426,6 +444,7 @@ class CustomerForm(QWidget):
                 msg = "Cliente salvo com sucesso!"
             
             conn.commit()
+            name_cache.clientes.invalidate(self.current_customer_id)
             QMessageBox.information(self, "Sucesso", msg)
             
             if self.parent() and isinstance(self.parent(), QDialog):
@@ -443,36 +462,33 @@ class CustomerForm(QWidget):
             conn.close()
             
     def load_customers(self):
-        """Carrega/Busca clientes e preenche a tabela."""
-        self.customer_table.setRowCount(0)
+        """Carrega/Busca clientes e preenche a tabela (em segundo plano)."""
+        self.customer_search.run_now()
+
+    def _build_customers_query(self):
         search_term = self.search_input.text().strip()
-        conn = get_connection()
-        try:
-            cur = conn.cursor()
-            query = "SELECT id, nome_razao, cpf, cnpj, celular FROM clientes WHERE id > 1" 
-            params = []
-            
-            if search_term:
-                query += " AND (nome_razao LIKE ? OR cpf LIKE ? OR cnpj LIKE ?)"
-                params.extend([f"%{search_term}%", f"%{search_term}%", f"%{search_term}%"])
-            
-            query += " ORDER BY nome_razao"
-            cur.execute(query, tuple(params))
-            
-            clientes = cur.fetchall()
-            for cliente in clientes:
-                row = self.customer_table.rowCount()
-                self.customer_table.insertRow(row)
-                cpf_cnpj = cliente['cpf'] if cliente['cpf'] else cliente['cnpj']
-                self.customer_table.setItem(row, 0, QTableWidgetItem(str(cliente['id'])))
-                self.customer_table.setItem(row, 1, QTableWidgetItem(cliente['nome_razao']))
-                self.customer_table.setItem(row, 2, QTableWidgetItem(cpf_cnpj))
-                self.customer_table.setItem(row, 3, QTableWidgetItem(cliente['celular']))
+        query = "SELECT id, nome_razao, cpf, cnpj, celular FROM clientes WHERE id > 1" 
+        params = []
         
-        except Exception as e:
-            QMessageBox.critical(self, "Erro", f"Erro ao carregar clientes: {e}")
-        finally:
-            conn.close()
+        if search_term:
+            query += " AND (nome_razao LIKE ? OR cpf LIKE ? OR cnpj LIKE ?)"
+            params.extend([f"%{search_term}%", f"%{search_term}%", f"%{search_term}%"])
+        
+        query += " ORDER BY nome_razao"
+        return query, params
+
+    def _append_customers(self, clientes, primeiro_lote):
+        if primeiro_lote:
+            self.customer_table.setRowCount(0)
+        
+        for cliente in clientes:
+            row = self.customer_table.rowCount()
+            self.customer_table.insertRow(row)
+            cpf_cnpj = cliente['cpf'] if cliente['cpf'] else cliente['cnpj']
+            self.customer_table.setItem(row, 0, QTableWidgetItem(str(cliente['id'])))
+            self.customer_table.setItem(row, 1, QTableWidgetItem(cliente['nome_razao']))
+            self.customer_table.setItem(row, 2, QTableWidgetItem(cpf_cnpj))
+            self.customer_table.setItem(row, 3, QTableWidgetItem(cliente['celular']))
 
     def _load_field_permissions(self):
         conn = get_connection()
@@ -0,0 +1,262 @@
+# modules/dre_engine.py
+"""
+Motor do DRE hierárquico (regime de caixa).
+
+Usa duas estruturas mantidas por gatilhos (migração 10):
+- categorias_fechamento: pares ancestral/descendente do plano de contas;
+- dre_mensal: total pago por mês x empresa x categoria.
+
+rollup() soma o período e já consolida os subtotais de cada grupo numa
+única consulta: cada valor entra em todos os ancestrais da sua categoria
+pelo JOIN com o fechamento. Meses inteiros do período vêm do resumo
+mensal; só os meses parciais das pontas (ex.: de 10/03 a 20/05) leem os
+lançamentos, pelo índice (status, data_pagamento). As colunas mês a mês
+e o período de comparação saem do mesmo resumo, sem reagregar o histórico.
+
+Verificação/correção a partir dos lançamentos e do plano de contas:
+    python -m modules.dre_engine [--check]
+"""
+import sys
+import logging
+import calendar
+from datetime import date, timedelta
+from database.db import get_connection, rebuild_categorias_fechamento, rebuild_dre_mensal
+
+logger = logging.getLogger(__name__)
+
+TIPOS = ("RECEITA", "DESPESA")
+TOLERANCIA = 0.005  # centavo arredondado
+
+COMPARACAO_ANTERIOR = "ANTERIOR"          # mesmo número de dias, imediatamente antes
+COMPARACAO_ANO_ANTERIOR = "ANO_ANTERIOR"  # mesmas datas, um ano antes
+
+
+# --- PERÍODOS ---
+
+def _data(texto):
+    return date.fromisoformat(texto[:10])
+
+
+def month_spans(data_inicio, data_fim):
+    """
+    Meses do intervalo ('AAAA-MM-DD'): [(mes, inicio, fim, completo)],
+    com inicio/fim recortados pelo intervalo.
+    """
+    inicio, fim = _data(data_inicio), _data(data_fim)
+    meses = []
+    atual = inicio.replace(day=1)
+    while atual <= fim:
+        ultimo = atual.replace(day=calendar.monthrange(atual.year, atual.month)[1])
+        a, b = max(atual, inicio), min(ultimo, fim)
+        meses.append((atual.strftime("%Y-%m"), a.isoformat(), b.isoformat(), a == atual and b == ultimo))
+        atual = ultimo + timedelta(days=1)
+    return meses
+
+
+def _um_ano_antes(d):
+    try:
+        return d.replace(year=d.year - 1)
+    except ValueError:  # 29/02
+        return d.replace(year=d.year - 1, day=28)
+
+
+def comparison_period(data_inicio, data_fim, modo):
+    """(inicio, fim) do período de comparação, ou None se 'modo' for vazio."""
+    inicio, fim = _data(data_inicio), _data(data_fim)
+    if modo == COMPARACAO_ANTERIOR:
+        dias = (fim - inicio).days + 1
+        return (inicio - timedelta(days=dias)).isoformat(), (inicio - timedelta(days=1)).isoformat()
+    if modo == COMPARACAO_ANO_ANTERIOR:
+        return _um_ano_antes(inicio).isoformat(), _um_ano_antes(fim).isoformat()
+    return None
+
+
+# --- CONSULTA ---
+
+def rollup(cur, data_inicio, data_fim, empresa_id=None):
+    """
+    Totais pagos no intervalo por mês e categoria, já consolidados na
+    hierarquia: {(mes, categoria_id): total da categoria e subcategorias}.
+    """
+    meses = month_spans(data_inicio, data_fim)
+    if not meses:
+        return {}
+
+    partes, params = [], []
+    completos = [m for m, _, _, completo in meses if completo]
+    if completos:
+        # Os meses completos são sempre contíguos (só as pontas podem ser parciais)
+        sql = "SELECT mes, categoria_id, total FROM dre_mensal WHERE mes BETWEEN ? AND ?"
+        params += [completos[0], completos[-1]]
+        if empresa_id:
+            sql += " AND empresa_id = ?"
+            params.append(empresa_id)
+        partes.append(sql)
+    for _, inicio, fim, completo in meses:
+        if completo:
+            continue
+        sql = """
+            SELECT strftime('%Y-%m', l.data_pagamento) AS mes, l.categoria_id AS categoria_id,
+                   l.valor_pago AS total
+            FROM lancamentos_financeiros l
+            JOIN titulos_financeiros t ON t.id = l.titulo_id
+            WHERE l.status = 'PAGO' AND l.data_pagamento BETWEEN ? AND ?
+        """
+        params += [inicio, fim]
+        if empresa_id:
+            sql += " AND t.empresa_id = ?"
+            params.append(empresa_id)
+        partes.append(sql)
+
+    cur.execute(f"""
+        SELECT b.mes, f.ancestral_id AS categoria_id, ROUND(SUM(b.total), 2) AS total
+        FROM ({" UNION ALL ".join(partes)}) AS b
+        JOIN categorias_fechamento f ON f.descendente_id = b.categoria_id
+        GROUP BY b.mes, f.ancestral_id
+    """, params)
+    return {(row['mes'], row['categoria_id']): row['total'] or 0.0 for row in cur.fetchall()}
+
+
+def load_categories(cur):
+    """
+    Plano de contas em pré-ordem: [{"id", "nome", "tipo", "nivel", "filhos"}].
+    Categorias cujo pai não existe mais são tratadas como raízes.
+    """
+    cur.execute("SELECT id, nome, tipo, parent_id FROM categorias_financeiras ORDER BY nome")
+    categorias = {row['id']: dict(row) for row in cur.fetchall()}
+    filhos = {}
+    for cat in categorias.values():
+        pai = cat['parent_id'] if cat['parent_id'] in categorias else None
+        filhos.setdefault(pai, []).append(cat['id'])
+
+    ordem = []
+    pilha = [(cid, 0) for cid in reversed(filhos.get(None, []))]
+    while pilha:
+        cid, nivel = pilha.pop()
+        cat = categorias[cid]
+        ordem.append({"id": cid, "nome": cat['nome'], "tipo": cat['tipo'], "nivel": nivel,
+                      "filhos": len(filhos.get(cid, []))})
+        pilha.extend((f, nivel + 1) for f in reversed(filhos.get(cid, [])))
+    return ordem
+
+
+def build_dre(cur, data_inicio, data_fim, empresa_id=None, comparacao=None):
+    """
+    Monta o DRE do período. Retorna:
+    {"meses": [mes, ...],
+     "linhas": [{"id", "nome", "tipo", "nivel", "filhos", "valores": {mes: v},
+                 "total": v, "comparacao": v ou None}, ...],
+     "totais": {tipo: {"valores": {mes: v}, "total": v, "comparacao": v ou None}}}
+    As linhas seguem a hierarquia (dentro de cada grupo, maiores
+    valores primeiro) e só incluem categorias com movimento em algum
+    dos períodos.
+    """
+    meses = [m for m, _, _, _ in month_spans(data_inicio, data_fim)]
+    valores = rollup(cur, data_inicio, data_fim, empresa_id)
+    periodo_comp = comparison_period(data_inicio, data_fim, comparacao) if comparacao else None
+    comp = {}
+    if periodo_comp:
+        for (_, cid), v in rollup(cur, *periodo_comp, empresa_id).items():
+            comp[cid] = comp.get(cid, 0.0) + v
+
+    por_categoria = {}
+    for (mes, cid), v in valores.items():
+        por_categoria.setdefault(cid, {})[mes] = v
+
+    def _linha(cat):
+        vals = por_categoria.get(cat['id'], {})
+        return dict(cat, valores=vals, total=round(sum(vals.values()), 2),
+                    comparacao=round(comp.get(cat['id'], 0.0), 2) if periodo_comp else None)
+
+    # Reordena irmãos pelo total (desc), preservando a pré-ordem
+    arvore = load_categories(cur)
+    linhas = _ordenar_por_total([_linha(c) for c in arvore])
+    linhas = [l for l in linhas if abs(l['total']) > TOLERANCIA or (l['comparacao'] and abs(l['comparacao']) > TOLERANCIA)]
+
+    totais = {}
+    for tipo in TIPOS:
+        raizes = [l for l in linhas if l['nivel'] == 0 and l['tipo'] == tipo]
+        totais[tipo] = {
+            "valores": {m: round(sum(l['valores'].get(m, 0.0) for l in raizes), 2) for m in meses},
+            "total": round(sum(l['total'] for l in raizes), 2),
+            "comparacao": round(sum(l['comparacao'] for l in raizes), 2) if periodo_comp else None,
+        }
+    return {"meses": meses, "linhas": linhas, "totais": totais}
+
+
+def _ordenar_por_total(linhas):
+    """Ordena cada nível de irmãos por total decrescente, mantendo subárvores juntas."""
+    def _subarvores(inicio, nivel):
+        blocos, i = [], inicio
+        while i < len(linhas) and linhas[i]['nivel'] >= nivel:
+            j = i + 1
+            while j < len(linhas) and linhas[j]['nivel'] > nivel:
+                j += 1
+            blocos.append([linhas[i]] + _subarvores(i + 1, nivel + 1)[0])
+            i = j
+        blocos.sort(key=lambda b: -b[0]['total'])
+        return [l for b in blocos for l in b], i
+    return _subarvores(0, 0)[0]
+
+
+# --- VERIFICAÇÃO DE CONSISTÊNCIA ---
+
+def _snapshot(cur):
+    cur.execute("SELECT mes, empresa_id, categoria_id, total, lancamentos FROM dre_mensal")
+    resumo = {(r['mes'], r['empresa_id'], r['categoria_id']): (r['total'], r['lancamentos'])
+              for r in cur.fetchall() if r['lancamentos'] or abs(r['total']) > TOLERANCIA}
+    cur.execute("SELECT ancestral_id, descendente_id, profundidade FROM categorias_fechamento")
+    fechamento = {(r['ancestral_id'], r['descendente_id']): r['profundidade'] for r in cur.fetchall()}
+    return resumo, fechamento
+
+
+def check_dre_summary(repair=True):
+    """
+    Recalcula o fechamento de categorias e o resumo mensal e compara com
+    os mantidos pelos gatilhos.
+    Retorna {"success", "divergencias": {chave: (atual, recalculado)}}.
+    Com repair=True os valores recalculados são gravados.
+    """
+    conn = get_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        cur = conn.cursor()
+        resumo, fechamento = _snapshot(cur)
+        rebuild_categorias_fechamento(cur)
+        rebuild_dre_mensal(cur)
+        resumo_novo, fechamento_novo = _snapshot(cur)
+
+        divergencias = {}
+        for chave in set(resumo) | set(resumo_novo):
+            a, r = resumo.get(chave, (0, 0)), resumo_novo.get(chave, (0, 0))
+            if abs(a[0] - r[0]) > TOLERANCIA or a[1] != r[1]:
+                divergencias[("dre_mensal", *chave)] = (a, r)
+        for chave in set(fechamento) | set(fechamento_novo):
+            if fechamento.get(chave) != fechamento_novo.get(chave):
+                divergencias[("categorias_fechamento", *chave)] = (fechamento.get(chave), fechamento_novo.get(chave))
+
+        if divergencias and repair:
+            conn.commit()
+            logger.warning(f"Resumo do DRE divergente, recalculado: {divergencias}")
+        else:
+            conn.rollback()
+            if divergencias:
+                logger.warning(f"Resumo do DRE divergente: {divergencias}")
+        return {"success": True, "divergencias": divergencias}
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Erro ao verificar o resumo do DRE: {e}", exc_info=True)
+        return {"success": False, "error": f"Erro ao verificar o resumo do DRE: {e}"}
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    resultado = check_dre_summary(repair="--check" not in sys.argv)
+    if not resultado["success"]:
+        print(resultado["error"])
+    elif resultado["divergencias"]:
+        for chave, (atual, recalculado) in sorted(resultado["divergencias"].items(), key=str):
+            print(f"{chave}: {atual} -> {recalculado}")
+    else:
+        print("Resumo do DRE confere com os lançamentos.")
@@ -0,0 +1,169 @@
+# modules/escpos.py
+"""
+Geração de comandos ESC/POS para impressoras térmicas (cupom 80mm/58mm).
+
+EscPosDocument monta o fluxo de bytes (texto, negrito, alinhamento,
+QR Code nativo da impressora e corte), enviado à impressora pelos
+backends de modules/print_spooler.py, sem passar por PDF nem pelo driver.
+
+EscPosDumpServer é uma impressora de rede falsa (porta 9100) para testes:
+    python -m modules.escpos [porta]
+"""
+import socket
+import textwrap
+import threading
+
+ESC = b"\x1b"
+GS = b"\x1d"
+
+ESQUERDA, CENTRO, DIREITA = 0, 1, 2
+
+# Página de código PC860 (Português): ESC t 3
+CODEPAGE = "cp860"
+CODEPAGE_ESCPOS = 3
+
+COLUNAS_POR_LARGURA = {80: 48, 58: 32}  # Fonte A
+
+
+def colunas_para_largura(largura_mm):
+    return COLUNAS_POR_LARGURA.get(largura_mm or 80, 48)
+
+
+class EscPosDocument:
+    """Documento ESC/POS montado em memória."""
+
+    def __init__(self, colunas=48):
+        self.colunas = colunas
+        self._buf = bytearray(ESC + b"@" + ESC + b"t" + bytes([CODEPAGE_ESCPOS]))
+        self._align = ESQUERDA
+
+    # --- FORMATAÇÃO ---
+
+    def _encode(self, texto):
+        return str(texto).encode(CODEPAGE, errors="replace")
+
+    def _set_align(self, align):
+        if align != self._align:
+            self._buf += ESC + b"a" + bytes([align])
+            self._align = align
+
+    def text(self, texto="", align=ESQUERDA, bold=False, double=False):
+        """Imprime o texto (quebrando em palavras na largura do papel)."""
+        self._set_align(align)
+        if bold:
+            self._buf += ESC + b"E\x01"
+        if double:
+            self._buf += GS + b"!\x11"
+        largura = self.colunas // 2 if double else self.colunas
+        for linha in textwrap.wrap(str(texto), largura) or [""]:
+            self._buf += self._encode(linha) + b"\n"
+        if double:
+            self._buf += GS + b"!\x00"
+        if bold:
+            self._buf += ESC + b"E\x00"
+        return self
+
+    def columns(self, esquerda, direita, bold=False, double=False):
+        """Linha com texto à esquerda e valor alinhado à direita."""
+        largura = self.colunas // 2 if double else self.colunas
+        direita = str(direita)
+        esquerda = str(esquerda)[:max(largura - len(direita) - 1, 0)]
+        return self.text(esquerda + " " * (largura - len(esquerda) - len(direita)) + direita,
+                         ESQUERDA, bold, double)
+
+    def divider(self, caractere="-"):
+        return self.text(caractere * self.colunas)
+
+    def feed(self, linhas=1):
+        self._buf += ESC + b"d" + bytes([linhas])
+        return self
+
+    def qrcode(self, dados, tamanho=6):
+        """QR Code gerado pela própria impressora (GS ( k, modelo 2, correção M)."""
+        self._set_align(CENTRO)
+        payload = self._encode(dados)
+        tam = len(payload) + 3
+        self._buf += GS + b"(k\x04\x001A2\x00"                   # modelo 2
+        self._buf += GS + b"(k\x03\x001C" + bytes([tamanho])      # tamanho do módulo
+        self._buf += GS + b"(k\x03\x001E1"                        # correção M
+        self._buf += GS + b"(k" + bytes([tam % 256, tam // 256]) + b"1P0" + payload
+        self._buf += GS + b"(k\x03\x001Q0"                        # imprime
+        self._buf += b"\n"
+        return self
+
+    def cut(self):
+        """Avança o papel até a guilhotina e faz o corte parcial."""
+        self._buf += GS + b"VB\x03"
+        return self
+
+    def getvalue(self):
+        return bytes(self._buf)
+
+
+class EscPosDumpServer:
+    """
+    Impressora de rede falsa: aceita conexões na porta informada e guarda
+    os bytes recebidos de cada trabalho em 'trabalhos'.
+    """
+
+    def __init__(self, host="127.0.0.1", porta=9100):
+        self.trabalhos = []
+        self._sock = socket.create_server((host, porta))
+        self.endereco = self._sock.getsockname()
+        self._thread = threading.Thread(target=self._loop, name="EscPosDumpServer", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            with conn:
+                dados = bytearray()
+                while True:
+                    bloco = conn.recv(65536)
+                    if not bloco:
+                        break
+                    dados += bloco
+            self.trabalhos.append(bytes(dados))
+
+    def close(self):
+        self._sock.close()
+
+
+def preview(dados):
+    """Texto legível de um fluxo ESC/POS (comandos removidos), para conferência."""
+    texto = bytearray()
+    i = 0
+    while i < len(dados):
+        b = dados[i]
+        if b == 0x1b:      # ESC x [n]
+            i += 3 if dados[i + 1:i + 2] in (b"a", b"E", b"t", b"d") else 2
+        elif b == 0x1d:    # GS
+            cmd = dados[i + 1:i + 2]
+            if cmd == b"(":
+                tam = dados[i + 3] + dados[i + 4] * 256
+                i += 5 + tam
+            elif cmd == b"V":
+                texto += b"\n--- corte ---\n"
+                i += 4
+            else:
+                i += 3
+        else:
+            texto.append(b)
+            i += 1
+    return texto.decode(CODEPAGE, errors="replace")
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    servidor = EscPosDumpServer("0.0.0.0", int(sys.argv[1]) if len(sys.argv) > 1 else 9100)
+    print(f"Impressora ESC/POS simulada em {servidor.endereco[0]}:{servidor.endereco[1]}")
+    vistos = 0
+    while True:
+        time.sleep(0.5)
+        for dados in servidor.trabalhos[vistos:]:
+            print(preview(dados))
+        vistos = len(servidor.trabalhos)
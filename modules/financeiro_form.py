@@ -1,20 +1,22 @@
 # -*- coding: utf-8 -*-
 # modules/financeiro_form.py
 import sqlite3
-import datetime
 import logging # <-- NOVO
 from PyQt5.QtWidgets import (
     QWidget, QLabel, QLineEdit, QPushButton, QVBoxLayout, QHBoxLayout, 
-    QMessageBox, QGridLayout, QFrame, QTableWidget, QHeaderView, 
-    QTableWidgetItem, QAbstractItemView, QStackedWidget, QComboBox,
+    QMessageBox, QGridLayout, QFrame, QHeaderView, 
+    QAbstractItemView, QStackedWidget, QComboBox, QTableView,
     QTabWidget, QDateEdit,QDialog
 )
-from PyQt5.QtCore import Qt, QDate, QLocale
+from PyQt5.QtCore import QDate, QLocale
 from PyQt5.QtGui import QFont, QColor
 from database.db import get_connection
 from .lancamento_dialog import LancamentoDialog # Importa o diálogo de lançamento
 from .baixa_lancamento_dialog import BaixaLancamentoDialog # Importa o diálogo de baixa
 from .edit_lancamento_dialog import EditLancamentoDialog # Importa o diálogo de edição
+from .financial_kpis import get_dashboard_kpis
+from .keyset_table_model import KeysetTableModel, Coluna, ALINHAR_DIREITA, ALINHAR_CENTRO
+from . import name_cache
 
 # --- NOVAS IMPORTAÇÕES PARA GRÁFICOS ---
 try:
@@ -25,6 +27,12 @@ except ImportError:
     pg = None # Define como None para evitar quebra
 # --- FIM DAS NOVAS IMPORTAÇÕES ---
 
+# Cores das tabelas paginadas (papéis BackgroundRole/ForegroundRole do modelo)
+COR_STATUS = {'PAGO': QColor("#dff0d8"), 'VENCIDO': QColor("#f2dede")} # Verde claro / Vermelho claro
+COR_SAIDA = QColor("#c0392b") # Vermelho
+COR_ENTRADA = QColor("#27AE60") # Verde
+COR_NAO_CONCILIADO = QColor("#7f8c8d")
+
 
 class FinanceiroForm(QWidget):
     """
@@ -41,9 +49,7 @@ class FinanceiroForm(QWidget):
         self.logger = logging.getLogger(__name__)
         
         self.contas_map = {} # {id: nome}
-        self.categorias_map = {} # {id: (nome, tipo)}
-        self.centros_custo_map = {} # {id: nome}
-        self.parceiros_map = {} # {tipo_id: nome}
+        # Nomes de categorias, centros de custo e parceiros: modules/name_cache.py (por página)
         
         # --- Referências dos Gráficos ---
         self.graph_fluxo_caixa = None
@@ -67,7 +73,7 @@ class FinanceiroForm(QWidget):
             QTabBar::tab { background: #e0e0e0; padding: 10px 25px; font-size: 14px; }
             QTabBar::tab:selected { background: #fdfdfd; border: 1px solid #c0c0d0; border-bottom: none; }
 
-            QTableWidget {
+            QTableView {
                 border: 1px solid #c0c0d0;
                 selection-background-color: #0078d7; font-size: 14px;
             }
@@ -251,13 +257,27 @@ class FinanceiroForm(QWidget):
         
         layout.addWidget(filter_frame)
 
-        # --- Tabela ---
-        self.lanc_table = QTableWidget()
-        self.lanc_table.setColumnCount(9)
-        self.lanc_table.setHorizontalHeaderLabels([
-            "ID", "Vencimento", "Tipo", "Status", "Descrição", 
-            "Categoria", "Centro Custo", "Valor Previsto", "Valor Pago"
-        ])
+        # --- Tabela (modelo paginado: páginas lidas conforme a rolagem) ---
+        self.lanc_model = KeysetTableModel([
+            Coluna("ID", 'id'),
+            Coluna("Vencimento", 'data_vencimento'),
+            Coluna("Tipo", 'tipo'),
+            Coluna("Status", 'status'),
+            Coluna("Descrição", 'descricao'),
+            Coluna("Parceiro", 'cliente_id', formato=self._nome_parceiro),
+            Coluna("Categoria", 'categoria_id',
+                   formato=lambda r: name_cache.categorias_financeiras.get(r['categoria_id'])),
+            Coluna("Centro Custo", 'centro_custo_id',
+                   formato=lambda r: name_cache.centros_de_custo.get(r['centro_custo_id'])),
+            Coluna("Valor Previsto", 'valor_previsto', formato=lambda r: f"{r['valor_previsto']:.2f}",
+                   alinhamento=ALINHAR_DIREITA),
+            Coluna("Valor Pago", 'valor_pago', formato=lambda r: f"{r['valor_pago']:.2f}",
+                   alinhamento=ALINHAR_DIREITA),
+        ], cor_linha=lambda r: COR_STATUS.get(r['status']), ao_carregar=self._resolver_nomes, parent=self)
+        self.lanc_model.erro.connect(
+            lambda msg: QMessageBox.critical(self, "Erro ao Carregar Lançamentos", f"Erro: {msg}"))
+        self.lanc_table = QTableView()
+        self.lanc_table.setModel(self.lanc_model)
         self.lanc_table.horizontalHeader().setSectionResizeMode(4, QHeaderView.Stretch)
         self.lanc_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.lanc_table.setSelectionBehavior(QAbstractItemView.SelectRows)
@@ -299,12 +319,25 @@ class FinanceiroForm(QWidget):
         
         layout.addWidget(filter_frame)
 
-        # --- Tabela (Nova coluna) ---
-        self.extrato_table = QTableWidget()
-        self.extrato_table.setColumnCount(6) # <-- MUDOU DE 5 PARA 6
-        self.extrato_table.setHorizontalHeaderLabels([
-            "ID Mov.", "Data", "Tipo", "Descrição", "Valor (R$)", "Conciliado?"
-        ])
+        # --- Tabela (modelo paginado: páginas lidas conforme a rolagem) ---
+        self.extrato_model = KeysetTableModel([
+            Coluna("ID Mov.", 'id'),
+            Coluna("Data", 'data_movimento'),
+            Coluna("Tipo", 'tipo_movimento'),
+            Coluna("Descrição", 'descricao'),
+            Coluna("Valor (R$)", 'valor',
+                   formato=lambda r: f"R$ {-r['valor'] if r['tipo_movimento'] == 'SAIDA' else r['valor']:.2f}",
+                   alinhamento=ALINHAR_DIREITA,
+                   cor_texto=lambda r: COR_SAIDA if r['tipo_movimento'] == 'SAIDA' else COR_ENTRADA),
+            Coluna("Conciliado?", 'conciliado',
+                   formato=lambda r: "✔️ Sim" if r['conciliado'] else "Não",
+                   alinhamento=ALINHAR_CENTRO,
+                   cor_texto=lambda r: COR_ENTRADA if r['conciliado'] else COR_NAO_CONCILIADO),
+        ], parent=self)
+        self.extrato_model.erro.connect(
+            lambda msg: QMessageBox.critical(self, "Erro ao Carregar Extrato", f"Erro: {msg}"))
+        self.extrato_table = QTableView()
+        self.extrato_table.setModel(self.extrato_model)
         self.extrato_table.horizontalHeader().setSectionResizeMode(3, QHeaderView.Stretch)
         self.extrato_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.extrato_table.setSelectionBehavior(QAbstractItemView.SelectRows)
@@ -337,7 +370,7 @@ class FinanceiroForm(QWidget):
         self.btn_desconciliar.clicked.connect(lambda: self._conciliar_movimento(conciliar=False))
 
     def _load_all_maps(self):
-        # (Inalterado)
+        # Só as contas (combo do extrato); os demais nomes vêm de modules/name_cache.py
         conn = get_connection()
         try:
             cur = conn.cursor()
@@ -351,219 +384,109 @@ class FinanceiroForm(QWidget):
                 self.contas_map[c['id']] = c['nome']
                 self.extrato_conta_combo.addItem(c['nome'], c['id'])
                 
-            # Categorias
-            cur.execute("SELECT id, nome, tipo FROM categorias_financeiras ORDER BY nome")
-            self.categorias_map.clear()
-            for c in cur.fetchall():
-                self.categorias_map[c['id']] = (c['nome'], c['tipo'])
-                
-            # Centros de Custo
-            cur.execute("SELECT id, nome FROM centros_de_custo WHERE empresa_id = ? ORDER BY nome", (self.empresa_id,))
-            self.centros_custo_map.clear()
-            for c in cur.fetchall():
-                self.centros_custo_map[c['id']] = c['nome']
-
-            # Parceiros (Clientes/Fornecedores)
-            self.parceiros_map.clear()
-            cur.execute("SELECT id, nome_razao FROM clientes")
-            for p in cur.fetchall():
-                self.parceiros_map[f"C_{p['id']}"] = p['nome_razao']
-            cur.execute("SELECT id, nome FROM fornecedores")
-            for p in cur.fetchall():
-                self.parceiros_map[f"F_{p['id']}"] = p['nome']
-                
         except Exception as e:
             QMessageBox.critical(self, "Erro ao Carregar Dados", f"Erro: {e}")
         finally:
             conn.close()
 
-    def load_dashboard_data(self):
-        # (Inalterado)
+    def _resolver_nomes(self, linhas):
+        """Resolve em lote (cache LRU) os nomes exibidos numa página de lançamentos."""
         conn = get_connection()
         try:
             cur = conn.cursor()
+            name_cache.categorias_financeiras.get_many((r['categoria_id'] for r in linhas), cur)
+            name_cache.centros_de_custo.get_many((r['centro_custo_id'] for r in linhas), cur)
+            name_cache.clientes.get_many((r['cliente_id'] for r in linhas), cur)
+            name_cache.fornecedores.get_many((r['fornecedor_id'] for r in linhas), cur)
+        finally:
+            conn.close()
+
+    def _nome_parceiro(self, linha):
+        if linha['cliente_id']:
+            return name_cache.clientes.get(linha['cliente_id'])
+        return name_cache.fornecedores.get(linha['fornecedor_id'])
+
+    def load_dashboard_data(self):
+        """KPIs e gráficos do dashboard (modules/financial_kpis.py, com cache por empresa)."""
+        try:
+            kpis = get_dashboard_kpis(self.empresa_id)
             
-            # 1. Saldo Total
-            cur.execute("SELECT SUM(saldo_atual) as saldo_total FROM contas_financeiras WHERE empresa_id = ? AND active = 1", (self.empresa_id,))
-            saldo = cur.fetchone()['saldo_total'] or 0.0
+            saldo = kpis['saldo']
             self.lbl_kpi_saldo.setText(f"R$ {saldo:.2f}")
             self.lbl_kpi_saldo.setObjectName("kpi_value_ok" if saldo >= 0 else "kpi_value_bad")
-            
-            # 2. Contas a Pagar (Vencido)
-            cur.execute("""
-                SELECT SUM(valor_previsto - IFNULL(valor_pago, 0)) as total_vencido 
-                FROM lancamentos_financeiros
-                WHERE tipo = 'A PAGAR' AND status != 'PAGO' AND data_vencimento < DATE('now')
-            """)
-            vencido = cur.fetchone()['total_vencido'] or 0.0
-            self.lbl_kpi_vencido.setText(f"R$ {vencido:.2f}")
-
-            # 3. Contas a Vencer (Hoje)
-            cur.execute("""
-                SELECT SUM(valor_previsto - IFNULL(valor_pago, 0)) as total_hoje
-                FROM lancamentos_financeiros
-                WHERE status != 'PAGO' AND data_vencimento = DATE('now')
-            """)
-            hoje = cur.fetchone()['total_hoje'] or 0.0
-            self.lbl_kpi_hoje.setText(f"R$ {hoje:.2f}")
-
-            # 4. A Receber (Mês)
-            cur.execute("""
-                SELECT SUM(valor_previsto - IFNULL(valor_pago, 0)) as total_receber
-                FROM lancamentos_financeiros
-                WHERE tipo = 'A RECEBER' AND status != 'PAGO' 
-                  AND STRFTIME('%Y-%m', data_vencimento) = STRFTIME('%Y-%m', 'now')
-            """)
-            receber = cur.fetchone()['total_receber'] or 0.0
-            self.lbl_kpi_receber.setText(f"R$ {receber:.2f}")
+            self.lbl_kpi_vencido.setText(f"R$ {kpis['vencido']:.2f}")
+            self.lbl_kpi_hoje.setText(f"R$ {kpis['vence_hoje']:.2f}")
+            self.lbl_kpi_receber.setText(f"R$ {kpis['receber_mes']:.2f}")
             
             if pg: 
-                self._load_graph_fluxo_caixa(conn)
-                self._load_graph_desp_categoria(conn)
+                self._load_graph_fluxo_caixa(kpis['projecao'])
+                self._load_graph_desp_categoria(kpis['despesas_categoria'])
             
+            tempos = kpis['tempos']
+            self.logger.debug(f"Dashboard financeiro: {tempos['total_ms']:.1f} ms (cache: {tempos['cache']}).")
         except Exception as e:
             QMessageBox.critical(self, "Erro no Dashboard", f"Erro ao carregar KPIs: {e}")
-        finally:
-            conn.close()
 
     def load_lancamentos(self):
-        # (Inalterado)
-        self.lanc_table.setRowCount(0)
+        # Paginado por (data_vencimento, id): o modelo lê as páginas seguintes ao rolar
+        query = """
+            SELECT 
+                l.id, l.data_vencimento, l.tipo, l.status, l.descricao, 
+                l.categoria_id, l.centro_custo_id, t.cliente_id, t.fornecedor_id,
+                l.valor_previsto, 
+                IFNULL(l.valor_pago, 0) as valor_pago
+            FROM lancamentos_financeiros l
+            JOIN titulos_financeiros t ON l.titulo_id = t.id
+            WHERE t.empresa_id = ? 
+        """
+        params = [self.empresa_id]
+        
+        # A data inicial é o cursor inicial do modelo (ver modules/keyset_table_model.py)
+        start_date = self.lanc_date_start.date().toString("yyyy-MM-dd")
+        end_date = self.lanc_date_end.date().toString("yyyy-MM-dd")
+        query += " AND l.data_vencimento <= ?"
+        params.append(end_date)
+        
+        status = self.lanc_status_combo.currentText()
+        
+        # O status VENCIDO é gravado (gatilhos + modules/overdue_sweeper.py);
+        # o termo IN é o mesmo do índice parcial idx_lancamentos_abertos
+        if status == "PENDENTE":
+            query += " AND l.status IN ('PENDENTE', 'VENCIDO')" # Mostra PENDENTE e VENCIDO
+        elif status == "VENCIDO":
+            query += " AND l.status IN ('PENDENTE', 'VENCIDO') AND l.status = 'VENCIDO'"
+        elif status != "TODOS":
+            query += " AND l.status = ?"
+            params.append(status)
+            
+        tipo = self.lanc_tipo_combo.currentText()
+        if tipo != "TODOS":
+            query += " AND l.tipo = ?"
+            params.append(tipo)
         
-        conn = get_connection()
         try:
-            cur = conn.cursor()
-            
-            query = """
-                SELECT 
-                    l.id, l.data_vencimento, l.tipo, l.status, l.descricao, 
-                    l.categoria_id, l.centro_custo_id, 
-                    l.valor_previsto, 
-                    IFNULL(l.valor_pago, 0) as valor_pago
-                FROM lancamentos_financeiros l
-                JOIN titulos_financeiros t ON l.titulo_id = t.id
-                WHERE t.empresa_id = ? 
-            """
-            params = [self.empresa_id]
-            
-            start_date = self.lanc_date_start.date().toString("yyyy-MM-dd")
-            end_date = self.lanc_date_end.date().toString("yyyy-MM-dd")
-            query += " AND l.data_vencimento BETWEEN ? AND ?"
-            params.extend([start_date, end_date])
-            
-            status = self.lanc_status_combo.currentText()
-            hoje = QDate.currentDate().toString("yyyy-MM-dd")
-            
-            if status == "PENDENTE":
-                query += " AND l.status != 'PAGO'" # Mostra PENDENTE e VENCIDO
-            elif status == "VENCIDO":
-                 query += " AND l.status != 'PAGO' AND l.data_vencimento < ?"
-                 params.append(hoje)
-            elif status != "TODOS":
-                query += " AND l.status = ?"
-                params.append(status)
-                
-            tipo = self.lanc_tipo_combo.currentText()
-            if tipo != "TODOS":
-                query += " AND l.tipo = ?"
-                params.append(tipo)
-                
-            query += " ORDER BY l.data_vencimento"
-            
-            cur.execute(query, tuple(params))
-            
-            for row in cur.fetchall():
-                idx = self.lanc_table.rowCount()
-                self.lanc_table.insertRow(idx)
-                
-                cat_nome = self.categorias_map.get(row['categoria_id'], ("-", "-"))[0]
-                cc_nome = self.centros_custo_map.get(row['centro_custo_id'], "-")
-                
-                status_atual = row['status']
-                if status_atual != 'PAGO' and row['data_vencimento'] < hoje:
-                    status_atual = 'VENCIDO'
-                
-                self.lanc_table.setItem(idx, 0, QTableWidgetItem(str(row['id'])))
-                self.lanc_table.setItem(idx, 1, QTableWidgetItem(row['data_vencimento']))
-                self.lanc_table.setItem(idx, 2, QTableWidgetItem(row['tipo']))
-                self.lanc_table.setItem(idx, 3, QTableWidgetItem(status_atual))
-                self.lanc_table.setItem(idx, 4, QTableWidgetItem(row['descricao']))
-                self.lanc_table.setItem(idx, 5, QTableWidgetItem(cat_nome))
-                self.lanc_table.setItem(idx, 6, QTableWidgetItem(cc_nome))
-                
-                valor_previsto_item = QTableWidgetItem(f"{row['valor_previsto']:.2f}")
-                valor_previsto_item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
-                self.lanc_table.setItem(idx, 7, valor_previsto_item)
-                
-                valor_pago_item = QTableWidgetItem(f"{row['valor_pago']:.2f}")
-                valor_pago_item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
-                self.lanc_table.setItem(idx, 8, valor_pago_item)
-                
-                if status_atual == 'PAGO':
-                    color = QColor("#dff0d8") # Verde claro
-                elif status_atual == 'VENCIDO':
-                    color = QColor("#f2dede") # Vermelho claro
-                else:
-                    color = QColor("white")
-                    
-                for j in range(self.lanc_table.columnCount()):
-                    self.lanc_table.item(idx, j).setBackground(color)
-
+            self.lanc_model.set_query(query, params, [("l.data_vencimento", 'data_vencimento'), ("l.id", 'id')],
+                                      apos=(start_date, 0))
         except Exception as e:
             QMessageBox.critical(self, "Erro ao Carregar Lançamentos", f"Erro: {e}")
-        finally:
-            conn.close()
 
     def load_extrato(self):
-        # (Atualizado para incluir 'conciliado')
-        self.extrato_table.setRowCount(0)
+        # Paginado por (data_movimento, id), do mais recente para o mais antigo
         conta_id = self.extrato_conta_combo.currentData()
         
         if conta_id is None:
+            self.extrato_model.clear()
             QMessageBox.warning(self, "Seleção", "Selecione uma conta financeira para gerar o extrato.")
             return
 
-        conn = get_connection()
         try:
-            cur = conn.cursor()
-            cur.execute("""
+            self.extrato_model.set_query("""
                 SELECT id, data_movimento, tipo_movimento, descricao, valor, conciliado 
                 FROM movimentacoes_contas
                 WHERE conta_id = ?
-                ORDER BY data_movimento DESC, id DESC
-            """, (conta_id,))
-            
-            for mov in cur.fetchall():
-                row = self.extrato_table.rowCount()
-                self.extrato_table.insertRow(row)
-                
-                valor = mov['valor']
-                if mov['tipo_movimento'] == 'SAIDA':
-                    valor = -valor
-                    color = QColor("#c0392b") # Vermelho
-                else:
-                    color = QColor("#27AE60") # Verde
-                
-                item_valor = QTableWidgetItem(f"R$ {valor:.2f}")
-                item_valor.setForeground(color)
-                item_valor.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
-
-                is_conciliado = bool(mov['conciliado'])
-                item_conc = QTableWidgetItem("✔️ Sim" if is_conciliado else "Não")
-                item_conc.setTextAlignment(Qt.AlignCenter)
-                item_conc.setForeground(QColor("#27AE60") if is_conciliado else QColor("#7f8c8d"))
-
-                self.extrato_table.setItem(row, 0, QTableWidgetItem(str(mov['id'])))
-                self.extrato_table.setItem(row, 1, QTableWidgetItem(mov['data_movimento']))
-                self.extrato_table.setItem(row, 2, QTableWidgetItem(mov['tipo_movimento']))
-                self.extrato_table.setItem(row, 3, QTableWidgetItem(mov['descricao']))
-                self.extrato_table.setItem(row, 4, item_valor)
-                self.extrato_table.setItem(row, 5, item_conc) # <-- NOVO
-
+            """, (conta_id,), [("data_movimento", 'data_movimento'), ("id", 'id')], decrescente=True)
         except Exception as e:
             QMessageBox.critical(self, "Erro ao Carregar Extrato", f"Erro: {e}")
-        finally:
-            conn.close()
             
     def _open_new_lancamento_dialog(self):
         """Abre o diálogo de novo lançamento."""
@@ -578,13 +501,12 @@ class FinanceiroForm(QWidget):
             
     def _get_selected_lancamento(self):
         """Pega o ID e os dados completos do lançamento selecionado na tabela."""
-        row = self.lanc_table.currentRow()
-        if row < 0:
+        linha = self.lanc_model.row_data(self.lanc_table.currentIndex().row())
+        if linha is None:
             QMessageBox.warning(self, "Seleção", "Selecione um lançamento na tabela primeiro.")
             return None, None
         
-        lancamento_id_str = self.lanc_table.item(row, 0).text()
-        lancamento_id = int(lancamento_id_str)
+        lancamento_id = linha['id']
         
         conn = get_connection()
         try:
@@ -743,7 +665,7 @@ class FinanceiroForm(QWidget):
         if not lancamento_id:
             return
 
-        if data['status'] == 'PENDENTE' and (data.get('valor_pago', 0.0) or 0.0) == 0:
+        if data['status'] in ('PENDENTE', 'VENCIDO') and (data.get('valor_pago', 0.0) or 0.0) == 0:
             QMessageBox.information(self, "Ação Inválida", "Este lançamento não possui nenhuma baixa para estornar.")
             return
 
@@ -930,17 +852,11 @@ class FinanceiroForm(QWidget):
 
     def _get_selected_movimento(self):
         """Pega o ID da movimentação selecionada na tabela Extrato."""
-        row = self.extrato_table.currentRow()
-        if row < 0:
+        linha = self.extrato_model.row_data(self.extrato_table.currentIndex().row())
+        if linha is None:
             QMessageBox.warning(self, "Seleção", "Selecione uma movimentação na tabela de extrato primeiro.")
             return None
-        
-        try:
-            mov_id = int(self.extrato_table.item(row, 0).text())
-            return mov_id
-        except Exception:
-            QMessageBox.critical(self, "Erro", "Não foi possível ler o ID da movimentação selecionada.")
-            return None
+        return linha['id']
 
     def _conciliar_movimento(self, conciliar=True):
         """Altera o status 'conciliado' de uma movimentação."""
@@ -992,38 +908,22 @@ class FinanceiroForm(QWidget):
         if horizontal:
             plot_widget.getViewBox().invertY(True) # Inverte o eixo Y
 
-    def _load_graph_fluxo_caixa(self, conn):
-        """Busca dados e plota o gráfico de Fluxo de Caixa (Receitas vs Despesas)"""
+    def _load_graph_fluxo_caixa(self, projecao):
+        """Plota o gráfico de Fluxo de Caixa (Receitas vs Despesas) a partir de [(dia, receitas, despesas)]"""
         if not self.graph_fluxo_caixa: return
         self.graph_fluxo_caixa.clear()
 
         try:
-            cur = conn.cursor()
-            # Busca Receitas e Despesas agrupadas por dia para os próximos 30 dias
-            cur.execute(f"""
-                SELECT 
-                    data_vencimento,
-                    SUM(CASE WHEN tipo = 'A RECEBER' THEN (valor_previsto - IFNULL(valor_pago, 0)) ELSE 0 END) as receitas,
-                    SUM(CASE WHEN tipo = 'A PAGAR' THEN (valor_previsto - IFNULL(valor_pago, 0)) ELSE 0 END) as despesas
-                FROM lancamentos_financeiros
-                WHERE status != 'PAGO'
-                  AND data_vencimento BETWEEN DATE('now') AND DATE('now', '+30 days')
-                GROUP BY data_vencimento
-                ORDER BY data_vencimento
-            """)
-            
-            data = cur.fetchall()
-            
             receitas_vals = []
             despesas_vals = []
             ticks = [] # Rótulos do eixo X (Datas)
             
             # Mapeia os dados para os eixos
-            for i, row in enumerate(data):
-                receitas_vals.append(row['receitas'])
-                despesas_vals.append(row['despesas'])
+            for i, (dia, receitas, despesas) in enumerate(projecao):
+                receitas_vals.append(receitas)
+                despesas_vals.append(despesas)
                 # Formata a data para (Ex: 14/11)
-                ticks.append((i, datetime.strptime(row['data_vencimento'], '%Y-%m-%d').strftime('%d/%m')))
+                ticks.append((i, f"{dia[8:10]}/{dia[5:7]}"))
             
             x_axis = self.graph_fluxo_caixa.getAxis('bottom')
             x_axis.setTicks([ticks])
@@ -1039,31 +939,14 @@ class FinanceiroForm(QWidget):
         except Exception as e:
             print(f"Erro ao gerar gráfico de fluxo de caixa: {e}")
 
-    def _load_graph_desp_categoria(self, conn):
-        """Busca dados e plota o gráfico de Despesas por Categoria (Gráfico de Pizza/Barras)"""
+    def _load_graph_desp_categoria(self, despesas_categoria):
+        """Plota o gráfico de Despesas por Categoria a partir de [(nome, total)] (maiores do mês atual)"""
         if not self.graph_desp_categoria: return
         self.graph_desp_categoria.clear()
 
         try:
-            cur = conn.cursor()
-            # Busca as 10 maiores categorias de despesa pagas no mês atual
-            cur.execute("""
-                SELECT 
-                    c.nome,
-                    SUM(l.valor_pago) as total_pago
-                FROM lancamentos_financeiros l
-                JOIN categorias_financeiras c ON l.categoria_id = c.id
-                WHERE l.tipo = 'A PAGAR' AND l.status = 'PAGO'
-                  AND STRFTIME('%Y-%m', l.data_pagamento) = STRFTIME('%Y-%m', 'now')
-                GROUP BY c.nome
-                ORDER BY total_pago DESC
-                LIMIT 10
-            """)
-            
-            data = cur.fetchall()
-            
-            valores = [row['total_pago'] for row in data]
-            nomes = [row['nome'] for row in data]
+            valores = [total for _, total in despesas_categoria]
+            nomes = [nome for nome, _ in despesas_categoria]
             ticks = [(i, nome) for i, nome in enumerate(nomes)] # Rótulos do eixo Y
             
             y_axis = self.graph_desp_categoria.getAxis('left')
@@ -0,0 +1,176 @@
+# modules/financial_kpis.py
+"""
+Indicadores do dashboard financeiro (FinanceiroForm), calculados numa
+passada e guardados em cache por empresa.
+
+compute_kpis() lê os lançamentos em aberto até o fim da projeção numa
+única consulta agrupada por dia de vencimento (os vencidos antes do mês
+corrente ficam num único grupo): status por igualdade e vencimento por
+intervalo, ambos no índice parcial de cobertura idx_lancamentos_abertos,
+sem STRFTIME nas colunas. Vencido, vence hoje,
+a receber no mês e a projeção de 30 dias saem desses grupos; o saldo
+e as maiores despesas do mês são duas leituras pequenas.
+
+get_dashboard_kpis() guarda o resultado por empresa junto com a versão
+'financeiro' de 'versoes_dados' (migração 11), que os gatilhos
+incrementam a cada gravação em lançamentos, títulos ou contas: o cache
+é reaproveitado enquanto a versão e o dia não mudarem.
+
+Tempos de uma empresa (sem cache e com cache):
+    python -m modules.financial_kpis [empresa_id]
+"""
+import sys
+import time
+import logging
+import threading
+from datetime import date, timedelta
+from database.db import get_connection
+
+logger = logging.getLogger(__name__)
+
+DIAS_PROJECAO = 30
+TOP_CATEGORIAS = 10
+
+_cache = {}  # empresa_id -> (versão, dia, kpis)
+_cache_lock = threading.Lock()
+
+
+# --- CÁLCULO ---
+
+def _fim_do_mes(d):
+    proximo = (d.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return proximo - timedelta(days=1)
+
+
+def data_version(cur):
+    """Versão atual dos dados financeiros (muda a cada gravação)."""
+    cur.execute("SELECT versao FROM versoes_dados WHERE nome = 'financeiro'")
+    row = cur.fetchone()
+    return row['versao'] if row else None
+
+
+def compute_kpis(cur, empresa_id, hoje=None):
+    """
+    Calcula os indicadores da empresa na data 'hoje' (date; padrão: data local).
+    Retorna dict com saldo, vencido, vence_hoje, receber_mes, projecao
+    [(dia, receitas, despesas)] e despesas_categoria [(nome, total)].
+    """
+    hoje = hoje or date.today()
+    inicio_mes, fim_mes = hoje.replace(day=1), _fim_do_mes(hoje)
+    fim_projecao = hoje + timedelta(days=DIAS_PROJECAO)
+    s_hoje, s_inicio_mes, s_fim_mes = hoje.isoformat(), inicio_mes.isoformat(), fim_mes.isoformat()
+    s_fim_projecao = fim_projecao.isoformat()
+
+    cur.execute("""
+        SELECT SUM(saldo_atual) AS saldo_total FROM contas_financeiras
+        WHERE empresa_id = ? AND active = 1
+    """, (empresa_id,))
+    saldo = cur.fetchone()['saldo_total'] or 0.0
+
+    # Uma passada pelos lançamentos em aberto: um grupo por dia a partir do
+    # início do mês e um único grupo (dia NULL) para os vencidos antes dele.
+    # CROSS JOIN fixa os lançamentos como laço externo: pelas estatísticas os
+    # status parecem equilibrados e o planejador partiria dos títulos da empresa.
+    cur.execute("""
+        SELECT CASE WHEN l.data_vencimento < :inicio_mes THEN NULL ELSE l.data_vencimento END AS dia,
+               l.tipo, SUM(l.valor_previsto - IFNULL(l.valor_pago, 0)) AS aberto
+        FROM lancamentos_financeiros l
+        CROSS JOIN titulos_financeiros t ON t.id = l.titulo_id
+        WHERE l.status IN ('PENDENTE', 'VENCIDO')
+          AND l.data_vencimento <= :limite
+          AND t.empresa_id = :empresa_id
+        GROUP BY 1, 2
+    """, {"inicio_mes": s_inicio_mes, "limite": max(s_fim_mes, s_fim_projecao), "empresa_id": empresa_id})
+
+    vencido = vence_hoje = receber_mes = 0.0
+    projecao = {}
+    for row in cur.fetchall():
+        dia, tipo, aberto = row['dia'], row['tipo'], row['aberto'] or 0.0
+        if tipo == 'A PAGAR' and (dia is None or dia < s_hoje):
+            vencido += aberto
+        if dia == s_hoje:
+            vence_hoje += aberto
+        if tipo == 'A RECEBER' and dia is not None and dia <= s_fim_mes:
+            receber_mes += aberto
+        if dia is not None and s_hoje <= dia <= s_fim_projecao:
+            receitas, despesas = projecao.get(dia, (0.0, 0.0))
+            if tipo == 'A RECEBER':
+                receitas += aberto
+            elif tipo == 'A PAGAR':
+                despesas += aberto
+            projecao[dia] = (receitas, despesas)
+
+    cur.execute("""
+        SELECT c.nome, SUM(l.valor_pago) AS total_pago
+        FROM lancamentos_financeiros l
+        JOIN titulos_financeiros t ON t.id = l.titulo_id
+        JOIN categorias_financeiras c ON c.id = l.categoria_id
+        WHERE l.status = 'PAGO' AND l.data_pagamento BETWEEN ? AND ?
+          AND l.tipo = 'A PAGAR' AND t.empresa_id = ?
+        GROUP BY c.nome
+        ORDER BY total_pago DESC
+        LIMIT ?
+    """, (s_inicio_mes, s_fim_mes, empresa_id, TOP_CATEGORIAS))
+    despesas_categoria = [(row['nome'], row['total_pago'] or 0.0) for row in cur.fetchall()]
+
+    return {
+        "saldo": saldo,
+        "vencido": vencido,
+        "vence_hoje": vence_hoje,
+        "receber_mes": receber_mes,
+        "projecao": [(dia, *projecao[dia]) for dia in sorted(projecao)],
+        "despesas_categoria": despesas_categoria,
+    }
+
+
+# --- CACHE ---
+
+def get_dashboard_kpis(empresa_id, usar_cache=True):
+    """
+    Indicadores da empresa, do cache quando a versão dos dados e o dia
+    não mudaram. O dict retornado inclui "tempos": {"total_ms",
+    "calculo_ms" (0 se veio do cache), "cache": bool}.
+    """
+    inicio = time.perf_counter()
+    hoje = date.today()
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        versao = data_version(cur)
+        with _cache_lock:
+            guardado = _cache.get(empresa_id)
+        if usar_cache and guardado and guardado[0] == versao and guardado[1] == hoje:
+            kpis = dict(guardado[2])
+            kpis["tempos"] = {"total_ms": (time.perf_counter() - inicio) * 1000, "calculo_ms": 0.0, "cache": True}
+            return kpis
+
+        inicio_calculo = time.perf_counter()
+        kpis = compute_kpis(cur, empresa_id, hoje)
+        calculo_ms = (time.perf_counter() - inicio_calculo) * 1000
+        with _cache_lock:
+            _cache[empresa_id] = (versao, hoje, kpis)
+    finally:
+        conn.close()
+
+    kpis = dict(kpis)
+    kpis["tempos"] = {"total_ms": (time.perf_counter() - inicio) * 1000, "calculo_ms": calculo_ms, "cache": False}
+    logger.debug(f"KPIs financeiros da empresa {empresa_id} calculados em {calculo_ms:.1f} ms.")
+    return kpis
+
+
+def invalidate(empresa_id=None):
+    """Descarta o cache de uma empresa (ou de todas)."""
+    with _cache_lock:
+        if empresa_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(empresa_id, None)
+
+
+if __name__ == "__main__":
+    empresa = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    for rotulo, usar_cache in (("sem cache", False), ("com cache", True), ("com cache", True)):
+        k = get_dashboard_kpis(empresa, usar_cache)
+        print(f"{rotulo}: {k['tempos']['total_ms']:.1f} ms (cálculo {k['tempos']['calculo_ms']:.1f} ms)")
+    print(f"Saldo R$ {k['saldo']:.2f} | Vencido R$ {k['vencido']:.2f} | Hoje R$ {k['vence_hoje']:.2f} "
+          f"| A receber (mês) R$ {k['receber_mes']:.2f}")
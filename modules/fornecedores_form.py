@@ -15,6 +15,7 @@ from PyQt5.QtWidgets import (
 )
 from PyQt5.QtCore import Qt
 from database.db import get_connection
+from . import name_cache
 
 class FornecedoresForm(QWidget):
     """
@@ -298,6 +299,8 @@ class FornecedoresForm(QWidget):
             
             cur.execute(query, data)
             conn.commit()
+            if self.current_fornecedor_id:
+                name_cache.fornecedores.invalidate(self.current_fornecedor_id)
             
             QMessageBox.information(self, "Sucesso", msg)
             self.set_mode(0)
@@ -376,6 +379,7 @@ class FornecedoresForm(QWidget):
             
             cur.execute("DELETE FROM fornecedores WHERE id = ?", (self.current_fornecedor_id,))
             conn.commit()
+            name_cache.fornecedores.invalidate(self.current_fornecedor_id)
             
             QMessageBox.information(self, "Sucesso", "Fornecedor excluído com sucesso.")
             self.set_mode(0)
@@ -560,6 +564,8 @@ class FornecedoresForm(QWidget):
                 )
                  
             conn.commit()
+            if records_to_update:
+                name_cache.fornecedores.invalidate()
 
             # 6. Exibe o resultado
             msg_final = f"{len(records_to_insert)} fornecedores criados.\n"
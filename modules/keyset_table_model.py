@@ -0,0 +1,181 @@
+# modules/keyset_table_model.py
+"""
+Modelo de tabela paginado por chave (keyset) para listas longas.
+
+KeysetTableModel lê a consulta em páginas de PAGE_SIZE linhas: a
+primeira ao definir a consulta e as seguintes quando a view pede mais
+(canFetchMore/fetchMore, chamados pelo QTableView ao rolar até o fim).
+Cada página continua a partir da chave de ordenação da última linha
+lida, com uma comparação de valores de linha
+    (data, id) > (?, ?) ORDER BY data, id LIMIT n
+que o SQLite resolve no índice, sem OFFSET: o custo de uma página não
+cresce com a posição na lista. O limite inferior do filtro deve ser
+passado como cursor inicial ('apos') e não na consulta: com duas
+restrições de início na mesma coluna o SQLite usa uma só no índice e a
+página volta a percorrer o intervalo desde o começo.
+
+Texto, alinhamento e cores saem de data() por papel (DisplayRole,
+TextAlignmentRole, BackgroundRole, ForegroundRole) a partir das linhas
+guardadas; não há um QTableWidgetItem por célula. Com isso o tempo até
+a primeira pintura depende só do tamanho da página, não do resultado.
+'ao_carregar' recebe cada página lida antes de ela ser exibida (ex.:
+para resolver em lote os nomes da página em modules/name_cache.py).
+"""
+import logging
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QVariant, pyqtSignal
+from database.db import get_connection
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 200
+
+ALINHAR_DIREITA = Qt.AlignRight | Qt.AlignVCenter
+ALINHAR_CENTRO = Qt.AlignCenter
+
+
+class Coluna:
+    """
+    Coluna do modelo: 'chave' é o nome da coluna na consulta; 'formato'
+    (linha -> texto), 'alinhamento' e 'cor_texto' (linha -> QColor ou
+    None) são opcionais.
+    """
+    def __init__(self, titulo, chave, formato=None, alinhamento=None, cor_texto=None):
+        self.titulo = titulo
+        self.chave = chave
+        self.formato = formato
+        self.alinhamento = alinhamento
+        self.cor_texto = cor_texto
+
+
+class KeysetTableModel(QAbstractTableModel):
+    """
+    Modelo somente leitura sobre uma consulta paginada por chave.
+    'cor_linha' (linha -> QColor ou None) define o fundo da linha inteira;
+    'ao_carregar' (lista de linhas -> None) é chamado a cada página lida.
+    """
+    erro = pyqtSignal(str)
+
+    def __init__(self, colunas, cor_linha=None, ao_carregar=None, page_size=PAGE_SIZE, parent=None):
+        super().__init__(parent)
+        self._colunas = colunas
+        self._cor_linha = cor_linha
+        self._ao_carregar = ao_carregar
+        self._page_size = page_size
+        self._linhas = []
+        self._sql = None
+        self._params = ()
+        self._chaves = []
+        self._decrescente = False
+        self._cursor = None
+        self._fim = True
+
+    # --- CONSULTA ---
+
+    def set_query(self, sql, params, chaves, decrescente=False, apos=None):
+        """
+        Define a consulta e carrega a primeira página.
+        'sql' é um SELECT com cláusula WHERE e sem ORDER BY/LIMIT;
+        'chaves' é a ordenação [(expressão SQL, coluna do resultado)],
+        terminando numa coluna única (ex.: o id), toda no mesmo sentido.
+        'apos' (opcional) são os valores das chaves a partir dos quais ler,
+        exclusive (ex.: (data_inicial, 0)).
+        Erros da primeira página são propagados para a tela.
+        """
+        self.beginResetModel()
+        self._sql, self._params = sql, tuple(params)
+        self._chaves, self._decrescente = chaves, decrescente
+        self._cursor = tuple(apos) if apos is not None else None
+        self._linhas = []
+        self._fim = False
+        try:
+            self._linhas = self._ler_pagina()
+        finally:
+            self.endResetModel()
+
+    def clear(self):
+        self.beginResetModel()
+        self._sql, self._cursor, self._linhas, self._fim = None, None, [], True
+        self.endResetModel()
+
+    def _ler_pagina(self):
+        expressoes = ", ".join(e for e, _ in self._chaves)
+        sentido = " DESC" if self._decrescente else ""
+        sql, params = self._sql, list(self._params)
+        if self._cursor is not None:
+            comparacao = "<" if self._decrescente else ">"
+            marcadores = ", ".join("?" for _ in self._chaves)
+            sql += f" AND ({expressoes}) {comparacao} ({marcadores})"
+            params += self._cursor
+        ordem = ", ".join(f"{e}{sentido}" for e, _ in self._chaves)
+        sql += f" ORDER BY {ordem} LIMIT ?"
+        params.append(self._page_size)
+
+        conn = get_connection()
+        try:
+            linhas = conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+        if linhas:
+            self._cursor = tuple(linhas[-1][c] for _, c in self._chaves)
+            if self._ao_carregar:
+                self._ao_carregar(linhas)
+        if len(linhas) < self._page_size:
+            self._fim = True
+        return linhas
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._fim and self._sql is not None
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        try:
+            pagina = self._ler_pagina()
+        except Exception as e:
+            self._fim = True
+            logger.error(f"Erro ao ler a próxima página: {e}", exc_info=True)
+            self.erro.emit(str(e))
+            return
+        if pagina:
+            inicio = len(self._linhas)
+            self.beginInsertRows(QModelIndex(), inicio, inicio + len(pagina) - 1)
+            self._linhas.extend(pagina)
+            self.endInsertRows()
+
+    # --- ACESSO ---
+
+    def row_data(self, row):
+        """Linha da consulta (sqlite3.Row) na posição 'row', ou None."""
+        if 0 <= row < len(self._linhas):
+            return self._linhas[row]
+        return None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._linhas)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._colunas)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self._colunas[section].titulo
+        return QVariant()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return QVariant()
+        linha = self._linhas[index.row()]
+        coluna = self._colunas[index.column()]
+
+        if role == Qt.DisplayRole:
+            if coluna.formato:
+                return coluna.formato(linha)
+            valor = linha[coluna.chave]
+            return "" if valor is None else str(valor)
+        if role == Qt.TextAlignmentRole and coluna.alinhamento is not None:
+            return int(coluna.alinhamento)
+        if role == Qt.BackgroundRole and self._cor_linha:
+            return self._cor_linha(linha) or QVariant()
+        if role == Qt.ForegroundRole and coluna.cor_texto:
+            return coluna.cor_texto(linha) or QVariant()
+        return QVariant()
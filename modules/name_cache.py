@@ -0,0 +1,129 @@
+# modules/name_cache.py
+"""
+Cache de nomes por id (clientes, fornecedores, categorias e centros de
+custo) para rotular listas sem carregar as tabelas inteiras.
+
+Cada NameCache guarda até 'capacidade' nomes em ordem de uso (LRU).
+get_many() resolve os ids de uma página de uma vez: os que faltam são
+lidos em lote com "WHERE id IN (...)". Antes do lote, a versão da
+tabela em 'versoes_dados' (migração 13, incrementada por gatilhos
+quando o nome muda ou o registro é excluído) é comparada com a do
+cache, que é descartado se a tabela mudou, inclusive em outro processo
+ou terminal. get() lê só a memória quando o id já está no cache,
+adequado para data() de um modelo depois de get_many() na página.
+
+Ids que não existem na tabela (p. ex. um parceiro excluído ainda
+referenciado) também ficam no cache, como None, para que cada repintura
+não volte ao banco. Só são guardados os ids que não serão atribuídos a
+uma inclusão (até o maior id da tabela ou já emitido pelo AUTOINCREMENT),
+porque inclusões não mudam a versão.
+
+As telas de cadastro chamam invalidate() ao gravar, para que a própria
+instância veja a alteração sem esperar a próxima página.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from database.db import get_connection
+
+logger = logging.getLogger(__name__)
+
+CAPACIDADE_PADRAO = 5000
+LOTE_IN = 500  # ids por consulta (abaixo do limite de parâmetros do SQLite)
+
+
+class NameCache:
+    """Nomes de 'tabela' ('coluna') por id, limitados a 'capacidade' entradas."""
+
+    def __init__(self, tabela, coluna, capacidade=CAPACIDADE_PADRAO):
+        self.tabela = tabela
+        self.coluna = coluna
+        self.capacidade = capacidade
+        self._nomes = OrderedDict()
+        self._versao = None
+        self._lock = threading.Lock()
+
+    def get_many(self, ids, cur=None):
+        """{id: nome} dos ids informados (ids inexistentes ficam de fora)."""
+        ids = {i for i in ids if i is not None}
+        if not ids:
+            return {}
+        conn = None
+        if cur is None:
+            conn = get_connection()
+            cur = conn.cursor()
+        try:
+            cur.execute("SELECT versao FROM versoes_dados WHERE nome = ?", (self.tabela,))
+            row = cur.fetchone()
+            versao = row['versao'] if row else None
+            with self._lock:
+                if versao != self._versao:
+                    self._nomes.clear()
+                    self._versao = versao
+                faltantes = [i for i in ids if i not in self._nomes]
+
+            lidos = {}
+            for inicio in range(0, len(faltantes), LOTE_IN):
+                lote = faltantes[inicio:inicio + LOTE_IN]
+                marcadores = ", ".join("?" for _ in lote)
+                cur.execute(f"SELECT id, {self.coluna} AS nome FROM {self.tabela} WHERE id IN ({marcadores})", lote)
+                lidos.update((r['id'], r['nome']) for r in cur.fetchall())
+            ausentes = [i for i in faltantes if i not in lidos]
+            if ausentes:
+                cur.execute(f"""
+                    SELECT MAX(COALESCE((SELECT MAX(id) FROM {self.tabela}), 0),
+                               COALESCE((SELECT seq FROM sqlite_sequence WHERE name = ?), 0))
+                """, (self.tabela,))
+                maior = cur.fetchone()[0]
+                lidos.update((i, None) for i in ausentes if i <= maior)
+        finally:
+            if conn is not None:
+                conn.close()
+
+        with self._lock:
+            if self._versao == versao:
+                for i, nome in lidos.items():
+                    self._guardar(i, nome)
+            resultado = {}
+            for i in ids:
+                if i in self._nomes:
+                    self._nomes.move_to_end(i)
+                    nome = self._nomes[i]
+                else:
+                    nome = lidos.get(i)
+                if nome is not None:
+                    resultado[i] = nome
+        return resultado
+
+    def get(self, id_, padrao="-"):
+        """Nome do id; só consulta o banco se ele não estiver no cache."""
+        if id_ is None:
+            return padrao
+        with self._lock:
+            if id_ in self._nomes:
+                self._nomes.move_to_end(id_)
+                nome = self._nomes[id_]
+                return padrao if nome is None else nome
+        return self.get_many([id_]).get(id_, padrao)
+
+    def _guardar(self, id_, nome):
+        self._nomes[id_] = nome
+        self._nomes.move_to_end(id_)
+        while len(self._nomes) > self.capacidade:
+            self._nomes.popitem(last=False)
+
+    def invalidate(self, id_=None):
+        """Descarta um id (ou todo o cache)."""
+        with self._lock:
+            if id_ is None:
+                self._nomes.clear()
+                self._versao = None
+            else:
+                self._nomes.pop(id_, None)
+
+
+# Caches compartilhados pelas telas do processo
+clientes = NameCache("clientes", "nome_razao")
+fornecedores = NameCache("fornecedores", "nome")
+categorias_financeiras = NameCache("categorias_financeiras", "nome")
+centros_de_custo = NameCache("centros_de_custo", "nome")
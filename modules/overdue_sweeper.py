@@ -0,0 +1,100 @@
+# modules/overdue_sweeper.py
+"""
+Varredura de lançamentos vencidos.
+
+O status VENCIDO é gravado em 'lancamentos_financeiros' (migração 12):
+os gatilhos acertam PENDENTE/VENCIDO quando o lançamento é gravado, e
+sweep_overdue() trata a passagem dos dias, movendo em lote os PENDENTES
+cujo vencimento ficou para trás. Com isso os filtros de status viram
+comparações de igualdade no índice parcial idx_lancamentos_abertos, em
+vez de 'status != PAGO' mais a comparação de datas linha a linha.
+
+OverdueSweeper executa a varredura ao iniciar e logo após cada
+meia-noite (horário local), numa thread em segundo plano.
+
+Varredura manual:
+    python -m modules.overdue_sweeper
+"""
+import logging
+import threading
+from datetime import datetime, timedelta
+from database.db import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Termo idêntico ao WHERE do índice parcial (o SQLite só usa o índice se o termo aparecer na consulta)
+SQL_EM_ABERTO = "status IN ('PENDENTE', 'VENCIDO')"
+
+FOLGA_MEIA_NOITE = 5  # segundos após a virada do dia
+
+
+def sweep_overdue():
+    """
+    Move PENDENTE -> VENCIDO os lançamentos vencidos antes de hoje (data
+    local, a mesma dos gatilhos) e VENCIDO -> PENDENTE os que voltaram a
+    vencer no futuro (ex.: relógio ajustado).
+    Retorna {"success", "vencidos", "reabertos"}.
+    """
+    conn = get_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        cur = conn.cursor()
+        hoje = cur.execute("SELECT date('now', 'localtime')").fetchone()[0]
+        cur.execute(f"""
+            UPDATE lancamentos_financeiros SET status = 'VENCIDO'
+            WHERE {SQL_EM_ABERTO} AND status = 'PENDENTE' AND data_vencimento < ?
+        """, (hoje,))
+        vencidos = cur.rowcount
+        cur.execute(f"""
+            UPDATE lancamentos_financeiros SET status = 'PENDENTE'
+            WHERE {SQL_EM_ABERTO} AND status = 'VENCIDO' AND data_vencimento >= ?
+        """, (hoje,))
+        reabertos = cur.rowcount
+        conn.commit()
+        if vencidos or reabertos:
+            logger.info(f"Varredura de vencidos ({hoje}): {vencidos} vencidos, {reabertos} reabertos.")
+        return {"success": True, "vencidos": vencidos, "reabertos": reabertos}
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Erro na varredura de lançamentos vencidos: {e}", exc_info=True)
+        return {"success": False, "error": f"Erro na varredura de vencidos: {e}"}
+    finally:
+        conn.close()
+
+
+class OverdueSweeper:
+    """Executa sweep_overdue() agora e a cada virada de dia, até close()."""
+
+    def __init__(self):
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="OverdueSweeper", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while not self._parar.is_set():
+            sweep_overdue()
+            agora = datetime.now()
+            amanha = datetime.combine(agora.date() + timedelta(days=1), datetime.min.time())
+            self._parar.wait((amanha - agora).total_seconds() + FOLGA_MEIA_NOITE)
+
+    def close(self):
+        self._parar.set()
+
+
+_sweeper = None
+
+
+def start_overdue_sweeper():
+    """Inicia a varredura diária do processo (uma única instância)."""
+    global _sweeper
+    if _sweeper is None:
+        _sweeper = OverdueSweeper()
+    return _sweeper
+
+
+if __name__ == "__main__":
+    resultado = sweep_overdue()
+    if resultado["success"]:
+        print(f"{resultado['vencidos']} lançamentos vencidos, {resultado['reabertos']} reabertos.")
+    else:
+        print(resultado["error"])
@@ -0,0 +1,253 @@
+# modules/pdf_report.py
+"""
+Relatórios tabulares em PDF gerados em blocos de uma página.
+
+Uma única Table do reportlab com todas as linhas tem custo de layout
+superlinear (medição e quebra de uma tabela gigante). Aqui cada página
+recebe sua própria Table, com larguras de coluna e alturas de linha
+fixas (estimadas por uma amostra das primeiras linhas), desenhada
+direto no canvas: o custo é linear e as linhas são consumidas à medida
+que chegam (lista ou cursor), sem montar a história inteira em memória.
+
+PdfRenderProcess executa a geração em outro processo, para que a
+interface continue respondendo; o módulo não importa Qt nem
+database.db, de modo que o processo filho carrega só o necessário.
+"""
+import os
+import queue
+import sqlite3
+import itertools
+import multiprocessing
+from datetime import datetime
+from reportlab.pdfgen import canvas
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.units import inch
+from reportlab.lib import colors
+from reportlab.platypus import Table, TableStyle, Paragraph
+
+MARGEM = inch / 2
+RODAPE = 16             # faixa inferior reservada ao número da página
+FONTE, FONTE_NEGRITO = "Helvetica", "Helvetica-Bold"
+TAMANHO_FONTE = 9
+TAMANHO_CABECALHO = 12
+ALTURA_LINHA = 14
+ALTURA_CABECALHO = 20
+PREENCHIMENTO = 8       # espaço horizontal interno de cada célula (6 + 2 de folga)
+AMOSTRA_LARGURAS = 500  # linhas usadas para estimar a largura das colunas
+LOTE_CURSOR = 2000
+
+ESTILO_TABELA = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#0078D7")),  # Cor do cabeçalho
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), FONTE_NEGRITO),
+    ('FONTSIZE', (0, 0), (-1, 0), TAMANHO_CABECALHO),
+    ('FONTNAME', (0, 1), (-1, -1), FONTE),
+    ('FONTSIZE', (0, 1), (-1, -1), TAMANHO_FONTE),
+    ('BOX', (0, 0), (-1, -1), 0.25, colors.black),
+    ('GRID', (0, 0), (-1, -1), 0.25, colors.black),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+])
+
+
+class RenderCancelado(Exception):
+    """Geração interrompida pelo usuário."""
+
+
+# --- FONTES DE LINHAS ---
+
+def iter_query_rows(db_path, sql, params=(), formatos=None, cancelado=None):
+    """
+    Lê a consulta em lotes (fetchmany) com uma conexão somente leitura
+    própria. 'formatos' tem, por coluna, um formato str.format (ex.:
+    "R$ {:.2f}") ou None para str(); valores nulos viram "".
+    """
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        if cancelado:
+            # Retorno != 0 interrompe a instrução em andamento
+            conn.set_progress_handler(lambda: 1 if cancelado() else 0, 1000)
+        cur = conn.execute(sql, params)
+        while True:
+            lote = cur.fetchmany(LOTE_CURSOR)
+            if not lote:
+                break
+            for row in lote:
+                if formatos:
+                    yield [_texto(v, f) for v, f in zip(row, formatos)]
+                else:
+                    yield [_texto(v) for v in row]
+    finally:
+        conn.close()
+
+
+def _texto(valor, formato=None):
+    if valor is None:
+        return ""
+    return formato.format(valor) if formato else str(valor)
+
+
+# --- LAYOUT ---
+
+def _larguras(headers, amostra, largura_util):
+    """Largura de cada coluna pela amostra; reduzidas proporcionalmente se não couberem."""
+    larguras = [stringWidth(str(h), FONTE_NEGRITO, TAMANHO_CABECALHO) + PREENCHIMENTO for h in headers]
+    for row in amostra:
+        for i, texto in enumerate(row[:len(larguras)]):
+            larguras[i] = max(larguras[i], stringWidth(texto, FONTE, TAMANHO_FONTE) + PREENCHIMENTO)
+    total = sum(larguras)
+    if total > largura_util:
+        larguras = [l * largura_util / total for l in larguras]
+    return larguras
+
+
+def _ajustar(texto, fonte, tamanho, largura):
+    """Corta o texto que não cabe na coluna (larguras fixas: sem quebra de linha)."""
+    # Nenhum caractere da Helvetica passa de ~1 em: textos curtos dispensam a medição
+    if len(texto) * tamanho * 1.05 <= largura or stringWidth(texto, fonte, tamanho) <= largura:
+        return texto
+    while texto and stringWidth(texto + "…", fonte, tamanho) > largura:
+        texto = texto[:-1]
+    return texto + "…"
+
+
+def render_pdf(path, headers, rows, title, orientation="landscape", progresso=None, cancelado=None):
+    """
+    Grava o relatório em 'path' (via 'path.tmp', substituído ao final).
+    'rows' é qualquer iterável de listas de textos. progresso(linhas,
+    páginas) é chamado a cada página; se cancelado() retornar True,
+    levanta RenderCancelado. Retorna o total de linhas.
+    """
+    pagesize = landscape(A4) if orientation == "landscape" else A4
+    largura_util = pagesize[0] - 2 * MARGEM
+
+    rows = iter(rows)
+    amostra = list(itertools.islice(rows, AMOSTRA_LARGURAS))
+    larguras = _larguras(headers, amostra, largura_util)
+    x = MARGEM + (largura_util - sum(larguras)) / 2  # tabela centralizada
+    limites = [l - PREENCHIMENTO for l in larguras]
+    cabecalho = [_ajustar(str(h), FONTE_NEGRITO, TAMANHO_CABECALHO, l) for h, l in zip(headers, limites)]
+
+    tmp_path = path + ".tmp"
+    c = canvas.Canvas(tmp_path, pagesize=pagesize)
+    c.setTitle(title)
+    try:
+        # Título e data apenas na primeira página
+        styles = getSampleStyleSheet()
+        style_title = styles['h1']
+        style_title.alignment = TA_CENTER
+        style_normal = styles['Normal']
+        style_normal.alignment = TA_CENTER
+        topo = pagesize[1] - MARGEM
+        for p in (Paragraph(title, style_title),
+                  Paragraph(f"Gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}", style_normal)):
+            _, h = p.wrapOn(c, largura_util, topo)
+            topo -= h
+            p.drawOn(c, MARGEM, topo)
+        topo -= 2 * style_normal.leading
+
+        total = 0
+        pagina = 1
+        bloco = []
+        capacidade = int((topo - MARGEM - RODAPE - ALTURA_CABECALHO) // ALTURA_LINHA)
+
+        def _desenhar_pagina():
+            t = Table([cabecalho] + bloco, colWidths=larguras,
+                      rowHeights=[ALTURA_CABECALHO] + [ALTURA_LINHA] * len(bloco))
+            t.setStyle(ESTILO_TABELA)
+            _, h = t.wrapOn(c, largura_util, topo)
+            t.drawOn(c, x, topo - h)
+            c.setFont(FONTE, 8)
+            c.drawRightString(pagesize[0] - MARGEM, MARGEM, f"Página {pagina}")
+            c.showPage()
+
+        for row in itertools.chain(amostra, rows):
+            bloco.append([_ajustar(t, FONTE, TAMANHO_FONTE, l) for t, l in zip(row, limites)])
+            if len(bloco) < capacidade:
+                continue
+            _desenhar_pagina()
+            total += len(bloco)
+            if cancelado and cancelado():
+                raise RenderCancelado()
+            if progresso:
+                progresso(total, pagina)
+            bloco = []
+            pagina += 1
+            topo = pagesize[1] - MARGEM
+            capacidade = int((topo - MARGEM - RODAPE - ALTURA_CABECALHO) // ALTURA_LINHA)
+
+        if bloco or total == 0:
+            _desenhar_pagina()
+            total += len(bloco)
+            if progresso:
+                progresso(total, pagina)
+        c.save()
+        os.replace(tmp_path, path)
+        return total
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+# --- GERAÇÃO EM OUTRO PROCESSO ---
+
+def _processo_render(path, headers, fonte, title, orientation, fila, cancelar):
+    """Ponto de entrada do processo filho. 'fonte': ("linhas", rows) ou ("consulta", db_path, sql, params, formatos)."""
+    try:
+        if fonte[0] == "consulta":
+            rows = iter_query_rows(*fonte[1:], cancelado=cancelar.is_set)
+        else:
+            rows = fonte[1]
+        total = render_pdf(path, headers, rows, title, orientation,
+                           progresso=lambda linhas, paginas: fila.put(("progresso", linhas, paginas)),
+                           cancelado=cancelar.is_set)
+        fila.put(("concluido", total))
+    except Exception as e:
+        # "interrupted" do SQLite também indica cancelamento
+        if cancelar.is_set():
+            fila.put(("cancelado",))
+        else:
+            fila.put(("erro", str(e)))
+
+
+class PdfRenderProcess:
+    """
+    Gera o PDF em um processo separado (contexto 'spawn', o mesmo do
+    Windows). O chamador consulta poll() periodicamente; as mensagens
+    são ("progresso", linhas, páginas), ("concluido", total),
+    ("cancelado",) e ("erro", mensagem).
+    """
+
+    def __init__(self, path, headers, fonte, title, orientation="landscape"):
+        ctx = multiprocessing.get_context("spawn")
+        self._fila = ctx.Queue()
+        self._cancelar = ctx.Event()
+        self._processo = ctx.Process(
+            target=_processo_render,
+            args=(path, headers, fonte, title, orientation, self._fila, self._cancelar),
+            name="PdfReport", daemon=True
+        )
+
+    def start(self):
+        self._processo.start()
+
+    def cancel(self):
+        self._cancelar.set()
+
+    def poll(self):
+        mensagens = []
+        while True:
+            try:
+                mensagens.append(self._fila.get_nowait())
+            except queue.Empty:
+                break
+        if not mensagens and not self._processo.is_alive() and self._processo.exitcode not in (None, 0):
+            mensagens.append(("erro", f"Processo de geração encerrado (código {self._processo.exitcode})."))
+        return mensagens
+
+    def join(self, timeout=None):
+        self._processo.join(timeout)
@@ -1,11 +1,20 @@
 # modules/pos_controller.py
 import json
+import uuid
 import sqlite3
 import socket
 import logging
 from PyQt5.QtWidgets import QMessageBox
 from PyQt5.QtCore import Qt
 from database.db import get_connection
+from .product_lookup import ProductLookupIndex
+from . import sale_persistence
+from . import session_totals
+from . import cash_session
+from . import store_replica
+from . import store_server
+from .sequence_service import TerminalSequence
+from .sale_journal import SaleJournal, replay_journal, has_pending_entries
 
 class PosController:
     """
@@ -27,7 +36,10 @@ class PosController:
         # --- Propriedades para o modelo CNPJ/Tabela ---
         self.identificador_loja = None
         self.tabela_id_ativa = None
+        self.product_index = None # Índice em memória código -> produto (leitura do PDV)
         self.deposito_id_padrao = None # ID do depósito de onde baixa o estoque
+        self.numeracao = None # Números de venda do terminal (blocos reservados)
+        self.replica = store_replica.active() # Modo réplica do servidor da loja (None = banco direto)
         
         # --- NOVAS Propriedades Financeiras (Roteamento) ---
         self.conta_pdv_id = None    # ID da conta 'PDV / Caixa Operador'
@@ -37,14 +49,70 @@ class PosController:
         self.conta_dest_outros_id = None
         
         self.current_caixa_id = None
+        self._caixa_totais_verificado = None
         self.user_field_permissions = {}
         self.limite_desconto = 100.0 
         
-        self.is_terminal_valid = self._validate_terminal()
+        # --- Gravação assíncrona de vendas (diário local) ---
+        self.sale_journal = None
+        journal_ok = self._replay_sale_journal()
+        
+        self.is_terminal_valid = journal_ok and self._validate_terminal() and self._load_sale_numbering()
         if self.is_terminal_valid:
             self._load_active_price_tabela()
             self._load_user_permissions()
+            self._build_product_index()
+            # Em modo réplica o banco já é local: a gravação assíncrona não se aplica
+            if self.terminal_data.get('gravacao_assincrona') and not self.replica:
+                self.sale_journal = SaleJournal()
+                self.logger.info(f"Terminal ID {self.terminal_id}: gravação assíncrona de vendas ativa.")
         
+    def _replay_sale_journal(self):
+        """
+        Grava no banco vendas do diário local que ficaram pendentes (antes de
+        ler a numeração). Sem isso o PDV não abre: as vendas seguem só no diário.
+        """
+        try:
+            replay_journal()
+            return True
+        except Exception as e:
+            self.logger.critical(f"Falha ao reaplicar o diário de vendas pendentes: {e}", exc_info=True)
+            QMessageBox.critical(None, "Vendas Pendentes",
+                "Existem vendas no diário local que não puderam ser gravadas no banco.\n\n"
+                f"Erro: {e}\n\nO PDV não será aberto. Verifique a conexão com o banco de dados e reabra o PDV.")
+            return False
+
+    def _load_sale_numbering(self):
+        """
+        Retoma o bloco de números do terminal e confere as lacunas (depois do
+        diário). Vendas ainda no diário têm números que não estão em 'vendas':
+        a numeração não é montada enquanto o diário não for esvaziado, para
+        não reemitir esses números nem registrá-los como lacunas.
+        """
+        if has_pending_entries():
+            self.logger.critical(f"Terminal {self.terminal_id}: numeração não carregada, diário de vendas com pendências.")
+            QMessageBox.critical(None, "Numeração de Vendas",
+                "Existem vendas no diário local ainda não gravadas no banco.\n\n"
+                "A numeração não pode ser retomada até que sejam gravadas. Reabra o PDV.")
+            return False
+        try:
+            if self.replica:
+                self.numeracao = store_replica.RemoteTerminalSequence(self.terminal_id, self.replica)
+                self.replica.numeracao = self.numeracao
+            else:
+                self.numeracao = TerminalSequence(self.terminal_id)
+            return True
+        except Exception as e:
+            self.logger.error(f"Erro ao carregar a numeração do terminal {self.terminal_id}: {e}", exc_info=True)
+            QMessageBox.critical(None, "Numeração de Vendas",
+                f"Não foi possível carregar a numeração de vendas deste terminal.\n\nErro: {e}")
+            return False
+
+    def flush_pending_sales(self):
+        """Aguarda a gravação das vendas do diário (antes de consultar vendas no banco)."""
+        if self.sale_journal and not self.sale_journal.flush():
+            self.logger.error(f"Timeout aguardando gravação de {self.sale_journal.pendentes} venda(s) do diário.")
+
     def _validate_terminal(self):
         """Verifica se esta máquina (hostname) está cadastrada como um terminal ativo e carrega o CNPJ/Identificador."""
         try:
@@ -136,6 +204,19 @@ class PosController:
         finally:
             conn.close()
 
+    def _build_product_index(self):
+        """Carrega o índice de códigos da tabela de preço ativa."""
+        if self.tabela_id_ativa is None:
+            return
+        self.product_index = ProductLookupIndex(self.tabela_id_ativa)
+        self.product_index.build()
+
+    def lookup_product(self, codigo):
+        """Resolve um EAN / código interno / código alternativo na tabela ativa."""
+        if self.product_index is None:
+            return None
+        return self.product_index.lookup(codigo)
+
     def _load_user_permissions(self):
         conn = get_connection()
         try:
@@ -179,6 +260,12 @@ class PosController:
         finally:
             conn.close()
 
+        if self.current_caixa_id and self.current_caixa_id != self._caixa_totais_verificado:
+            # Sessão retomada: confere os totais acumulados uma vez (vendas
+            # gravadas fora deste PDV, p. ex. por versão anterior do sistema)
+            self._caixa_totais_verificado = self.current_caixa_id
+            session_totals.check_session_totals(self.current_caixa_id)
+
     def finalize_sale(self, cart_items, pagamentos, troco, subtotal, 
                       desconto_itens, desconto_geral, total_final, 
                       current_cliente_id, tipo_documento='FISCAL'):
@@ -189,8 +276,24 @@ class PosController:
             QMessageBox.critical(None, "Erro de Terminal", "O depósito padrão não está configurado neste terminal.")
             return {"success": False, "error": "Depósito padrão não configurado."}
 
-        current_sale_number = self.terminal_data['numero_nfe_atual'] + 1
-        next_sale_number = current_sale_number
+        try:
+            current_sale_number = self.numeracao.peek()
+        except Exception as e:
+            self.logger.error(f"FALHA ao reservar numeração (Terminal ID {self.terminal_id}). Erro: {e}", exc_info=True)
+            return {"success": False, "error": f"Erro ao reservar número da venda: {e}"}
+        
+        total_pago = sum(p['valor'] for p in pagamentos)
+        venda = (
+            self.user_id, current_cliente_id, self.current_caixa_id,
+            self.empresa_id, self.local_id, self.terminal_id, current_sale_number,
+            subtotal, desconto_itens, desconto_geral,
+            total_final, total_pago, troco, tipo_documento
+        )
+        
+        if self.sale_journal:
+            return self._finalize_sale_async(venda, cart_items, pagamentos, current_sale_number,
+                                             current_cliente_id, subtotal, desconto_itens,
+                                             desconto_geral, total_final, troco, tipo_documento)
         
         conn = get_connection()
         cur = conn.cursor()
@@ -199,79 +302,30 @@ class PosController:
         
         try:
             conn.execute("BEGIN")
-            total_pago = sum(p['valor'] for p in pagamentos)
             
-            # 1. Salva Venda
-            cur.execute("""
-                INSERT INTO vendas (
-                    user_id, cliente_id, caixa_id, 
-                    empresa_id, local_id, terminal_id, numero_venda_terminal,
-                    subtotal, desconto_itens, desconto_geral, 
-                    total_final, total_pago, troco, tipo_documento 
-                )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                self.user_id, current_cliente_id, self.current_caixa_id,
-                self.empresa_id, self.local_id, self.terminal_id, current_sale_number,
-                subtotal, desconto_itens, desconto_geral,
-                total_final, total_pago, troco, tipo_documento
-            ))
-            venda_id = cur.lastrowid
-            
-            dados_itens_para_cupom = []
-            
-            # 2. Salva Itens e Baixa Estoque
-            for item in cart_items:
-                total_item = (item['preco_unitario'] * item['quantidade']) - item['desconto_item']
-                
-                cur.execute("""
-                    INSERT INTO vendas_itens (venda_id, produto_id, codigo_barras, descricao, quantidade, preco_unitario, desconto_item, total_item)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (venda_id, item['produto_id'], item['codigo_barras'], item['descricao'], item['quantidade'], 
-                      item['preco_unitario'], item['desconto_item'], total_item))
-                
-                quantidade_baixa = -item['quantidade']
-                
-                cur.execute("""
-                    INSERT INTO estoque (id_produto, id_deposito, quantidade, updated_at)
-                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-                    ON CONFLICT(id_produto, id_deposito) DO UPDATE SET
-                        quantidade = quantidade + excluded.quantidade,
-                        updated_at = CURRENT_TIMESTAMP
-                """, (item['produto_id'], self.deposito_id_padrao, quantidade_baixa)) 
-                
-                item_cupom = item.copy()
-                item_cupom['total_item'] = total_item
-                dados_itens_para_cupom.append(item_cupom)
-            
-            # 4. Salva Pagamentos
-            for pg in pagamentos:
-                forma = pg['forma']
-                valor = pg['valor']
-                tipo_pagamento = pg.get('tipo_pagamento', None) 
-                tipo_cartao = pg.get('tipo_cartao', None)     
-                parcelas = pg.get('parcelas', 1)             
-                nsu = pg.get('nsu', None)
-                doc = pg.get('doc', None)
-                
-                cur.execute("""
-                    INSERT INTO vendas_pagamentos (
-                        venda_id, forma, valor, tipo_pagamento, nsu, doc, 
-                        tipo_cartao, parcelas
-                    ) 
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (venda_id, forma, valor, tipo_pagamento, nsu, doc,
-                      tipo_cartao, parcelas))
-            
-            # 5. Atualiza Sequencial do Terminal
-            cur.execute(
-                "UPDATE terminais_pdv SET numero_nfe_atual = ? WHERE id = ?",
-                (next_sale_number, self.terminal_id)
+            # Modo réplica: id e data da venda iguais na cópia local e no servidor
+            journal_id = data_venda = None
+            if self.replica:
+                journal_id, data_venda = uuid.uuid4().hex, store_replica.timestamp()
+            
+            # 1-4. Salva Venda, Itens (lote), Baixa de Estoque (agregada por produto) e Pagamentos (lote)
+            venda_id, dados_itens_para_cupom = sale_persistence.insert_sale(
+                cur, venda, cart_items, pagamentos, self.deposito_id_padrao, data_venda, journal_id
             )
+            if self.replica:
+                store_replica.enqueue_event(cur, store_server.VENDA, {
+                    "journal_id": journal_id, "venda": list(venda), "itens": cart_items,
+                    "pagamentos": pagamentos, "deposito_id": self.deposito_id_padrao,
+                    "terminal_id": self.terminal_id, "numero": current_sale_number, "data_venda": data_venda,
+                })
             
             conn.commit()
+            if self.replica:
+                self.replica.notify()
             
-            self.terminal_data['numero_nfe_atual'] = next_sale_number
+            # 5. Consome o número (o contador do terminal já avançou na reserva do bloco)
+            self.numeracao.advance(current_sale_number)
+            self.terminal_data['numero_nfe_atual'] = current_sale_number
             
             self.logger.info(f"VENDA FINALIZADA (Tipo: {tipo_documento}). ID: {venda_id}, N°: {current_sale_number}, Caixa: {self.current_caixa_id}, User: {self.user_id}, Total: R$ {total_final:.2f}")
             
@@ -301,7 +355,53 @@ class PosController:
         finally:
             conn.close()
 
+    def _finalize_sale_async(self, venda, cart_items, pagamentos, current_sale_number,
+                             current_cliente_id, subtotal, desconto_itens,
+                             desconto_geral, total_final, troco, tipo_documento):
+        """
+        Modo 'gravacao_assincrona': registra a venda no diário local (fsync)
+        e retorna; a thread do SaleJournal grava no banco em lote.
+        """
+        try:
+            self.sale_journal.submit(venda, cart_items, pagamentos, self.deposito_id_padrao,
+                                     self.terminal_id, current_sale_number)
+        except Exception as e:
+            self.logger.error(f"FALHA ao registrar venda no diário (User ID {self.user_id}, Caixa ID {self.current_caixa_id}). Erro: {e}", exc_info=True)
+            return {"success": False, "error": f"Erro ao salvar venda: {e}"}
+        
+        # Número só é consumido depois de gravado no diário
+        self.numeracao.advance(current_sale_number)
+        self.terminal_data['numero_nfe_atual'] = current_sale_number
+        
+        self.logger.info(f"VENDA FINALIZADA (Tipo: {tipo_documento}, diário). N°: {current_sale_number}, Caixa: {self.current_caixa_id}, User: {self.user_id}, Total: R$ {total_final:.2f}")
+        
+        dados_itens_para_cupom = []
+        for item in cart_items:
+            item_cupom = item.copy()
+            item_cupom['total_item'] = (item['preco_unitario'] * item['quantidade']) - item['desconto_item']
+            dados_itens_para_cupom.append(item_cupom)
+        
+        sale_data_for_receipt = {
+            "venda_id": None, # Atribuído pelo banco na gravação em segundo plano
+            "user_id": self.user_id,
+            "cliente_id": current_cliente_id,
+            "empresa_id": self.empresa_id,
+            "local_id": self.local_id,
+            "terminal_id": self.terminal_id,
+            "numero_venda_terminal": current_sale_number,
+            "cart_items": dados_itens_para_cupom,
+            "pagamentos": pagamentos,
+            "subtotal": subtotal,
+            "desconto_itens": desconto_itens,
+            "desconto_geral": desconto_geral,
+            "total_final": total_final,
+            "troco": troco,
+            "tipo_documento": tipo_documento
+        }
+        return {"success": True, "sale_number": current_sale_number, "receipt_data": sale_data_for_receipt}
+
     def get_receipt_data_for_venda(self, venda_id):
+        self.flush_pending_sales()
         conn = get_connection()
         try:
             cur = conn.cursor()
@@ -346,8 +446,12 @@ class PosController:
             conn.close()
     
     def convert_to_fiscal(self, venda_id_para_converter):
-        current_sale_number = self.terminal_data['numero_nfe_atual'] + 1
-        next_sale_number = current_sale_number
+        self.flush_pending_sales()
+        try:
+            current_sale_number = self.numeracao.peek()
+        except Exception as e:
+            self.logger.error(f"FALHA ao reservar numeração (Terminal ID {self.terminal_id}). Erro: {e}", exc_info=True)
+            return {"success": False, "error": f"Erro ao reservar número da venda: {e}"}
         
         conn = get_connection()
         try:
@@ -361,15 +465,19 @@ class PosController:
                     numero_venda_terminal = ? 
                 WHERE id = ?
             """, (current_sale_number, venda_id_para_converter))
-            
-            cur.execute(
-                "UPDATE terminais_pdv SET numero_nfe_atual = ? WHERE id = ?",
-                (next_sale_number, self.terminal_id)
-            )
+            if self.replica:
+                cur.execute("SELECT journal_id FROM vendas WHERE id = ?", (venda_id_para_converter,))
+                store_replica.enqueue_event(cur, store_server.CONVERSAO_FISCAL, {
+                    "journal_id": cur.fetchone()['journal_id'], "numero": current_sale_number,
+                    "terminal_id": self.terminal_id,
+                })
             
             conn.commit()
+            if self.replica:
+                self.replica.notify()
             
-            self.terminal_data['numero_nfe_atual'] = next_sale_number
+            self.numeracao.advance(current_sale_number)
+            self.terminal_data['numero_nfe_atual'] = current_sale_number
             
             self.logger.info(f"CONVERSÃO P/ FISCAL (User ID {self.user_id}). Venda ID: {venda_id_para_converter}, Novo N°: {current_sale_number}.")
             
@@ -386,53 +494,39 @@ class PosController:
         """
         Busca e calcula os totais esperados (registrados) para o fechamento.
         IMPORTANTE: Ignora vendas canceladas!
+        Lê os totais acumulados da sessão (modules/session_totals.py).
         """
-        conn = get_connection()
+        self.flush_pending_sales()
         try:
-            cur = conn.cursor()
-            
-            cur.execute("SELECT valor_inicial FROM caixa_sessoes WHERE id = ?", (caixa_id,))
-            abertura = cur.fetchone()
-            suprimento_inicial = abertura['valor_inicial'] if abertura else 0.0
+            totais = session_totals.get_session_totals(caixa_id)
+            return {"success": True, "totals": session_totals.expected_closing_totals(totais)}
+        except Exception as e:
+            return {"success": False, "error": f"Erro ao calcular totais do caixa: {e}"}
 
-            cur.execute("SELECT tipo, SUM(valor) as total_mov FROM caixa_movimentacoes WHERE caixa_id = ? GROUP BY tipo", (caixa_id,))
-            movimentacoes = cur.fetchall()
-            suprimentos_mov = 0.0
-            sangrias_mov = 0.0
-            for mov in movimentacoes:
-                if mov['tipo'] == 'SUPRIMENTO':
-                    suprimentos_mov = mov['total_mov']
-                elif mov['tipo'] == 'SANGRIA':
-                    sangrias_mov = mov['total_mov']
+    def open_cash_session(self, valor_inicial):
+        """
+        Abre a sessão de caixa do usuário neste terminal. Em modo réplica a
+        sessão é aberta no servidor da loja (mesmo id nos dois bancos).
+        """
+        try:
+            caixa_id = None
+            if self.replica:
+                caixa_id, valor_inicial = self.replica.open_cash(self.user_id, self.terminal_id, valor_inicial)
+        except (store_replica.StoreUnavailable, store_replica.StoreError) as e:
+            self.logger.error(f"FALHA ao abrir caixa no servidor da loja (User ID {self.user_id}): {e}")
+            return {"success": False, "error": f"Não foi possível abrir o caixa no servidor da loja: {e}"}
 
-            cur.execute("""
-                SELECT vp.forma, SUM(vp.valor) as total_forma
-                FROM vendas_pagamentos vp
-                JOIN vendas v ON vp.venda_id = v.id
-                WHERE v.caixa_id = ? 
-                  AND v.status = 'FINALIZADA'
-                GROUP BY vp.forma
-            """, (caixa_id,))
-            
-            rows_vendas = cur.fetchall()
-            
-            formas_pagamento = {"Dinheiro": 0.0, "Pix": 0.0, "Cartão": 0.0, "Doc. Crédito": 0.0, "Outros": 0.0}
-            
-            for row in rows_vendas:
-                forma = row['forma']
-                if forma in formas_pagamento:
-                    formas_pagamento[forma] += row['total_forma']
-                else:
-                    formas_pagamento[forma] = row['total_forma']
-            
-            formas_pagamento["Dinheiro"] += suprimento_inicial
-            formas_pagamento["Dinheiro"] += suprimentos_mov
-            formas_pagamento["Dinheiro"] -= sangrias_mov
-            
-            return {"success": True, "totals": formas_pagamento}
-        
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            caixa_id = cash_session.open_session(cur, self.user_id, self.terminal_id, valor_inicial, caixa_id)
+            conn.commit()
+            self.logger.info(f"ABERTURA DE CAIXA (User ID {self.user_id}, Caixa ID {caixa_id}). Valor inicial: R$ {valor_inicial:.2f}.")
+            return {"success": True, "caixa_id": caixa_id}
         except Exception as e:
-            return {"success": False, "error": f"Erro ao calcular totais do caixa: {e}"}
+            conn.rollback()
+            self.logger.error(f"FALHA na abertura de caixa (User ID {self.user_id}). Erro: {e}", exc_info=True)
+            return {"success": False, "error": f"Não foi possível abrir o caixa: {e}"}
         finally:
             conn.close()
 
@@ -445,90 +539,27 @@ class PosController:
         
         conn = get_connection()
         try:
-            cur = conn.cursor()
-            
-            cur.execute("SELECT id FROM categorias_financeiras WHERE nome = 'Receita de Vendas PDV' AND tipo = 'RECEITA'")
-            cat_venda = cur.fetchone()
-            
-            if not cat_venda:
-                cur.execute("SELECT id FROM categorias_financeiras WHERE tipo = 'RECEITA' LIMIT 1")
-                cat_venda = cur.fetchone()
-            
-            categoria_venda_id = cat_venda['id'] if cat_venda else None
-            
             conn.execute("BEGIN")
+            cur = conn.cursor()
             
-            cur.execute("""
-                UPDATE caixa_sessoes 
-                SET 
-                    status = 'FECHADO', 
-                    data_fechamento = CURRENT_TIMESTAMP,
-                    valor_final_calculado = ?,
-                    valor_final_informado = ?,
-                    diferenca = ?,
-                    autorizador_id = ?
-                WHERE id = ?
-            """, (
-                data["calculado"],
-                data["informado"],
-                data["diferenca"],
-                autorizador_id,
-                self.current_caixa_id
-            ))
-            
-            descricao_titulo = f"Fechamento Caixa #{self.current_caixa_id} - Terminal: {self.nome_terminal}"
-            valor_total_fechamento = data["calculado"] 
-            
-            cur.execute("""
-                INSERT INTO titulos_financeiros 
-                (empresa_id, tipo, categoria_id, data_emissao, descricao, valor_total, status)
-                VALUES (?, 'RECEBER', ?, CURRENT_TIMESTAMP, ?, ?, 'PAGO')
-            """, (self.empresa_id, categoria_venda_id, descricao_titulo, valor_total_fechamento))
-            
-            titulo_id = cur.lastrowid
-            
-            for forma_pagamento, valor in expected_totals_map.items():
-                if valor == 0:
-                    continue 
-
-                destino_conta_id = None
-                if forma_pagamento == "Dinheiro":
-                    destino_conta_id = self.conta_dest_dinheiro_id
-                elif forma_pagamento == "Cartão":
-                    destino_conta_id = self.conta_dest_cartao_id
-                elif forma_pagamento == "Pix":
-                    destino_conta_id = self.conta_dest_pix_id
-                else: 
-                    destino_conta_id = self.conta_dest_outros_id
-
-                desc_lancamento = f"Recebimento {forma_pagamento} - Fechamento Caixa #{self.current_caixa_id}"
-                
-                cur.execute("""
-                    INSERT INTO lancamentos_financeiros
-                    (titulo_id, tipo, categoria_id, descricao, valor_previsto, data_vencimento, status, data_pagamento, valor_pago)
-                    VALUES (?, 'RECEBER', ?, ?, ?, DATE('now'), 'PAGO', DATE('now'), ?)
-                """, (titulo_id, categoria_venda_id, desc_lancamento, valor, valor))
-                
-                lancamento_id = cur.lastrowid
-                
-                cur.execute("""
-                    INSERT INTO movimentacoes_contas
-                    (conta_id, lancamento_id, caixa_sessao_id, tipo_movimento, valor, descricao, conciliado)
-                    VALUES (?, ?, ?, 'SAIDA', ?, ?, 1)
-                """, (self.conta_pdv_id, lancamento_id, self.current_caixa_id, valor, desc_lancamento))
-
-                cur.execute("""
-                    INSERT INTO movimentacoes_contas
-                    (conta_id, lancamento_id, caixa_sessao_id, tipo_movimento, valor, descricao, conciliado)
-                    VALUES (?, ?, ?, 'ENTRADA', ?, ?, 1)
-                """, (destino_conta_id, lancamento_id, self.current_caixa_id, valor, desc_lancamento))
-
-                cur.execute("UPDATE contas_financeiras SET saldo_atual = saldo_atual - ? WHERE id = ?", (valor, self.conta_pdv_id))
-                cur.execute("UPDATE contas_financeiras SET saldo_atual = saldo_atual + ? WHERE id = ?", (valor, destino_conta_id))
+            if self.replica:
+                # O financeiro do fechamento é lançado pelo servidor da loja
+                data_fechamento = store_replica.timestamp()
+                cash_session.mark_closed(cur, self.current_caixa_id, data, autorizador_id, data_fechamento)
+                store_replica.enqueue_event(cur, store_server.FECHAMENTO_CAIXA, {
+                    "caixa_id": self.current_caixa_id, "terminal_id": self.terminal_id,
+                    "conferencia": data, "autorizador_id": autorizador_id,
+                    "data_fechamento": data_fechamento, "totais": expected_totals_map,
+                })
+            else:
+                cash_session.close_session(cur, self.current_caixa_id, self.terminal_data, data,
+                                           autorizador_id, expected_totals_map)
 
             conn.commit()
+            if self.replica:
+                self.replica.notify()
             
-            self.logger.info(f"FECHAMENTO DE CAIXA (User ID {self.user_id}, Caixa ID {self.current_caixa_id}). Valor: R$ {valor_total_fechamento:.2f}.")
+            self.logger.info(f"FECHAMENTO DE CAIXA (User ID {self.user_id}, Caixa ID {self.current_caixa_id}). Valor: R$ {data['calculado']:.2f}.")
             
             return {"success": True}
         
@@ -543,20 +574,19 @@ class PosController:
         conn = get_connection()
         try:
             cur = conn.cursor()
-            cur.execute("""
-                INSERT INTO caixa_movimentacoes 
-                (caixa_id, user_id, terminal_id, tipo, valor, motivo, autorizador_id)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                self.current_caixa_id,
-                self.user_id,
-                self.terminal_id,
-                tipo,
-                valor,
-                motivo,
-                autorizador_id if autorizador_id else self.user_id
-            ))
+            autorizador_id = autorizador_id if autorizador_id else self.user_id
+            data_movimento = store_replica.timestamp() if self.replica else None
+            cash_session.record_movement(cur, self.current_caixa_id, self.user_id, self.terminal_id,
+                                         tipo, valor, motivo, autorizador_id, data_movimento)
+            if self.replica:
+                store_replica.enqueue_event(cur, store_server.MOV_CAIXA, {
+                    "caixa_id": self.current_caixa_id, "user_id": self.user_id, "terminal_id": self.terminal_id,
+                    "tipo": tipo, "valor": valor, "motivo": motivo, "autorizador_id": autorizador_id,
+                    "data": data_movimento,
+                })
             conn.commit()
+            if self.replica:
+                self.replica.notify()
             
             self.logger.info(f"MOV. CAIXA (User ID {self.user_id}, Caixa ID {self.current_caixa_id}). Tipo: {tipo}, Valor: R$ {valor:.2f}.")
             
@@ -576,6 +606,7 @@ class PosController:
         2. Devolve produtos ao estoque.
         3. Registra log e auditoria.
         """
+        self.flush_pending_sales()
         if not self.current_caixa_id:
              return {"success": False, "error": "Caixa não está aberto."}
 
@@ -593,19 +624,16 @@ class PosController:
             if venda['status'] == 'CANCELADA':
                  return {"success": False, "error": "Venda já está cancelada."}
 
-            cur.execute("UPDATE vendas SET status = 'CANCELADA' WHERE id = ?", (venda_id,))
-            
-            cur.execute("SELECT produto_id, quantidade FROM vendas_itens WHERE venda_id = ?", (venda_id,))
-            itens = cur.fetchall()
-            
-            for item in itens:
-                cur.execute("""
-                    UPDATE estoque 
-                    SET quantidade = quantidade + ?, updated_at = CURRENT_TIMESTAMP
-                    WHERE id_produto = ? AND id_deposito = ?
-                """, (item['quantidade'], item['produto_id'], self.deposito_id_padrao))
+            sale_persistence.cancel_sale(cur, venda, self.user_id, motivo, self.deposito_id_padrao)
+            if self.replica:
+                store_replica.enqueue_event(cur, store_server.CANCELAMENTO, {
+                    "journal_id": venda['journal_id'], "user_id": self.user_id, "motivo": motivo,
+                    "deposito_id": self.deposito_id_padrao, "terminal_id": self.terminal_id,
+                })
                 
             conn.commit()
+            if self.replica:
+                self.replica.notify()
             
             self.logger.info(f"VENDA CANCELADA (User ID {self.user_id}). Venda ID: {venda_id}. Motivo: {motivo}")
             
@@ -13,6 +13,7 @@ from PyQt5.QtWidgets import (
 from PyQt5.QtCore import Qt, QLocale
 from PyQt5.QtGui import QDoubleValidator, QPixmap # <-- Import QPixmap adicionado
 from database.db import get_connection
+from .product_search import search_products
 import datetime
 
 class PricingManagerForm(QWidget):
@@ -174,6 +175,15 @@ class PricingManagerForm(QWidget):
         header_layout.addWidget(self.btn_export_csv)
         layout.addLayout(header_layout)
         
+        # Filtro do Grid (índice textual de produtos)
+        filter_layout = QHBoxLayout()
+        self.pricing_filter_input = QLineEdit()
+        self.pricing_filter_input.setPlaceholderText("Filtrar por Nome, Marca, EAN ou Código (Enter)...")
+        self.btn_filtrar_grid = QPushButton("Filtrar")
+        filter_layout.addWidget(self.pricing_filter_input, 1)
+        filter_layout.addWidget(self.btn_filtrar_grid)
+        layout.addLayout(filter_layout)
+        
         # Grid de Precificação
         self.pricing_grid = QTableWidget()
         self.pricing_grid.setColumnCount(6)
@@ -201,6 +211,8 @@ class PricingManagerForm(QWidget):
         
         # Precificação
         self.pricing_tabela_combo.currentIndexChanged.connect(self._load_pricing_grid)
+        self.pricing_filter_input.returnPressed.connect(self._load_pricing_grid)
+        self.btn_filtrar_grid.clicked.connect(self._load_pricing_grid)
         self.btn_salvar_grid.clicked.connect(self._save_pricing_grid)
         self.pricing_grid.cellChanged.connect(self._on_price_or_cost_changed)
         
@@ -433,7 +445,6 @@ class PricingManagerForm(QWidget):
     # --- LÓGICA DE PRECIFICAÇÃO (GRID) ---
     
     def _load_pricing_grid(self):
-        # (Inalterado)
         self.pricing_grid.setRowCount(0)
         self.product_data_cache.clear()
         self.btn_salvar_grid.setEnabled(False)
@@ -443,10 +454,14 @@ class PricingManagerForm(QWidget):
 
         conn = get_connection()
         try:
-            # 1. Busca todos os produtos mestre (simples)
+            # 1. Busca os produtos mestre (simples), filtrados pelo índice textual se houver filtro
             cur = conn.cursor()
-            cur.execute("SELECT id, nome, codigo_interno FROM produtos WHERE active = 1 ORDER BY nome")
-            products = cur.fetchall()
+            filtro = self.pricing_filter_input.text().strip()
+            if filtro:
+                products = search_products(filtro, limit=1000)
+            else:
+                cur.execute("SELECT id, nome, codigo_interno FROM produtos WHERE active = 1 ORDER BY nome")
+                products = cur.fetchall()
             
             # 2. Busca os preços existentes para esta tabela
             cur.execute("""
@@ -454,15 +469,15 @@ class PricingManagerForm(QWidget):
                 FROM produto_tabela_preco 
                 WHERE id_tabela = ?
             """, (tabela_id,))
-            pricing = {p['id_produto']: p for p in cur.fetchall()}
+            pricing = {p['id_produto']: dict(p) for p in cur.fetchall()}
             
             for prod in products:
                 prod_id = prod['id']
                 pricing_data = pricing.get(prod_id, {})
                 
-                venda = pricing_data.get('preco_vendadecimal', 0.0)
-                custo = pricing_data.get('preco_custodecimal', 0.0)
-                margem = pricing_data.get('margemdecimal', 0.0)
+                venda = pricing_data.get('preco_vendadecimal') or 0.0
+                custo = pricing_data.get('preco_custodecimal') or 0.0
+                margem = pricing_data.get('margemdecimal') or 0.0
                 
                 self.product_data_cache[prod_id] = {'id': prod_id, 'venda': venda, 'custo': custo, 'margem': margem}
                 
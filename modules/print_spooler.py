@@ -0,0 +1,367 @@
+# modules/print_spooler.py
+"""
+Spooler de impressão do PDV.
+
+Os documentos (cupom, cancelamento, Relatório Z) entram na tabela
+'fila_impressao' com os dados necessários para gerá-los e são
+renderizados e enviados à impressora por uma thread própria, de modo que
+a finalização da venda devolve o controle ao operador imediatamente.
+Trabalhos pendentes de uma execução anterior (queda do PDV) são
+retomados na criação do spooler.
+
+A saída é feita por um backend intercambiável:
+- Win32PdfBackend: PDF pelo verbo 'printto' do Windows (comportamento
+  original);
+- Win32RawBackend: bytes crus (ESC/POS) pelo spooler do Windows;
+- TcpBackend / DeviceFileBackend: ESC/POS direto pela rede (porta 9100)
+  ou pela porta serial/USB/Bluetooth do sistema;
+- FileBackend: grava cada trabalho em um diretório (testes/diagnóstico).
+"""
+import os
+import json
+import time
+import queue
+import socket
+import logging
+import tempfile
+import threading
+from database.db import get_connection
+
+logger = logging.getLogger(__name__)
+
+MAX_TENTATIVAS = 3
+ESPERA_TENTATIVA = 2.0      # segundos (multiplicado pela tentativa)
+DIAS_HISTORICO = 7          # trabalhos impressos mantidos na fila
+
+STATUS_PENDENTE = 'PENDENTE'
+STATUS_IMPRESSO = 'IMPRESSO'
+STATUS_ERRO = 'ERRO'
+
+
+class PrintError(Exception):
+    """Falha ao renderizar ou enviar um trabalho de impressão."""
+
+
+# -------------------------------------------------------------------
+# --- BACKENDS ---
+# -------------------------------------------------------------------
+
+class PrintBackend:
+    """
+    Destino dos trabalhos. 'formato' indica o que send() espera receber
+    ('pdf' ou 'escpos'); send() levanta exceção em caso de falha.
+    """
+    formato = "pdf"
+
+    def send(self, job_id, dados):
+        raise NotImplementedError
+
+    def idle(self):
+        """Chamado pela thread do spooler quando a fila está vazia."""
+
+    def descricao(self):
+        return self.__class__.__name__
+
+
+class Win32PdfBackend(PrintBackend):
+    """
+    Envia o PDF com ShellExecute 'printto'. O aplicativo de PDF lê o
+    arquivo depois que o ShellExecute retorna, então o temporário só é
+    removido após ATRASO_REMOCAO segundos (em idle()).
+    """
+    formato = "pdf"
+    ATRASO_REMOCAO = 30.0
+
+    def __init__(self, printer_name):
+        self.printer_name = printer_name
+        self._temporarios = []  # [(caminho, instante)]
+
+    def send(self, job_id, dados):
+        import win32api
+        fd, pdf_path = tempfile.mkstemp(suffix=".pdf", prefix=f"bluesys_{job_id}_")
+        with os.fdopen(fd, "wb") as f:
+            f.write(dados)
+        self._temporarios.append((pdf_path, time.monotonic()))
+        win32api.ShellExecute(0, "printto", f'"{pdf_path}"', f'"{self.printer_name}"', ".", 0)
+
+    def idle(self):
+        agora = time.monotonic()
+        restantes = []
+        for caminho, instante in self._temporarios:
+            if agora - instante < self.ATRASO_REMOCAO:
+                restantes.append((caminho, instante))
+                continue
+            try:
+                os.remove(caminho)
+            except OSError:
+                pass
+        self._temporarios = restantes
+
+    def descricao(self):
+        return f"Windows (PDF) '{self.printer_name}'"
+
+
+class Win32RawBackend(PrintBackend):
+    """Envia bytes crus (ESC/POS) à impressora instalada no Windows."""
+    formato = "escpos"
+
+    def __init__(self, printer_name):
+        self.printer_name = printer_name
+
+    def send(self, job_id, dados):
+        import win32print
+        handle = win32print.OpenPrinter(self.printer_name)
+        try:
+            win32print.StartDocPrinter(handle, 1, (f"BlueSys {job_id}", None, "RAW"))
+            try:
+                win32print.StartPagePrinter(handle)
+                win32print.WritePrinter(handle, dados)
+                win32print.EndPagePrinter(handle)
+            finally:
+                win32print.EndDocPrinter(handle)
+        finally:
+            win32print.ClosePrinter(handle)
+
+    def descricao(self):
+        return f"Windows (RAW) '{self.printer_name}'"
+
+
+class TcpBackend(PrintBackend):
+    """ESC/POS direto para impressora de rede (RAW, porta 9100)."""
+    formato = "escpos"
+    TIMEOUT = 5.0
+
+    def __init__(self, host, porta=9100):
+        self.host = host
+        self.porta = porta
+
+    def send(self, job_id, dados):
+        with socket.create_connection((self.host, self.porta), timeout=self.TIMEOUT) as sock:
+            sock.sendall(dados)
+
+    def descricao(self):
+        return f"ESC/POS {self.host}:{self.porta}"
+
+
+class DeviceFileBackend(PrintBackend):
+    """
+    ESC/POS direto para a porta do sistema: serial ('COM3'), Bluetooth
+    pareado (porta COM virtual) ou dispositivo USB ('/dev/usb/lp0').
+    """
+    formato = "escpos"
+
+    def __init__(self, caminho):
+        if os.name == "nt" and caminho.upper().startswith("COM"):
+            caminho = "\\\\.\\" + caminho  # COM10+ exige o prefixo de dispositivo
+        self.caminho = caminho
+
+    def send(self, job_id, dados):
+        with open(self.caminho, "wb", buffering=0) as porta:
+            porta.write(dados)
+
+    def descricao(self):
+        return f"ESC/POS '{self.caminho}'"
+
+
+class FileBackend(PrintBackend):
+    """Grava cada trabalho como arquivo em 'diretorio'."""
+
+    def __init__(self, diretorio, formato="pdf"):
+        self.diretorio = diretorio
+        self.formato = formato
+
+    def send(self, job_id, dados):
+        os.makedirs(self.diretorio, exist_ok=True)
+        extensao = "pdf" if self.formato == "pdf" else "bin"
+        with open(os.path.join(self.diretorio, f"trabalho_{job_id:06d}.{extensao}"), "wb") as f:
+            f.write(dados)
+
+    def descricao(self):
+        return f"Arquivo '{self.diretorio}'"
+
+
+# -------------------------------------------------------------------
+# --- SPOOLER ---
+# -------------------------------------------------------------------
+
+class PrintSpooler:
+    """
+    Fila de impressão de um terminal (uma instância por PDV). Com
+    retomar=True, reenfileira os trabalhos pendentes do terminal.
+
+    'renderizadores' mapeia (formato, tipo) -> função(dados) que devolve
+    os bytes do documento. Ouvintes registrados em add_listener() são
+    chamados na thread do spooler como ouvinte(job_id, status, mensagem).
+    """
+
+    def __init__(self, terminal_id, backend, renderizadores, retomar=True):
+        self.terminal_id = terminal_id
+        self.backend = backend
+        self.renderizadores = renderizadores
+        self._ouvintes = []
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pendentes = 0
+
+        if retomar:
+            for job_id in self._load_pending():
+                self._enfileirar(job_id)
+
+        self._thread = threading.Thread(target=self._worker_loop, name="PrintSpooler", daemon=True)
+        self._thread.start()
+
+    # --- API ---
+
+    def add_listener(self, ouvinte):
+        self._ouvintes.append(ouvinte)
+
+    def submit(self, tipo, dados):
+        """Registra o trabalho na fila persistente e retorna o job_id."""
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                "INSERT INTO fila_impressao (terminal_id, tipo, dados) VALUES (?, ?, ?)",
+                (self.terminal_id, tipo, json.dumps(dados, default=str))
+            )
+            conn.commit()
+            job_id = cur.lastrowid
+        finally:
+            conn.close()
+        self._enfileirar(job_id)
+        return job_id
+
+    def reprint(self, job_id):
+        """Recoloca na fila um trabalho já impresso ou com erro."""
+        self._update(job_id, STATUS_PENDENTE, tentativas=0)
+        self._enfileirar(job_id)
+
+    def flush(self, timeout=30.0):
+        """Aguarda até a fila esvaziar (impressos ou com erro)."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pendentes == 0, timeout)
+
+    def close(self):
+        """Encerra a thread depois dos trabalhos já enfileirados."""
+        self._queue.put(None)
+
+    @property
+    def pendentes(self):
+        return self._pendentes
+
+    # --- PERSISTÊNCIA ---
+
+    def _load_pending(self):
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                "DELETE FROM fila_impressao WHERE terminal_id = ? AND status = ? AND criado_em < datetime('now', ?)",
+                (self.terminal_id, STATUS_IMPRESSO, f"-{DIAS_HISTORICO} days")
+            )
+            conn.commit()
+            cur.execute(
+                "SELECT id FROM fila_impressao WHERE terminal_id = ? AND status = ? ORDER BY id",
+                (self.terminal_id, STATUS_PENDENTE)
+            )
+            ids = [row['id'] for row in cur.fetchall()]
+            if ids:
+                logger.warning(f"Spooler: {len(ids)} trabalho(s) de impressão pendente(s) retomado(s).")
+            return ids
+        except Exception as e:
+            logger.error(f"Spooler: erro ao carregar trabalhos pendentes: {e}", exc_info=True)
+            return []
+        finally:
+            conn.close()
+
+    def _update(self, job_id, status, tentativas=None, erro=None):
+        conn = get_connection()
+        try:
+            conn.execute("""
+                UPDATE fila_impressao
+                SET status = ?, tentativas = COALESCE(?, tentativas), erro = ?, atualizado_em = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (status, tentativas, erro, job_id))
+            conn.commit()
+        finally:
+            conn.close()
+
+    # --- THREAD DE IMPRESSÃO ---
+
+    def _enfileirar(self, job_id):
+        with self._lock:
+            self._pendentes += 1
+        self._queue.put(job_id)
+
+    def _notificar(self, job_id, status, mensagem=None):
+        for ouvinte in self._ouvintes:
+            try:
+                ouvinte(job_id, status, mensagem)
+            except Exception as e:
+                logger.error(f"Spooler: erro no ouvinte de status: {e}", exc_info=True)
+
+    def _worker_loop(self):
+        while True:
+            try:
+                job_id = self._queue.get(timeout=5.0)
+            except queue.Empty:
+                self.backend.idle()
+                continue
+            if job_id is None:
+                return
+            try:
+                self._process(job_id)
+            except Exception as e:
+                logger.error(f"Spooler: falha inesperada no trabalho {job_id}: {e}", exc_info=True)
+            with self._idle:
+                self._pendentes -= 1
+                if self._pendentes == 0:
+                    self._idle.notify_all()
+            if self._queue.empty():
+                self.backend.idle()
+
+    def _render(self, job_id):
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT tipo, dados, tentativas FROM fila_impressao WHERE id = ?", (job_id,))
+            job = cur.fetchone()
+        finally:
+            conn.close()
+        if job is None:
+            raise PrintError(f"Trabalho {job_id} não encontrado na fila.")
+        renderizar = self.renderizadores.get((self.backend.formato, job['tipo']))
+        if renderizar is None:
+            raise PrintError(f"Documento '{job['tipo']}' não suportado em {self.backend.descricao()}.")
+        return renderizar(json.loads(job['dados'])), job['tentativas']
+
+    def _process(self, job_id):
+        try:
+            dados, tentativas = self._render(job_id)
+        except Exception as e:
+            # Erro de renderização não se resolve com nova tentativa
+            logger.error(f"Spooler: erro ao gerar o trabalho {job_id}: {e}", exc_info=True)
+            self._update(job_id, STATUS_ERRO, erro=str(e))
+            self._notificar(job_id, STATUS_ERRO, f"Não foi possível gerar o documento.\n\nErro: {e}")
+            return
+
+        while True:
+            try:
+                self.backend.send(job_id, dados)
+            except Exception as e:
+                tentativas += 1
+                if tentativas < MAX_TENTATIVAS:
+                    logger.warning(f"Spooler: trabalho {job_id}, tentativa {tentativas} falhou ({e}).")
+                    self._update(job_id, STATUS_PENDENTE, tentativas=tentativas, erro=str(e))
+                    time.sleep(ESPERA_TENTATIVA * tentativas)
+                    continue
+                logger.error(f"Spooler: trabalho {job_id} não impresso após {tentativas} tentativas: {e}")
+                self._update(job_id, STATUS_ERRO, tentativas=tentativas, erro=str(e))
+                self._notificar(job_id, STATUS_ERRO,
+                    f"Não foi possível imprimir em {self.backend.descricao()}.\n"
+                    f"Verifique se a impressora está online.\n\nErro Técnico: {e}")
+                return
+            self._update(job_id, STATUS_IMPRESSO, tentativas=tentativas + 1)
+            self._notificar(job_id, STATUS_IMPRESSO)
+            return
@@ -1,17 +1,20 @@
 # modules/printing_service.py
 import os
-import tempfile
 import sqlite3
-import win32print
 import win32api
-import shutil
 import io
 import qrcode
 import re 
+import logging
 from datetime import datetime
 from PyQt5.QtWidgets import QMessageBox, QFileDialog
+from PyQt5.QtCore import QObject, pyqtSignal
 
 from database.db import get_connection
+from . import escpos
+from .print_spooler import (
+    PrintSpooler, Win32PdfBackend, Win32RawBackend, TcpBackend, DeviceFileBackend, STATUS_ERRO
+)
 
 # --- Importações do ReportLab ---
 from reportlab.pdfgen import canvas
@@ -27,11 +30,22 @@ WIDTH = 80 * mm
 MARGIN_LEFT = 3 * mm
 MARGIN_RIGHT = WIDTH - (3 * mm)
 
+logger = logging.getLogger(__name__)
+
 # -------------------------------------------------------------------
 # --- FUNÇÕES DE IMPRESSÃO (COMPARTILHADAS) ---
 # -------------------------------------------------------------------
 
-def _save_virtual_pdf(pdf_path, suggested_name):
+# terminais_pdv.impressora_modo_impressao
+MODO_PDF = 1      # PDF pelo driver do Windows
+MODO_ESCPOS = 2   # ESC/POS direto na impressora térmica
+
+# terminais_pdv.impressora_tipo_conexao
+CONEXAO_USB, CONEXAO_SERIAL, CONEXAO_IP, CONEXAO_BLUETOOTH = 1, 2, 3, 4
+
+IMPRESSORAS_VIRTUAIS = ["microsoft print to pdf", "xps", "onenote", "document writer"]
+
+def _save_virtual_pdf(pdf_bytes, suggested_name):
     """
     Abre um QFileDialog para salvar o PDF virtualmente.
     """
@@ -44,7 +58,8 @@ def _save_virtual_pdf(pdf_path, suggested_name):
         )
         
         if save_path:
-            shutil.copy(pdf_path, save_path)
+            with open(save_path, "wb") as f:
+                f.write(pdf_bytes)
             try:
                 win32api.ShellExecute(0, "open", f'"{save_path}"', None, ".", 1)
             except Exception as e_open:
@@ -53,60 +68,33 @@ def _save_virtual_pdf(pdf_path, suggested_name):
     except Exception as e:
         QMessageBox.warning(None, "Erro ao Salvar PDF", 
             f"Não foi possível salvar o cupom virtual.\n\nErro: {e}")
-    finally:
-        if os.path.exists(pdf_path):
-            os.remove(pdf_path)
 
-def _print_physical(pdf_path, printer_name):
-    """
-    Envia o PDF diretamente para uma impressora física ou para a
-    'Microsoft Print to PDF' (usando o verbo 'printto').
-    """
-    if not printer_name:
-        try:
-            printer_name = win32print.GetDefaultPrinter()
-        except Exception:
-            QMessageBox.warning(None, "Erro ao Imprimir", 
-                "Nenhuma impressora configurada no terminal e falha ao obter a impressora padrão do Windows.")
-            if os.path.exists(pdf_path):
-                os.remove(pdf_path)
-            return
+def _is_virtual_printer(printer_name):
+    """Impressora não definida ou virtual (PDF/XPS): o documento é salvo, não impresso."""
+    return not printer_name or any(v in printer_name.lower() for v in IMPRESSORAS_VIRTUAIS)
 
-    try:
-        win32api.ShellExecute(
-            0,
-            "printto", 
-            f'"{pdf_path}"',
-            f'"{printer_name}"',
-            ".",
-            0
-        )
-    except Exception as e:
-        QMessageBox.warning(None, "Erro ao Imprimir", 
-            f"Não foi possível imprimir o cupom na impressora '{printer_name}'.\n"
-            f"Verifique se a impressora está online.\n\n"
-            f"Erro Técnico: {e}")
-    finally:
-        if os.path.exists(pdf_path):
-            try:
-                import time
-                time.sleep(2) 
-                os.remove(pdf_path)
-            except:
-                pass
-
-def _get_printer_name(conn, terminal_id):
-    """Busca o nome da impressora no terminal e o sanitiza."""
+def _get_printer_config(conn, terminal_id):
+    """Busca a configuração de impressora do terminal (nome sanitizado)."""
     cur = conn.cursor()
-    cur.execute("SELECT impressora_nome FROM terminais_pdv WHERE id = ?", (terminal_id,))
+    cur.execute("""
+        SELECT impressora_nome, impressora_tipo_conexao, impressora_endereco_conexao,
+               impressora_largura_papel, impressora_modo_impressao
+        FROM terminais_pdv WHERE id = ?
+    """, (terminal_id,))
     terminal = cur.fetchone()
+    if not terminal:
+        return {"nome": None, "modo": MODO_PDF, "conexao": CONEXAO_USB, "endereco": "", "largura": 80}
     
-    if terminal and terminal['impressora_nome']:
-        raw_name = terminal['impressora_nome']
-        clean_name = re.sub(r'[\x00-\x1F\x7F-\x9F]', '', raw_name).strip()
-        return clean_name
-        
-    return None
+    nome = None
+    if terminal['impressora_nome']:
+        nome = re.sub(r'[\x00-\x1F\x7F-\x9F]', '', terminal['impressora_nome']).strip() or None
+    return {
+        "nome": nome,
+        "modo": terminal['impressora_modo_impressao'] or MODO_PDF,
+        "conexao": terminal['impressora_tipo_conexao'] or CONEXAO_USB,
+        "endereco": (terminal['impressora_endereco_conexao'] or "").strip(),
+        "largura": terminal['impressora_largura_papel'] or 80,
+    }
 
 # -------------------------------------------------------------------
 # --- CLASSE PRINCIPAL ---
@@ -116,7 +104,7 @@ class ReceiptPrinter:
     def __init__(self, sale_data):
         self.sale_data = sale_data
         self.full_data = {}
-        self.pdf_path = ""
+        self.pdf_buffer = None
         self.c = None
         
         # --- CÁLCULO DINÂMICO DA ALTURA (Para Vendas Normais) ---
@@ -176,24 +164,23 @@ class ReceiptPrinter:
         self._draw_line("-" * 50, "Courier", 8, TA_CENTER)
         self.y_pos -= (1 * mm)
 
-    def _create_temp_pdf(self, custom_height=None):
-        """Cria o canvas e o caminho temporário do PDF."""
-        fd, self.pdf_path = tempfile.mkstemp(suffix=".pdf")
-        os.close(fd)
+    def _create_pdf(self, custom_height=None):
+        """Cria o canvas do PDF em memória."""
+        self.pdf_buffer = io.BytesIO()
         # Se uma altura específica for passada (cancelamento), usa ela.
         height_to_use = custom_height if custom_height else self.page_height
-        self.c = canvas.Canvas(self.pdf_path, pagesize=(WIDTH, height_to_use))
+        self.c = canvas.Canvas(self.pdf_buffer, pagesize=(WIDTH, height_to_use))
         self.y_pos = height_to_use - (5 * mm) # Reinicia posição Y
 
     def _save_and_close_pdf(self):
-        """Salva o PDF e retorna o caminho."""
+        """Finaliza o PDF e retorna o conteúdo (bytes)."""
         self.c.showPage()
         self.c.save()
-        return self.pdf_path
+        return self.pdf_buffer.getvalue()
 
     # --- Cupom Simples / Não-Fiscal ---
     def _generate_non_fiscal_receipt(self):
-        self._create_temp_pdf()
+        self._create_pdf()
         emp = self.full_data["empresa"]
         venda = self.full_data["venda"]
         
@@ -281,7 +268,7 @@ class ReceiptPrinter:
     # --- Cupom Fiscal ---
     def _generate_fiscal_receipt(self):
         """Cria o PDF para um cupom FISCAL (NFC-e)."""
-        self._create_temp_pdf()
+        self._create_pdf()
         emp = self.full_data["empresa"]
         venda = self.full_data["venda"]
         
@@ -382,17 +369,14 @@ class ReceiptPrinter:
             qr.make(fit=True)
             img = qr.make_image(fill_color="black", back_color="white")
             
-            fd_qr, qr_path = tempfile.mkstemp(suffix=".png")
-            os.close(fd_qr)
-            img.save(qr_path)
+            qr_png = io.BytesIO()
+            img.save(qr_png)
+            qr_png.seek(0)
 
             qr_size = 30 * mm 
             qr_x = (WIDTH - qr_size) / 2 
             self.y_pos -= qr_size 
-            self.c.drawImage(ImageReader(qr_path), qr_x, self.y_pos, width=qr_size, height=qr_size)
-            
-            if os.path.exists(qr_path):
-                os.remove(qr_path)
+            self.c.drawImage(ImageReader(qr_png), qr_x, self.y_pos, width=qr_size, height=qr_size)
             
         except Exception as e_qr:
             self._draw_line(f"[Erro ao gerar QR Code: {e_qr}]", "Helvetica", 7, TA_CENTER)
@@ -429,7 +413,7 @@ class ReceiptPrinter:
         cancellation_height = 130 * mm
         
         # Cria o PDF com a altura específica
-        self._create_temp_pdf(custom_height=cancellation_height)
+        self._create_pdf(custom_height=cancellation_height)
         
         emp = self.full_data["empresa"]
         venda = self.full_data["venda"]
@@ -469,35 +453,291 @@ class ReceiptPrinter:
         
         return self._save_and_close_pdf()
 
+# -------------------------------------------------------------------
+# --- RENDERIZAÇÃO (executada pela thread do spooler) ---
+# -------------------------------------------------------------------
+
+def render_receipt_pdf(sale_data_dict):
+    """Gera o PDF do cupom de venda (fiscal ou não-fiscal)."""
+    conn = get_connection()
+    try:
+        printer = ReceiptPrinter(sale_data_dict)
+        printer._load_full_data(conn)
+    finally:
+        conn.close()
+    if sale_data_dict.get('tipo_documento', 'FISCAL') == 'NAO_FISCAL':
+        return printer._generate_non_fiscal_receipt()
+    return printer._generate_fiscal_receipt()
+
+def render_cancellation_pdf(dados):
+    """Gera o PDF do comprovante de cancelamento ({'venda': ..., 'motivo': ...})."""
+    conn = get_connection()
+    try:
+        printer = ReceiptPrinter(dados['venda'])
+        printer._load_full_data(conn)
+    finally:
+        conn.close()
+    return printer._generate_cancellation_receipt(dados['motivo'])
+
+def render_z_report_pdf(dados):
+    """Gera o PDF do Relatório Z a partir do texto sintético ({'report_text': ...})."""
+    report_text = dados['report_text']
+    pdf_buffer = io.BytesIO()
+    
+    # Altura dinâmica para o Relatório Z também
+    num_lines = report_text.count('\n') + 10
+    dynamic_height = num_lines * (5 * mm)
+    
+    doc = SimpleDocTemplate(pdf_buffer, pagesize=(WIDTH, dynamic_height),
+                            leftMargin=MARGIN_LEFT, rightMargin=MARGIN_LEFT,
+                            topMargin=5*mm, bottomMargin=5*mm)
+    
+    styles = getSampleStyleSheet()
+    style = ParagraphStyle('ReportStyle', parent=styles['Normal'], fontName='Courier', fontSize=8, leading=10)
+    formatted_text = report_text.replace(" ", "&nbsp;").replace("\n", "<br/>")
+    doc.build([Paragraph(formatted_text, style)])
+    return pdf_buffer.getvalue()
+
+# --- ESC/POS (impressora térmica, sem PDF) ---
+
+def _load_receipt_data(sale_data_dict):
+    conn = get_connection()
+    try:
+        printer = ReceiptPrinter(sale_data_dict)
+        printer._load_full_data(conn)
+        return printer.full_data
+    finally:
+        conn.close()
+
+def _escpos_itens_e_totais(doc, venda, fiscal):
+    doc.columns("# Cód Descrição" if fiscal else "# Descrição", "Vl.Total")
+    for i, item in enumerate(venda["cart_items"]):
+        if fiscal:
+            doc.text(f"{i+1:03} {item['codigo_barras']} {item['descricao']}")
+        else:
+            doc.text(f"{i+1:03} {item['descricao']}")
+        unidade = item.get('unidade', 'UN')
+        doc.columns(f"     {item['quantidade']:.2f} {unidade} X {item['preco_unitario']:.2f}",
+                    f"{item['total_item']:.2f}", bold=True)
+        if item['desconto_item'] > 0:
+            doc.text(f"Desconto item: -{item['desconto_item']:.2f}", escpos.DIREITA)
+    doc.divider()
+
+    doc.columns("QTD. TOTAL DE ITENS", f"{len(venda['cart_items']):02}")
+    doc.columns("VALOR TOTAL R$", f"{venda['subtotal']:.2f}")
+    total_descontos = venda['desconto_itens'] + venda['desconto_geral']
+    if total_descontos > 0:
+        doc.columns("Descontos R$", f"-{total_descontos:.2f}")
+    doc.columns("VALOR A PAGAR R$", f"{venda['total_final']:.2f}", bold=True)
+    doc.feed(1)
+
+    doc.columns("FORMA DE PAGAMENTO", "Valor Pago")
+    for pg in venda["pagamentos"]:
+        forma_texto = pg['forma']
+        if forma_texto == "Cartão" and pg.get('tipo_cartao'):
+            forma_texto = f"Cartão {pg['tipo_cartao'].lower()}"
+        doc.columns(forma_texto, f"{pg['valor']:.2f}")
+    if venda['troco'] > 0:
+        doc.columns("Troco R$", f"{venda['troco']:.2f}")
+    doc.divider()
+
+def render_receipt_escpos(sale_data_dict, colunas=48):
+    """Gera o cupom de venda em ESC/POS (mesmo conteúdo do PDF)."""
+    full_data = _load_receipt_data(sale_data_dict)
+    emp, venda = full_data["empresa"], full_data["venda"]
+    fiscal = sale_data_dict.get('tipo_documento', 'FISCAL') != 'NAO_FISCAL'
+    doc = escpos.EscPosDocument(colunas)
+
+    if fiscal:
+        doc.text(emp.get('razao_social', 'NOME DA EMPRESA'), escpos.CENTRO, bold=True)
+        doc.text(f"CNPJ: {emp.get('cnpj', 'N/A')} IE: {emp.get('ie', 'N/A')}", escpos.CENTRO)
+        doc.text(f"{emp.get('end_logradouro', 'RUA')}, {emp.get('end_numero', 'S/N')}, {emp.get('end_bairro', 'BAIRRO')}", escpos.CENTRO)
+        doc.text(f"{emp.get('end_municipio', 'CIDADE')}, {emp.get('end_uf', 'UF')}", escpos.CENTRO)
+        doc.divider()
+        doc.text("DOCUMENTO AUXILIAR DA NOTA FISCAL", escpos.CENTRO, bold=True)
+        doc.text("DE CONSUMIDOR ELETRÔNICA", escpos.CENTRO, bold=True)
+        if full_data["terminal"].get('ambiente', 2) == 2:
+            doc.text("EMITIDA EM AMBIENTE DE HOMOLOGAÇÃO", escpos.CENTRO)
+            doc.text("SEM VALOR FISCAL", escpos.CENTRO, bold=True)
+    else:
+        doc.text(emp.get('nome_fantasia', emp.get('razao_social', 'NOME DA EMPRESA')), escpos.CENTRO, bold=True)
+        doc.text(f"CNPJ: {emp.get('cnpj', 'N/A')}", escpos.CENTRO)
+        doc.divider()
+        doc.text("CUPOM NÃO-FISCAL", escpos.CENTRO, bold=True)
+        doc.text(f"Venda Nº: {venda['numero_venda_terminal']}", escpos.CENTRO, bold=True, double=True)
+        doc.text(datetime.now().strftime("%d/%m/%Y %H:%M:%S"), escpos.CENTRO)
+    doc.divider()
+
+    _escpos_itens_e_totais(doc, venda, fiscal)
+
+    cli = full_data["cliente"]
+    op = full_data["operador"].get('username', 'N/A')
+    if fiscal:
+        doc_cliente = cli.get('cpf', '') or cli.get('cnpj', '')
+        doc.text(f"CONSUMIDOR CPF/CNPJ: {doc_cliente}" if doc_cliente else "CONSUMIDOR NÃO IDENTIFICADO", escpos.CENTRO)
+
+        url_consulta = "nfce.sefaz.pe.gov.br/nfce/consulta"
+        chave_acesso = "2625 1138 5024 9000 0105 6505 3000 0001 7510 0280 2624"
+        doc.qrcode(f"http://{url_consulta}?p={chave_acesso.replace(' ', '')}|2|...etc")
+        doc.text("Consulte pela Chave de Acesso em", escpos.CENTRO)
+        doc.text(url_consulta, escpos.CENTRO, bold=True)
+        doc.text("(Chave de Acesso simulada)", escpos.CENTRO)
+        doc.text(chave_acesso, escpos.CENTRO)
+        doc.feed(1)
+        doc.columns(f"NFC-e n° {venda['numero_venda_terminal']} Série {full_data['terminal'].get('serie_fiscal', 1)}",
+                    datetime.now().strftime("%d/%m/%Y %H:%M:%S"))
+        doc.text("(Protocolo de Autorização simulado)")
+        doc.text("999999999999999")
+        doc.divider()
+        doc.text(f"Operador: {op}", escpos.CENTRO)
+        doc.text("BlueSys ERP - www.bluesys.com.br", escpos.CENTRO)
+    else:
+        doc.text(f"Cliente: {cli.get('nome_razao', 'CONSUMIDOR FINAL')}", escpos.CENTRO)
+        doc.text(f"Operador: {op}", escpos.CENTRO)
+        doc.text("BlueSys ERP - Cupom Não-Fiscal", escpos.CENTRO)
+
+    return doc.cut().getvalue()
+
+def render_cancellation_escpos(dados, colunas=48):
+    """Gera o comprovante de cancelamento em ESC/POS."""
+    full_data = _load_receipt_data(dados['venda'])
+    emp, venda = full_data["empresa"], full_data["venda"]
+    doc = escpos.EscPosDocument(colunas)
+
+    doc.text(emp.get('nome_fantasia', emp.get('razao_social', 'NOME DA EMPRESA')), escpos.CENTRO, bold=True)
+    doc.text(f"CNPJ: {emp.get('cnpj', 'N/A')}", escpos.CENTRO)
+    doc.divider()
+    doc.text("*** COMPROVANTE DE CANCELAMENTO ***", escpos.CENTRO, bold=True)
+    doc.feed(1)
+    doc.text(f"VENDA Nº: {venda['numero_venda_terminal']}", bold=True)
+    doc.text(f"DATA VENDA: {venda['data_venda']}")
+    doc.text(f"VALOR TOTAL: R$ {venda['total_final']:.2f}", bold=True)
+    doc.divider()
+    doc.text("MOTIVO DO CANCELAMENTO:", bold=True)
+    doc.text(dados['motivo'])
+    doc.divider()
+    doc.feed(3)
+    doc.text("_" * min(40, colunas), escpos.CENTRO)
+    doc.text("Assinatura do Operador/Supervisor", escpos.CENTRO)
+    doc.feed(1)
+    doc.text(f"Cancelado por: {full_data['operador'].get('username', 'N/A')}", escpos.CENTRO)
+    doc.text(datetime.now().strftime("%d/%m/%Y %H:%M:%S"), escpos.CENTRO)
+    return doc.cut().getvalue()
+
+def render_z_report_escpos(dados, colunas=48):
+    """Imprime o texto do Relatório Z linha a linha."""
+    doc = escpos.EscPosDocument(colunas)
+    for linha in dados['report_text'].split("\n"):
+        doc.text(linha.rstrip())
+    return doc.cut().getvalue()
+
+# (formato do backend, tipo do trabalho) -> renderizador
+RENDERIZADORES = {
+    ("pdf", "VENDA"): render_receipt_pdf,
+    ("pdf", "CANCELAMENTO"): render_cancellation_pdf,
+    ("pdf", "RELATORIO_Z"): render_z_report_pdf,
+}
+
+def _renderizadores(largura_papel):
+    """RENDERIZADORES + os de ESC/POS na largura de papel do terminal."""
+    colunas = escpos.colunas_para_largura(largura_papel)
+    return {
+        **RENDERIZADORES,
+        ("escpos", "VENDA"): lambda dados: render_receipt_escpos(dados, colunas),
+        ("escpos", "CANCELAMENTO"): lambda dados: render_cancellation_escpos(dados, colunas),
+        ("escpos", "RELATORIO_Z"): lambda dados: render_z_report_escpos(dados, colunas),
+    }
+
+# -------------------------------------------------------------------
+# --- SPOOLER (um por terminal) ---
+# -------------------------------------------------------------------
+
+class _AvisoImpressao(QObject):
+    """Leva os erros da thread do spooler para a thread da interface."""
+    erro = pyqtSignal(int, str)
+
+    def __init__(self):
+        super().__init__()
+        self.erro.connect(self._mostrar)
+
+    def _mostrar(self, job_id, mensagem):
+        QMessageBox.warning(None, "Erro ao Imprimir", mensagem)
+
+_spoolers = {}
+_aviso = None
+
+def _build_backend(config):
+    """Escolhe o backend pelo modo de impressão e tipo de conexão do terminal."""
+    if config['modo'] != MODO_ESCPOS:
+        return Win32PdfBackend(config['nome'])
+    
+    endereco = config['endereco']
+    if config['conexao'] == CONEXAO_IP:
+        host, _, porta = endereco.partition(":")
+        return TcpBackend(host, int(porta) if porta else 9100)
+    if config['conexao'] in (CONEXAO_SERIAL, CONEXAO_BLUETOOTH):
+        return DeviceFileBackend(endereco)
+    # USB: dispositivo do sistema (/dev/usb/lp0) ou fila RAW da impressora instalada no Windows
+    if endereco and os.path.sep in endereco:
+        return DeviceFileBackend(endereco)
+    return Win32RawBackend(config['nome'])
+
+def get_spooler(terminal_id, config):
+    """
+    Retorna o spooler do terminal, recriando-o se a configuração da
+    impressora mudou. Deve ser chamado na thread da interface (cria o
+    aviso de erros).
+    """
+    global _aviso
+    spooler = _spoolers.get(terminal_id)
+    if spooler is None or spooler.config != config:
+        if _aviso is None:
+            _aviso = _AvisoImpressao()
+        if spooler is not None:
+            # O spooler anterior termina os trabalhos que já recebeu
+            spooler.close()
+        novo = PrintSpooler(terminal_id, _build_backend(config), _renderizadores(config['largura']),
+                            retomar=spooler is None)
+        novo.config = config
+        novo.add_listener(
+            lambda job_id, status, mensagem: _aviso.erro.emit(job_id, mensagem) if status == STATUS_ERRO else None
+        )
+        _spoolers[terminal_id] = spooler = novo
+        logger.info(f"Spooler do terminal {terminal_id}: {spooler.backend.descricao()}")
+    return spooler
+
+# -------------------------------------------------------------------
+# --- FUNÇÕES PÚBLICAS ---
+# -------------------------------------------------------------------
+
+def _dispatch(conn, terminal_id, tipo, dados, render, suggested_name):
+    """
+    Impressora física ou ESC/POS: enfileira no spooler e retorna imediatamente.
+    Impressora virtual/não definida: gera agora e abre o 'Salvar Como'.
+    """
+    config = _get_printer_config(conn, terminal_id)
+    if config['modo'] != MODO_ESCPOS and _is_virtual_printer(config['nome']):
+        print(f"Impressora '{config['nome']}' é virtual ou não definida. Usando 'Salvar Como'...")
+        _save_virtual_pdf(render(dados), suggested_name)
+    else:
+        get_spooler(terminal_id, config).submit(tipo, dados)
+
 def generate_and_print_receipt(sale_data_dict):
     """
     Função pública que orquestra a criação e impressão do CUPOM DE VENDA.
     """
     conn = None
-    pdf_path = None
     try:
         conn = get_connection()
-        printer = ReceiptPrinter(sale_data_dict)
-        printer._load_full_data(conn)
-        
         tipo = sale_data_dict.get('tipo_documento', 'FISCAL')
         n_venda = sale_data_dict['numero_venda_terminal']
         
         if tipo == 'NAO_FISCAL':
-            pdf_path = printer._generate_non_fiscal_receipt()
             suggested_name = f"Cupom_NaoFiscal_{n_venda}.pdf"
         else: # FISCAL
-            pdf_path = printer._generate_fiscal_receipt()
             suggested_name = f"Cupom_Fiscal_{n_venda}.pdf"
 
-        if pdf_path:
-            printer_name = _get_printer_name(conn, sale_data_dict['terminal_id'])
-            if (not printer_name or any(v in printer_name.lower() for v in ["microsoft print to pdf", "xps", "onenote", "document writer"])):
-                print(f"Impressora '{printer_name}' é virtual ou não definida. Usando 'Salvar Como'...")
-                _save_virtual_pdf(pdf_path, suggested_name)
-            else:
-                print(f"Enviando para impressora física: {printer_name}")
-                _print_physical(pdf_path, printer_name)
+        _dispatch(conn, sale_data_dict['terminal_id'], "VENDA", sale_data_dict, render_receipt_pdf, suggested_name)
         
     except Exception as e:
         QMessageBox.critical(None, "Erro Fatal no Cupom", f"Ocorreu um erro geral: {e}")
@@ -510,21 +750,11 @@ def generate_and_print_cancellation_receipt(sale_data_dict, motivo):
     Gera e imprime o comprovante de cancelamento.
     """
     conn = None
-    pdf_path = None
     try:
         conn = get_connection()
-        printer = ReceiptPrinter(sale_data_dict)
-        printer._load_full_data(conn) 
-        
-        pdf_path = printer._generate_cancellation_receipt(motivo)
         suggested_name = f"Cancelamento_Venda_{sale_data_dict['numero_venda_terminal']}.pdf"
-        
-        if pdf_path:
-            printer_name = _get_printer_name(conn, sale_data_dict['terminal_id'])
-            if (not printer_name or any(v in printer_name.lower() for v in ["microsoft print to pdf", "xps", "onenote", "document writer"])):
-                _save_virtual_pdf(pdf_path, suggested_name)
-            else:
-                _print_physical(pdf_path, printer_name)
+        dados = {"venda": sale_data_dict, "motivo": motivo}
+        _dispatch(conn, sale_data_dict['terminal_id'], "CANCELAMENTO", dados, render_cancellation_pdf, suggested_name)
                 
     except Exception as e:
         QMessageBox.critical(None, "Erro Fatal no Cancelamento", f"Erro ao imprimir comprovante: {e}")
@@ -540,39 +770,13 @@ def generate_and_print_z_report(report_text, terminal_id):
     Função pública que gera e imprime o Relatório Z (Sintético).
     """
     conn = None
-    pdf_path = None
     try:
         conn = get_connection()
-        printer_name = _get_printer_name(conn, terminal_id)
-        
-        fd, pdf_path = tempfile.mkstemp(suffix=".pdf")
-        os.close(fd)
-        
-        # Altura dinâmica para o Relatório Z também
-        num_lines = report_text.count('\n') + 10
-        dynamic_height = num_lines * (5 * mm)
-        
-        doc = SimpleDocTemplate(pdf_path, pagesize=(WIDTH, dynamic_height),
-                                leftMargin=MARGIN_LEFT, rightMargin=MARGIN_LEFT,
-                                topMargin=5*mm, bottomMargin=5*mm)
-        
-        styles = getSampleStyleSheet()
-        style = ParagraphStyle('ReportStyle', parent=styles['Normal'], fontName='Courier', fontSize=8, leading=10)
-        formatted_text = report_text.replace(" ", "&nbsp;").replace("\n", "<br/>")
-        story = [Paragraph(formatted_text, style)]
-        doc.build(story)
-
-        if pdf_path:
-            suggested_name = f"Relatorio_Fechamento_{datetime.now():%Y%m%d}.pdf"
-            if (not printer_name or any(v in printer_name.lower() for v in ["microsoft print to pdf", "xps", "onenote", "document writer"])):
-                _save_virtual_pdf(pdf_path, suggested_name)
-            else:
-                _print_physical(pdf_path, printer_name)
+        suggested_name = f"Relatorio_Fechamento_{datetime.now():%Y%m%d}.pdf"
+        _dispatch(conn, terminal_id, "RELATORIO_Z", {"report_text": report_text}, render_z_report_pdf, suggested_name)
                 
     except Exception as e:
         QMessageBox.critical(None, "Erro Fatal no Relatório Z", f"Erro: {e}")
-        if pdf_path and os.path.exists(pdf_path):
-            os.remove(pdf_path)
             
     finally:
-        if conn: conn.close()
\ No newline at end of file
+        if conn: conn.close()
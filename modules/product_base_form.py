@@ -17,6 +17,9 @@ from PyQt5.QtWidgets import (
 from PyQt5.QtCore import Qt, QLocale, QStringListModel, QDate, QSize 
 from PyQt5.QtGui import QDoubleValidator, QPixmap 
 from database.db import get_connection
+from .product_search import build_search_query
+from .search_worker import BackgroundSearch
+from .sequence_service import process_sequence
 
 class ProductBaseForm(QWidget):
     """
@@ -26,6 +29,7 @@ class ProductBaseForm(QWidget):
         super().__init__()
         self.user_id = user_id
         self.current_product_id = None
+        self._sku_reservado = None # Cód. Interno gerado e ainda não salvo
         self.setWindowTitle("Cadastro Básico de Produtos")
         
         # --- NOVO: Logger ---
@@ -40,6 +44,13 @@ class ProductBaseForm(QWidget):
         self._setup_validators()
         self._setup_styles()
         self._build_ui()
+        
+        # Listagem/busca em segundo plano (não trava a interface em catálogos grandes)
+        self.product_search_worker = BackgroundSearch(self._build_products_query, self)
+        self.product_search_worker.batchReady.connect(self._append_products)
+        self.product_search_worker.failed.connect(
+            lambda msg: QMessageBox.critical(self, "Erro", f"Erro ao carregar produtos: {msg}"))
+        
         self._connect_signals()
         
         start_mode = kwargs.get('start_mode', 'consulta') 
@@ -123,7 +134,7 @@ class ProductBaseForm(QWidget):
         search_layout.setContentsMargins(0, 10, 0, 10)
         self.btn_novo = QPushButton("Novo Produto")
         self.search_input = QLineEdit()
-        self.search_input.setPlaceholderText("Pesquisar por Nome, Marca ou Código Interno...")
+        self.search_input.setPlaceholderText("Pesquisar por Nome, Marca, Modelo, EAN ou Código...")
         self.btn_pesquisar = QPushButton("Pesquisar")
         
         search_layout.addWidget(self.btn_novo)
@@ -358,6 +369,7 @@ class ProductBaseForm(QWidget):
         self.btn_cancelar.clicked.connect(self.cancel_action)
         self.btn_pesquisar.clicked.connect(self.load_products)
         self.search_input.returnPressed.connect(self.load_products)
+        self.search_input.textChanged.connect(self.product_search_worker.schedule)
         self.product_table.itemDoubleClicked.connect(self._load_product_for_edit)
         
         self.btn_add_codigo.clicked.connect(self._add_codigo_alternativo)
@@ -455,6 +467,7 @@ class ProductBaseForm(QWidget):
 
     def clear_form(self):
         # (Atualizado com os novos campos e correções)
+        self._devolver_sku()
         self.current_product_id = None
         self.empresa_combo.setCurrentIndex(0)
         self.categoria_combo.setCurrentIndex(0)
@@ -490,42 +503,32 @@ class ProductBaseForm(QWidget):
         self.form_title.setText("Cadastro de Produto Básico")
 
     def load_products(self):
-        # (Inalterado)
-        self.product_table.setRowCount(0)
+        self.product_search_worker.run_now()
+
+    def _build_products_query(self):
         search_term = self.search_input.text().strip()
-        
-        conn = get_connection()
-        try:
-            cur = conn.cursor()
-            query = """
-                SELECT p.id, p.nome, p.codigo_interno, p.unidade, p.marca, p.active
-                FROM produtos p
-            """
-            params = []
-            
-            if search_term:
-                query += " WHERE (p.nome LIKE ? OR p.marca LIKE ? OR p.codigo_interno LIKE ?)"
-                params.extend([f"%{search_term}%", f"%{search_term}%", f"%{search_term}%"])
-            
-            query += " ORDER BY p.nome"
-            cur.execute(query, tuple(params))
-            
-            rows = cur.fetchall()
-            for row in rows:
-                idx = self.product_table.rowCount()
-                self.product_table.insertRow(idx)
-                self.product_table.setItem(idx, 0, QTableWidgetItem(str(row['id'])))
-                self.product_table.setItem(idx, 1, QTableWidgetItem(row['codigo_interno'] or "-"))
-                self.product_table.setItem(idx, 2, QTableWidgetItem(row['nome']))
-                self.product_table.setItem(idx, 3, QTableWidgetItem(row['unidade'] or "-"))
-                self.product_table.setItem(idx, 4, QTableWidgetItem(row['marca'] or "-"))
-                self.product_table.setItem(idx, 5, QTableWidgetItem("Sim" if row['active'] else "Não"))
-        
-        except Exception as e:
-            self.logger.error(f"Erro ao carregar produtos: {e}", exc_info=True)
-            QMessageBox.critical(self, "Erro", f"Erro ao carregar produtos: {e}")
-        finally:
-            conn.close()
+        if search_term:
+            # Índice textual: relevância, sem acentos, por prefixo
+            return build_search_query(search_term, somente_ativos=False, limit=500)
+        return """
+            SELECT p.id, p.nome, p.codigo_interno, p.unidade, p.marca, p.active
+            FROM produtos p
+            ORDER BY p.nome
+        """, ()
+
+    def _append_products(self, rows, primeiro_lote):
+        if primeiro_lote:
+            self.product_table.setRowCount(0)
+        
+        for row in rows:
+            idx = self.product_table.rowCount()
+            self.product_table.insertRow(idx)
+            self.product_table.setItem(idx, 0, QTableWidgetItem(str(row['id'])))
+            self.product_table.setItem(idx, 1, QTableWidgetItem(row['codigo_interno'] or "-"))
+            self.product_table.setItem(idx, 2, QTableWidgetItem(row['nome']))
+            self.product_table.setItem(idx, 3, QTableWidgetItem(row['unidade'] or "-"))
+            self.product_table.setItem(idx, 4, QTableWidgetItem(row['marca'] or "-"))
+            self.product_table.setItem(idx, 5, QTableWidgetItem("Sim" if row['active'] else "Não"))
 
     def _load_product_for_edit(self, item):
         # (Atualizado com a correção do .get e do log)
@@ -593,26 +596,20 @@ class ProductBaseForm(QWidget):
             conn.close()
 
     def _generate_sku(self):
-        # (Inalterado)
-        conn = get_connection()
+        # Número do bloco de COD_INTERNO reservado pelo processo (modules/sequence_service.py)
         try:
-            cur = conn.cursor()
-            cur.execute("UPDATE sequencias SET valor = valor + 1 WHERE nome = 'COD_INTERNO'")
-            if cur.rowcount == 0:
-                cur.execute("INSERT INTO sequencias (nome, valor, prefixo) VALUES ('COD_INTERNO', 203000, '')")
-                novo_sku = "203000"
-            else:
-                cur.execute("SELECT valor FROM sequencias WHERE nome = 'COD_INTERNO'")
-                novo_sku = str(cur.fetchone()['valor'])
-                
-            conn.commit()
+            novo_sku = str(process_sequence('COD_INTERNO', inicial=203000).take())
+            self._sku_reservado = novo_sku
             self.codigo_interno_input.setText(novo_sku)
         except Exception as e:
             self.logger.error(f"Erro ao gerar SKU: {e}")
-            conn.rollback()
             QMessageBox.critical(self, "Erro de DB", f"Falha ao gerar Cód. Interno: {e}")
-        finally:
-            conn.close()
+
+    def _devolver_sku(self):
+        """Devolve ao bloco o Cód. Interno gerado para um produto que não foi salvo."""
+        sku, self._sku_reservado = self._sku_reservado, None
+        if sku and not self.current_product_id:
+            process_sequence('COD_INTERNO', inicial=203000).give_back(int(sku))
 
     def _load_codigos_alternativos(self):
         # (Inalterado)
@@ -863,6 +860,7 @@ class ProductBaseForm(QWidget):
                 msg += "\nPreço rápido salvo com sucesso!"
             
             conn.commit()
+            self._sku_reservado = None
             
             # --- LOG ADICIONADO ---
             self.logger.info(f"Usuário {self.user_id} {action_verb} produto: '{data['nome']}' (Cód: {data['codigo_interno']}).")
@@ -876,29 +874,13 @@ class ProductBaseForm(QWidget):
 
         except sqlite3.IntegrityError as e:
             QMessageBox.critical(self, "Erro", f"Erro de integridade (Código Interno ou EAN duplicado?): {e}")
-            if not self.current_product_id:
-                self._rollback_sku(self.codigo_interno_input.text())
+            self._sku_reservado = None # pode já estar em uso: não volta ao bloco
         except Exception as e:
             self.logger.error(f"Erro ao salvar produto: {e}", exc_info=True)
             QMessageBox.critical(self, "Erro", f"Erro ao salvar produto: {e}")
         finally:
             conn.close()
     
-    def _rollback_sku(self, sku_value):
-        # (Inalterado)
-        if not sku_value:
-            return
-        try:
-            conn = get_connection()
-            cur = conn.cursor()
-            cur.execute("UPDATE sequencias SET valor = valor - 1 WHERE nome = 'COD_INTERNO' AND valor = ?", (sku_value,))
-            conn.commit()
-        except Exception as e:
-            self.logger.error(f"Erro ao reverter SKU {sku_value}: {e}")
-        finally:
-            if conn:
-                conn.close()
-
     def _reload_form_after_save(self, product_id):
         # (Inalterado)
         conn = get_connection()
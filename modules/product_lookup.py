@@ -0,0 +1,216 @@
+# modules/product_lookup.py
+import time
+import logging
+from database.db import get_connection, catalog_changes_horizon
+
+
+class ProductLookupIndex:
+    """
+    Índice em memória (local do terminal) de código -> produto para a
+    tabela de preço ativa. Resolve a leitura do código de barras no PDV
+    sem consultar o banco.
+
+    O índice é carregado uma vez e mantido atualizado de forma incremental
+    a partir de 'catalogo_alteracoes' (alimentada por gatilhos em produtos,
+    produto_tabela_preco e produto_codigos_alternativos). Se a compactação
+    diária do log já descartou a posição do índice, ele é recarregado.
+    """
+    INTERVALO_SINCRONIA = 2.0  # segundos entre verificações de alterações
+
+    def __init__(self, tabela_id):
+        self.logger = logging.getLogger(__name__)
+        self.tabela_id = tabela_id
+
+        self._produtos = {}      # produto_id -> dict (mesmo formato do search_product)
+        self._por_ean = {}       # ean -> produto_id
+        self._por_codigo = {}    # codigo_interno -> produto_id
+        self._por_alternativo = {}  # codigo alternativo -> produto_id
+        self._alternativos = {}  # produto_id -> [codigos alternativos]
+
+        self._ultima_seq = 0
+        self._ultima_sincronia = 0.0
+        self.carregado = False
+
+    # --- CARGA ---
+
+    def build(self):
+        """Carrega todo o catálogo ativo com preço na tabela do terminal."""
+        inicio = time.perf_counter()
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+
+            # Marca a posição do log ANTES da carga: alterações concorrentes
+            # serão reaplicadas na próxima sincronia.
+            cur.execute("SELECT COALESCE(MAX(seq), 0) FROM catalogo_alteracoes")
+            ultima_seq = cur.fetchone()[0]
+
+            self._produtos.clear()
+            self._por_ean.clear()
+            self._por_codigo.clear()
+            self._por_alternativo.clear()
+            self._alternativos.clear()
+
+            cur.execute("""
+                SELECT p.id, p.ean, p.codigo_interno, p.nome, p.unidade, ptp.preco_vendadecimal, p.caminho_imagem
+                FROM produtos p
+                JOIN produto_tabela_preco ptp ON ptp.id_produto = p.id AND ptp.id_tabela = ?
+                WHERE p.active = 1
+            """, (self.tabela_id,))
+            for row in cur:
+                self._indexar(tuple(row))
+
+            cur.execute("SELECT id_produto, codigo FROM produto_codigos_alternativos")
+            for produto_id, codigo in cur:
+                if produto_id in self._produtos:
+                    self._indexar_alternativo(produto_id, codigo)
+
+            self._ultima_seq = ultima_seq
+            self._ultima_sincronia = time.monotonic()
+            self.carregado = True
+            self.logger.info(
+                f"Índice de códigos carregado: {len(self._produtos)} produtos, "
+                f"tabela {self.tabela_id}, {time.perf_counter() - inicio:.2f}s"
+            )
+        except Exception as e:
+            self.carregado = False
+            self.logger.error(f"Erro ao carregar índice de códigos: {e}", exc_info=True)
+        finally:
+            conn.close()
+
+    def _indexar(self, row):
+        produto_id, ean, codigo_interno, nome, unidade, preco, caminho_imagem = row
+        self._produtos[produto_id] = {
+            "produto_id": produto_id,
+            "ean": ean,
+            "codigo_interno": codigo_interno,
+            "descricao": nome,
+            "unidade": unidade,
+            "preco_venda": preco,
+            "caminho_imagem": caminho_imagem,
+        }
+        if ean:
+            self._por_ean[ean] = produto_id
+        if codigo_interno:
+            self._por_codigo[codigo_interno] = produto_id
+
+    def _indexar_alternativo(self, produto_id, codigo):
+        self._por_alternativo[codigo] = produto_id
+        self._alternativos.setdefault(produto_id, []).append(codigo)
+
+    def _remover(self, produto_id):
+        produto = self._produtos.pop(produto_id, None)
+        if produto:
+            if self._por_ean.get(produto["ean"]) == produto_id:
+                del self._por_ean[produto["ean"]]
+            if self._por_codigo.get(produto["codigo_interno"]) == produto_id:
+                del self._por_codigo[produto["codigo_interno"]]
+        for codigo in self._alternativos.pop(produto_id, []):
+            if self._por_alternativo.get(codigo) == produto_id:
+                del self._por_alternativo[codigo]
+
+    # --- SINCRONIA INCREMENTAL ---
+
+    def sync(self):
+        """Reaplica no índice os produtos alterados desde a última sincronia."""
+        if not self.carregado:
+            self.build()
+            return
+
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            if self._ultima_seq < catalog_changes_horizon(cur):
+                self.logger.info("Índice de códigos: posição descartada do log do catálogo; recarregando.")
+                self.build()
+                return
+            cur.execute(
+                "SELECT seq, produto_id FROM catalogo_alteracoes WHERE seq > ? ORDER BY seq",
+                (self._ultima_seq,)
+            )
+            alteracoes = cur.fetchall()
+            self._ultima_sincronia = time.monotonic()
+            if not alteracoes:
+                return
+
+            ids = list({a['produto_id'] for a in alteracoes})
+            for produto_id in ids:
+                self._remover(produto_id)
+
+            # Em blocos para respeitar o limite de parâmetros do SQLite
+            for i in range(0, len(ids), 500):
+                bloco = ids[i:i + 500]
+                marcadores = ",".join("?" * len(bloco))
+                cur.execute(f"""
+                    SELECT p.id, p.ean, p.codigo_interno, p.nome, p.unidade, ptp.preco_vendadecimal, p.caminho_imagem
+                    FROM produtos p
+                    JOIN produto_tabela_preco ptp ON ptp.id_produto = p.id AND ptp.id_tabela = ?
+                    WHERE p.active = 1 AND p.id IN ({marcadores})
+                """, (self.tabela_id, *bloco))
+                for row in cur.fetchall():
+                    self._indexar(tuple(row))
+
+                cur.execute(f"""
+                    SELECT id_produto, codigo FROM produto_codigos_alternativos
+                    WHERE id_produto IN ({marcadores})
+                """, bloco)
+                for produto_id, codigo in cur.fetchall():
+                    if produto_id in self._produtos:
+                        self._indexar_alternativo(produto_id, codigo)
+
+            self._ultima_seq = alteracoes[-1]['seq']
+            self.logger.debug(f"Índice de códigos: {len(ids)} produto(s) atualizado(s).")
+        except Exception as e:
+            self.logger.error(f"Erro ao sincronizar índice de códigos: {e}", exc_info=True)
+        finally:
+            conn.close()
+
+    def _sync_se_necessario(self):
+        if time.monotonic() - self._ultima_sincronia >= self.INTERVALO_SINCRONIA:
+            self.sync()
+
+    # --- CONSULTA ---
+
+    def _resolver(self, codigo):
+        produto_id = (self._por_ean.get(codigo)
+                      or self._por_codigo.get(codigo)
+                      or self._por_alternativo.get(codigo))
+        return self._produtos.get(produto_id) if produto_id else None
+
+    def lookup(self, codigo):
+        """
+        Retorna o produto (dict) para um EAN, código interno ou código
+        alternativo, ou None. Em caso de falha, sincroniza antes de
+        responder para não perder produtos recém-cadastrados.
+        """
+        if not self.carregado:
+            return self._lookup_sql(codigo)
+
+        self._sync_se_necessario()
+        produto = self._resolver(codigo)
+        if produto is None:
+            self.sync()
+            produto = self._resolver(codigo)
+        return dict(produto) if produto else None
+
+    def _lookup_sql(self, codigo):
+        """Consulta direta (índice indisponível). Cada ramo usa um índice."""
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT p.id as produto_id, p.ean, p.codigo_interno, p.nome as descricao,
+                       p.unidade, ptp.preco_vendadecimal as preco_venda, p.caminho_imagem
+                FROM produtos p
+                JOIN produto_tabela_preco ptp ON ptp.id_produto = p.id AND ptp.id_tabela = ?
+                WHERE p.active = 1 AND p.id IN (
+                    SELECT id FROM produtos WHERE ean = ?
+                    UNION ALL SELECT id FROM produtos WHERE codigo_interno = ?
+                    UNION ALL SELECT id_produto FROM produto_codigos_alternativos WHERE codigo = ?
+                )
+                LIMIT 1
+            """, (self.tabela_id, codigo, codigo, codigo))
+            row = cur.fetchone()
+            return dict(row) if row else None
+        finally:
+            conn.close()
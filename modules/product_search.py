@@ -0,0 +1,136 @@
+# modules/product_search.py
+import re
+from database.db import get_connection
+
+LIMITE_PADRAO = 200
+
+# Colunas do índice 'produtos_busca' por modo de busca
+CAMPOS_NOME = "{nome marca modelo}"
+CAMPOS_CODIGO = "{codigos}"
+
+# Pesos do bm25 (nome, marca, modelo, codigos): o nome pesa mais
+PESOS_BM25 = "10.0, 2.0, 2.0, 5.0"
+
+_fts_disponivel = None
+
+
+def fts_disponivel():
+    """Verifica (uma vez) se o índice FTS5 'produtos_busca' existe neste banco."""
+    global _fts_disponivel
+    if _fts_disponivel is None:
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1 FROM sqlite_master WHERE name = 'produtos_busca'")
+            _fts_disponivel = cur.fetchone() is not None
+        finally:
+            conn.close()
+    return _fts_disponivel
+
+
+def build_match_expression(term, campos=None):
+    """
+    Converte o texto digitado em uma expressão MATCH do FTS5: cada palavra
+    vira um prefixo entre aspas ("pao"* "fran"*), todas obrigatórias.
+    Retorna None se não houver palavras pesquisáveis.
+    """
+    palavras = re.findall(r"\w+", term or "")
+    if not palavras:
+        return None
+    expr = " ".join(f'"{p}"*' for p in palavras)
+    if campos:
+        expr = f"{campos} : ({expr})"
+    return expr
+
+
+def search_products(term, tabela_id=None, modo=None, somente_ativos=True, limit=LIMITE_PADRAO):
+    """
+    Busca produtos por nome/marca/modelo/códigos, ordenados por relevância.
+
+    - tabela_id: se informado, retorna apenas produtos com preço nessa
+      tabela e inclui a coluna 'preco_vendadecimal'.
+    - modo: None (todos os campos), "nome" ou "codigo".
+    Retorna uma lista de sqlite3.Row (id, codigo_interno, nome, marca,
+    unidade, active[, preco_vendadecimal]).
+    """
+    query = build_search_query(term, tabela_id, modo, somente_ativos, limit)
+    if query is None:
+        return []
+
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(*query)
+        return cur.fetchall()
+    finally:
+        conn.close()
+
+
+def build_search_query(term, tabela_id=None, modo=None, somente_ativos=True, limit=LIMITE_PADRAO):
+    """
+    Monta (sql, params) da busca de produtos, sem executar. Usado também
+    pela busca em segundo plano (modules/search_worker.py).
+    Retorna None se o termo não tiver palavras pesquisáveis.
+    """
+    if not fts_disponivel():
+        return _build_like_query(term, tabela_id, modo, somente_ativos, limit)
+
+    campos = {"nome": CAMPOS_NOME, "codigo": CAMPOS_CODIGO}.get(modo)
+    expr = build_match_expression(term, campos)
+    if expr is None:
+        return None
+
+    select = "SELECT p.id, p.codigo_interno, p.nome, p.marca, p.unidade, p.active"
+    joins = ""
+    where = ["produtos_busca MATCH ?"]
+    params = [expr]
+    if tabela_id is not None:
+        select += ", ptp.preco_vendadecimal"
+        joins = "JOIN produto_tabela_preco ptp ON ptp.id_produto = p.id AND ptp.id_tabela = ?"
+        params.insert(0, tabela_id)
+    if somente_ativos:
+        where.append("p.active = 1")
+    params.append(limit)
+
+    sql = f"""
+        {select}
+        FROM produtos_busca
+        JOIN produtos p ON p.id = produtos_busca.rowid
+        {joins}
+        WHERE {" AND ".join(where)}
+        ORDER BY bm25(produtos_busca, {PESOS_BM25}), p.nome
+        LIMIT ?
+    """
+    return sql, params
+
+
+def _build_like_query(term, tabela_id, modo, somente_ativos, limit):
+    """Busca por LIKE (SQLite sem FTS5)."""
+    if not (term or "").strip():
+        return None
+    like = f"%{term}%"
+    select = "SELECT p.id, p.codigo_interno, p.nome, p.marca, p.unidade, p.active"
+    joins = ""
+    params = []
+    if tabela_id is not None:
+        select += ", ptp.preco_vendadecimal"
+        joins = "JOIN produto_tabela_preco ptp ON ptp.id_produto = p.id AND ptp.id_tabela = ?"
+        params.append(tabela_id)
+
+    filtro_nome = "p.nome LIKE ? OR p.marca LIKE ? OR p.modelo LIKE ?"
+    filtro_codigo = ("p.codigo_interno LIKE ? OR p.ean LIKE ? OR p.id IN "
+                     "(SELECT id_produto FROM produto_codigos_alternativos WHERE codigo LIKE ?)")
+    if modo == "nome":
+        filtros, n = filtro_nome, 3
+    elif modo == "codigo":
+        filtros, n = filtro_codigo, 3
+    else:
+        filtros, n = f"{filtro_nome} OR {filtro_codigo}", 6
+    params.extend([like] * n)
+
+    where = f"({filtros})"
+    if somente_ativos:
+        where += " AND p.active = 1"
+    params.append(limit)
+
+    return f"{select} FROM produtos p {joins} WHERE {where} ORDER BY p.nome LIMIT ?", params
@@ -8,7 +8,8 @@ from PyQt5.QtWidgets import (
     QSpinBox, QLabel 
 )
 from PyQt5.QtCore import Qt
-from database.db import get_connection
+from .product_search import build_search_query
+from .search_worker import BackgroundSearch
 
 class ProductSearchDialog(QDialog):
     """
@@ -86,71 +87,48 @@ class ProductSearchDialog(QDialog):
         layout.addLayout(btn_layout)
         
     def _connect_signals(self):
-        self.search_input.textChanged.connect(self._search_products)
-        self.rb_nome.toggled.connect(self._search_products)
+        # Busca em segundo plano: o diálogo não trava enquanto o operador digita
+        self.search = BackgroundSearch(self._build_search_query, self, debounce_ms=150)
+        self.search.batchReady.connect(self._append_results)
+        self.search.failed.connect(lambda msg: QMessageBox.critical(self, "Erro", f"Erro ao buscar produtos: {msg}"))
+        
+        self.search_input.textChanged.connect(self.search.schedule)
+        self.rb_nome.toggled.connect(self.search.run_now)
         
         self.btn_confirmar.clicked.connect(self.confirm_selection)
         self.btn_cancelar.clicked.connect(self.reject)
         self.results_table.itemDoubleClicked.connect(self.confirm_selection)
         
-    def _search_products(self):
-        """Executa a busca no DB e preenche a tabela."""
+    def _build_search_query(self):
+        """Monta a busca (índice textual, por relevância) para o termo digitado."""
         term = self.search_input.text().strip()
-        self.results_table.setRowCount(0)
-        
         if not term or self.tabela_id_ativa is None:
-            return
-            
-        conn = get_connection()
-        try:
-            cur = conn.cursor()
-            
-            # Query base: Busca produtos ativos e junta com o Preço da Tabela Ativa
-            query = """
-                SELECT 
-                    p.id, 
-                    p.codigo_interno,
-                    p.nome,
-                    ptp.preco_vendadecimal
-                FROM produtos p
-                JOIN produto_tabela_preco ptp ON p.id = ptp.id_produto
-                WHERE 
-                    p.active = 1
-                    AND ptp.id_tabela = ?
-                    AND (
-            """
+            return None
+        modo = "nome" if self.rb_nome.isChecked() else "codigo"
+        return build_search_query(term, tabela_id=self.tabela_id_ativa, modo=modo)
+
+    def _append_results(self, resultados, primeiro_lote):
+        """Recebe um lote de resultados da busca e acrescenta à tabela."""
+        if primeiro_lote:
+            self.results_table.setRowCount(0)
             
-            # Adiciona a cláusula WHERE de busca
-            if self.rb_nome.isChecked():
-                query += "p.nome LIKE ?)"
-                search_params = [f"%{term}%"]
-            else: # Cód. Interno/EAN/Alternativo
-                query += "p.codigo_interno LIKE ? OR p.ean LIKE ? OR p.id IN (SELECT id_produto FROM produto_codigos_alternativos WHERE codigo LIKE ?))"
-                search_params = [f"%{term}%", f"%{term}%", f"%{term}%"]
+        for item in resultados:
+            row = self.results_table.rowCount()
+            self.results_table.insertRow(row)
             
-            query += " GROUP BY p.id ORDER BY p.nome"
+            preco_venda = item['preco_vendadecimal'] if item['preco_vendadecimal'] is not None else 0.0
             
-            params = [self.tabela_id_ativa] + search_params
-            cur.execute(query, tuple(params))
+            self.results_table.setItem(row, 0, QTableWidgetItem(str(item['id'])))
+            self.results_table.setItem(row, 1, QTableWidgetItem(item['codigo_interno']))
+            self.results_table.setItem(row, 2, QTableWidgetItem(item['nome']))
+            self.results_table.setItem(row, 3, QTableWidgetItem(f"R$ {preco_venda:.2f}"))
             
-            for item in cur.fetchall():
-                row = self.results_table.rowCount()
-                self.results_table.insertRow(row)
-                
-                preco_venda = item['preco_vendadecimal'] if item['preco_vendadecimal'] is not None else 0.0
-                
-                self.results_table.setItem(row, 0, QTableWidgetItem(str(item['id'])))
-                self.results_table.setItem(row, 1, QTableWidgetItem(item['codigo_interno']))
-                self.results_table.setItem(row, 2, QTableWidgetItem(item['nome']))
-                self.results_table.setItem(row, 3, QTableWidgetItem(f"R$ {preco_venda:.2f}"))
-                
-            if self.results_table.rowCount() > 0:
-                self.results_table.selectRow(0)
-                
-        except Exception as e:
-            QMessageBox.critical(self, "Erro", f"Erro ao buscar produtos: {e}")
-        finally:
-            conn.close()
+        if primeiro_lote and self.results_table.rowCount() > 0:
+            self.results_table.selectRow(0)
+
+    def done(self, result):
+        self.search.cancel()
+        super().done(result)
 
     def confirm_selection(self):
         """Confirma o item selecionado e fecha o diálogo."""
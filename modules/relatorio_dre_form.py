@@ -11,11 +11,15 @@ from PyQt5.QtGui import QColor, QFont
 from PyQt5.QtCore import Qt, QDate
 from database.db import get_connection
 from .report_exporter import export_to_pdf, export_to_xlsx
+from .dre_engine import build_dre, COMPARACAO_ANTERIOR, COMPARACAO_ANO_ANTERIOR
+
+MESES_ABREV = ["Jan", "Fev", "Mar", "Abr", "Mai", "Jun", "Jul", "Ago", "Set", "Out", "Nov", "Dez"]
 
 class RelatorioDREForm(QWidget):
     """
     Relatório DRE (Demonstrativo de Resultado do Exercício)
-    Baseado em Regime de Caixa (Lançamentos Pagos).
+    Baseado em Regime de Caixa (Lançamentos Pagos), com subtotais por
+    grupo do plano de contas (modules/dre_engine.py).
     """
     def __init__(self, user_id, **kwargs):
         super().__init__()
@@ -23,6 +27,8 @@ class RelatorioDREForm(QWidget):
         self.setWindowTitle("Relatório DRE (Regime de Caixa)")
         
         self.company_map = {}
+        self._meses = []        # colunas mês a mês exibidas
+        self._comparar = False  # colunas de comparação exibidas
         
         self._setup_styles()
         self._build_ui()
@@ -86,6 +92,17 @@ class RelatorioDREForm(QWidget):
         self.date_end.setCalendarPopup(True)
         filter_layout.addWidget(self.date_end, 0, 3)
         
+        self.colunas_combo = QComboBox()
+        self.colunas_combo.addItem("Total do Período", False)
+        self.colunas_combo.addItem("Mês a Mês", True)
+        filter_layout.addWidget(self.colunas_combo, 0, 4)
+        
+        self.comparacao_combo = QComboBox()
+        self.comparacao_combo.addItem("Sem Comparação", None)
+        self.comparacao_combo.addItem("Comparar c/ Período Anterior", COMPARACAO_ANTERIOR)
+        self.comparacao_combo.addItem("Comparar c/ Ano Anterior", COMPARACAO_ANO_ANTERIOR)
+        filter_layout.addWidget(self.comparacao_combo, 0, 5)
+        
         filter_layout.addWidget(QLabel("Empresa:"), 1, 0)
         self.empresa_combo = QComboBox()
         filter_layout.addWidget(self.empresa_combo, 1, 1, 1, 3)
@@ -149,74 +166,61 @@ class RelatorioDREForm(QWidget):
         date_start_str = self.date_start.date().toString("yyyy-MM-dd")
         date_end_str = self.date_end.date().toString("yyyy-MM-dd")
         empresa_id = self.empresa_combo.currentData()
+        mensal = self.colunas_combo.currentData()
+        comparacao = self.comparacao_combo.currentData()
         
         conn = get_connection()
         try:
             cur = conn.cursor()
+            dre = build_dre(cur, date_start_str, date_end_str, empresa_id, comparacao)
             
-            # Query principal que agrupa por categoria
-            query = """
-                SELECT 
-                    c.nome as categoria_nome,
-                    c.tipo as categoria_tipo,
-                    SUM(l.valor_pago) as total_pago
-                FROM lancamentos_financeiros l
-                JOIN categorias_financeiras c ON l.categoria_id = c.id
-                JOIN titulos_financeiros t ON l.titulo_id = t.id
-                WHERE l.status = 'PAGO'
-                  AND l.data_pagamento BETWEEN ? AND ?
-            """
-            params = [date_start_str, date_end_str]
-            
-            if empresa_id:
-                query += " AND t.empresa_id = ?"
-                params.append(empresa_id)
-                
-            query += " GROUP BY c.id, c.nome, c.tipo ORDER BY c.tipo DESC, total_pago DESC"
-            
-            cur.execute(query, tuple(params))
-            
-            lancamentos = cur.fetchall()
-            
-            total_receitas = 0.0
-            total_despesas = 0.0
-            receitas_list = []
-            despesas_list = []
+            # --- Colunas: [meses...] Total [Comparação, Var. %] ---
+            self._meses = dre['meses'] if mensal and len(dre['meses']) > 1 else []
+            self._comparar = comparacao is not None
+            headers = ["Descrição (Plano de Contas)"]
+            headers += [f"{MESES_ABREV[int(m[5:]) - 1]}/{m[2:4]}" for m in self._meses]
+            headers.append("Total (R$)" if self._meses else "Valor (R$)")
+            if self._comparar:
+                headers += ["Comparação (R$)", "Var. %"]
+            self.report_table.setColumnCount(len(headers))
+            self.report_table.setHorizontalHeaderLabels(headers)
+            self.report_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+            for col in range(1, len(headers)):
+                self.report_table.horizontalHeader().setSectionResizeMode(col, QHeaderView.ResizeToContents)
             
-            for lanc in lancamentos:
-                if lanc['categoria_tipo'] == 'RECEITA':
-                    total_receitas += lanc['total_pago']
-                    receitas_list.append((lanc['categoria_nome'], lanc['total_pago']))
-                else: # DESPESA
-                    total_despesas += lanc['total_pago']
-                    despesas_list.append((lanc['categoria_nome'], lanc['total_pago']))
-            
-            resultado = total_receitas - total_despesas
+            totais = dre['totais']
+            resultado = {
+                "valores": {m: totais['RECEITA']['valores'][m] - totais['DESPESA']['valores'][m] for m in dre['meses']},
+                "total": totais['RECEITA']['total'] - totais['DESPESA']['total'],
+                "comparacao": (totais['RECEITA']['comparacao'] - totais['DESPESA']['comparacao']) if self._comparar else None,
+            }
             
             # --- Preenche a Tabela ---
             
             # 1. Receitas
-            row = self._insert_header_row("RECEITAS")
-            for nome, valor in receitas_list:
-                self._insert_data_row(f"    {nome}", valor)
-            self._insert_total_row("TOTAL DE RECEITAS", total_receitas, QColor("#27AE60"))
+            self._insert_header_row("RECEITAS")
+            for linha in dre['linhas']:
+                if linha['tipo'] == 'RECEITA':
+                    self._insert_data_row(linha)
+            self._insert_total_row("TOTAL DE RECEITAS", totais['RECEITA'], QColor("#27AE60"))
             
             # 2. Despesas
             self._insert_spacer_row()
-            row = self._insert_header_row("DESPESAS")
-            for nome, valor in despesas_list:
-                self._insert_data_row(f"    {nome}", valor)
-            self._insert_total_row("TOTAL DE DESPESAS", total_despesas, QColor("#c0392b"))
+            self._insert_header_row("DESPESAS")
+            for linha in dre['linhas']:
+                if linha['tipo'] != 'RECEITA':
+                    self._insert_data_row(linha)
+            self._insert_total_row("TOTAL DE DESPESAS", totais['DESPESA'], QColor("#c0392b"))
 
             # 3. Resultado
             self._insert_spacer_row()
-            cor_resultado = QColor("#0078d7") if resultado >= 0 else QColor("#c0392b")
+            cor_resultado = QColor("#0078d7") if resultado['total'] >= 0 else QColor("#c0392b")
             self._insert_total_row("RESULTADO LÍQUIDO (LUCRO/PREJUÍZO)", resultado, cor_resultado, 14)
             
             
             count = self.report_table.rowCount()
             if show_message:
-                QMessageBox.information(self, "Relatório", f"DRE gerado com sucesso. {len(lancamentos)} grupos de lançamentos encontrados.")
+                QMessageBox.information(self, "Relatório", f"DRE gerado com sucesso. {len(dre['linhas'])} categorias com movimento.")
             
             if count > 0:
                 self.btn_export_pdf.setEnabled(True)
@@ -232,74 +236,86 @@ class RelatorioDREForm(QWidget):
 
     # --- Funções de ajuda para popular a tabela ---
     
+    def _valores_colunas(self, dados):
+        """Textos das colunas de valor de uma linha (meses, total e comparação)."""
+        textos = [f"R$ {dados['valores'].get(m, 0.0):.2f}" for m in self._meses]
+        textos.append(f"R$ {dados['total']:.2f}")
+        if self._comparar:
+            comp = dados['comparacao'] or 0.0
+            textos.append(f"R$ {comp:.2f}")
+            textos.append(f"{(dados['total'] - comp) / abs(comp) * 100:+.1f}%" if abs(comp) >= 0.01 else "")
+        return textos
+    
     def _insert_header_row(self, text):
         row = self.report_table.rowCount()
         self.report_table.insertRow(row)
         item_desc = QTableWidgetItem(text)
         item_desc.setFont(QFont("Segoe UI", 12, QFont.Bold))
         item_desc.setBackground(QColor("#e0e0e0"))
-        item_valor = QTableWidgetItem("")
-        item_valor.setBackground(QColor("#e0e0e0"))
         self.report_table.setItem(row, 0, item_desc)
-        self.report_table.setItem(row, 1, item_valor)
+        for col in range(1, self.report_table.columnCount()):
+            item_valor = QTableWidgetItem("")
+            item_valor.setBackground(QColor("#e0e0e0"))
+            self.report_table.setItem(row, col, item_valor)
         return row
         
-    def _insert_data_row(self, text, valor):
+    def _insert_data_row(self, linha):
+        """Linha de categoria; grupos (com subcategorias) em negrito, com o subtotal."""
         row = self.report_table.rowCount()
         self.report_table.insertRow(row)
-        item_desc = QTableWidgetItem(text)
-        
-        item_valor = QTableWidgetItem(f"R$ {valor:.2f}")
-        item_valor.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
-        
+        item_desc = QTableWidgetItem("    " * (linha['nivel'] + 1) + linha['nome'])
+        fonte = QFont("Segoe UI", 10, QFont.Bold) if linha['filhos'] else None
+        if fonte:
+            item_desc.setFont(fonte)
         self.report_table.setItem(row, 0, item_desc)
-        self.report_table.setItem(row, 1, item_valor)
+        
+        for col, texto in enumerate(self._valores_colunas(linha), start=1):
+            item_valor = QTableWidgetItem(texto)
+            item_valor.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+            if fonte:
+                item_valor.setFont(fonte)
+            self.report_table.setItem(row, col, item_valor)
         return row
         
-    def _insert_total_row(self, text, valor, color, font_size=12):
+    def _insert_total_row(self, text, dados, color, font_size=12):
         row = self.report_table.rowCount()
         self.report_table.insertRow(row)
         
         item_desc = QTableWidgetItem(text)
         item_desc.setFont(QFont("Segoe UI", font_size, QFont.Bold))
         item_desc.setForeground(color)
-        
-        item_valor = QTableWidgetItem(f"R$ {valor:.2f}")
-        item_valor.setFont(QFont("Segoe UI", font_size, QFont.Bold))
-        item_valor.setForeground(color)
-        item_valor.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
-        
         self.report_table.setItem(row, 0, item_desc)
-        self.report_table.setItem(row, 1, item_valor)
+        
+        for col, texto in enumerate(self._valores_colunas(dados), start=1):
+            item_valor = QTableWidgetItem(texto)
+            item_valor.setFont(QFont("Segoe UI", font_size, QFont.Bold))
+            item_valor.setForeground(color)
+            item_valor.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+            self.report_table.setItem(row, col, item_valor)
         return row
         
     def _insert_spacer_row(self):
         row = self.report_table.rowCount()
         self.report_table.insertRow(row)
         self.report_table.setRowHeight(row, 10) # Linha fina
-        item1 = QTableWidgetItem("")
-        item1.setBackground(QColor("#f8f8fb"))
-        item2 = QTableWidgetItem("")
-        item2.setBackground(QColor("#f8f8fb"))
-        self.report_table.setItem(row, 0, item1)
-        self.report_table.setItem(row, 1, item2)
+        for col in range(self.report_table.columnCount()):
+            item = QTableWidgetItem("")
+            item.setBackground(QColor("#f8f8fb"))
+            self.report_table.setItem(row, col, item)
 
     # --- Funções de Exportação ---
 
     def _get_table_data(self):
         """Lê os dados e cabeçalhos da QTableWidget para exportação."""
-        headers = ["Descrição", "Valor (R$)"]
+        colunas = self.report_table.columnCount()
+        headers = ["Descrição"] + [self.report_table.horizontalHeaderItem(c).text() for c in range(1, colunas)]
         
         data = []
         for i in range(self.report_table.rowCount()):
             row_data = []
-            # Coluna 0 (Descrição)
-            item_desc = self.report_table.item(i, 0)
-            row_data.append(item_desc.text() if item_desc else "")
-            # Coluna 1 (Valor)
-            item_valor = self.report_table.item(i, 1)
-            row_data.append(item_valor.text() if item_valor else "")
-            
+            for c in range(colunas):
+                item = self.report_table.item(i, c)
+                row_data.append(item.text() if item else "")
             data.append(row_data)
         return headers, data
 
@@ -307,7 +323,8 @@ class RelatorioDREForm(QWidget):
         try:
             headers, data = self._get_table_data()
             title = f"Relatório DRE (Regime de Caixa) - {self.date_start.text()} a {self.date_end.text()}"
-            export_to_pdf(headers, data, title, self, orientation='portrait')
+            orientation = 'portrait' if len(headers) <= 3 else 'landscape'
+            export_to_pdf(headers, data, title, self, orientation=orientation)
         except Exception as e:
             QMessageBox.critical(self, "Erro ao Exportar PDF", f"Falha ao gerar PDF: {e}")
             
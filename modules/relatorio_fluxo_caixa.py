@@ -11,6 +11,7 @@ from PyQt5.QtGui import QColor, QFont
 from PyQt5.QtCore import Qt, QDate
 from database.db import get_connection
 from .report_exporter import export_to_pdf, export_to_xlsx
+from .account_balances import opening_balance
 
 class RelatorioFluxoCaixa(QWidget):
     """
@@ -196,23 +197,12 @@ class RelatorioFluxoCaixa(QWidget):
         try:
             cur = conn.cursor()
             
-            # 1. Buscar Saldo Inicial da Conta
-            cur.execute("SELECT saldo_inicial FROM contas_financeiras WHERE id = ?", (conta_id,))
-            saldo_inicial = cur.fetchone()['saldo_inicial'] or 0.0
+            # 1. Saldo anterior: saldo inicial + saldo mensal + movimentações do mês até o início
+            saldo_anterior = opening_balance(cur, conta_id, date_start_str)
             
-            # 2. Buscar Movimentações ANTERIORES ao período
+            # 2. Buscar Movimentações DO período
             cur.execute("""
-                SELECT SUM(CASE WHEN tipo_movimento = 'ENTRADA' THEN valor ELSE -valor END) as total_anterior
-                FROM movimentacoes_contas
-                WHERE conta_id = ? AND data_movimento < ?
-            """, (conta_id, date_start_str))
-            
-            mov_anterior = cur.fetchone()['total_anterior'] or 0.0
-            saldo_anterior = saldo_inicial + mov_anterior
-            
-            # 3. Buscar Movimentações DO período
-            cur.execute("""
-                SELECT data_movimento, tipo_movimento, descricao, valor 
+                SELECT id, data_movimento, tipo_movimento, descricao, valor 
                 FROM movimentacoes_contas
                 WHERE conta_id = ? AND data_movimento BETWEEN ? AND ?
                 ORDER BY data_movimento, id
@@ -246,10 +236,10 @@ class RelatorioFluxoCaixa(QWidget):
                 self.report_table.setItem(row, 3, QTableWidgetItem(mov['descricao']))
                 self.report_table.setItem(row, 4, item_valor)
             
-            # 4. Calcular Saldo Final
+            # 3. Calcular Saldo Final
             saldo_atual = saldo_anterior + total_entradas - total_saidas
             
-            # 5. Atualizar Labels de Resumo
+            # 4. Atualizar Labels de Resumo
             self.lbl_saldo_anterior.setText(f"R$ {saldo_anterior:.2f}")
             self.lbl_total_entradas.setText(f"R$ {total_entradas:.2f}")
             self.lbl_total_saidas.setText(f"R$ {total_saidas:.2f}")
@@ -4,17 +4,52 @@ from PyQt5.QtWidgets import (
     QWidget, QLabel, QPushButton, QVBoxLayout, QHBoxLayout, 
     QMessageBox, QTableWidget, QTableWidgetItem, QHeaderView, 
     QAbstractItemView, QDateEdit, QCalendarWidget, QComboBox,
-    QFrame, QGridLayout, QFileDialog
+    QFrame, QGridLayout, QFileDialog, QProgressBar
 )
 from PyQt5.QtGui import QColor
-from PyQt5.QtCore import Qt, QDate
+from PyQt5.QtCore import Qt, QDate, QTimer
 from database.db import get_connection
-from .report_exporter import export_to_pdf, export_to_xlsx
+from .report_exporter import export_to_pdf, export_query_to_xlsx
+from .search_worker import BackgroundSearch
+
+# --- CORREÇÃO: Removido "AND cs.status = 'FECHADO'" ---
+# Vendas = total_final de todas as vendas da sessão (finalizadas e canceladas)
+SQL_SESSOES = """
+    SELECT 
+        cs.id, cs.data_abertura, cs.data_fechamento,
+        t.nome_terminal, u.username,
+        cs.valor_inicial, cs.diferenca,
+        cs.status,
+        COALESCE(ct.total_liquido + ct.total_cancelado, 0.0) AS total_vendas,
+        COALESCE(ct.total_suprimentos - ct.total_sangrias, 0.0) AS total_movs
+    FROM caixa_sessoes cs
+    JOIN terminais_pdv t ON cs.terminal_id = t.id
+    JOIN usuarios u ON cs.user_id = u.id
+    LEFT JOIN caixa_totais ct ON ct.caixa_id = cs.id
+    WHERE cs.data_abertura BETWEEN ? AND ?
+"""
+
+
+def _linha_xlsx(sessao):
+    """Colunas visíveis da tabela, com valores numéricos (executa na thread da exportação)."""
+    return (
+        sessao['data_abertura'],
+        sessao['data_fechamento'] or "(ABERTO)",
+        sessao['nome_terminal'],
+        sessao['username'],
+        sessao['valor_inicial'],
+        sessao['total_vendas'],
+        sessao['total_movs'],
+        "(Caixa Aberto)" if sessao['status'] == 'ABERTO' else (sessao['diferenca'] or 0.0),
+    )
+
 
 class RelatorioVendasCaixa(QWidget):
     """
     Relatório de Vendas por Caixa (Sessões de Caixa).
     """
+    LINHAS_POR_CICLO = 250  # linhas inseridas na tabela por ciclo do event loop
+
     def __init__(self, user_id, **kwargs):
         super().__init__()
         self.user_id = user_id
@@ -22,6 +57,19 @@ class RelatorioVendasCaixa(QWidget):
         
         self._setup_styles()
         self._build_ui()
+        
+        # Consulta em segundo plano (não trava a interface em períodos longos)
+        self._show_message = False
+        self._fila_linhas = []       # linhas recebidas ainda não exibidas
+        self._total_consulta = None  # total informado ao fim da consulta
+        self._timer_linhas = QTimer(self)
+        self._timer_linhas.setInterval(0)
+        self._timer_linhas.timeout.connect(self._drain_rows)
+        self.report_worker = BackgroundSearch(self._build_report_query, self, batch_size=500)
+        self.report_worker.batchReady.connect(self._append_rows)
+        self.report_worker.finished.connect(self._on_report_finished)
+        self.report_worker.failed.connect(self._on_report_failed)
+        
         self._connect_signals()
         
         self.load_report(show_message=False) 
@@ -122,6 +170,19 @@ class RelatorioVendasCaixa(QWidget):
         
         main_layout.addWidget(filter_frame)
 
+        # Progresso da consulta (visível apenas durante o carregamento)
+        progress_layout = QHBoxLayout()
+        self.lbl_progresso = QLabel()
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 0)
+        self.progress_bar.setMaximumHeight(12)
+        self.btn_cancelar_consulta = QPushButton("Cancelar")
+        self.btn_cancelar_consulta.setStyleSheet("background-color: #95A5A6;")
+        progress_layout.addWidget(self.lbl_progresso)
+        progress_layout.addWidget(self.progress_bar, 1)
+        progress_layout.addWidget(self.btn_cancelar_consulta)
+        main_layout.addLayout(progress_layout)
+
         self.report_table = QTableWidget()
         self.report_table.setColumnCount(9)
         self.report_table.setHorizontalHeaderLabels([
@@ -136,6 +197,7 @@ class RelatorioVendasCaixa(QWidget):
         self.report_table.setColumnHidden(0, True)
         
         main_layout.addWidget(self.report_table)
+        self._set_loading(False)
         
         self._load_filters()
 
@@ -167,117 +229,136 @@ class RelatorioVendasCaixa(QWidget):
 
     def _connect_signals(self):
         self.btn_filtrar.clicked.connect(lambda: self.load_report(show_message=True))
+        self.btn_cancelar_consulta.clicked.connect(self._cancel_report)
         
         self.btn_export_pdf.clicked.connect(self._export_pdf)
         self.btn_export_xlsx.clicked.connect(self._export_xlsx)
 
     def load_report(self, show_message=False):
-        """Carrega os dados do relatório com base nos filtros."""
-        self.report_table.setRowCount(0)
-        
+        """Carrega os dados do relatório com base nos filtros (em segundo plano)."""
+        self._show_message = show_message
+        self._reset_queue()
+        self.btn_export_pdf.setEnabled(False)
+        self.btn_export_xlsx.setEnabled(False)
+        self._set_loading(True)
+        self.report_worker.run_now()
+
+    def _build_report_query(self):
+        """
+        Sessões do período com os totais de cada uma em uma única consulta,
+        lidos de 'caixa_totais' (mantida a cada venda/cancelamento/movimentação).
+        """
         date_start_str = self.date_start.date().toString("yyyy-MM-dd") + " 00:00:00"
         date_end_str = self.date_end.date().toString("yyyy-MM-dd") + " 23:59:59"
         empresa_id = self.empresa_combo.currentData()
         terminal_id = self.terminal_combo.currentData()
         operador_id = self.operador_combo.currentData()
         
-        conn = get_connection()
-        try:
-            cur = conn.cursor()
-            
-            # --- CORREÇÃO: Removido "AND cs.status = 'FECHADO'" ---
-            query = """
-                SELECT 
-                    cs.id, cs.data_abertura, cs.data_fechamento,
-                    t.nome_terminal, u.username,
-                    cs.valor_inicial, cs.diferenca,
-                    cs.status
-                FROM caixa_sessoes cs
-                JOIN terminais_pdv t ON cs.terminal_id = t.id
-                JOIN usuarios u ON cs.user_id = u.id
-                WHERE cs.data_abertura BETWEEN ? AND ?
-            """
-            params = [date_start_str, date_end_str]
-            
-            if empresa_id:
-                query += " AND t.empresa_id = ?"
-                params.append(empresa_id)
-            if terminal_id:
-                query += " AND cs.terminal_id = ?"
-                params.append(terminal_id)
-            if operador_id:
-                query += " AND cs.user_id = ?"
-                params.append(operador_id)
-                
-            query += " ORDER BY cs.data_abertura DESC"
-            
-            cur.execute(query, tuple(params))
-            sessoes = cur.fetchall()
+        query = SQL_SESSOES
+        params = [date_start_str, date_end_str]
+        
+        if empresa_id:
+            query += " AND t.empresa_id = ?"
+            params.append(empresa_id)
+        if terminal_id:
+            query += " AND cs.terminal_id = ?"
+            params.append(terminal_id)
+        if operador_id:
+            query += " AND cs.user_id = ?"
+            params.append(operador_id)
             
-            cur_vendas = conn.cursor()
-            cur_mov = conn.cursor()
+        query += " ORDER BY cs.data_abertura DESC"
+        # Guardada para a exportação refletir o que foi carregado na tela
+        self._ultima_consulta = (query, tuple(params))
+        return self._ultima_consulta
 
-            for sessao in sessoes:
-                caixa_id = sessao['id']
-                
-                # Total de Vendas na sessão (usando o total_final gravado)
-                cur_vendas.execute("SELECT SUM(total_final) as total_vendas FROM vendas WHERE caixa_id = ?", (caixa_id,))
-                vendas = cur_vendas.fetchone()
-                total_vendas = vendas['total_vendas'] if vendas and vendas['total_vendas'] else 0.0
-                
-                # Total de Movimentações (Sangria/Suprimento)
-                cur_mov.execute("SELECT tipo, SUM(valor) as total_tipo FROM caixa_movimentacoes WHERE caixa_id = ? GROUP BY tipo", (caixa_id,))
-                movs = cur_mov.fetchall()
-                total_movs = 0.0
-                for mov in movs:
-                    if mov['tipo'] == 'SUPRIMENTO':
-                        total_movs += mov['total_tipo']
-                    elif mov['tipo'] == 'SANGRIA':
-                        total_movs -= mov['total_tipo']
-                
-                row = self.report_table.rowCount()
-                self.report_table.insertRow(row)
-                
-                # --- CORREÇÃO: Exibe 'ABERTO' se o fechamento for nulo ---
-                data_fechamento = sessao['data_fechamento'] if sessao['data_fechamento'] else "(ABERTO)"
-                
-                self.report_table.setItem(row, 0, QTableWidgetItem(str(sessao['id'])))
-                self.report_table.setItem(row, 1, QTableWidgetItem(sessao['data_abertura']))
-                self.report_table.setItem(row, 2, QTableWidgetItem(data_fechamento))
-                self.report_table.setItem(row, 3, QTableWidgetItem(sessao['nome_terminal']))
-                self.report_table.setItem(row, 4, QTableWidgetItem(sessao['username']))
-                self.report_table.setItem(row, 5, QTableWidgetItem(f"R$ {sessao['valor_inicial']:.2f}"))
-                self.report_table.setItem(row, 6, QTableWidgetItem(f"R$ {total_vendas:.2f}"))
-                self.report_table.setItem(row, 7, QTableWidgetItem(f"R$ {total_movs:.2f}"))
-                
-                item_diferenca = QTableWidgetItem(f"R$ {sessao['diferenca'] or 0.0:.2f}")
-                if sessao['status'] == 'ABERTO':
-                    item_diferenca.setText("(Caixa Aberto)")
-                    item_diferenca.setForeground(QColor("gray"))
-                elif sessao['diferenca']:
-                    diferenca = sessao['diferenca']
-                    if diferenca > 0.01: 
-                        item_diferenca.setForeground(QColor("red")) # Falta
-                    elif diferenca < -0.01: 
-                        item_diferenca.setForeground(QColor("blue")) # Sobra
-                self.report_table.setItem(row, 8, item_diferenca)
-                # --- FIM DAS CORREÇÕES ---
+    def _append_rows(self, sessoes, primeiro_lote):
+        """Recebe um lote da consulta; a inserção na tabela é feita aos poucos."""
+        if primeiro_lote:
+            self.report_table.setRowCount(0)
+        self._fila_linhas.extend(sessoes)
+        if not self._timer_linhas.isActive():
+            self._timer_linhas.start()
+
+    def _drain_rows(self):
+        lote = self._fila_linhas[:self.LINHAS_POR_CICLO]
+        del self._fila_linhas[:self.LINHAS_POR_CICLO]
+        self._insert_rows(lote)
+        self.lbl_progresso.setText(f"Carregando... {self.report_table.rowCount()} sessões")
+        if not self._fila_linhas:
+            self._timer_linhas.stop()
+            if self._total_consulta is not None:
+                self._conclude_report()
+
+    def _insert_rows(self, sessoes):
+        inicio = self.report_table.rowCount()
+        self.report_table.setRowCount(inicio + len(sessoes))
+        for row, sessao in enumerate(sessoes, start=inicio):
+            # --- CORREÇÃO: Exibe 'ABERTO' se o fechamento for nulo ---
+            data_fechamento = sessao['data_fechamento'] if sessao['data_fechamento'] else "(ABERTO)"
             
-            count = self.report_table.rowCount()
-            if show_message:
-                QMessageBox.information(self, "Relatório", f"{count} sessões de caixa encontradas.")
+            self.report_table.setItem(row, 0, QTableWidgetItem(str(sessao['id'])))
+            self.report_table.setItem(row, 1, QTableWidgetItem(sessao['data_abertura']))
+            self.report_table.setItem(row, 2, QTableWidgetItem(data_fechamento))
+            self.report_table.setItem(row, 3, QTableWidgetItem(sessao['nome_terminal']))
+            self.report_table.setItem(row, 4, QTableWidgetItem(sessao['username']))
+            self.report_table.setItem(row, 5, QTableWidgetItem(f"R$ {sessao['valor_inicial']:.2f}"))
+            self.report_table.setItem(row, 6, QTableWidgetItem(f"R$ {sessao['total_vendas']:.2f}"))
+            self.report_table.setItem(row, 7, QTableWidgetItem(f"R$ {sessao['total_movs']:.2f}"))
             
-            if count > 0:
-                self.btn_export_pdf.setEnabled(True)
-                self.btn_export_xlsx.setEnabled(True)
-            else:
-                self.btn_export_pdf.setEnabled(False)
-                self.btn_export_xlsx.setEnabled(False)
-                
-        except Exception as e:
-            QMessageBox.critical(self, "Erro", f"Erro ao carregar relatório: {e}")
-        finally:
-            conn.close()
+            item_diferenca = QTableWidgetItem(f"R$ {sessao['diferenca'] or 0.0:.2f}")
+            if sessao['status'] == 'ABERTO':
+                item_diferenca.setText("(Caixa Aberto)")
+                item_diferenca.setForeground(QColor("gray"))
+            elif sessao['diferenca']:
+                diferenca = sessao['diferenca']
+                if diferenca > 0.01: 
+                    item_diferenca.setForeground(QColor("red")) # Falta
+                elif diferenca < -0.01: 
+                    item_diferenca.setForeground(QColor("blue")) # Sobra
+            self.report_table.setItem(row, 8, item_diferenca)
+
+    def _on_report_finished(self, count):
+        self._total_consulta = count
+        if not self._fila_linhas:
+            self._conclude_report()
+
+    def _conclude_report(self):
+        count = self._total_consulta
+        self._set_loading(False)
+        if count > 0:
+            self.btn_export_pdf.setEnabled(True)
+            self.btn_export_xlsx.setEnabled(True)
+        if self._show_message:
+            QMessageBox.information(self, "Relatório", f"{count} sessões de caixa encontradas.")
+
+    def _reset_queue(self):
+        self._timer_linhas.stop()
+        self._fila_linhas = []
+        self._total_consulta = None
+
+    def _on_report_failed(self, mensagem):
+        self._reset_queue()
+        self._set_loading(False)
+        QMessageBox.critical(self, "Erro", f"Erro ao carregar relatório: {mensagem}")
+
+    def _cancel_report(self):
+        self.report_worker.cancel()
+        self._reset_queue()
+        self._set_loading(False)
+        self.lbl_progresso.setText(f"Consulta cancelada ({self.report_table.rowCount()} sessões carregadas).")
+        self.lbl_progresso.setVisible(True)
+
+    def _set_loading(self, carregando):
+        # Ajuste de largura pelo conteúdo percorre todas as linhas: só ao final da carga
+        modo = QHeaderView.Interactive if carregando else QHeaderView.ResizeToContents
+        self.report_table.horizontalHeader().setSectionResizeMode(1, modo)
+        self.report_table.horizontalHeader().setSectionResizeMode(2, modo)
+        self.lbl_progresso.setText("Carregando..." if carregando else "")
+        self.lbl_progresso.setVisible(carregando)
+        self.progress_bar.setVisible(carregando)
+        self.btn_cancelar_consulta.setVisible(carregando)
+        self.btn_filtrar.setEnabled(not carregando)
 
     def _get_table_data(self):
         """Lê os dados e cabeçalhos da QTableWidget para exportação."""
@@ -306,7 +387,9 @@ class RelatorioVendasCaixa(QWidget):
             
     def _export_xlsx(self):
         try:
-            headers, data = self._get_table_data()
-            export_to_xlsx(headers, data, self)
+            # Exporta direto da consulta (em segundo plano), sem ler a tabela da tela
+            headers = [self.report_table.horizontalHeaderItem(j).text()
+                       for j in range(1, self.report_table.columnCount())]
+            export_query_to_xlsx(self._ultima_consulta, headers, self, "Vendas por Caixa", _linha_xlsx)
         except Exception as e:
             QMessageBox.critical(self, "Erro ao Exportar XLSX", f"Falha ao gerar Excel: {e}")
\ No newline at end of file
@@ -9,16 +9,40 @@ from PyQt5.QtWidgets import (
 from PyQt5.QtGui import QColor
 from PyQt5.QtCore import Qt, QDate
 from database.db import get_connection
-from .report_exporter import export_to_pdf, export_to_xlsx
+from .report_exporter import export_query_to_pdf, export_query_to_xlsx
+from . import sales_facts
+
+MODO_RESUMO, MODO_DETALHADO = 1, 2
+
+COLUNAS = {
+    MODO_RESUMO: ["Código", "Descrição", "Qtd.", "Vl. Bruto", "Descontos", "Vl. Total", "Linhas"],
+    MODO_DETALHADO: ["Data/Hora", "Nº Venda", "Código", "Descrição", "Qtd.", "Vl. Unit.", "Vl. Total"],
+}
+
+# Formato de cada coluna no PDF (o mesmo exibido na tabela)
+FORMATOS_PDF = {
+    MODO_RESUMO: [None, None, "{:.2f}", "R$ {:.2f}", "R$ {:.2f}", "R$ {:.2f}", None],
+    MODO_DETALHADO: [None, None, None, None, "{:.2f}", "R$ {:.2f}", "R$ {:.2f}"],
+}
+
+
+def _linha_resumo_xlsx(row):
+    """Descarta o produto_id (usado só no detalhamento)."""
+    return tuple(row)[:7]
+
 
 class RelatorioVendasProduto(QWidget):
     """
     Relatório de Vendas por Produto (Analítico de Itens).
+
+    O modo Resumo lê o fato diário 'vendas_diarias' (modules/sales_facts.py);
+    um duplo clique em um produto abre as vendas dele no modo Detalhado.
     """
     def __init__(self, user_id, **kwargs):
         super().__init__()
         self.user_id = user_id
         self.setWindowTitle("Relatório de Vendas por Produto")
+        self._detalhe_produto = None  # (produto_id, codigo) do duplo clique no resumo
         
         self._setup_styles()
         self._build_ui()
@@ -94,6 +118,12 @@ class RelatorioVendasProduto(QWidget):
         filter_layout.addWidget(QLabel("Empresa:"), 1, 0)
         self.empresa_combo = QComboBox()
         filter_layout.addWidget(self.empresa_combo, 1, 1, 1, 3) 
+
+        filter_layout.addWidget(QLabel("Visão:"), 1, 4)
+        self.modo_combo = QComboBox()
+        self.modo_combo.addItem("Resumo por produto", MODO_RESUMO)
+        self.modo_combo.addItem("Detalhado (itens vendidos)", MODO_DETALHADO)
+        filter_layout.addWidget(self.modo_combo, 1, 5)
         
         filter_layout.addWidget(QLabel("Terminal:"), 2, 0)
         self.terminal_combo = QComboBox()
@@ -126,13 +156,7 @@ class RelatorioVendasProduto(QWidget):
         main_layout.addWidget(filter_frame)
 
         self.report_table = QTableWidget()
-        self.report_table.setColumnCount(7)
-        self.report_table.setHorizontalHeaderLabels([
-            "Data/Hora", "Nº Venda", "Código", "Descrição", 
-            "Qtd.", "Vl. Unit.", "Vl. Total"
-        ])
-        self.report_table.horizontalHeader().setSectionResizeMode(3, QHeaderView.Stretch)
-        self.report_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeToContents)
+        self._set_columns(MODO_RESUMO)
         self.report_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.report_table.setSelectionBehavior(QAbstractItemView.SelectRows)
         
@@ -163,53 +187,139 @@ class RelatorioVendasProduto(QWidget):
     def _connect_signals(self):
         self.btn_filtrar.clicked.connect(lambda: self.load_report(show_message=True))
         self.produto_input.returnPressed.connect(lambda: self.load_report(show_message=True))
+        self.produto_input.textEdited.connect(self._clear_drill_down)
+        self.modo_combo.currentIndexChanged.connect(self._on_mode_changed)
+        self.report_table.itemDoubleClicked.connect(self._drill_down)
         
         self.btn_export_pdf.clicked.connect(self._export_pdf)
         self.btn_export_xlsx.clicked.connect(self._export_xlsx)
 
-    def load_report(self, show_message=False):
-        """Carrega os dados do relatório com base nos filtros."""
+    def _set_columns(self, modo):
         self.report_table.setRowCount(0)
-        
+        self.report_table.setColumnCount(len(COLUNAS[modo]))
+        self.report_table.setHorizontalHeaderLabels(COLUNAS[modo])
+        header = self.report_table.horizontalHeader()
+        for j in range(len(COLUNAS[modo])):
+            header.setSectionResizeMode(j, QHeaderView.Interactive)
+        coluna_descricao = COLUNAS[modo].index("Descrição")
+        header.setSectionResizeMode(coluna_descricao, QHeaderView.Stretch)
+        header.setSectionResizeMode(0, QHeaderView.ResizeToContents)
+
+    def _on_mode_changed(self):
+        self._set_columns(self.modo_combo.currentData())
+        self.btn_export_pdf.setEnabled(False)
+        self.btn_export_xlsx.setEnabled(False)
+
+    def _clear_drill_down(self):
+        self._detalhe_produto = None
+
+    def _drill_down(self, item):
+        """Duplo clique no resumo: abre os itens vendidos do produto no período."""
+        if self.modo_combo.currentData() != MODO_RESUMO:
+            return
+        produto_id, codigo = self.report_table.item(item.row(), 0).data(Qt.UserRole)
+        self.modo_combo.setCurrentIndex(self.modo_combo.findData(MODO_DETALHADO))
+        self.produto_input.setText(codigo)
+        self._detalhe_produto = (produto_id, codigo)
+        self.load_report()
+
+    def _build_summary_query(self):
+        return sales_facts.product_summary_query(
+            self.date_start.date().toString("yyyy-MM-dd"),
+            self.date_end.date().toString("yyyy-MM-dd"),
+            self.empresa_combo.currentData(),
+            self.terminal_combo.currentData(),
+            self.produto_input.text().strip(),
+        )
+
+    def _build_report_query(self):
+        """Monta (sql, params) do relatório detalhado a partir dos filtros."""
         date_start_str = self.date_start.date().toString("yyyy-MM-dd") + " 00:00:00"
         date_end_str = self.date_end.date().toString("yyyy-MM-dd") + " 23:59:59"
         empresa_id = self.empresa_combo.currentData()
         terminal_id = self.terminal_combo.currentData()
         produto_codigo = self.produto_input.text().strip()
         
+        # A query usa vendas_itens (histórico) que contém o código do SKU vendido.
+        query = """
+            SELECT 
+                v.data_venda, v.numero_venda_terminal,
+                vi.codigo_barras, vi.descricao,
+                vi.quantidade, vi.preco_unitario, vi.total_item
+            FROM vendas_itens vi
+            JOIN vendas v ON vi.venda_id = v.id
+            WHERE v.data_venda BETWEEN ? AND ?
+              AND v.status = 'FINALIZADA'
+        """
+        params = [date_start_str, date_end_str]
+        
+        if empresa_id:
+            query += " AND v.empresa_id = ?"
+            params.append(empresa_id)
+        if terminal_id:
+            query += " AND v.terminal_id = ?"
+            params.append(terminal_id)
+            
+        if self._detalhe_produto:
+            # Detalhamento de uma linha do resumo: produto e código exatos
+            query += " AND COALESCE(vi.produto_id, 0) = ? AND vi.codigo_barras = ?"
+            params.extend(self._detalhe_produto)
+        # --- CORREÇÃO: Filtro de Código (ignora case, busca LIKE) ---
+        elif produto_codigo:
+            # Busca por código de barras (EAN) ou código interno (SKU)
+            query += " AND vi.codigo_barras LIKE ?"
+            params.append(f"%{produto_codigo}%")
+            
+        query += " ORDER BY v.data_venda DESC, v.numero_venda_terminal DESC"
+        return query, tuple(params)
+
+    def load_report(self, show_message=False):
+        """Carrega os dados do relatório com base nos filtros."""
+        self.report_table.setRowCount(0)
+        self._modo_consulta = self.modo_combo.currentData()
+        if self._modo_consulta == MODO_RESUMO:
+            self._load_summary(show_message)
+        else:
+            self._load_detail(show_message)
+
+    def _load_summary(self, show_message):
+        self._ultima_consulta = self._build_summary_query()
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute(*self._ultima_consulta)
+            produtos = cur.fetchall()
+
+            if show_message:
+                QMessageBox.information(self, "Relatório", f"{len(produtos)} produtos encontrados.")
+
+            self.report_table.setRowCount(len(produtos))
+            for row, p in enumerate(produtos):
+                item_codigo = QTableWidgetItem(p['codigo_barras'])
+                item_codigo.setData(Qt.UserRole, (p['produto_id'], p['codigo_barras']))
+                self.report_table.setItem(row, 0, item_codigo)
+                self.report_table.setItem(row, 1, QTableWidgetItem(p['descricao']))
+                self.report_table.setItem(row, 2, QTableWidgetItem(f"{p['quantidade']:.2f}"))
+                self.report_table.setItem(row, 3, QTableWidgetItem(f"R$ {p['total_bruto']:.2f}"))
+                self.report_table.setItem(row, 4, QTableWidgetItem(f"R$ {p['total_descontos']:.2f}"))
+                self.report_table.setItem(row, 5, QTableWidgetItem(f"R$ {p['total_liquido']:.2f}"))
+                self.report_table.setItem(row, 6, QTableWidgetItem(str(p['linhas'])))
+
+            self.btn_export_pdf.setEnabled(bool(produtos))
+            self.btn_export_xlsx.setEnabled(bool(produtos))
+
+        except Exception as e:
+            QMessageBox.critical(self, "Erro", f"Erro ao carregar resumo de produtos: {e}")
+        finally:
+            conn.close()
+
+    def _load_detail(self, show_message):
+        self._ultima_consulta = self._build_report_query()
+        
         conn = get_connection()
         try:
             cur = conn.cursor()
-            
-            # A query usa vendas_itens (histórico) que contém o código do SKU vendido.
-            query = """
-                SELECT 
-                    v.data_venda, v.numero_venda_terminal,
-                    vi.codigo_barras, vi.descricao,
-                    vi.quantidade, vi.preco_unitario, vi.total_item
-                FROM vendas_itens vi
-                JOIN vendas v ON vi.venda_id = v.id
-                WHERE v.data_venda BETWEEN ? AND ?
-                  AND v.status = 'FINALIZADA'
-            """
-            params = [date_start_str, date_end_str]
-            
-            if empresa_id:
-                query += " AND v.empresa_id = ?"
-                params.append(empresa_id)
-            if terminal_id:
-                query += " AND v.terminal_id = ?"
-                params.append(terminal_id)
-                
-            # --- CORREÇÃO: Filtro de Código (ignora case, busca LIKE) ---
-            if produto_codigo:
-                # Busca por código de barras (EAN) ou código interno (SKU)
-                query += " AND vi.codigo_barras LIKE ?"
-                params.append(f"%{produto_codigo}%")
-                
-            query += " ORDER BY v.data_venda DESC, v.numero_venda_terminal DESC"
-            
-            cur.execute(query, tuple(params))
+            cur.execute(*self._ultima_consulta)
             itens = cur.fetchall()
 
             count = len(itens)
@@ -240,32 +350,24 @@ class RelatorioVendasProduto(QWidget):
         finally:
             conn.close()
 
-    def _get_table_data(self):
-        """Lê os dados e cabeçalhos da QTableWidget para exportação."""
-        headers = []
-        for j in range(self.report_table.columnCount()):
-            headers.append(self.report_table.horizontalHeaderItem(j).text())
-        
-        data = []
-        for i in range(self.report_table.rowCount()):
-            row_data = []
-            for j in range(self.report_table.columnCount()):
-                item = self.report_table.item(i, j)
-                row_data.append(item.text() if item else "")
-            data.append(row_data)
-        return headers, data
+    def _get_headers(self):
+        """Cabeçalhos da tabela (a exportação lê as linhas direto da consulta)."""
+        return [self.report_table.horizontalHeaderItem(j).text()
+                for j in range(self.report_table.columnCount())]
 
     def _export_pdf(self):
         try:
-            headers, data = self._get_table_data()
+            # Gerado em outro processo, direto da consulta (mesmo formato da tabela)
+            headers = self._get_headers()
             title = "Relatório de Vendas por Produto"
-            export_to_pdf(headers, data, title, self)
+            export_query_to_pdf(self._ultima_consulta, headers, title, self, FORMATOS_PDF[self._modo_consulta])
         except Exception as e:
             QMessageBox.critical(self, "Erro ao Exportar PDF", f"Falha ao gerar PDF: {e}")
             
     def _export_xlsx(self):
         try:
-            headers, data = self._get_table_data()
-            export_to_xlsx(headers, data, self)
+            # Exporta direto da consulta (em segundo plano), sem ler a tabela da tela
+            formatar = _linha_resumo_xlsx if self._modo_consulta == MODO_RESUMO else None
+            export_query_to_xlsx(self._ultima_consulta, self._get_headers(), self, "Vendas por Produto", formatar)
         except Exception as e:
             QMessageBox.critical(self, "Erro ao Exportar XLSX", f"Falha ao gerar Excel: {e}")
\ No newline at end of file
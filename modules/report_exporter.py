@@ -1,20 +1,209 @@
 # modules/report_exporter.py
+import os
+import logging
+import itertools
+import threading
 import openpyxl
 from openpyxl.styles import Font, Alignment
-from PyQt5.QtWidgets import QFileDialog, QMessageBox
-from reportlab.lib.pagesizes import A4, landscape
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.units import inch
-from reportlab.lib import colors
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
+from PyQt5.QtCore import Qt, QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+from PyQt5.QtWidgets import QFileDialog, QMessageBox, QProgressDialog
 from datetime import datetime
+from database.db import get_connection, DB_PATH
+from .pdf_report import PdfRenderProcess
 
-# --- 1. IMPORTAÇÕES FALTANTES ---
-from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
-# --- FIM DA CORREÇÃO ---
+logger = logging.getLogger(__name__)
 
 # --- 1. EXPORTADOR XLSX (EXCEL) ---
 
+AMOSTRA_LARGURAS = 1000  # linhas usadas para estimar a largura das colunas
+LARGURA_MAXIMA = 60
+LOTE_CURSOR = 2000       # linhas por fetchmany
+PROGRESSO_CADA = 5000    # linhas entre avisos de progresso
+VERIFICA_CANCELAR = 500  # linhas entre verificações de cancelamento
+
+
+class ExportacaoCancelada(Exception):
+    """Exportação interrompida pelo usuário."""
+
+
+def write_xlsx(path, headers, rows, titulo="Relatório", progresso=None, cancelado=None):
+    """
+    Grava 'rows' (qualquer iterável de sequências) em um .xlsx no modo
+    write-only do openpyxl: cada linha vai direto para o arquivo, sem
+    montar a planilha em memória. Nesse modo as larguras das colunas
+    precisam ser definidas antes da primeira linha, por isso são
+    estimadas pelas primeiras AMOSTRA_LARGURAS linhas.
+
+    progresso(total) é chamado a cada PROGRESSO_CADA linhas; se
+    cancelado() retornar True, levanta ExportacaoCancelada. O arquivo é
+    gravado em 'path.tmp' e só substitui 'path' ao final.
+    Retorna o total de linhas de dados.
+    """
+    rows = iter(rows)
+    amostra = list(itertools.islice(rows, AMOSTRA_LARGURAS))
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet(titulo[:31])  # limite do Excel para nome de aba
+
+    larguras = [len(str(h)) for h in headers]
+    for row in amostra:
+        for i, valor in enumerate(row[:len(larguras)]):
+            if valor is not None:
+                larguras[i] = max(larguras[i], len(str(valor)))
+    for i, largura in enumerate(larguras):
+        # +5 para dar um respiro
+        ws.column_dimensions[get_column_letter(i + 1)].width = min(largura + 5, LARGURA_MAXIMA)
+
+    # Define o estilo do Cabeçalho
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = openpyxl.styles.PatternFill(start_color="0078D7", end_color="0078D7", fill_type="solid")
+    header_align = Alignment(horizontal="center", vertical="center")
+    cabecalho = []
+    for h in headers:
+        cell = WriteOnlyCell(ws, value=h)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_align
+        cabecalho.append(cell)
+    ws.append(cabecalho)
+
+    tmp_path = path + ".tmp"
+    total = 0
+    try:
+        for row in itertools.chain(amostra, rows):
+            ws.append(row)
+            total += 1
+            if cancelado and total % VERIFICA_CANCELAR == 0 and cancelado():
+                raise ExportacaoCancelada()
+            if progresso and total % PROGRESSO_CADA == 0:
+                progresso(total)
+        wb.save(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if not ws.closed:
+            ws.close()  # encerra a gravação incremental (arquivo temporário do openpyxl)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if progresso:
+        progresso(total)
+    return total
+
+
+def iter_query(sql, params=(), formatar=None, cancelado=None):
+    """
+    Gera as linhas de uma consulta lendo o cursor em lotes (fetchmany),
+    sem carregar o resultado inteiro. 'formatar(row)' converte cada linha
+    na sequência de valores das colunas exportadas (padrão: tuple(row)).
+    Com 'cancelado', a consulta em andamento é interrompida no SQLite.
+    """
+    formatar = formatar or tuple
+    conn = get_connection()
+    try:
+        if cancelado:
+            # Retorno != 0 interrompe a instrução em andamento
+            conn.set_progress_handler(lambda: 1 if cancelado() else 0, 1000)
+        cur = conn.execute(sql, params)
+        while True:
+            lote = cur.fetchmany(LOTE_CURSOR)
+            if not lote:
+                break
+            for row in lote:
+                yield formatar(row)
+    finally:
+        conn.set_progress_handler(None, 0)
+        conn.close()
+
+
+class _ExportSignals(QObject):
+    progress = pyqtSignal(int)
+    finished = pyqtSignal(int)
+    cancelled = pyqtSignal()
+    error = pyqtSignal(str)
+
+
+class _XlsxQueryTask(QRunnable):
+    """Executa a consulta e grava o .xlsx em uma thread do pool."""
+
+    def __init__(self, signals, path, headers, sql, params, formatar, titulo):
+        super().__init__()
+        self.signals = signals
+        self.path = path
+        self.headers = headers
+        self.sql = sql
+        self.params = params
+        self.formatar = formatar
+        self.titulo = titulo
+        self.cancelar = threading.Event()
+
+    def run(self):
+        try:
+            rows = iter_query(self.sql, self.params, self.formatar, self.cancelar.is_set)
+            total = write_xlsx(self.path, self.headers, rows, self.titulo,
+                               progresso=self.signals.progress.emit, cancelado=self.cancelar.is_set)
+            self.signals.finished.emit(total)
+        except Exception as e:
+            # "interrupted" do SQLite também indica cancelamento
+            if self.cancelar.is_set():
+                self.signals.cancelled.emit()
+            else:
+                logger.error(f"Erro ao exportar XLSX: {e}", exc_info=True)
+                self.signals.error.emit(str(e))
+
+
+def export_query_to_xlsx(query, headers, parent_widget, titulo="Relatório", formatar=None):
+    """
+    Exporta para Excel o resultado de uma consulta, lido direto do cursor
+    em segundo plano (não depende das linhas carregadas na tela).
+    'query' é (sql, params); 'formatar' segue iter_query.
+    """
+    default_name = f"Relatorio_Vendas_{datetime.now():%Y%m%d}.xlsx"
+    save_path, _ = QFileDialog.getSaveFileName(
+        parent_widget,
+        "Salvar Relatório Excel",
+        default_name,
+        "Excel Files (*.xlsx)"
+    )
+
+    if not save_path:
+        return # Usuário cancelou
+
+    dialog = QProgressDialog("Exportando...", "Cancelar", 0, 0, parent_widget)
+    dialog.setWindowTitle("Exportar XLSX")
+    dialog.setWindowModality(Qt.WindowModal)
+    dialog.setMinimumDuration(0)
+
+    sql, params = query
+    signals = _ExportSignals(dialog)
+    task = _XlsxQueryTask(signals, save_path, headers, sql, params, formatar, titulo)
+
+    def _concluir():
+        dialog.canceled.disconnect(task.cancelar.set)
+        dialog.reset()
+        dialog.deleteLater()
+
+    def _on_finished(total):
+        _concluir()
+        QMessageBox.information(parent_widget, "Sucesso", f"{total} linhas salvas com sucesso em:\n{save_path}")
+
+    def _on_cancelled():
+        _concluir()
+        QMessageBox.information(parent_widget, "Exportar XLSX", "Exportação cancelada.")
+
+    def _on_error(mensagem):
+        _concluir()
+        QMessageBox.critical(parent_widget, "Erro ao Exportar XLSX", f"Falha ao gerar Excel: {mensagem}")
+
+    dialog.canceled.connect(task.cancelar.set)
+    signals.progress.connect(lambda total: dialog.setLabelText(f"Exportando... {total} linhas"))
+    signals.finished.connect(_on_finished)
+    signals.cancelled.connect(_on_cancelled)
+    signals.error.connect(_on_error)
+    QThreadPool.globalInstance().start(task)
+
+
 def export_to_xlsx(headers, data, parent_widget):
     """
     Exporta os dados da tabela para um arquivo Excel (.xlsx).
@@ -32,33 +221,7 @@ def export_to_xlsx(headers, data, parent_widget):
         if not save_path:
             return # Usuário cancelou
 
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Relatório de Vendas"
-        
-        # Define o estilo do Cabeçalho
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = openpyxl.styles.PatternFill(start_color="0078D7", end_color="0078D7", fill_type="solid")
-        header_align = Alignment(horizontal="center", vertical="center")
-        
-        # Escreve os Cabeçalhos
-        ws.append(headers)
-        for cell in ws[1]: # Itera sobre a linha 1
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = header_align
-            
-        # Escreve os Dados
-        for row in data:
-            ws.append(row)
-            
-        # Ajusta a largura das colunas
-        for i, column_cells in enumerate(ws.columns):
-            # +5 para dar um respiro
-            length = max(len(str(cell.value) or "") for cell in column_cells) + 5
-            ws.column_dimensions[openpyxl.utils.get_column_letter(i + 1)].width = length
-
-        wb.save(save_path)
+        write_xlsx(save_path, headers, data, "Relatório de Vendas")
         QMessageBox.information(parent_widget, "Sucesso", f"Relatório salvo com sucesso em:\n{save_path}")
 
     except Exception as e:
@@ -66,70 +229,97 @@ def export_to_xlsx(headers, data, parent_widget):
 
 # --- 2. EXPORTADOR PDF (A4) ---
 
-def export_to_pdf(headers, data, title, parent_widget):
+INTERVALO_POLL_PDF = 100  # ms entre leituras do progresso do processo de geração
+
+
+def _pedir_caminho_pdf(parent_widget):
+    default_name = f"Relatorio_Vendas_{datetime.now():%Y%m%d}.pdf"
+    save_path, _ = QFileDialog.getSaveFileName(
+        parent_widget, 
+        "Salvar Relatório PDF", 
+        default_name, 
+        "PDF Files (*.pdf)"
+    )
+    return save_path
+
+
+def _run_pdf_process(save_path, headers, fonte, title, orientation, parent_widget):
     """
-    Exporta os dados da tabela para um PDF A4 "bonito" em modo paisagem.
+    Gera o PDF em outro processo (modules.pdf_report), acompanhando o
+    progresso em um QProgressDialog com opção de cancelar.
+    """
+    processo = PdfRenderProcess(save_path, headers, fonte, title, orientation)
+
+    dialog = QProgressDialog("Gerando PDF...", "Cancelar", 0, 0, parent_widget)
+    dialog.setWindowTitle("Exportar PDF")
+    dialog.setWindowModality(Qt.WindowModal)
+    dialog.setMinimumDuration(0)
+    timer = QTimer(dialog)
+    timer.setInterval(INTERVALO_POLL_PDF)
+
+    def _concluir():
+        timer.stop()
+        dialog.canceled.disconnect(processo.cancel)
+        dialog.reset()
+        dialog.deleteLater()
+        processo.join(5)
+
+    def _poll():
+        for mensagem in processo.poll():
+            tipo = mensagem[0]
+            if tipo == "progresso":
+                _, linhas, paginas = mensagem
+                dialog.setLabelText(f"Gerando PDF... {linhas} linhas, {paginas} páginas")
+            elif tipo == "concluido":
+                _concluir()
+                QMessageBox.information(parent_widget, "Sucesso", f"Relatório salvo com sucesso em:\n{save_path}")
+                return
+            elif tipo == "cancelado":
+                _concluir()
+                QMessageBox.information(parent_widget, "Exportar PDF", "Exportação cancelada.")
+                return
+            else:
+                _concluir()
+                logger.error(f"Erro ao gerar PDF: {mensagem[1]}")
+                QMessageBox.critical(parent_widget, "Erro ao Exportar PDF", f"Falha ao gerar PDF: {mensagem[1]}")
+                return
+
+    dialog.canceled.connect(processo.cancel)
+    timer.timeout.connect(_poll)
+    processo.start()
+    timer.start()
+
+
+def export_to_pdf(headers, data, title, parent_widget, orientation='landscape'):
+    """
+    Exporta os dados da tabela para um PDF A4 "bonito" (paisagem por
+    padrão), gerado em outro processo.
     """
     try:
-        default_name = f"Relatorio_Vendas_{datetime.now():%Y%m%d}.pdf"
-        save_path, _ = QFileDialog.getSaveFileName(
-            parent_widget, 
-            "Salvar Relatório PDF", 
-            default_name, 
-            "PDF Files (*.pdf)"
-        )
-        
+        save_path = _pedir_caminho_pdf(parent_widget)
         if not save_path:
             return
 
-        # Configura o documento A4 em modo Paisagem (landscape)
-        doc = SimpleDocTemplate(save_path, pagesize=landscape(A4),
-                                rightMargin=inch/2, leftMargin=inch/2,
-                                topMargin=inch/2, bottomMargin=inch/2)
-        
-        story = []
-        styles = getSampleStyleSheet()
-        
-        # Título
-        style_title = styles['h1']
-        style_title.alignment = TA_CENTER # <-- Agora funciona
-        story.append(Paragraph(title, style_title))
-        
-        # Data
-        style_normal = styles['Normal']
-        style_normal.alignment = TA_CENTER # <-- Agora funciona
-        story.append(Paragraph(f"Gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}", style_normal))
+        _run_pdf_process(save_path, headers, ("linhas", data), title, orientation, parent_widget)
 
-        # Adiciona um espaço
-        story.append(Paragraph("<br/><br/>", style_normal))
-        
-        # Prepara dados para a tabela (Cabeçalho + dados)
-        table_data = [headers] + data
-        
-        # Cria a Tabela
-        t = Table(table_data, repeatRows=1) # Repete o cabeçalho em novas páginas
-        
-        # Estilo da Tabela
-        style_table = TableStyle([
-            ('BACKGROUND', (0,0), (-1,0), colors.HexColor("#0078D7")), # Cor do cabeçalho
-            ('TEXTCOLOR', (0,0), (-1,0), colors.whitesmoke),
-            ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0,0), (-1,0), 12),
-            
-            ('FONTNAME', (0,1), (-1,-1), 'Helvetica'),
-            ('FONTSIZE', (0,1), (-1,-1), 9),
-            ('BOX', (0,0), (-1,-1), 0.25, colors.black),
-            ('GRID', (0,0), (-1,-1), 0.25, colors.black),
-            ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
-        ])
-        t.setStyle(style_table)
-        
-        story.append(t)
-        
-        # Constrói o PDF
-        doc.build(story)
-        QMessageBox.information(parent_widget, "Sucesso", f"Relatório salvo com sucesso em:\n{save_path}")
+    except Exception as e:
+        QMessageBox.critical(parent_widget, "Erro ao Exportar PDF", f"Falha ao gerar PDF: {e}")
+
+
+def export_query_to_pdf(query, headers, title, parent_widget, formatos=None, orientation='landscape'):
+    """
+    Exporta para PDF o resultado de uma consulta (sql, params), lido
+    direto do banco pelo processo de geração. 'formatos': um formato
+    por coluna (ver pdf_report.iter_query_rows).
+    """
+    try:
+        save_path = _pedir_caminho_pdf(parent_widget)
+        if not save_path:
+            return
+
+        sql, params = query
+        fonte = ("consulta", DB_PATH, sql, tuple(params), formatos)
+        _run_pdf_process(save_path, headers, fonte, title, orientation, parent_widget)
 
     except Exception as e:
-        QMessageBox.critical(parent_widget, "Erro ao Exportar PDF", f"Falha ao gerar PDF: {e}")
\ No newline at end of file
+        QMessageBox.critical(parent_widget, "Erro ao Exportar PDF", f"Falha ao gerar PDF: {e}")
@@ -0,0 +1,396 @@
+# modules/sale_journal.py
+"""
+Gravação assíncrona (write-behind) das vendas do PDV.
+
+Com a opção 'gravacao_assincrona' do terminal ativa, a venda finalizada
+é anexada a um diário local (JSON por linha, com fsync) e o caixa segue
+imediatamente; uma thread de gravação descarrega o diário no banco em
+transações em lote. Na abertura do PDV, entradas que não chegaram ao
+banco são reaplicadas (replay_journal); se a reaplicação falhar, o PDV
+não abre. A coluna única vendas.journal_id torna a reaplicação
+idempotente. Só saem do diário as linhas cujo journal_id já está em
+'vendas' (ou que foram separadas como rejeitadas): o arquivo nunca é
+descartado inteiro.
+
+A numeração vem do bloco reservado pelo terminal
+(modules/sequence_service.py), que já avançou o contador
+terminais_pdv.numero_nfe_atual; o número só é consumido depois de
+gravado no diário. O banco ainda avança o contador (MAX), nunca o
+recua, para diários gravados antes da numeração por blocos.
+
+Verificação da recuperação (banco e diário temporários; não toca nos
+dados da loja): queda antes da gravação, reaplicação com o banco
+inacessível, reaplicação idempotente, linhas de outra execução mantidas
+pelo gravador e venda rejeitada:
+    python -m modules.sale_journal --check
+"""
+import os
+import sys
+import json
+import uuid
+import queue
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from database.db import get_connection, use_database, create_tables
+from . import sale_persistence
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "journal")
+JOURNAL_FILE = os.path.join(JOURNAL_DIR, "vendas_pendentes.jsonl")
+REJECTED_FILE = os.path.join(JOURNAL_DIR, "vendas_rejeitadas.jsonl")
+
+LOTE_MAXIMO = 50  # vendas por transação do gravador
+LOTE_IN = 500     # journal_ids por consulta de conferência
+
+
+def _append_fsync(path, linha):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(linha + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _write_entries(cur, entradas):
+    """Grava as entradas na transação aberta, ignorando as já gravadas."""
+    for entrada in entradas:
+        cur.execute("SELECT 1 FROM vendas WHERE journal_id = ?", (entrada['journal_id'],))
+        if cur.fetchone():
+            continue
+        sale_persistence.insert_sale(
+            cur, tuple(entrada['venda']), entrada['itens'], entrada['pagamentos'],
+            entrada['deposito_id'], data_venda=entrada['data_venda'], journal_id=entrada['journal_id']
+        )
+        cur.execute(
+            "UPDATE terminais_pdv SET numero_nfe_atual = MAX(COALESCE(numero_nfe_atual, 0), ?) WHERE id = ?",
+            (entrada['numero'], entrada['terminal_id'])
+        )
+
+
+def _persist(entradas):
+    """
+    Grava um lote em uma única transação. Se o lote falhar, grava uma a
+    uma e separa em REJECTED_FILE as que o banco recusar. Erros
+    transitórios (banco ocupado/inacessível) sobem para nova tentativa.
+    Retorna os journal_ids rejeitados.
+    """
+    rejeitados = set()
+    conn = get_connection()
+    try:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            _write_entries(conn.cursor(), entradas)
+            conn.commit()
+            return rejeitados
+        except Exception as e:
+            conn.rollback()
+            if _is_transient(e):
+                raise
+            logger.warning(f"Lote de {len(entradas)} venda(s) do diário falhou ({e}); gravando individualmente.")
+
+        for entrada in entradas:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                _write_entries(conn.cursor(), [entrada])
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                if _is_transient(e):
+                    raise
+                logger.critical(f"Venda N° {entrada['numero']} do diário rejeitada pelo banco: {e}", exc_info=True)
+                _append_fsync(REJECTED_FILE, json.dumps(entrada, default=str))
+                rejeitados.add(entrada['journal_id'])
+        return rejeitados
+    finally:
+        conn.close()
+
+
+def _is_transient(erro):
+    """Banco ocupado/indisponível: tentar de novo mais tarde em vez de rejeitar."""
+    msg = str(erro).lower()
+    return "locked" in msg or "busy" in msg or "unable to open" in msg or "disk i/o" in msg
+
+
+def _read_journal():
+    """Entradas do diário, na ordem: [(entrada, linha)]."""
+    if not os.path.exists(JOURNAL_FILE):
+        return []
+    entradas = []
+    with open(JOURNAL_FILE, "r", encoding="utf-8") as f:
+        for linha in f:
+            linha = linha.strip()
+            if not linha:
+                continue
+            try:
+                entradas.append((json.loads(linha), linha))
+            except json.JSONDecodeError:
+                # Última linha truncada por uma queda durante a escrita: a
+                # venda não foi confirmada ao operador.
+                logger.error("Linha inválida no diário de vendas ignorada.")
+    return entradas
+
+
+def has_pending_entries():
+    """True se o diário ainda tem vendas (gravadas ou não no banco)."""
+    return bool(_read_journal())
+
+
+def _discard_confirmed(rejeitados=()):
+    """
+    Retira do diário as vendas cujo journal_id já está em 'vendas' e as
+    separadas em REJECTED_FILE ('rejeitados'); remove o arquivo se não
+    sobrar nenhuma. Retorna o número de vendas que continuam no diário.
+    """
+    entradas = _read_journal()
+    confirmados = set(rejeitados)
+    ids = [e['journal_id'] for e, _ in entradas if e['journal_id'] not in confirmados]
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        for inicio in range(0, len(ids), LOTE_IN):
+            lote = ids[inicio:inicio + LOTE_IN]
+            cur.execute(f"SELECT journal_id FROM vendas WHERE journal_id IN ({', '.join('?' for _ in lote)})", lote)
+            confirmados.update(row[0] for row in cur.fetchall())
+    finally:
+        conn.close()
+
+    restantes = [linha for e, linha in entradas if e['journal_id'] not in confirmados]
+    if not restantes:
+        try:
+            os.remove(JOURNAL_FILE)
+        except FileNotFoundError:
+            pass
+        return 0
+    temporario = JOURNAL_FILE + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        f.write("\n".join(restantes) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporario, JOURNAL_FILE)
+    return len(restantes)
+
+
+def replay_journal():
+    """
+    Reaplica no banco as vendas do diário que ainda não foram gravadas
+    (queda do PDV ou do gravador). Chamado antes de ler o terminal, para
+    que a numeração do terminal seja retomada a partir de todas as vendas
+    emitidas. Falhas sobem para o chamador, e as vendas continuam no diário.
+    """
+    entradas = [e for e, _ in _read_journal()]
+    if not entradas:
+        _discard_confirmed()
+        return 0
+    rejeitados = _persist(entradas)
+    restantes = _discard_confirmed(rejeitados)
+    if restantes:
+        raise RuntimeError(f"{restantes} venda(s) do diário não confirmada(s) no banco.")
+    logger.warning(f"Diário de vendas: {len(entradas)} venda(s) pendente(s) processada(s).")
+    return len(entradas)
+
+
+def _new_entry(venda, cart_items, pagamentos, deposito_id, terminal_id, numero):
+    return {
+        "journal_id": uuid.uuid4().hex,
+        "venda": list(venda),
+        "itens": cart_items,
+        "pagamentos": pagamentos,
+        "deposito_id": deposito_id,
+        "terminal_id": terminal_id,
+        "numero": numero,
+        # Mesmo formato/fuso do CURRENT_TIMESTAMP do SQLite
+        "data_venda": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+class SaleJournal:
+    """Diário local + thread de gravação em lote (uma instância por PDV)."""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pendentes = 0
+        self._rejeitados = set()
+        self._thread = threading.Thread(target=self._writer_loop, name="SaleJournalWriter", daemon=True)
+        self._thread.start()
+
+    def submit(self, venda, cart_items, pagamentos, deposito_id, terminal_id, numero):
+        """
+        Registra a venda no diário (fsync) e agenda a gravação no banco.
+        Retorna o journal_id. Exceções de E/S sobem para o chamador: a
+        venda não foi registrada e o número não deve ser consumido.
+        """
+        entrada = _new_entry(venda, cart_items, pagamentos, deposito_id, terminal_id, numero)
+        linha = json.dumps(entrada, default=str)
+        with self._lock:
+            _append_fsync(JOURNAL_FILE, linha)
+            self._pendentes += 1
+        self._queue.put(entrada)
+        return entrada['journal_id']
+
+    def flush(self, timeout=30.0):
+        """Aguarda até todas as vendas do diário estarem no banco."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pendentes == 0, timeout)
+
+    @property
+    def pendentes(self):
+        return self._pendentes
+
+    def _writer_loop(self):
+        while True:
+            lote = [self._queue.get()]
+            while len(lote) < LOTE_MAXIMO:
+                try:
+                    lote.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            while True:
+                try:
+                    rejeitados = _persist(lote)
+                    break
+                except Exception as e:
+                    # Banco indisponível: as vendas seguem no diário; tenta de novo
+                    logger.error(f"Gravador de vendas: falha ao gravar lote ({e}). Nova tentativa em 2s.")
+                    threading.Event().wait(2.0)
+
+            with self._idle:
+                self._pendentes -= len(lote)
+                self._rejeitados.update(rejeitados)
+                if self._pendentes == 0:
+                    # Fila vazia: retira do diário só o que está confirmado no banco
+                    # (o lock impede novas linhas durante a reescrita)
+                    try:
+                        _discard_confirmed(self._rejeitados)
+                        self._rejeitados.clear()
+                    except Exception as e:
+                        logger.error(f"Gravador de vendas: diário mantido, conferência falhou ({e}).")
+                    self._idle.notify_all()
+
+
+# --- VERIFICAÇÃO ---
+
+@contextmanager
+def _journal_in(pasta):
+    """Diário e rejeitadas em 'pasta' dentro do bloco."""
+    global JOURNAL_DIR, JOURNAL_FILE, REJECTED_FILE
+    anteriores = JOURNAL_DIR, JOURNAL_FILE, REJECTED_FILE
+    JOURNAL_DIR = pasta
+    JOURNAL_FILE = os.path.join(pasta, "vendas_pendentes.jsonl")
+    REJECTED_FILE = os.path.join(pasta, "vendas_rejeitadas.jsonl")
+    try:
+        yield
+    finally:
+        JOURNAL_DIR, JOURNAL_FILE, REJECTED_FILE = anteriores
+
+
+def check_crash_recovery():
+    """
+    Simula quedas do PDV e do banco num banco e num diário temporários e
+    confere as garantias do diário. Retorna {"success", "falhas": [descrição]}.
+    """
+    from .sequence_service import TerminalSequence, pending_gaps, create_check_terminal
+
+    falhas = []
+
+    def conferir(condicao, descricao):
+        if not condicao:
+            falhas.append(descricao)
+
+    def vendas():
+        conn = get_connection()
+        try:
+            return {row['journal_id']: row['numero_venda_terminal'] for row in
+                    conn.execute("SELECT journal_id, numero_venda_terminal FROM vendas WHERE journal_id IS NOT NULL")}
+        finally:
+            conn.close()
+
+    with tempfile.TemporaryDirectory() as pasta, use_database(os.path.join(pasta, "verificacao.db")), _journal_in(pasta):
+        create_tables()
+        conn = get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            t = create_check_terminal(conn.cursor())
+            conn.commit()
+        finally:
+            conn.close()
+        itens = [{"produto_id": t["produto_id"], "codigo_barras": "1", "descricao": "Produto", "quantidade": 1.0,
+                  "preco_unitario": 2.5, "desconto_item": 0.0}]
+        pagamentos = [{"forma": "Dinheiro", "valor": 2.5}]
+
+        def entrada(numero):
+            venda = (t["user_id"], None, t["caixa_id"], t["empresa_id"], t["local_id"], t["terminal_id"], numero,
+                     2.5, 0.0, 0.0, 2.5, 2.5, 0.0, "FISCAL")
+            return _new_entry(venda, itens, pagamentos, t["deposito_id"], t["terminal_id"], numero)
+
+        # Queda antes do gravador: vendas 1-3 só no diário (a 2 já gravada no
+        # banco, queda antes da limpeza) e a última linha truncada
+        diario = [entrada(n) for n in (1, 2, 3)]
+        for e in diario:
+            _append_fsync(JOURNAL_FILE, json.dumps(e))
+        _persist([diario[1]])
+        with open(JOURNAL_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entrada(4))[:40])
+
+        # Reaplicação com o banco inacessível: falha e o diário fica intacto
+        with use_database(os.path.join(pasta, "inacessivel", "banco.db")):
+            try:
+                replay_journal()
+                conferir(False, "reaplicação com o banco inacessível não falhou")
+            except Exception:
+                pass
+        conferir(len(_read_journal()) == 3, "diário alterado pela reaplicação que falhou")
+        conferir(list(vendas()) == [diario[1]["journal_id"]], "vendas gravadas pela reaplicação que falhou")
+
+        # Reaplicação: cada venda uma única vez, diário vazio, numeração seguindo
+        replay_journal()
+        conferir(vendas() == {e["journal_id"]: e["numero"] for e in diario}, "reaplicação não gravou cada venda uma vez")
+        conferir(not os.path.exists(JOURNAL_FILE), "diário não removido depois da reaplicação")
+        replay_journal()
+        conferir(len(vendas()) == 3, "segunda reaplicação duplicou vendas")
+        numeracao = TerminalSequence(t["terminal_id"])
+        conferir(numeracao.peek() == 4, "numeração não seguiu a maior venda reaplicada")
+        conn = get_connection()
+        try:
+            conferir(not pending_gaps(conn.cursor()), "reaplicação deixou lacunas na numeração")
+        finally:
+            conn.close()
+
+        # Gravador: grava o que recebeu e mantém no diário a linha de outra execução
+        orfa = entrada(90)
+        _append_fsync(JOURNAL_FILE, json.dumps(orfa))
+        gravador = SaleJournal()
+        recebidas = [gravador.submit(entrada(n)["venda"], itens, pagamentos, t["deposito_id"], t["terminal_id"], n)
+                     for n in (4, 5)]
+        conferir(gravador.flush(10.0), "gravador não esvaziou a fila")
+        conferir(all(j in vendas() for j in recebidas), "gravador não gravou as vendas recebidas")
+        conferir([e["journal_id"] for e, _ in _read_journal()] == [orfa["journal_id"]],
+                 "gravador descartou linha não confirmada no banco")
+
+        # Venda recusada pelo banco: separada em rejeitadas, a reaplicação segue
+        recusada = entrada(91)
+        recusada["venda"] = recusada["venda"][:5]
+        _append_fsync(JOURNAL_FILE, json.dumps(recusada))
+        replay_journal()
+        conferir(orfa["journal_id"] in vendas(), "reaplicação não gravou a linha mantida pelo gravador")
+        conferir(not has_pending_entries(), "venda rejeitada ficou no diário")
+        with open(REJECTED_FILE, encoding="utf-8") as f:
+            conferir(recusada["journal_id"] in f.read(), "venda rejeitada não separada")
+
+    return {"success": not falhas, "falhas": falhas}
+
+
+if __name__ == "__main__":
+    if "--check" in sys.argv:
+        logging.basicConfig(level=logging.CRITICAL + 1)
+        resultado = check_crash_recovery()
+        for falha in resultado["falhas"]:
+            print(f"FALHA: {falha}")
+        print("Recuperação do diário de vendas confere." if resultado["success"] else "")
+        sys.exit(0 if resultado["success"] else 1)
@@ -0,0 +1,119 @@
+# modules/sale_persistence.py
+"""
+Gravação em lote de uma venda do PDV (cabeçalho, itens, lançamentos no
+razão de estoque, pagamentos, totais da sessão de caixa e fato diário
+de vendas).
+
+Os comandos SQL são constantes do módulo: como a conexão do pool é
+persistente por thread (database.db.get_connection), o cache de
+comandos preparados do sqlite3 reaproveita o mesmo statement de uma
+venda para a outra, e o executemany prepara cada comando uma única vez
+por venda, independente do tamanho do carrinho.
+
+cancel_sale() reúne os passos do cancelamento, usados pelo PDV e pelo
+servidor da loja ao aplicar cancelamentos enviados por um terminal.
+"""
+from collections import defaultdict
+from . import session_totals
+from . import sales_facts
+from . import stock_ledger
+
+SQL_INSERT_VENDA = """
+    INSERT INTO vendas (
+        user_id, cliente_id, caixa_id,
+        empresa_id, local_id, terminal_id, numero_venda_terminal,
+        subtotal, desconto_itens, desconto_geral,
+        total_final, total_pago, troco, tipo_documento,
+        data_venda, journal_id
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?)
+"""
+
+SQL_INSERT_ITEM = """
+    INSERT INTO vendas_itens (venda_id, produto_id, codigo_barras, descricao, quantidade, preco_unitario, desconto_item, total_item)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+SQL_INSERT_PAGAMENTO = """
+    INSERT INTO vendas_pagamentos (
+        venda_id, forma, valor, tipo_pagamento, nsu, doc,
+        tipo_cartao, parcelas
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def aggregate_stock_deltas(itens, sinal=-1):
+    """
+    Soma as quantidades por produto (o mesmo produto lido várias vezes
+    vira um único lançamento) e ordena por id_produto, para que as páginas
+    do índice de 'estoque' sejam visitadas em sequência.
+    Retorna [(produto_id, delta), ...].
+    """
+    deltas = defaultdict(float)
+    for item in itens:
+        deltas[item['produto_id']] += sinal * item['quantidade']
+    return sorted((pid, qtd) for pid, qtd in deltas.items() if qtd != 0)
+
+
+def insert_sale(cur, venda, cart_items, pagamentos, deposito_id, data_venda=None, journal_id=None):
+    """
+    Grava a venda na transação aberta em 'cur'.
+    'venda' é a tupla de valores de SQL_INSERT_VENDA (sem data_venda e
+    journal_id, que só são informados pela gravação assíncrona).
+    Retorna (venda_id, itens_para_cupom).
+    """
+    cur.execute(SQL_INSERT_VENDA, (*venda, data_venda, journal_id))
+    venda_id = cur.lastrowid
+
+    linhas_itens = []
+    itens_cupom = []
+    for item in cart_items:
+        total_item = (item['preco_unitario'] * item['quantidade']) - item['desconto_item']
+        linhas_itens.append((
+            venda_id, item['produto_id'], item['codigo_barras'], item['descricao'], item['quantidade'],
+            item['preco_unitario'], item['desconto_item'], total_item
+        ))
+        item_cupom = item.copy()
+        item_cupom['total_item'] = total_item
+        itens_cupom.append(item_cupom)
+
+    cur.executemany(SQL_INSERT_ITEM, linhas_itens)
+    sales_facts.record_sale(cur, venda_id)
+    stock_ledger.record_movements(
+        cur, stock_ledger.VENDA, deposito_id, aggregate_stock_deltas(cart_items),
+        'VENDA', venda_id, user_id=venda[0], data=data_venda
+    )
+
+    cur.executemany(SQL_INSERT_PAGAMENTO, [
+        (venda_id, pg['forma'], pg['valor'], pg.get('tipo_pagamento', None), pg.get('nsu', None),
+         pg.get('doc', None), pg.get('tipo_cartao', None), pg.get('parcelas', 1))
+        for pg in pagamentos
+    ])
+
+    caixa_id, subtotal, desconto_itens, desconto_geral, total_final = venda[2], *venda[7:11]
+    session_totals.record_sale(cur, caixa_id, subtotal, desconto_itens, desconto_geral, total_final, pagamentos)
+
+    return venda_id, itens_cupom
+
+
+def cancel_sale(cur, venda, user_id, motivo, deposito_id=None):
+    """
+    Cancela a venda ('venda' é a linha de vendas) na transação aberta em
+    'cur': status, totais da sessão, fato diário e estorno dos lançamentos
+    da venda no razão de estoque (nos depósitos de onde saíram). Vendas
+    anteriores ao razão voltam para 'deposito_id' (depósito do terminal).
+    """
+    venda_id = venda['id']
+    cur.execute("UPDATE vendas SET status = 'CANCELADA' WHERE id = ?", (venda_id,))
+    session_totals.record_cancellation(cur, venda)
+    sales_facts.record_cancellation(cur, venda_id)
+
+    estornados = stock_ledger.reverse_document(cur, 'VENDA', venda_id, user_id=user_id, observacao=motivo)
+    if not estornados and deposito_id is not None:
+        cur.execute("SELECT produto_id, quantidade FROM vendas_itens WHERE venda_id = ?", (venda_id,))
+        stock_ledger.record_movements(
+            cur, stock_ledger.CANCELAMENTO, deposito_id,
+            aggregate_stock_deltas(cur.fetchall(), sinal=1),
+            'VENDA', venda_id, user_id=user_id, observacao=motivo
+        )
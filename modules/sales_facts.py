@@ -0,0 +1,119 @@
+# modules/sales_facts.py
+"""
+Fato diário de vendas (tabela 'vendas_diarias', migração 8).
+
+Cada linha acumula, para um dia x empresa x local x terminal x
+produto/código vendido, a quantidade, o valor bruto, os descontos de
+item, o valor líquido (soma de total_item) e o número de linhas de
+item das vendas FINALIZADAS. record_sale e record_cancellation recebem
+o cursor da transação da venda/cancelamento, assim como
+modules/session_totals.py.
+
+O desconto geral da venda não é rateado por produto: o líquido é o
+mesmo 'Vl. Total' do relatório detalhado.
+
+Reconstrução (todo o histórico ou um intervalo de dias):
+    python -m modules.sales_facts [AAAA-MM-DD [AAAA-MM-DD]]
+"""
+import sys
+import logging
+from database.db import get_connection, rebuild_vendas_diarias
+
+logger = logging.getLogger(__name__)
+
+SQL_UPSERT_ITENS = """
+    INSERT INTO vendas_diarias (
+        dia, empresa_id, local_id, terminal_id, produto_id, codigo_barras,
+        descricao, quantidade, total_bruto, total_descontos, total_liquido, linhas
+    )
+    SELECT date(v.data_venda), COALESCE(v.empresa_id, 0), COALESCE(v.local_id, 0),
+           COALESCE(v.terminal_id, 0), COALESCE(vi.produto_id, 0), vi.codigo_barras,
+           MAX(vi.descricao), ROUND(:sinal * SUM(vi.quantidade), 3),
+           ROUND(:sinal * SUM(vi.preco_unitario * vi.quantidade), 2),
+           ROUND(:sinal * SUM(COALESCE(vi.desconto_item, 0)), 2),
+           ROUND(:sinal * SUM(vi.total_item), 2), :sinal * COUNT(*)
+    FROM vendas_itens vi
+    JOIN vendas v ON v.id = vi.venda_id
+    WHERE vi.venda_id = :venda_id
+    GROUP BY 1, 2, 3, 4, 5, 6
+    ON CONFLICT (dia, empresa_id, local_id, terminal_id, produto_id, codigo_barras) DO UPDATE SET
+        descricao = excluded.descricao,
+        quantidade = ROUND(quantidade + excluded.quantidade, 3),
+        total_bruto = ROUND(total_bruto + excluded.total_bruto, 2),
+        total_descontos = ROUND(total_descontos + excluded.total_descontos, 2),
+        total_liquido = ROUND(total_liquido + excluded.total_liquido, 2),
+        linhas = linhas + excluded.linhas
+"""
+
+
+# --- ATUALIZAÇÃO INCREMENTAL (na transação do chamador) ---
+
+def record_sale(cur, venda_id):
+    """Soma os itens da venda (já gravados na transação) ao fato diário."""
+    cur.execute(SQL_UPSERT_ITENS, {"venda_id": venda_id, "sinal": 1})
+
+
+def record_cancellation(cur, venda_id):
+    """Retira os itens de uma venda FINALIZADA que está sendo cancelada."""
+    cur.execute(SQL_UPSERT_ITENS, {"venda_id": venda_id, "sinal": -1})
+
+
+# --- CONSULTA ---
+
+def product_summary_query(dia_inicio, dia_fim, empresa_id=None, terminal_id=None, codigo=None):
+    """
+    (sql, params) do resumo por produto/código no intervalo de dias.
+    Colunas: codigo_barras, descricao, quantidade, total_bruto,
+    total_descontos, total_liquido, linhas, produto_id.
+    """
+    query = """
+        SELECT codigo_barras, MAX(descricao) AS descricao,
+               ROUND(SUM(quantidade), 3) AS quantidade,
+               ROUND(SUM(total_bruto), 2) AS total_bruto,
+               ROUND(SUM(total_descontos), 2) AS total_descontos,
+               ROUND(SUM(total_liquido), 2) AS total_liquido,
+               SUM(linhas) AS linhas,
+               produto_id
+        FROM vendas_diarias
+        WHERE dia BETWEEN ? AND ?
+    """
+    params = [dia_inicio, dia_fim]
+    if empresa_id:
+        query += " AND empresa_id = ?"
+        params.append(empresa_id)
+    if terminal_id:
+        query += " AND terminal_id = ?"
+        params.append(terminal_id)
+    if codigo:
+        query += " AND codigo_barras LIKE ?"
+        params.append(f"%{codigo}%")
+    query += """
+        GROUP BY produto_id, codigo_barras
+        HAVING SUM(linhas) > 0
+        ORDER BY total_liquido DESC
+    """
+    return query, tuple(params)
+
+
+# --- RECONSTRUÇÃO ---
+
+def rebuild(dia_inicio=None, dia_fim=None):
+    """Recalcula o fato diário (todo o histórico ou o intervalo de dias)."""
+    conn = get_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        rebuild_vendas_diarias(conn.cursor(), dia_inicio, dia_fim)
+        conn.commit()
+        logger.info(f"Fato diário de vendas recalculado ({dia_inicio or 'início'} a {dia_fim or dia_inicio or 'hoje'}).")
+        return {"success": True}
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Erro ao recalcular o fato diário de vendas: {e}", exc_info=True)
+        return {"success": False, "error": f"Erro ao recalcular vendas diárias: {e}"}
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    resultado = rebuild(*sys.argv[1:3])
+    print("Vendas diárias recalculadas." if resultado["success"] else resultado["error"])
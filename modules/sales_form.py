@@ -434,21 +434,11 @@ class SalesForm(QWidget):
         dialog = OpenCashDialog(self.nome_terminal, self)
         if dialog.exec_() == QDialog.Accepted:
             valor_inicial = dialog.get_value()
-            conn = get_connection()
-            try:
-                cur = conn.cursor()
-                cur.execute("""
-                    INSERT INTO caixa_sessoes (user_id, valor_inicial, status, terminal_id) 
-                    VALUES (?, ?, 'ABERTO', ?)
-                """, (self.user_id, valor_inicial, self.controller.terminal_id))
-                
-                new_caixa_id = cur.lastrowid
-                conn.commit()
-                self.set_caixa_aberto(new_caixa_id)
-            except Exception as e:
-                QMessageBox.critical(self, "Erro", f"Não foi possível abrir o caixa: {e}")
-            finally:
-                conn.close()
+            result = self.controller.open_cash_session(valor_inicial)
+            if result["success"]:
+                self.set_caixa_aberto(result["caixa_id"])
+            else:
+                QMessageBox.critical(self, "Erro", result["error"])
 
     def _prompt_close_cash(self):
         if not self.controller.current_caixa_id:
@@ -475,6 +465,7 @@ class SalesForm(QWidget):
         autorizador_id = None
         
         try:
+            self.controller.flush_pending_sales()
             conf_dialog = CloseCashDialog(self.controller.current_caixa_id, self.nome_terminal, self)
             
             if conf_dialog.exec_() != QDialog.Accepted:
@@ -672,33 +663,8 @@ class SalesForm(QWidget):
                     self.product_search.selectAll()
                     return
         
-        conn = get_connection()
         try:
-            cur = conn.cursor()
-            query = """
-                SELECT 
-                    p.id as produto_id, 
-                    p.ean, 
-                    p.codigo_interno, 
-                    p.nome as descricao,
-                    p.unidade,
-                    ptp.preco_vendadecimal as preco_venda
-                FROM produtos p
-                LEFT JOIN produto_tabela_preco ptp ON p.id = ptp.id_produto
-                LEFT JOIN produto_codigos_alternativos pca ON p.id = pca.id_produto
-                WHERE 
-                    (
-                        p.ean = ? OR p.codigo_interno = ?
-                        OR pca.codigo = ?
-                    )
-                    AND p.active = 1
-                    AND ptp.id_tabela = ?
-                GROUP BY p.id 
-                LIMIT 1
-            """
-            
-            cur.execute(query, (codigo, codigo, codigo, self.controller.tabela_id_ativa))
-            produto_data = cur.fetchone()
+            produto_data = self.controller.lookup_product(codigo)
             
             if not produto_data:
                 self.product_name_display.setText("❌ PRODUTO NÃO ENCONTRADO")
@@ -710,17 +676,17 @@ class SalesForm(QWidget):
                 self.product_search.selectAll()
                 return
                 
-            self.add_item_to_cart(dict(produto_data), quantidade)
-            self._load_product_image_by_id(produto_data['produto_id']) 
+            self.add_item_to_cart(produto_data, quantidade)
+            self._load_product_image(produto_data['caminho_imagem'])
             
         except Exception as e:
             QMessageBox.critical(self, "Erro de Banco de Dados", f"Erro ao buscar produto: {e}")
         finally:
-            conn.close()
             self.product_search.clear()
 
     def _load_nao_fiscal(self, numero_venda):
         self.clear_sale(force_clear=True) 
+        self.controller.flush_pending_sales()
         
         conn = get_connection()
         try:
@@ -1039,6 +1005,7 @@ class SalesForm(QWidget):
             if auth_dialog.exec_() != QDialog.Accepted:
                 return
 
+        self.controller.flush_pending_sales()
         dialog = CancelSaleDialog(
             current_caixa_id=self.controller.current_caixa_id,
             terminal_id=self.controller.terminal_id,
@@ -1063,7 +1030,7 @@ class SalesForm(QWidget):
                 
                 generate_and_print_cancellation_receipt(final_data, motivo)
                 
-                QMessageBox.information(self, "Cancelamento", "Venda cancelada e comprovante impresso com sucesso!")
+                QMessageBox.information(self, "Cancelamento", "Venda cancelada e comprovante enviado para impressão!")
             else:
                  QMessageBox.warning(self, "Aviso", "Venda cancelada, mas houve erro ao buscar dados para impressão.")
 
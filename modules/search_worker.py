@@ -0,0 +1,143 @@
+# modules/search_worker.py
+import sqlite3
+import logging
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+from database.db import get_connection
+
+
+class _Geracao:
+    """Contador de geração compartilhado entre a tela e as tarefas em execução."""
+    def __init__(self):
+        self.atual = 0
+
+
+class _QuerySignals(QObject):
+    batch = pyqtSignal(int, list, bool)   # geração, linhas, primeiro lote
+    finished = pyqtSignal(int, int)       # geração, total de linhas
+    error = pyqtSignal(int, str)          # geração, mensagem
+
+
+class _QueryTask(QRunnable):
+    """
+    Executa uma consulta em uma thread do pool e envia o resultado em lotes.
+    A consulta é abortada (progress handler) assim que uma nova geração
+    é iniciada pela tela.
+    """
+    PASSOS_PROGRESSO = 1000  # instruções da VM do SQLite entre verificações
+
+    def __init__(self, geracao, token, sql, params, batch_size):
+        super().__init__()
+        self.geracao = geracao
+        self.token = token
+        self.sql = sql
+        self.params = params
+        self.batch_size = batch_size
+        self.signals = _QuerySignals()
+
+    def _superada(self):
+        return self.token.atual != self.geracao
+
+    def run(self):
+        if self._superada():
+            return
+        conn = get_connection()
+        try:
+            # Retorno != 0 interrompe a instrução em andamento
+            conn.set_progress_handler(lambda: 1 if self._superada() else 0, self.PASSOS_PROGRESSO)
+            cur = conn.execute(self.sql, self.params)
+            total = 0
+            primeiro = True
+            while True:
+                rows = cur.fetchmany(self.batch_size)
+                if self._superada():
+                    return
+                if rows or primeiro:
+                    self.signals.batch.emit(self.geracao, rows, primeiro)
+                    primeiro = False
+                total += len(rows)
+                if len(rows) < self.batch_size:
+                    break
+            self.signals.finished.emit(self.geracao, total)
+        except sqlite3.OperationalError as e:
+            if not self._superada():  # "interrupted" de uma busca superada é esperado
+                self.signals.error.emit(self.geracao, str(e))
+        except Exception as e:
+            self.signals.error.emit(self.geracao, str(e))
+        finally:
+            conn.set_progress_handler(None, 0)
+            conn.close()
+
+
+class BackgroundSearch(QObject):
+    """
+    Busca interativa fora da thread da interface.
+
+    - schedule(): reinicia o debounce (ligar em textChanged);
+    - run_now(): executa imediatamente (Enter / botão Pesquisar);
+    - cancel(): descarta a busca em andamento.
+
+    'build_query' é chamado na thread da interface e deve retornar
+    (sql, params) ou None. Apenas a geração mais recente emite sinais:
+    batchReady(linhas, primeiro_lote) — no primeiro lote a tela limpa a
+    tabela —, finished(total) e failed(mensagem).
+    """
+    batchReady = pyqtSignal(list, bool)
+    finished = pyqtSignal(int)
+    failed = pyqtSignal(str)
+
+    def __init__(self, build_query, parent=None, debounce_ms=250, batch_size=100):
+        super().__init__(parent)
+        self.logger = logging.getLogger(__name__)
+        self.build_query = build_query
+        self.batch_size = batch_size
+        self._token = _Geracao()
+        self._pool = QThreadPool.globalInstance()
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(debounce_ms)
+        self._timer.timeout.connect(self.run_now)
+
+    def schedule(self):
+        self._timer.start()
+
+    def cancel(self):
+        self._timer.stop()
+        self._token.atual += 1
+
+    def run_now(self):
+        self.cancel()
+        geracao = self._token.atual
+
+        try:
+            query = self.build_query()
+        except Exception as e:
+            self.logger.error(f"Erro ao montar busca: {e}", exc_info=True)
+            self.failed.emit(str(e))
+            return
+
+        if query is None:
+            # Nada a buscar: a tela apenas limpa os resultados
+            self.batchReady.emit([], True)
+            self.finished.emit(0)
+            return
+
+        sql, params = query
+        task = _QueryTask(geracao, self._token, sql, params, self.batch_size)
+        task.signals.batch.connect(self._on_batch)
+        task.signals.finished.connect(self._on_finished)
+        task.signals.error.connect(self._on_error)
+        self._pool.start(task)
+
+    def _on_batch(self, geracao, rows, primeiro):
+        if geracao == self._token.atual:
+            self.batchReady.emit(rows, primeiro)
+
+    def _on_finished(self, geracao, total):
+        if geracao == self._token.atual:
+            self.finished.emit(total)
+
+    def _on_error(self, geracao, mensagem):
+        if geracao == self._token.atual:
+            self.logger.error(f"Erro na busca em segundo plano: {mensagem}")
+            self.failed.emit(mensagem)
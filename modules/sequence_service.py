@@ -0,0 +1,493 @@
+# modules/sequence_service.py
+"""
+Numeração por blocos reservados (vendas por terminal, códigos internos).
+
+Em vez de incrementar o contador a cada número (uma gravação na mesma
+linha por venda ou por produto), cada terminal ou processo reserva um
+bloco de números de uma vez, avançando o contador (o último número
+reservado: terminais_pdv.numero_nfe_atual, sequencias.valor) em
+'tamanho_bloco', e entrega os números do bloco em memória. O contador
+só é gravado de novo quando o bloco acaba.
+
+peek() devolve o próximo número sem consumi-lo; advance() o consome
+depois que o documento foi gravado (como o PDV já fazia com
+numero_nfe_atual), de modo que uma venda que falha não gasta número.
+
+Numeração fiscal (TerminalSequence): cada bloco fica registrado em
+'sequencias_blocos' (migração 16). Na abertura do PDV, depois da
+reaplicação do diário de vendas, o bloco em aberto é retomado a partir
+do maior número com venda (nenhum número se perde numa queda), e os
+blocos encerrados são conferidos contra as vendas: números sem venda
+(p. ex. a numeração antiga de uma pré-venda convertida, ou um contador
+alterado no cadastro do terminal) são gravados em 'sequencias_lacunas'
+para inutilização.
+
+Numeração de processo (ProcessSequence, ex.: COD_INTERNO): os números
+não usados do bloco voltam ao contador ao fim do processo, se nenhum
+outro processo reservou depois; caso contrário ficam sem uso.
+
+Lacunas pendentes de inutilização / registrar a inutilização:
+    python -m modules.sequence_service [--inutilizar LACUNA_ID PROTOCOLO]
+
+Verificação da numeração do terminal (banco temporário): retomada depois
+de uma queda, venda que falha, número sem venda e reaberturas seguidas:
+    python -m modules.sequence_service --check
+"""
+import os
+import sys
+import heapq
+import atexit
+import socket
+import logging
+import tempfile
+import threading
+from database.db import get_connection, use_database, create_tables
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_BLOCO_TERMINAL = 50
+TAMANHO_BLOCO_PROCESSO = 10
+
+
+class BlockSequence:
+    """
+    Números entregues a partir de blocos reservados no contador
+    'coluna' de 'tabela' (linha identificada por 'filtro'/'params').
+    """
+
+    def __init__(self, tabela, coluna, filtro, params, tamanho_bloco, inicial=1):
+        self._tabela = tabela
+        self._coluna = coluna
+        self._filtro = filtro
+        self._params = tuple(params)
+        self.tamanho_bloco = tamanho_bloco
+        self.inicial = inicial
+        self._proximo = None
+        self._fim = None
+        self._devolvidos = []  # números entregues e não usados (heap), reaproveitados primeiro
+        self._lock = threading.Lock()
+
+    # --- ENTREGA ---
+
+    def peek(self):
+        """Próximo número (reserva um novo bloco se o atual acabou), sem consumi-lo."""
+        with self._lock:
+            return self._peek()
+
+    def _peek(self):
+        if self._devolvidos:
+            return self._devolvidos[0]
+        if self._proximo is None or self._proximo > self._fim:
+            self._reservar()
+        return self._proximo
+
+    def advance(self, numero):
+        """Consome 'numero' (o último devolvido por peek()) depois de usado."""
+        with self._lock:
+            if self._devolvidos and self._devolvidos[0] == numero:
+                heapq.heappop(self._devolvidos)
+            elif numero == self._proximo:
+                self._proximo += 1
+
+    def take(self):
+        """Próximo número, já consumido."""
+        with self._lock:
+            numero = self._peek()
+            if self._devolvidos and self._devolvidos[0] == numero:
+                heapq.heappop(self._devolvidos)
+            else:
+                self._proximo += 1
+            return numero
+
+    def give_back(self, numero):
+        """Devolve um número de take() que não chegou a ser usado."""
+        with self._lock:
+            if numero not in self._devolvidos:
+                heapq.heappush(self._devolvidos, numero)
+
+    # --- CONTADOR ---
+
+    def _reservar(self):
+        n = self.tamanho_bloco
+        conn = get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            cur = conn.cursor()
+            self._criar_contador(cur)
+            cur.execute(f"""
+                UPDATE {self._tabela} SET {self._coluna} = COALESCE({self._coluna}, ?) + ?
+                WHERE {self._filtro}
+            """, (self.inicial - 1, n, *self._params))
+            if cur.rowcount == 0:
+                raise RuntimeError(f"Contador de numeração não encontrado em '{self._tabela}' {self._params}.")
+            cur.execute(f"SELECT {self._coluna} AS valor FROM {self._tabela} WHERE {self._filtro}", self._params)
+            fim = cur.fetchone()['valor']
+            self._ao_reservar(cur, fim - n + 1, fim)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        self._proximo, self._fim = fim - n + 1, fim
+        logger.debug(f"Bloco {self._proximo}-{self._fim} reservado em {self._tabela} {self._params}.")
+
+    def _criar_contador(self, cur):
+        """Cria a linha do contador se a numeração ainda não existir."""
+
+    def _ao_reservar(self, cur, inicio, fim):
+        """Chamado na transação da reserva de um novo bloco."""
+
+    def release(self):
+        """
+        Devolve ao contador os números não usados do bloco atual, se o
+        contador ainda estiver no fim dele (ninguém reservou depois).
+        """
+        with self._lock:
+            if self._proximo is None:
+                return False
+            sobra = sorted(self._devolvidos)
+            ultimo_usado = self._proximo - 1
+            while sobra and sobra[-1] == ultimo_usado:
+                sobra.pop()
+                ultimo_usado -= 1
+            conn = get_connection()
+            try:
+                cur = conn.cursor()
+                cur.execute(f"""
+                    UPDATE {self._tabela} SET {self._coluna} = ?
+                    WHERE {self._filtro} AND {self._coluna} = ?
+                """, (ultimo_usado, *self._params, self._fim))
+                conn.commit()
+                devolvido = cur.rowcount > 0
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"Erro ao devolver a sobra do bloco de {self._tabela} {self._params}: {e}", exc_info=True)
+                devolvido = False
+            finally:
+                conn.close()
+            self._proximo = self._fim = None
+            self._devolvidos = []
+            return devolvido
+
+
+class ProcessSequence(BlockSequence):
+    """Numeração de 'sequencias' (ex.: COD_INTERNO) com um bloco por processo."""
+
+    def __init__(self, nome, inicial=1, tamanho_bloco=TAMANHO_BLOCO_PROCESSO):
+        super().__init__("sequencias", "valor", "nome = ?", (nome,), tamanho_bloco, inicial)
+        self.nome = nome
+
+    def _criar_contador(self, cur):
+        cur.execute("""
+            INSERT INTO sequencias (nome, valor, prefixo) VALUES (?, ?, '')
+            ON CONFLICT (nome) DO NOTHING
+        """, (self.nome, self.inicial - 1))
+
+
+class TerminalSequence(BlockSequence):
+    """
+    Numeração de vendas do terminal (terminais_pdv.numero_nfe_atual), com
+    os blocos registrados em 'sequencias_blocos' e as lacunas conferidas
+    na criação. Criar depois de reaplicar o diário de vendas do terminal.
+    """
+
+    def __init__(self, terminal_id, tamanho_bloco=TAMANHO_BLOCO_TERMINAL):
+        super().__init__("terminais_pdv", "numero_nfe_atual", "id = ?", (terminal_id,), tamanho_bloco)
+        self.terminal_id = terminal_id
+        self.sequencia = f"TERMINAL:{terminal_id}"
+        self._bloco_id = None
+        self._retomar()
+
+    def _usados(self, cur, inicio, fim):
+        cur.execute("""
+            SELECT numero_venda_terminal FROM vendas
+            WHERE terminal_id = ? AND numero_venda_terminal BETWEEN ? AND ?
+        """, (self.terminal_id, inicio, fim))
+        return {row[0] for row in cur.fetchall()}
+
+    def _fechar(self, cur, bloco_id, usado_ate):
+        cur.execute("""
+            UPDATE sequencias_blocos SET status = 'FECHADO', usado_ate = ?, fechado_em = CURRENT_TIMESTAMP
+            WHERE id = ?
+        """, (usado_ate, bloco_id))
+
+    def _retomar(self):
+        conn = get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            cur = conn.cursor()
+            cur.execute("SELECT numero_nfe_atual, serie_fiscal FROM terminais_pdv WHERE id = ?", (self.terminal_id,))
+            terminal = cur.fetchone()
+            contador, serie = (terminal['numero_nfe_atual'] or 0), terminal['serie_fiscal']
+
+            cur.execute("""
+                SELECT id, inicio, fim FROM sequencias_blocos
+                WHERE sequencia = ? AND status = 'ABERTO' ORDER BY id
+            """, (self.sequencia,))
+            abertos = cur.fetchall()
+            for i, bloco in enumerate(abertos):
+                maior = max(self._usados(cur, bloco['inicio'], bloco['fim']), default=bloco['inicio'] - 1)
+                if i == len(abertos) - 1 and contador == bloco['fim'] and maior < bloco['fim']:
+                    self._bloco_id = bloco['id']
+                    self._proximo, self._fim = maior + 1, bloco['fim']
+                else:
+                    # Contador recuado no cadastro: a sobra do bloco volta a ser emitida
+                    self._fechar(cur, bloco['id'], bloco['fim'] if contador >= bloco['fim'] else maior)
+
+            self._conferir(cur, serie)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _conferir(self, cur, serie):
+        """Grava as lacunas dos blocos fechados do terminal e os marca como CONFERIDOS."""
+        cur.execute("""
+            SELECT id, inicio, usado_ate FROM sequencias_blocos
+            WHERE sequencia = ? AND status = 'FECHADO' ORDER BY id
+        """, (self.sequencia,))
+        for bloco in cur.fetchall():
+            usados = self._usados(cur, bloco['inicio'], bloco['usado_ate'])
+            faixas = []
+            for numero in range(bloco['inicio'], bloco['usado_ate'] + 1):
+                if numero in usados:
+                    continue
+                if faixas and faixas[-1][1] == numero - 1:
+                    faixas[-1][1] = numero
+                else:
+                    faixas.append([numero, numero])
+            self._registrar_lacunas(cur, [
+                (self.sequencia, serie, ini, fim, f"Sem venda no bloco {bloco['id']}") for ini, fim in faixas
+            ])
+            cur.execute("UPDATE sequencias_blocos SET status = 'CONFERIDO' WHERE id = ?", (bloco['id'],))
+            if faixas:
+                logger.warning(f"Terminal {self.terminal_id}: números sem venda {faixas} registrados para inutilização.")
+
+    def _registrar_lacunas(self, cur, lacunas):
+        """Grava as lacunas [(sequencia, serie, numero_inicio, numero_fim, motivo)] para inutilização."""
+        cur.executemany("""
+            INSERT INTO sequencias_lacunas (sequencia, serie, numero_inicio, numero_fim, motivo)
+            VALUES (?, ?, ?, ?, ?)
+        """, lacunas)
+
+    def _ao_reservar(self, cur, inicio, fim):
+        # O bloco anterior é só fechado aqui: vendas dele ainda podem estar no
+        # diário local, por isso a conferência fica para a próxima abertura.
+        if self._bloco_id is not None:
+            self._fechar(cur, self._bloco_id, self._proximo - 1)
+        cur.execute("""
+            INSERT INTO sequencias_blocos (sequencia, inicio, fim, dono) VALUES (?, ?, ?, ?)
+        """, (self.sequencia, inicio, fim, socket.gethostname()))
+        self._bloco_id = cur.lastrowid
+
+    def release(self):
+        """Os números do terminal são retomados na próxima abertura; nada a devolver."""
+        return False
+
+
+_processo = {}
+_processo_lock = threading.Lock()
+
+
+def process_sequence(nome, inicial=1, tamanho_bloco=TAMANHO_BLOCO_PROCESSO):
+    """Numeração 'nome' de 'sequencias' compartilhada pelo processo (sobra devolvida ao sair)."""
+    with _processo_lock:
+        if nome not in _processo:
+            _processo[nome] = ProcessSequence(nome, inicial, tamanho_bloco)
+            atexit.register(_processo[nome].release)
+        return _processo[nome]
+
+
+# --- LACUNAS (INUTILIZAÇÃO) ---
+
+def pending_gaps(cur, sequencia=None):
+    """Lacunas ainda não inutilizadas: [{"id", "sequencia", "serie", "numero_inicio", "numero_fim", "motivo", "registrada_em"}]."""
+    query = """
+        SELECT id, sequencia, serie, numero_inicio, numero_fim, motivo, registrada_em
+        FROM sequencias_lacunas WHERE inutilizada_em IS NULL
+    """
+    params = ()
+    if sequencia is not None:
+        query += " AND sequencia = ?"
+        params = (sequencia,)
+    cur.execute(query + " ORDER BY sequencia, numero_inicio", params)
+    return [dict(row) for row in cur.fetchall()]
+
+
+def mark_inutilized(lacuna_id, protocolo):
+    """Registra a inutilização de uma lacuna (protocolo da SEFAZ)."""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            UPDATE sequencias_lacunas SET inutilizada_em = CURRENT_TIMESTAMP, protocolo = ?
+            WHERE id = ? AND inutilizada_em IS NULL
+        """, (protocolo, lacuna_id))
+        conn.commit()
+        if cur.rowcount == 0:
+            return {"success": False, "error": "Lacuna não encontrada ou já inutilizada."}
+        logger.info(f"Lacuna {lacuna_id} inutilizada (protocolo {protocolo}).")
+        return {"success": True}
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Erro ao registrar inutilização da lacuna {lacuna_id}: {e}", exc_info=True)
+        return {"success": False, "error": f"Erro ao registrar inutilização: {e}"}
+    finally:
+        conn.close()
+
+
+# --- VERIFICAÇÃO ---
+
+def create_check_terminal(cur):
+    """
+    Cadastra na transação aberta um local, um depósito, um terminal deste
+    computador com a sessão de caixa aberta e um produto, para as
+    verificações em banco temporário. Retorna os ids.
+    """
+    from .cash_session import open_session
+
+    cur.execute("SELECT id FROM usuarios ORDER BY id LIMIT 1")
+    user_id = cur.fetchone()['id']
+    cur.execute("SELECT id FROM empresas ORDER BY id LIMIT 1")
+    empresa_id = cur.fetchone()['id']
+    cur.execute("INSERT INTO locais_escrituracao (empresa_id, nome_local) VALUES (?, 'Verificação')", (empresa_id,))
+    local_id = cur.lastrowid
+    cur.execute("INSERT INTO depositos (empresa_id, nome) VALUES (?, 'Verificação')", (empresa_id,))
+    deposito_id = cur.lastrowid
+    cur.execute("""
+        INSERT INTO terminais_pdv (empresa_id, local_id, nome_terminal, hostname, serie_fiscal, numero_nfe_atual, deposito_id_padrao)
+        VALUES (?, ?, 'Verificação', ?, 1, 0, ?)
+    """, (empresa_id, local_id, socket.gethostname(), deposito_id))
+    terminal_id = cur.lastrowid
+    caixa_id = open_session(cur, user_id, terminal_id, 0.0)
+    cur.execute("INSERT INTO produtos (empresa_id, nome) VALUES (?, 'Verificação')", (empresa_id,))
+    return {"user_id": user_id, "empresa_id": empresa_id, "local_id": local_id, "deposito_id": deposito_id,
+            "terminal_id": terminal_id, "caixa_id": caixa_id, "produto_id": cur.lastrowid}
+
+
+def check_terminal_numbering(tamanho_bloco=5):
+    """
+    Simula vendas, falhas e quedas do PDV num banco temporário e confere a
+    numeração do terminal. Retorna {"success", "falhas": [descrição]}.
+    """
+    from .sale_persistence import insert_sale
+
+    falhas = []
+
+    def conferir(condicao, descricao):
+        if not condicao:
+            falhas.append(descricao)
+
+    with tempfile.TemporaryDirectory() as pasta, use_database(os.path.join(pasta, "verificacao.db")):
+        create_tables()
+        conn = get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            t = create_check_terminal(conn.cursor())
+            conn.commit()
+        finally:
+            conn.close()
+        itens = [{"produto_id": t["produto_id"], "codigo_barras": "1", "descricao": "Produto", "quantidade": 1.0,
+                  "preco_unitario": 2.5, "desconto_item": 0.0}]
+        pagamentos = [{"forma": "Dinheiro", "valor": 2.5}]
+
+        def vender(numeracao, falhar=False):
+            """Venda com o próximo número, consumido só depois de gravada (como o PDV)."""
+            numero = numeracao.peek()
+            conn = get_connection()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                insert_sale(conn.cursor(), (t["user_id"], None, t["caixa_id"], t["empresa_id"], t["local_id"],
+                                            t["terminal_id"], numero, 2.5, 0.0, 0.0, 2.5, 2.5, 0.0, "FISCAL"),
+                            itens, pagamentos, t["deposito_id"])
+                if falhar:
+                    raise RuntimeError("falha simulada da venda")
+                conn.commit()
+            except RuntimeError:
+                conn.rollback()
+                return None
+            finally:
+                conn.close()
+            numeracao.advance(numero)
+            return numero
+
+        def abrir():
+            return TerminalSequence(t["terminal_id"], tamanho_bloco)
+
+        def consultar(sql):
+            conn = get_connection()
+            try:
+                return [tuple(row) for row in conn.execute(sql, (t["terminal_id"],))]
+            finally:
+                conn.close()
+
+        def lacunas():
+            conn = get_connection()
+            try:
+                return [(lac['numero_inicio'], lac['numero_fim'])
+                        for lac in pending_gaps(conn.cursor(), f"TERMINAL:{t['terminal_id']}")]
+            finally:
+                conn.close()
+
+        # Vendas 1-3 do bloco 1-5 e queda: a abertura seguinte retoma no 4
+        numeracao = abrir()
+        emitidos = [vender(numeracao) for _ in range(3)]
+        conferir(emitidos == [1, 2, 3], f"primeiras vendas numeradas {emitidos}")
+        numeracao = abrir()
+        conferir(numeracao.peek() == 4, f"retomada depois da queda em {numeracao.peek()}, esperado 4")
+
+        # Venda que falha não consome o número
+        conferir(vender(numeracao, falhar=True) is None, "venda com falha simulada foi gravada")
+        conferir(vender(numeracao) == 4, "venda depois da falha não reaproveitou o número")
+
+        # Número consumido sem venda (p. ex. pré-venda convertida com a numeração antiga)
+        numeracao.advance(numeracao.peek())
+        emitidos = [vender(numeracao) for _ in range(3)]
+        conferir(emitidos == [6, 7, 8], f"vendas seguintes numeradas {emitidos}")
+        conferir(lacunas() == [], "lacuna registrada antes da conferência do bloco")
+
+        # Queda e reaberturas: o 5 vira lacuna uma única vez e a numeração segue
+        numeracao = abrir()
+        conferir(lacunas() == [(5, 5)], f"lacunas depois da reabertura: {lacunas()}")
+        conferir(numeracao.peek() == 9, f"retomada no bloco novo em {numeracao.peek()}, esperado 9")
+        abrir()
+        conferir(lacunas() == [(5, 5)], f"lacunas depois da segunda reabertura: {lacunas()}")
+        numeracao = abrir()
+        conferir(vender(numeracao) == 9, "numeração não seguiu depois das reaberturas")
+
+        repetidos = consultar("""
+            SELECT numero_venda_terminal FROM vendas WHERE terminal_id = ?
+            GROUP BY numero_venda_terminal HAVING COUNT(*) > 1
+        """)
+        conferir(not repetidos, f"números de venda repetidos: {repetidos}")
+        contador = consultar("SELECT numero_nfe_atual FROM terminais_pdv WHERE id = ?")[0][0]
+        conferir(contador >= 9, f"contador do terminal ({contador}) abaixo da última venda")
+
+    return {"success": not falhas, "falhas": falhas}
+
+
+if __name__ == "__main__":
+    if "--check" in sys.argv:
+        logging.basicConfig(level=logging.CRITICAL + 1)
+        resultado = check_terminal_numbering()
+        for falha in resultado["falhas"]:
+            print(f"FALHA: {falha}")
+        print("Numeração do terminal confere." if resultado["success"] else "")
+        sys.exit(0 if resultado["success"] else 1)
+    elif len(sys.argv) == 4 and sys.argv[1] == "--inutilizar":
+        resultado = mark_inutilized(int(sys.argv[2]), sys.argv[3])
+        print("Inutilização registrada." if resultado["success"] else resultado["error"])
+    else:
+        conn = get_connection()
+        try:
+            lacunas = pending_gaps(conn.cursor())
+        finally:
+            conn.close()
+        for lac in lacunas:
+            faixa = str(lac['numero_inicio']) if lac['numero_inicio'] == lac['numero_fim'] else f"{lac['numero_inicio']}-{lac['numero_fim']}"
+            print(f"[{lac['id']}] {lac['sequencia']} série {lac['serie']}: {faixa} ({lac['motivo']}, {lac['registrada_em']})")
+        if not lacunas:
+            print("Nenhuma lacuna pendente de inutilização.")
@@ -0,0 +1,208 @@
+# modules/session_totals.py
+"""
+Totais acumulados da sessão de caixa (tabelas 'caixa_totais' e
+'caixa_totais_formas', migração 6).
+
+As funções record_* recebem o cursor da transação da venda, do
+cancelamento ou da movimentação, de modo que os totais nunca ficam
+defasados em relação às linhas de origem. O fechamento de caixa e o
+Relatório Z leem get_session_totals() em vez de reagregar a sessão.
+
+check_session_totals() recalcula os totais a partir das linhas de
+origem (database.db.rebuild_caixa_totais) e informa/corrige
+divergências — por exemplo, vendas gravadas por um terminal com versão
+anterior do sistema.
+"""
+import logging
+from database.db import get_connection, rebuild_caixa_totais
+
+logger = logging.getLogger(__name__)
+
+FORMAS_PADRAO = ("Dinheiro", "Pix", "Cartão", "Doc. Crédito", "Outros")
+
+CAMPOS_TOTAIS = (
+    "qtd_vendas", "total_bruto", "total_descontos", "total_liquido",
+    "qtd_canceladas", "total_cancelado", "total_suprimentos", "total_sangrias",
+)
+
+TOLERANCIA = 0.005  # centavo arredondado
+
+SQL_UPSERT_VENDA = """
+    INSERT INTO caixa_totais (caixa_id, qtd_vendas, total_bruto, total_descontos, total_liquido)
+    VALUES (?, 1, ROUND(?, 2), ROUND(?, 2), ROUND(?, 2))
+    ON CONFLICT(caixa_id) DO UPDATE SET
+        qtd_vendas = qtd_vendas + 1,
+        total_bruto = ROUND(total_bruto + excluded.total_bruto, 2),
+        total_descontos = ROUND(total_descontos + excluded.total_descontos, 2),
+        total_liquido = ROUND(total_liquido + excluded.total_liquido, 2)
+"""
+
+SQL_UPSERT_FORMA = """
+    INSERT INTO caixa_totais_formas (caixa_id, forma, qtd, total)
+    VALUES (?, ?, ?, ROUND(?, 2))
+    ON CONFLICT(caixa_id, forma) DO UPDATE SET
+        qtd = qtd + excluded.qtd,
+        total = ROUND(total + excluded.total, 2)
+"""
+
+SQL_CANCELAR_VENDA = """
+    UPDATE caixa_totais SET
+        qtd_vendas = qtd_vendas - 1,
+        total_bruto = ROUND(total_bruto - ?, 2),
+        total_descontos = ROUND(total_descontos - ?, 2),
+        total_liquido = ROUND(total_liquido - ?, 2),
+        qtd_canceladas = qtd_canceladas + 1,
+        total_cancelado = ROUND(total_cancelado + ?, 2)
+    WHERE caixa_id = ?
+"""
+
+SQL_UPSERT_MOVIMENTO = {
+    "SUPRIMENTO": """
+        INSERT INTO caixa_totais (caixa_id, total_suprimentos) VALUES (?, ROUND(?, 2))
+        ON CONFLICT(caixa_id) DO UPDATE SET
+            total_suprimentos = ROUND(total_suprimentos + excluded.total_suprimentos, 2)
+    """,
+    "SANGRIA": """
+        INSERT INTO caixa_totais (caixa_id, total_sangrias) VALUES (?, ROUND(?, 2))
+        ON CONFLICT(caixa_id) DO UPDATE SET
+            total_sangrias = ROUND(total_sangrias + excluded.total_sangrias, 2)
+    """,
+}
+
+
+# --- ATUALIZAÇÃO INCREMENTAL (na transação do chamador) ---
+
+def record_sale(cur, caixa_id, subtotal, desconto_itens, desconto_geral, total_final, pagamentos):
+    """Soma uma venda FINALIZADA e seus pagamentos aos totais da sessão."""
+    if caixa_id is None:
+        return
+    cur.execute(SQL_UPSERT_VENDA, (
+        caixa_id, subtotal, (desconto_itens or 0) + (desconto_geral or 0), total_final
+    ))
+    cur.executemany(SQL_UPSERT_FORMA, [
+        (caixa_id, pg['forma'], 1, pg['valor']) for pg in pagamentos
+    ])
+
+
+def record_cancellation(cur, venda):
+    """
+    Move uma venda (linha de 'vendas', ainda com os valores originais) de
+    FINALIZADA para CANCELADA nos totais e retira seus pagamentos.
+    """
+    caixa_id = venda['caixa_id']
+    if caixa_id is None:
+        return
+    descontos = (venda['desconto_itens'] or 0) + (venda['desconto_geral'] or 0)
+    cur.execute(SQL_CANCELAR_VENDA, (
+        venda['subtotal'], descontos, venda['total_final'], venda['total_final'], caixa_id
+    ))
+    cur.execute("""
+        SELECT forma, COUNT(*) AS qtd, SUM(valor) AS total
+        FROM vendas_pagamentos WHERE venda_id = ?
+        GROUP BY forma
+    """, (venda['id'],))
+    cur.executemany(SQL_UPSERT_FORMA, [
+        (caixa_id, row['forma'], -row['qtd'], -row['total']) for row in cur.fetchall()
+    ])
+
+
+def record_movement(cur, caixa_id, tipo, valor):
+    """Soma uma sangria/suprimento aos totais da sessão."""
+    sql = SQL_UPSERT_MOVIMENTO.get(tipo)
+    if sql is None or caixa_id is None:
+        return
+    cur.execute(sql, (caixa_id, valor))
+
+
+# --- CONSULTA ---
+
+def get_session_totals(caixa_id):
+    """
+    Retorna os totais da sessão: dict com CAMPOS_TOTAIS, 'valor_inicial'
+    e 'formas' ({forma: total}, só formas com pagamentos válidos).
+    """
+    conn = get_connection()
+    try:
+        return read_session_totals(conn.cursor(), caixa_id)
+    finally:
+        conn.close()
+
+
+def read_session_totals(cur, caixa_id):
+    """Como get_session_totals(), na transação aberta em 'cur'."""
+    cur.execute("SELECT valor_inicial FROM caixa_sessoes WHERE id = ?", (caixa_id,))
+    abertura = cur.fetchone()
+
+    cur.execute(f"SELECT {', '.join(CAMPOS_TOTAIS)} FROM caixa_totais WHERE caixa_id = ?", (caixa_id,))
+    row = cur.fetchone()
+    totais = dict(row) if row else dict.fromkeys(CAMPOS_TOTAIS, 0)
+    totais['valor_inicial'] = (abertura['valor_inicial'] or 0.0) if abertura else 0.0
+
+    cur.execute("""
+        SELECT forma, total FROM caixa_totais_formas
+        WHERE caixa_id = ? AND qtd > 0
+        ORDER BY forma
+    """, (caixa_id,))
+    totais['formas'] = {r['forma']: r['total'] for r in cur.fetchall()}
+    return totais
+
+
+def expected_closing_totals(totais):
+    """
+    Valores esperados na conferência de fechamento, por forma de
+    pagamento: o Dinheiro inclui abertura + suprimentos - sangrias.
+    """
+    esperado = dict.fromkeys(FORMAS_PADRAO, 0.0)
+    for forma, total in totais['formas'].items():
+        esperado[forma] = esperado.get(forma, 0.0) + total
+    esperado["Dinheiro"] += totais['valor_inicial'] + totais['total_suprimentos'] - totais['total_sangrias']
+    return esperado
+
+
+# --- VERIFICAÇÃO DE CONSISTÊNCIA ---
+
+def _snapshot(cur, caixa_id):
+    cur.execute(f"SELECT {', '.join(CAMPOS_TOTAIS)} FROM caixa_totais WHERE caixa_id = ?", (caixa_id,))
+    row = cur.fetchone()
+    totais = dict(row) if row else dict.fromkeys(CAMPOS_TOTAIS, 0)
+    cur.execute("SELECT forma, total FROM caixa_totais_formas WHERE caixa_id = ? AND qtd > 0", (caixa_id,))
+    for r in cur.fetchall():
+        totais[f"forma:{r['forma']}"] = r['total']
+    return totais
+
+
+def check_session_totals(caixa_id, repair=True):
+    """
+    Recalcula os totais da sessão a partir das vendas, pagamentos e
+    movimentações e compara com os acumulados.
+    Retorna {"success", "divergencias": {campo: (acumulado, recalculado)}}.
+    Com repair=True os totais recalculados são gravados.
+    """
+    conn = get_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        cur = conn.cursor()
+        atual = _snapshot(cur, caixa_id)
+        rebuild_caixa_totais(cur, caixa_id)
+        recalculado = _snapshot(cur, caixa_id)
+
+        divergencias = {}
+        for campo in set(atual) | set(recalculado):
+            a, r = atual.get(campo, 0) or 0, recalculado.get(campo, 0) or 0
+            if abs(a - r) > TOLERANCIA:
+                divergencias[campo] = (a, r)
+
+        if divergencias and repair:
+            conn.commit()
+            logger.warning(f"Totais do caixa {caixa_id} divergentes, recalculados: {divergencias}")
+        else:
+            conn.rollback()
+            if divergencias:
+                logger.warning(f"Totais do caixa {caixa_id} divergentes: {divergencias}")
+        return {"success": True, "divergencias": divergencias}
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Erro ao verificar totais do caixa {caixa_id}: {e}", exc_info=True)
+        return {"success": False, "error": f"Erro ao verificar totais do caixa: {e}"}
+    finally:
+        conn.close()
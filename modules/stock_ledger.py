@@ -0,0 +1,348 @@
+# modules/stock_ledger.py
+"""
+Razão de estoque: lançamentos somente de inclusão por produto/depósito.
+
+Cada entrada ou saída (venda, cancelamento, ajuste de inventário,
+transferência, compra) é um lançamento em 'estoque_movimentos'
+(migração 15) com o documento de origem. A tabela 'estoque' é um cache
+do saldo atual, mantido pelo gatilho de inclusão do razão e
+reconstruível a qualquer momento (database.db.rebuild_estoque).
+
+Cortes mensais por depósito ('estoque_saldos') guardam o saldo de cada
+produto no fim do último dia do mês. O estoque numa data é o corte
+anterior mais os lançamentos desde então, uma faixa do índice limitada
+a um mês, e o histórico de um produto começa pelo saldo calculado assim
+no dia anterior ao período. StockSnapshotter cria o corte do mês
+encerrado ao iniciar e logo após cada meia-noite; lançamentos
+retroativos são somados aos cortes já feitos pelo próprio gatilho.
+
+Cortes pendentes e verificação/correção do estoque pelo razão:
+    python -m modules.stock_ledger [--cortes] [--check]
+"""
+import sys
+import logging
+import threading
+from datetime import date, datetime, timedelta
+from database.db import get_connection, rebuild_estoque, rebuild_estoque_saldos
+
+logger = logging.getLogger(__name__)
+
+VENDA = 'VENDA'
+CANCELAMENTO = 'CANCELAMENTO'
+AJUSTE = 'AJUSTE'
+TRANSFERENCIA = 'TRANSFERENCIA'
+COMPRA = 'COMPRA'
+
+FOLGA_MEIA_NOITE = 5  # segundos após a virada do dia
+
+SQL_INSERT_MOVIMENTO = """
+    INSERT INTO estoque_movimentos (
+        data_movimento, id_produto, id_deposito, quantidade, tipo,
+        documento_tipo, documento_id, user_id, observacao
+    )
+    VALUES (COALESCE(?, CURRENT_TIMESTAMP), ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+# --- LANÇAMENTOS ---
+
+def record_movements(cur, tipo, deposito_id, deltas, documento_tipo=None, documento_id=None,
+                     user_id=None, data=None, observacao=None):
+    """
+    Lança [(produto_id, delta)] no depósito (delta negativo = saída) na
+    transação aberta em 'cur'. 'data' (texto 'AAAA-MM-DD HH:MM:SS')
+    é a data do lançamento; padrão: agora.
+    """
+    cur.executemany(SQL_INSERT_MOVIMENTO, [
+        (data, pid, deposito_id, qtd, tipo, documento_tipo, documento_id, user_id, observacao)
+        for pid, qtd in deltas
+    ])
+
+
+def reverse_document(cur, documento_tipo, documento_id, tipo=CANCELAMENTO, user_id=None, observacao=None):
+    """
+    Estorna os lançamentos de um documento (ex.: a venda cancelada) nos
+    mesmos depósitos de onde saíram. Retorna o número de lançamentos
+    (0 se o documento não tem lançamentos no razão).
+    """
+    cur.execute("""
+        SELECT id_deposito, id_produto, ROUND(SUM(quantidade), 3) AS quantidade
+        FROM estoque_movimentos
+        WHERE documento_tipo = ? AND documento_id = ?
+        GROUP BY id_deposito, id_produto
+        HAVING ROUND(SUM(quantidade), 3) != 0
+        ORDER BY id_deposito, id_produto
+    """, (documento_tipo, documento_id))
+    linhas = cur.fetchall()
+    cur.executemany(SQL_INSERT_MOVIMENTO, [
+        (None, r['id_produto'], r['id_deposito'], -r['quantidade'], tipo,
+         documento_tipo, documento_id, user_id, observacao)
+        for r in linhas
+    ])
+    return len(linhas)
+
+
+def record_transfer(cur, origem_id, destino_id, deltas, documento_tipo=None, documento_id=None,
+                    user_id=None, observacao=None):
+    """Transfere [(produto_id, quantidade)] (positivas) do depósito de origem para o de destino."""
+    record_movements(cur, TRANSFERENCIA, origem_id, [(pid, -qtd) for pid, qtd in deltas],
+                     documento_tipo, documento_id, user_id, observacao=observacao)
+    record_movements(cur, TRANSFERENCIA, destino_id, deltas,
+                     documento_tipo, documento_id, user_id, observacao=observacao)
+
+
+def record_inventory_count(cur, deposito_id, contagens, user_id=None, observacao=None):
+    """
+    Ajusta o estoque à contagem {produto_id: quantidade contada},
+    lançando a diferença para o saldo atual como AJUSTE.
+    Retorna [(produto_id, delta)] lançados.
+    """
+    atuais = {}
+    ids = sorted(contagens)
+    for inicio in range(0, len(ids), 500):
+        lote = ids[inicio:inicio + 500]
+        marcadores = ", ".join("?" for _ in lote)
+        cur.execute(f"""
+            SELECT id_produto, quantidade FROM estoque
+            WHERE id_deposito = ? AND id_produto IN ({marcadores})
+        """, (deposito_id, *lote))
+        atuais.update((r['id_produto'], r['quantidade'] or 0.0) for r in cur.fetchall())
+
+    deltas = [(pid, round(contagens[pid] - atuais.get(pid, 0.0), 3)) for pid in ids]
+    deltas = [(pid, qtd) for pid, qtd in deltas if qtd != 0]
+    record_movements(cur, AJUSTE, deposito_id, deltas, 'INVENTARIO', None, user_id, observacao=observacao)
+    return deltas
+
+
+# --- CONSULTA ---
+
+def _dia_seguinte(dia):
+    return (date.fromisoformat(dia) + timedelta(days=1)).isoformat()
+
+
+def _ultimo_corte(cur, deposito_id, dia):
+    cur.execute("""
+        SELECT MAX(data_corte) AS data_corte FROM estoque_saldos_cortes
+        WHERE id_deposito = ? AND data_corte <= ?
+    """, (deposito_id, dia))
+    return cur.fetchone()['data_corte']
+
+
+def stock_at(cur, deposito_id, dia, produto_id=None):
+    """
+    Saldo no fim do dia 'dia' ('AAAA-MM-DD'): {produto_id: quantidade}
+    (só os diferentes de zero), de todo o depósito ou de um produto.
+    """
+    corte = _ultimo_corte(cur, deposito_id, dia)
+    inicio = _dia_seguinte(corte) if corte else ""
+    fim = _dia_seguinte(dia)
+
+    saldos = {}
+    if produto_id is None:
+        if corte:
+            cur.execute("""
+                SELECT id_produto, quantidade FROM estoque_saldos
+                WHERE id_deposito = ? AND data_corte = ?
+            """, (deposito_id, corte))
+            saldos.update((r['id_produto'], r['quantidade']) for r in cur.fetchall())
+        cur.execute("""
+            SELECT id_produto, SUM(quantidade) AS quantidade FROM estoque_movimentos
+            WHERE id_deposito = ? AND data_movimento >= ? AND data_movimento < ?
+            GROUP BY id_produto
+        """, (deposito_id, inicio, fim))
+    else:
+        if corte:
+            cur.execute("""
+                SELECT id_produto, quantidade FROM estoque_saldos
+                WHERE id_deposito = ? AND data_corte = ? AND id_produto = ?
+            """, (deposito_id, corte, produto_id))
+            saldos.update((r['id_produto'], r['quantidade']) for r in cur.fetchall())
+        cur.execute("""
+            SELECT id_produto, SUM(quantidade) AS quantidade FROM estoque_movimentos
+            WHERE id_produto = ? AND id_deposito = ? AND data_movimento >= ? AND data_movimento < ?
+            GROUP BY id_produto
+        """, (produto_id, deposito_id, inicio, fim))
+    for r in cur.fetchall():
+        saldos[r['id_produto']] = saldos.get(r['id_produto'], 0.0) + r['quantidade']
+
+    return {pid: round(qtd, 3) for pid, qtd in saldos.items() if round(qtd, 3) != 0}
+
+
+def movement_history(cur, produto_id, deposito_id, dia_inicio, dia_fim):
+    """
+    Kardex do produto no depósito entre dia_inicio e dia_fim ('AAAA-MM-DD').
+    Retorna (saldo_anterior, [{"id", "data_movimento", "tipo", "quantidade",
+    "documento_tipo", "documento_id", "user_id", "observacao", "saldo"}]).
+    """
+    vespera = (date.fromisoformat(dia_inicio) - timedelta(days=1)).isoformat()
+    saldo_anterior = stock_at(cur, deposito_id, vespera, produto_id).get(produto_id, 0.0)
+
+    cur.execute("""
+        SELECT id, data_movimento, tipo, quantidade, documento_tipo, documento_id, user_id, observacao
+        FROM estoque_movimentos
+        WHERE id_produto = ? AND id_deposito = ? AND data_movimento >= ? AND data_movimento < ?
+        ORDER BY data_movimento, id
+    """, (produto_id, deposito_id, dia_inicio, _dia_seguinte(dia_fim)))
+    saldo = saldo_anterior
+    historico = []
+    for row in cur.fetchall():
+        saldo = round(saldo + row['quantidade'], 3)
+        linha = dict(row)
+        linha['saldo'] = saldo
+        historico.append(linha)
+    return saldo_anterior, historico
+
+
+# --- CORTES ---
+
+def take_snapshot(cur, deposito_id, data_corte):
+    """
+    Grava o saldo do depósito no fim de 'data_corte' ('AAAA-MM-DD') a partir
+    do corte anterior e dos lançamentos desde ele.
+    Retorna False se o corte já existia.
+    """
+    cur.execute("""
+        INSERT INTO estoque_saldos_cortes (id_deposito, data_corte) VALUES (?, ?)
+        ON CONFLICT (id_deposito, data_corte) DO NOTHING
+    """, (deposito_id, data_corte))
+    if cur.rowcount == 0:
+        return False
+
+    cur.execute("""
+        SELECT MAX(data_corte) AS data_corte FROM estoque_saldos_cortes
+        WHERE id_deposito = ? AND data_corte < ?
+    """, (deposito_id, data_corte))
+    anterior = cur.fetchone()['data_corte']
+    cur.execute("""
+        INSERT INTO estoque_saldos (id_deposito, data_corte, id_produto, quantidade)
+        SELECT ?, ?, id_produto, ROUND(SUM(quantidade), 3)
+        FROM (
+            SELECT id_produto, quantidade FROM estoque_saldos
+            WHERE id_deposito = ? AND data_corte = ?
+            UNION ALL
+            SELECT id_produto, quantidade FROM estoque_movimentos
+            WHERE id_deposito = ? AND data_movimento >= ? AND data_movimento < ?
+        )
+        GROUP BY id_produto
+        HAVING ROUND(SUM(quantidade), 3) != 0
+    """, (deposito_id, data_corte, deposito_id, anterior,
+          deposito_id, _dia_seguinte(anterior) if anterior else "", _dia_seguinte(data_corte)))
+    return True
+
+
+def take_due_snapshots(hoje=None):
+    """
+    Cria, para cada depósito, o corte do último dia do mês anterior a
+    'hoje' (date; padrão: data UTC, a mesma dos lançamentos) se ainda não existir.
+    Retorna {"success", "cortes"}.
+    """
+    hoje = hoje or datetime.utcnow().date()
+    data_corte = (hoje.replace(day=1) - timedelta(days=1)).isoformat()
+    conn = get_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        cur = conn.cursor()
+        cur.execute("SELECT id FROM depositos ORDER BY id")
+        cortes = sum(take_snapshot(cur, row['id'], data_corte) for row in cur.fetchall())
+        conn.commit()
+        if cortes:
+            logger.info(f"Cortes de estoque de {data_corte}: {cortes} depósito(s).")
+        return {"success": True, "cortes": cortes}
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Erro ao gravar os cortes de estoque: {e}", exc_info=True)
+        return {"success": False, "error": f"Erro ao gravar os cortes de estoque: {e}"}
+    finally:
+        conn.close()
+
+
+class StockSnapshotter:
+    """Executa take_due_snapshots() agora e a cada virada de dia, até close()."""
+
+    def __init__(self):
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="StockSnapshotter", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while not self._parar.is_set():
+            take_due_snapshots()
+            agora = datetime.utcnow()
+            amanha = datetime.combine(agora.date() + timedelta(days=1), datetime.min.time())
+            self._parar.wait((amanha - agora).total_seconds() + FOLGA_MEIA_NOITE)
+
+    def close(self):
+        self._parar.set()
+
+
+_snapshotter = None
+
+
+def start_stock_snapshots():
+    """Inicia os cortes mensais do processo (uma única instância)."""
+    global _snapshotter
+    if _snapshotter is None:
+        _snapshotter = StockSnapshotter()
+    return _snapshotter
+
+
+# --- VERIFICAÇÃO DE CONSISTÊNCIA ---
+
+def _snapshot(cur):
+    cur.execute("SELECT id_produto, id_deposito, quantidade FROM estoque")
+    estoque = {(r['id_produto'], r['id_deposito']): round(r['quantidade'] or 0.0, 3) for r in cur.fetchall()}
+    cur.execute("SELECT id_deposito, data_corte, id_produto, quantidade FROM estoque_saldos WHERE quantidade != 0")
+    saldos = {(r['id_deposito'], r['data_corte'], r['id_produto']): round(r['quantidade'], 3) for r in cur.fetchall()}
+    return estoque, saldos
+
+
+def check_stock_ledger(repair=True):
+    """
+    Recalcula 'estoque' e os cortes a partir do razão e compara com os
+    mantidos pelos gatilhos.
+    Retorna {"success", "divergencias": {chave: (atual, recalculado)}}.
+    Com repair=True os valores recalculados são gravados.
+    """
+    conn = get_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        cur = conn.cursor()
+        estoque, saldos = _snapshot(cur)
+        rebuild_estoque(cur)
+        rebuild_estoque_saldos(cur)
+        estoque_novo, saldos_novos = _snapshot(cur)
+
+        divergencias = {}
+        for atual, novo, rotulo in ((estoque, estoque_novo, "estoque"), (saldos, saldos_novos, "corte")):
+            for chave in set(atual) | set(novo):
+                if atual.get(chave, 0.0) != novo.get(chave, 0.0):
+                    divergencias[(rotulo, *chave)] = (atual.get(chave), novo.get(chave))
+
+        if divergencias and repair:
+            conn.commit()
+            logger.warning(f"Estoque divergente do razão, recalculado: {divergencias}")
+        else:
+            conn.rollback()
+            if divergencias:
+                logger.warning(f"Estoque divergente do razão: {divergencias}")
+        return {"success": True, "divergencias": divergencias}
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Erro ao verificar o estoque pelo razão: {e}", exc_info=True)
+        return {"success": False, "error": f"Erro ao verificar o estoque pelo razão: {e}"}
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    if "--cortes" in sys.argv:
+        resultado = take_due_snapshots()
+        print(resultado["error"] if not resultado["success"] else f"{resultado['cortes']} corte(s) gravado(s).")
+    resultado = check_stock_ledger(repair="--check" not in sys.argv)
+    if not resultado["success"]:
+        print(resultado["error"])
+    elif resultado["divergencias"]:
+        for chave, (atual, recalculado) in sorted(resultado["divergencias"].items(), key=str):
+            print(f"{chave}: {atual} -> {recalculado}")
+    else:
+        print("Estoque confere com o razão.")
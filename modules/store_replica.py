@@ -0,0 +1,697 @@
+# modules/store_replica.py
+"""
+Terminal em modo réplica do servidor da loja (modules/store_server.py).
+
+Ativado pela variável de ambiente BLUESYS_SERVIDOR_LOJA=host[:porta],
+com a chave da loja em BLUESYS_CHAVE_LOJA (a mesma do servidor; o
+"hello" de cada conexão prova que o terminal a tem, sem enviá-la).
+configure() troca o banco do processo (database.db.DB_PATH) por uma
+cópia local (BLUESYS_REPLICA_DB, padrão database/replica.db) antes de
+create_tables(): o PDV lê catálogo, preços, clientes e cadastros da
+cópia local, sem ida à rede, e continua vendendo com o servidor fora.
+
+ReplicaSync mantém a cópia e a saída numa thread:
+- envio: vendas, cancelamentos, conversões para fiscal, movimentações
+  e fechamento de caixa são gravados na cópia local e, na mesma
+  transação, em 'replicacao_saida' (enqueue_event); a thread envia a
+  saída em lotes de LOTE_ENVIO, na ordem, e marca o que o servidor
+  confirmou. notify() acorda a thread logo depois de uma gravação;
+- catálogo: alterações desde a última posição de 'catalogo_alteracoes'
+  do servidor, a cada INTERVALO_SINCRONIA (recarga completa se a posição
+  foi descartada na compactação do servidor). Os gatilhos locais alimentam o
+  'catalogo_alteracoes' da cópia, então o índice de códigos do PDV
+  (modules/product_lookup.py) acompanha as mudanças como antes. Produto
+  excluído no servidor fica inativo na cópia (pode haver vendas locais);
+- cadastros (REPLICADAS): a cada INTERVALO_CADASTROS compara os digestos
+  das páginas no servidor com os da última cópia e busca só as páginas
+  que mudaram;
+- clientes (INCREMENTAIS): a cada INTERVALO_SINCRONIA, as linhas
+  alteradas desde a última versão lida do log de alterações do servidor
+  (migração 18). A primeira cópia, e uma nova se a posição expirar na
+  compactação do servidor, é feita por páginas.
+A posição do catálogo, as posições no log e os digestos ficam em
+'replicacao_estado'.
+
+Numeração: RemoteTerminalSequence pede os blocos de números ao servidor
+(único dono dos contadores) e pré-reserva o próximo bloco quando metade
+do atual foi usada, para o terminal seguir vendendo sem o servidor. Os
+blocos ficam em 'sequencias_blocos' da cópia como no modo direto; as
+lacunas conferidas na abertura vão para o servidor como eventos.
+
+Abertura de caixa e cadastro de clientes precisam do servidor (o id é
+atribuído por ele). As demais telas de cadastro e o financeiro devem
+ser usados na máquina do banco central: alterações feitas na cópia
+local não são enviadas e são sobrescritas pela sincronia.
+
+Situação da cópia local e da saída:
+    BLUESYS_SERVIDOR_LOJA=host:porta BLUESYS_CHAVE_LOJA=... python -m modules.store_replica [--sincronizar]
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timezone
+import database.db as db
+from database.db import get_connection
+from .sequence_service import TerminalSequence
+from .store_server import (
+    PORTA_PADRAO, ENV_CHAVE, REPLICADAS, CHAVES, OMITIDAS, INCREMENTAIS, TAMANHO_PAGINA,
+    StoreError, encode, proof, LACUNA,
+)
+
+logger = logging.getLogger(__name__)
+
+ENV_SERVIDOR = "BLUESYS_SERVIDOR_LOJA"
+ENV_REPLICA_DB = "BLUESYS_REPLICA_DB"
+REPLICA_DB_PADRAO = os.path.join(db.DB_DIR, "replica.db")
+
+INTERVALO_SINCRONIA = 2.0      # segundos entre envios/consultas do catálogo
+INTERVALO_CADASTROS = 30.0     # segundos entre conferências dos cadastros
+LOTE_ENVIO = 200               # eventos por lote enviado
+LOTE_CATALOGO = 500            # produtos por página da carga inicial
+TAMANHO_BLOCO_REPLICA = 200    # números de venda por bloco pedido ao servidor
+RETENCAO_ENVIADOS = "-7 days"  # eventos confirmados mantidos na saída
+
+
+class StoreUnavailable(ConnectionError):
+    """Servidor da loja inacessível (ou ocupado): tentar de novo mais tarde."""
+
+
+def timestamp():
+    """Agora no formato/fuso do CURRENT_TIMESTAMP do SQLite."""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def enqueue_event(cur, tipo, dados):
+    """Grava um evento na saída, na transação aberta em 'cur'; retorna o id do evento."""
+    evento_id = uuid.uuid4().hex
+    cur.execute("INSERT INTO replicacao_saida (evento_id, tipo, dados) VALUES (?, ?, ?)",
+                (evento_id, tipo, json.dumps(dados, default=str)))
+    return evento_id
+
+
+# --- CLIENTE ---
+
+class StoreClient:
+    """Conexão com o servidor da loja (reaberta a cada falha); segura entre threads."""
+
+    def __init__(self, host, porta=PORTA_PADRAO, chave=None, timeout=10.0):
+        self.host = host
+        self.porta = porta
+        self.chave = chave
+        self.timeout = timeout
+        self._sock = None
+        self._arquivo = None
+        self._lock = threading.Lock()
+
+    def request(self, op, **dados):
+        """
+        Envia um pedido e retorna a resposta (dict sem "ok"). Recusas do
+        servidor sobem como StoreError; falhas de rede e erros transitórios
+        do banco central, como StoreUnavailable.
+        """
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._sock = socket.create_connection((self.host, self.porta), timeout=self.timeout)
+                    self._arquivo = self._sock.makefile("rb")
+                    self._autenticar()
+                resposta = self._trocar({"op": op, **dados})
+            except OSError as e:
+                self._fechar()
+                raise StoreUnavailable(f"Servidor da loja {self.host}:{self.porta} indisponível: {e}") from e
+        if resposta.pop("ok"):
+            return resposta
+        if resposta.get("codigo") == "TRANSITORIO":
+            raise StoreUnavailable(resposta["erro"])
+        raise StoreError(resposta["erro"], resposta.get("codigo", "ERRO"))
+
+    def _trocar(self, mensagem):
+        self._sock.sendall(encode(mensagem))
+        linha = self._arquivo.readline()
+        if not linha:
+            raise ConnectionError("conexão encerrada pelo servidor")
+        return json.loads(linha)
+
+    def _autenticar(self):
+        """"hello" da conexão nova: responde ao desafio do servidor com a prova da chave."""
+        desafio = self._trocar({"op": "hello"}).get("desafio")
+        resposta = self._trocar({"op": "hello", "prova": proof(self.chave, desafio or ""),
+                                 "hostname": socket.gethostname()})
+        if not resposta.get("ok"):
+            self._fechar()
+            raise StoreError(resposta.get("erro", "Conexão recusada pelo servidor da loja."),
+                             resposta.get("codigo", "NAO_AUTORIZADO"))
+
+    def _fechar(self):
+        for recurso in (self._arquivo, self._sock):
+            try:
+                if recurso is not None:
+                    recurso.close()
+            except OSError:
+                pass
+        self._sock = self._arquivo = None
+
+    def close(self):
+        with self._lock:
+            self._fechar()
+
+
+# --- APLICAÇÃO NA CÓPIA LOCAL ---
+
+def _colunas_locais(cur, tabela):
+    cur.execute(f"PRAGMA table_info({tabela})")
+    return {row['name'] for row in cur.fetchall()}
+
+
+def _upsert(cur, tabela, chave, dados):
+    """Inclui/atualiza pela 'chave' as linhas recebidas ({"colunas", "linhas"})."""
+    if not dados["linhas"]:
+        return
+    locais = _colunas_locais(cur, tabela)
+    indices = [i for i, c in enumerate(dados["colunas"]) if c in locais]
+    colunas = [dados["colunas"][i] for i in indices]
+    atualizar = ", ".join(f"{c} = excluded.{c}" for c in colunas if c != chave)
+    cur.executemany(f"""
+        INSERT INTO {tabela} ({', '.join(colunas)}) VALUES ({', '.join('?' for _ in colunas)})
+        ON CONFLICT ({chave}) DO {'UPDATE SET ' + atualizar if atualizar else 'NOTHING'}
+    """, [[linha[i] for i in indices] for linha in dados["linhas"]])
+
+
+def _excluir(cur, tabela, chave, valores):
+    """Exclui as linhas; as ainda referenciadas na cópia (p. ex. por vendas locais) são mantidas."""
+    for valor in valores:
+        cur.execute("SAVEPOINT exclusao")
+        try:
+            cur.execute(f"DELETE FROM {tabela} WHERE {chave} = ?", (valor,))
+            cur.execute("RELEASE exclusao")
+        except sqlite3.IntegrityError:
+            cur.execute("ROLLBACK TO exclusao")
+            cur.execute("RELEASE exclusao")
+            logger.warning(f"Réplica: {tabela} {chave}={valor} excluído no servidor e mantido (referenciado na cópia).")
+
+
+def _ids(dados, coluna="id"):
+    if not dados["linhas"]:
+        return set()
+    indice = dados["colunas"].index(coluna)
+    return {linha[indice] for linha in dados["linhas"]}
+
+
+def apply_page(cur, tabela, pagina, dados):
+    """Substitui a página 'pagina' de 'tabela' na cópia pelas linhas recebidas."""
+    chave = CHAVES[tabela]
+    inicio = pagina * TAMANHO_PAGINA
+    cur.execute(f"SELECT {chave} FROM {tabela} WHERE {chave} BETWEEN ? AND ?", (inicio, inicio + TAMANHO_PAGINA - 1))
+    _excluir(cur, tabela, chave, sorted({row[0] for row in cur.fetchall()} - _ids(dados, chave)))
+    # Pai depois do filho na mesma página (categorias, permissões): conferido no commit
+    cur.execute("PRAGMA defer_foreign_keys = ON")
+    _upsert(cur, tabela, chave, dados)
+    # Cópias anteriores à projeção do servidor ainda guardam essas colunas
+    for coluna in OMITIDAS.get(tabela, ()):
+        cur.execute(f"UPDATE {tabela} SET {coluna} = NULL WHERE {chave} BETWEEN ? AND ? AND {coluna} IS NOT NULL",
+                    (inicio, inicio + TAMANHO_PAGINA - 1))
+
+
+def apply_catalog(cur, carga):
+    """Aplica uma carga de catalog_payload() (store_server) na cópia."""
+    ids = carga["ids"]
+    if not ids:
+        return
+    marcadores = ", ".join("?" for _ in ids)
+    # Preços/códigos que saíram do produto primeiro (um código pode ter mudado de produto)
+    for tabela, dados in (("produto_tabela_preco", carga["precos"]), ("produto_codigos_alternativos", carga["codigos"])):
+        cur.execute(f"SELECT id FROM {tabela} WHERE id_produto IN ({marcadores})", ids)
+        sobrando = [row[0] for row in cur.fetchall() if row[0] not in _ids(dados)]
+        cur.executemany(f"DELETE FROM {tabela} WHERE id = ?", [(i,) for i in sobrando])
+    cur.execute("PRAGMA defer_foreign_keys = ON")
+    _upsert(cur, "produtos", "id", carga["produtos"])
+    _upsert(cur, "produto_tabela_preco", "id", carga["precos"])
+    _upsert(cur, "produto_codigos_alternativos", "id", carga["codigos"])
+    if carga["removidos"]:
+        cur.execute(f"UPDATE produtos SET active = 0 WHERE id IN ({', '.join('?' for _ in carga['removidos'])})",
+                    carga["removidos"])
+
+
+def apply_changes(cur, tabela, carga):
+    """Aplica uma resposta de "alteracoes" (store_server): linhas atuais e ids excluídos."""
+    _excluir(cur, tabela, "id", carga["excluidos"])
+    cur.execute("PRAGMA defer_foreign_keys = ON")
+    _upsert(cur, tabela, "id", carga)
+
+
+def _ler_estado(cur, chave, padrao=None):
+    cur.execute("SELECT valor FROM replicacao_estado WHERE chave = ?", (chave,))
+    row = cur.fetchone()
+    return json.loads(row['valor']) if row else padrao
+
+
+def _gravar_estado(cur, chave, valor):
+    cur.execute("""
+        INSERT INTO replicacao_estado (chave, valor) VALUES (?, ?)
+        ON CONFLICT (chave) DO UPDATE SET valor = excluded.valor
+    """, (chave, json.dumps(valor)))
+
+
+# --- SINCRONIA ---
+
+class ReplicaSync:
+    """Cópia local + envio da saída ao servidor da loja, numa thread (start/close)."""
+
+    def __init__(self, cliente):
+        self.cliente = cliente
+        self.consumidor = f"replica:{socket.gethostname()}"  # nome no log de alterações do servidor
+        self.numeracao = None  # RemoteTerminalSequence do PDV (pré-reserva de números)
+        self.online = False
+        self._proximos_cadastros = 0.0
+        self._parar = threading.Event()
+        self._acordar = threading.Event()
+        self._thread = None
+
+    # --- CICLO ---
+
+    def start(self):
+        """
+        Faz a cópia inicial se a cópia local ainda não existe (exige o
+        servidor) e inicia a thread de sincronia.
+        """
+        conn = get_connection()
+        try:
+            inicializada = _ler_estado(conn.cursor(), "catalogo_seq") is not None
+        finally:
+            conn.close()
+        if not inicializada:
+            logger.info("Réplica: criando a cópia local a partir do servidor da loja...")
+            self.bootstrap()
+        self._thread = threading.Thread(target=self._loop, name="ReplicaSync", daemon=True)
+        self._thread.start()
+
+    def notify(self):
+        """Acorda a thread para enviar a saída (chamado depois de gravar um evento)."""
+        self._acordar.set()
+
+    def close(self):
+        self._parar.set()
+        self._acordar.set()
+
+    def _loop(self):
+        while not self._parar.is_set():
+            self.sync_once()
+            self._acordar.wait(INTERVALO_SINCRONIA)
+            self._acordar.clear()
+
+    def sync_once(self):
+        """Um ciclo: envio da saída, pré-reserva de números, catálogo, clientes e (no intervalo) cadastros."""
+        try:
+            self.push()
+            if self.numeracao is not None:
+                self.numeracao.prefetch()
+            self.pull_catalog()
+            self.pull_changes()
+            agora = time.monotonic()
+            if agora >= self._proximos_cadastros:
+                self.pull_tables()
+                self._proximos_cadastros = agora + INTERVALO_CADASTROS
+            if not self.online:
+                logger.info("Réplica: servidor da loja acessível.")
+            self.online = True
+        except StoreUnavailable as e:
+            if self.online:
+                logger.warning(f"Réplica: {e}. Vendas seguem na saída local.")
+            self.online = False
+        except Exception as e:
+            logger.error(f"Réplica: erro na sincronia: {e}", exc_info=True)
+
+    def bootstrap(self):
+        """Cópia inicial: cadastros e catálogo completos (a posição do catálogo é lida antes)."""
+        self._conferir_versao()
+        self.pull_tables()
+        self.pull_changes()
+        self._copy_catalog()
+        logger.info("Réplica: cópia local criada.")
+
+    def _copy_catalog(self):
+        """Carga completa do catálogo por faixa de id; a posição do log é lida antes."""
+        seq = self.cliente.request("catalogo_inicio")["seq"]
+        apos_id = 0
+        while True:
+            carga = self.cliente.request("catalogo_produtos", apos_id=apos_id, limite=LOTE_CATALOGO)
+            if carga["ultimo_id"] is None:
+                break
+            self._aplicar(lambda cur: apply_catalog(cur, carga))
+            apos_id = carga["ultimo_id"]
+        self._aplicar(lambda cur: _gravar_estado(cur, "catalogo_seq", seq))
+
+    def _conferir_versao(self):
+        remota = self.cliente.request("hello")["versao_schema"]
+        conn = get_connection()
+        try:
+            local = db.get_schema_version(conn)
+        finally:
+            conn.close()
+        if remota != local:
+            raise StoreError(f"Versão do banco do servidor ({remota}) diferente da do terminal ({local}): atualize ambos.", "VERSAO")
+
+    def _aplicar(self, passo):
+        conn = get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            passo(conn.cursor())
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    # --- ENVIO ---
+
+    def push(self):
+        """Envia a saída pendente em lotes, na ordem. Retorna o número de eventos confirmados."""
+        total = 0
+        while True:
+            conn = get_connection()
+            try:
+                cur = conn.cursor()
+                cur.execute("""
+                    SELECT id, evento_id, tipo, dados FROM replicacao_saida
+                    WHERE enviado_em IS NULL ORDER BY id LIMIT ?
+                """, (LOTE_ENVIO,))
+                lote = cur.fetchall()
+            finally:
+                conn.close()
+            if not lote:
+                return total
+
+            eventos = [{"id": r['evento_id'], "tipo": r['tipo'], "dados": json.loads(r['dados'])} for r in lote]
+            confirmados = set(self.cliente.request("enviar", terminal_id=self._terminal_id(eventos), eventos=eventos)["confirmados"])
+
+            def marcar(cur):
+                cur.executemany("UPDATE replicacao_saida SET enviado_em = CURRENT_TIMESTAMP WHERE id = ?",
+                                [(r['id'],) for r in lote if r['evento_id'] in confirmados])
+                cur.execute("DELETE FROM replicacao_saida WHERE enviado_em < datetime('now', ?)", (RETENCAO_ENVIADOS,))
+            self._aplicar(marcar)
+            total += len(confirmados)
+            if len(confirmados) < len(lote):
+                return total
+
+    def _terminal_id(self, eventos):
+        if self.numeracao is not None:
+            return self.numeracao.terminal_id
+        return next((e["dados"].get("terminal_id") for e in eventos if e["dados"].get("terminal_id")), None)
+
+    @property
+    def pendentes(self):
+        conn = get_connection()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM replicacao_saida WHERE enviado_em IS NULL").fetchone()[0]
+        finally:
+            conn.close()
+
+    # --- CÓPIA LOCAL ---
+
+    def pull_catalog(self):
+        """
+        Aplica as alterações do catálogo desde a última posição. Posição já
+        descartada pelo servidor (EXPIRADO): recarrega o catálogo inteiro.
+        Retorna o número de produtos.
+        """
+        total = 0
+        while True:
+            conn = get_connection()
+            try:
+                desde = _ler_estado(conn.cursor(), "catalogo_seq", 0)
+            finally:
+                conn.close()
+            try:
+                carga = self.cliente.request("catalogo", desde=desde, consumidor=self.consumidor)
+            except StoreError as e:
+                if e.codigo != "EXPIRADO":
+                    raise
+                logger.warning(f"Réplica: {e} Recarregando o catálogo.")
+                self._copy_catalog()
+                continue
+            if carga["ate"] == desde:
+                return total
+
+            def aplicar(cur):
+                apply_catalog(cur, carga)
+                _gravar_estado(cur, "catalogo_seq", carga["ate"])
+            self._aplicar(aplicar)
+            total += len(carga["ids"])
+            if not carga["mais"]:
+                return total
+
+    def pull_tables(self):
+        """Busca as páginas dos cadastros cujo digesto mudou. Retorna o número de páginas aplicadas."""
+        total = 0
+        for tabela, _ in REPLICADAS:
+            if tabela not in INCREMENTAIS:
+                total += self._pull_pages(tabela)
+        return total
+
+    def _pull_pages(self, tabela):
+        remotas = {int(p): d for p, d in self.cliente.request("paginas", tabela=tabela)["paginas"].items()}
+        conn = get_connection()
+        try:
+            locais = {int(p): d for p, d in _ler_estado(conn.cursor(), f"paginas:{tabela}", {}).items()}
+        finally:
+            conn.close()
+
+        total = 0
+        for pagina in sorted(set(remotas) | set(locais)):
+            if remotas.get(pagina) == locais.get(pagina):
+                continue
+            if pagina in remotas:
+                dados = self.cliente.request("pagina", tabela=tabela, pagina=pagina)
+                locais[pagina] = remotas[pagina]
+            else:
+                dados = {"colunas": [], "linhas": []}
+                del locais[pagina]
+
+            def aplicar(cur, pagina=pagina, dados=dados, estado=dict(locais)):
+                apply_page(cur, tabela, pagina, dados)
+                _gravar_estado(cur, f"paginas:{tabela}", estado)
+            self._aplicar(aplicar)
+            total += 1
+        return total
+
+    def pull_changes(self):
+        """
+        Aplica as alterações dos cadastros INCREMENTAIS desde a última versão
+        lida do log do servidor. Sem posição (primeira cópia ou posição
+        expirada), copia a tabela por páginas a partir da versão atual.
+        Retorna o número de linhas aplicadas.
+        """
+        total = 0
+        for tabela in INCREMENTAIS:
+            chave_estado = f"alteracoes:{tabela}"
+            while True:
+                conn = get_connection()
+                try:
+                    desde = _ler_estado(conn.cursor(), chave_estado)
+                finally:
+                    conn.close()
+                if desde is None:
+                    total += self._copy_table(tabela)
+                    continue
+                try:
+                    carga = self.cliente.request("alteracoes", tabela=tabela, desde=desde, consumidor=self.consumidor)
+                except StoreError as e:
+                    if e.codigo != "EXPIRADO":
+                        raise
+                    logger.warning(f"Réplica: {e} Copiando '{tabela}' de novo.")
+                    self._aplicar(lambda cur: cur.execute("DELETE FROM replicacao_estado WHERE chave = ?", (chave_estado,)))
+                    continue
+                if carga["ate"] == desde:
+                    break
+
+                def aplicar(cur, carga=carga):
+                    apply_changes(cur, tabela, carga)
+                    _gravar_estado(cur, chave_estado, carga["ate"])
+                self._aplicar(aplicar)
+                total += len(carga["linhas"]) + len(carga["excluidos"])
+                if not carga["mais"]:
+                    break
+        return total
+
+    def _copy_table(self, tabela):
+        """Cópia completa de um cadastro incremental por páginas; a versão do log é lida antes."""
+        versao = self.cliente.request("alteracoes_inicio")["versao"]
+        self._aplicar(lambda cur: cur.execute("DELETE FROM replicacao_estado WHERE chave = ?", (f"paginas:{tabela}",)))
+        total = self._pull_pages(tabela)
+        self._aplicar(lambda cur: _gravar_estado(cur, f"alteracoes:{tabela}", versao))
+        logger.info(f"Réplica: '{tabela}' copiada; alterações a partir da versão {versao} do log.")
+        return total
+
+    # --- OPERAÇÕES NO SERVIDOR ---
+
+    def reserve_numbers(self, terminal_id, tamanho):
+        resposta = self.cliente.request("reservar_numeros", terminal_id=terminal_id, tamanho=tamanho)
+        return resposta["inicio"], resposta["fim"]
+
+    def open_cash(self, user_id, terminal_id, valor_inicial):
+        """Abre a sessão de caixa no servidor; retorna (caixa_id, valor_inicial)."""
+        resposta = self.cliente.request("abrir_caixa", user_id=user_id, terminal_id=terminal_id,
+                                        valor_inicial=valor_inicial)
+        return resposta["caixa_id"], resposta["valor_inicial"]
+
+    def save_customer(self, dados, cliente_id=None):
+        """
+        Grava o cliente no servidor e a linha resultante na cópia; retorna
+        o id. CPF/CNPJ repetido sobe como sqlite3.IntegrityError, como na
+        gravação local.
+        """
+        try:
+            resposta = self.cliente.request("salvar_cliente", dados=dados, id=cliente_id)
+        except StoreError as e:
+            if e.codigo == "DUPLICADO":
+                raise sqlite3.IntegrityError(str(e)) from e
+            raise
+        self._aplicar(lambda cur: _upsert(cur, "clientes", "id", resposta))
+        return resposta["id"]
+
+
+# --- NUMERAÇÃO ---
+
+class RemoteTerminalSequence(TerminalSequence):
+    """
+    Numeração de vendas do terminal em modo réplica: blocos reservados no
+    servidor (ReplicaSync.reserve_numbers) e registrados na cópia local;
+    o próximo bloco é pré-reservado pela thread de sincronia (prefetch).
+    """
+
+    def __init__(self, terminal_id, sync, tamanho_bloco=TAMANHO_BLOCO_REPLICA):
+        self._sync = sync
+        self._fila = []  # blocos pré-reservados [(bloco_id, próximo número, fim)]
+        super().__init__(terminal_id, tamanho_bloco)
+
+    def _retomar(self):
+        conn = get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            cur = conn.cursor()
+            cur.execute("SELECT serie_fiscal FROM terminais_pdv WHERE id = ?", (self.terminal_id,))
+            serie = cur.fetchone()['serie_fiscal']
+            cur.execute("""
+                SELECT id, inicio, fim FROM sequencias_blocos
+                WHERE sequencia = ? AND status = 'ABERTO' ORDER BY id
+            """, (self.sequencia,))
+            # Cada bloco aberto (o corrente e os pré-reservados) continua do
+            # maior número já usado dentro dele
+            for bloco in cur.fetchall():
+                maior = max(self._usados(cur, bloco['inicio'], bloco['fim']), default=bloco['inicio'] - 1)
+                if maior >= bloco['fim']:
+                    self._fechar(cur, bloco['id'], bloco['fim'])
+                else:
+                    self._fila.append((bloco['id'], maior + 1, bloco['fim']))
+            if self._fila:
+                self._bloco_id, self._proximo, self._fim = self._fila.pop(0)
+            self._conferir(cur, serie)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _registrar_bloco(self, inicio, fim, fechar_id=None):
+        conn = get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            cur = conn.cursor()
+            if fechar_id is not None:
+                self._fechar(cur, fechar_id, self._fim)
+            bloco_id = None
+            if inicio is not None:
+                cur.execute("""
+                    INSERT INTO sequencias_blocos (sequencia, inicio, fim, dono) VALUES (?, ?, ?, ?)
+                """, (self.sequencia, inicio, fim, socket.gethostname()))
+                bloco_id = cur.lastrowid
+            conn.commit()
+            return bloco_id
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _reservar(self):
+        # Bloco esgotado: fechado até o fim (os números do bloco são todos
+        # emitidos em ordem; a conferência da próxima abertura acha as lacunas)
+        if self._fila:
+            bloco_id, inicio, fim = self._fila.pop(0)
+            self._registrar_bloco(None, None, fechar_id=self._bloco_id)
+        else:
+            inicio, fim = self._sync.reserve_numbers(self.terminal_id, self.tamanho_bloco)
+            bloco_id = self._registrar_bloco(inicio, fim, fechar_id=self._bloco_id)
+        self._bloco_id, self._proximo, self._fim = bloco_id, inicio, fim
+        logger.debug(f"Terminal {self.terminal_id}: bloco {inicio}-{fim} em uso.")
+
+    def prefetch(self):
+        """Pré-reserva o próximo bloco quando metade do atual foi usada (thread de sincronia)."""
+        with self._lock:
+            restante = 0 if self._proximo is None else self._fim - self._proximo + 1
+            if self._fila or restante > self.tamanho_bloco // 2:
+                return
+        inicio, fim = self._sync.reserve_numbers(self.terminal_id, self.tamanho_bloco)
+        bloco_id = self._registrar_bloco(inicio, fim)
+        with self._lock:
+            self._fila.append((bloco_id, inicio, fim))
+
+    def _registrar_lacunas(self, cur, lacunas):
+        # As lacunas são inutilizadas a partir do banco central
+        for sequencia, serie, inicio, fim, motivo in lacunas:
+            enqueue_event(cur, LACUNA, {"terminal_id": self.terminal_id, "sequencia": sequencia, "serie": serie,
+                                        "numero_inicio": inicio, "numero_fim": fim, "motivo": motivo})
+
+
+# --- ATIVAÇÃO ---
+
+_replica = None
+
+
+def configure(endereco=None):
+    """
+    Ativa o modo réplica se houver servidor configurado ('endereco' ou
+    BLUESYS_SERVIDOR_LOJA): aponta o banco do processo para a cópia local
+    e retorna o ReplicaSync (a iniciar com start() depois de
+    create_tables()). Sem servidor configurado retorna None.
+    """
+    global _replica
+    endereco = endereco or os.environ.get(ENV_SERVIDOR)
+    if not endereco:
+        return None
+    host, _, porta = endereco.partition(":")
+    chave = os.environ.get(ENV_CHAVE)
+    if not chave:
+        raise StoreError(f"Modo réplica sem a chave da loja: defina {ENV_CHAVE} (a mesma do servidor).", "CONFIGURACAO")
+    db.DB_PATH = os.environ.get(ENV_REPLICA_DB) or REPLICA_DB_PADRAO
+    _replica = ReplicaSync(StoreClient(host, int(porta) if porta else PORTA_PADRAO, chave))
+    logger.info(f"Modo réplica: servidor da loja {host}:{porta or PORTA_PADRAO}, cópia local em {db.DB_PATH}.")
+    return _replica
+
+
+def active():
+    """ReplicaSync do processo em modo réplica, ou None (modo direto)."""
+    return _replica
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - [%(name)s] - %(message)s")
+    replica = configure()
+    if replica is None:
+        print(f"Defina {ENV_SERVIDOR}=host:porta.")
+        sys.exit(1)
+    db.create_tables()
+    if "--sincronizar" in sys.argv:
+        replica.start()
+        replica.close()
+        replica.sync_once()
+    print(f"Servidor: {replica.cliente.host}:{replica.cliente.porta} ({'acessível' if replica.online else 'não contatado'})")
+    print(f"Eventos pendentes de envio: {replica.pendentes}")
@@ -0,0 +1,792 @@
+# modules/store_server.py
+"""
+Servidor da loja: serviço asyncio que detém o banco central e atende os
+terminais em modo réplica (modules/store_replica.py).
+
+Protocolo: uma conexão TCP por terminal, mensagens JSON uma por linha.
+Cada pedido {"op": ..., ...} recebe {"ok": true, ...} ou
+{"ok": false, "erro", "codigo"} ("codigo" TRANSITORIO = tentar de novo).
+O banco é acessado por um executor de uma única thread: os pedidos de
+todos os terminais são gravados em sequência, sem disputa entre eles
+pelo bloqueio de escrita do SQLite.
+
+Leitura (cópia local do terminal):
+- "paginas"/"pagina": cadastros de REPLICADAS em páginas de
+  TAMANHO_PAGINA ids com um digesto por página; o terminal só busca as
+  páginas cujo digesto mudou desde a última cópia;
+- "alteracoes_inicio"/"alteracoes": para os cadastros INCREMENTAIS
+  (acompanhados pelo log de alterações, migração 18), as linhas
+  alteradas desde uma versão do log, sem reler a tabela para os
+  digestos. O terminal é registrado como consumidor do log
+  ("replica:<hostname>"); posição já descartada pela compactação
+  responde EXPIRADO e o terminal refaz a cópia por páginas;
+- "catalogo_inicio"/"catalogo_produtos": carga inicial do catálogo
+  (produtos, preços e códigos alternativos) por faixa de id;
+- "catalogo": produtos alterados desde uma posição de
+  'catalogo_alteracoes' (migração 3). O terminal é registrado como
+  consumidor desse log (migração 19); posição já descartada responde
+  EXPIRADO e o terminal recarrega o catálogo;
+
+Gravação:
+- "enviar": lote de eventos da saída do terminal. Cada evento é
+  aplicado num SAVEPOINT da transação do lote e registrado em
+  'replicacao_recebidos' (reenvio ignorado); o que o banco recusa fica
+  em 'replicacao_conflitos' como REJEITADO e é confirmado, para não
+  travar a fila do terminal;
+- "reservar_numeros": bloco de números de venda do terminal;
+- "abrir_caixa", "salvar_cliente": gravados aqui na hora, para que o id
+  seja o mesmo no terminal e no banco central.
+
+Política de conflitos:
+- numeração: os blocos de números de venda dos terminais em modo
+  réplica só são reservados aqui (terminais_pdv.numero_nfe_atual), então
+  dois terminais nunca recebem o mesmo número. Uma venda recebida com
+  número já usado por outra venda do terminal (p. ex. o terminal também
+  usado fora do modo réplica) é aceita e registrada como
+  NUMERO_DUPLICADO; o contador só avança (MAX);
+- estoque: vendas e cancelamentos são lançamentos no razão com a data
+  original e se somam em qualquer ordem. A venda nunca é recusada por
+  falta de estoque; um saldo negativo resultante é registrado como
+  ESTOQUE_NEGATIVO. Venda anterior a um inventário do produto no
+  depósito já lançado aqui (a contagem já refletia a saída) recebe um
+  AJUSTE de compensação (documento REPLICACAO) na data do inventário,
+  que mantém o saldo contado, e é registrada como
+  VENDA_ANTES_DO_INVENTARIO.
+
+Segurança (modelo de ameaça): a rede da loja não é confiável, mas o
+servidor e os terminais cadastrados são.
+- acesso: toda conexão começa com "hello" em desafio/resposta (HMAC da
+  chave compartilhada BLUESYS_CHAVE_LOJA); sem isso nenhuma outra
+  operação é atendida e a conexão é encerrada. A chave não trafega;
+- gravação: "enviar", "reservar_numeros", "abrir_caixa" e
+  "salvar_cliente" só são aceitos da máquina cadastrada e ativa em
+  terminais_pdv com o hostname informado no "hello", e só em nome desse
+  terminal. O hostname é declarado pelo terminal: quem tem a chave pode
+  se passar por outro terminal, então a chave deve ficar só nas
+  máquinas da loja;
+- dados: as páginas de cadastro são projetadas por coluna. Senhas de
+  certificado (OMITIDAS) não saem do banco central e a senha dos
+  usuários vai como hash PBKDF2 (database.db.hash_password), que o
+  login do terminal confere;
+- rede: o tráfego não é cifrado (cadastros, clientes e vendas passam em
+  claro). O servidor escuta só em 127.0.0.1, a menos que a interface da
+  rede da loja seja configurada (--host ou BLUESYS_HOST_LOJA); não expor
+  a porta fora dessa rede (use VPN entre lojas).
+
+Iniciar na máquina do banco central / listar conflitos pendentes:
+    BLUESYS_CHAVE_LOJA=... python -m modules.store_server [--host 192.168.0.10] [--porta 8765] [--conflitos]
+"""
+import os
+import sys
+import hmac
+import json
+import time
+import socket
+import secrets
+import asyncio
+import hashlib
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from database.db import (
+    get_connection, get_schema_version, create_tables,
+    CDC_TABELAS, ChangeCursorExpired, changes_position, get_changes, save_consumer_position,
+    catalog_changes_horizon, save_catalog_consumer_position, hash_password,
+)
+from . import sale_persistence
+from . import session_totals
+from . import cash_session
+from . import stock_ledger
+
+logger = logging.getLogger(__name__)
+
+PORTA_PADRAO = 8765
+ENV_CHAVE = "BLUESYS_CHAVE_LOJA"    # chave compartilhada entre o servidor e os terminais
+ENV_HOST = "BLUESYS_HOST_LOJA"      # interface da rede da loja em que o servidor escuta
+HOST_PADRAO = "127.0.0.1"
+TAMANHO_PAGINA = 1000       # ids por página de cadastro
+LIMITE_LINHA = 64 * 1024 * 1024  # maior mensagem aceita (lote de eventos)
+VALIDADE_DIGESTOS = 15.0    # segundos em que os digestos de uma tabela são reaproveitados
+LOTE_IN = 500               # ids por consulta (abaixo do limite de parâmetros do SQLite)
+TAMANHO_BLOCO_MAXIMO = 1000
+
+# Cadastros copiados para os terminais, na ordem de aplicação, com a chave de paginação
+REPLICADAS = (
+    ("empresas", "id"),
+    ("locais_escrituracao", "id"),
+    ("usuarios", "id"),
+    ("permissoes", "user_id"),
+    ("depositos", "id"),
+    ("tabelas_preco", "id"),
+    ("categorias", "id"),
+    ("fornecedores", "id"),
+    ("contas_financeiras", "id"),
+    ("categorias_financeiras", "id"),
+    ("centros_de_custo", "id"),
+    ("motivos_cancelamento", "id"),
+    ("terminais_pdv", "id"),
+    ("clientes", "id"),
+)
+CHAVES = dict(REPLICADAS)
+# Colunas que não saem do banco central
+OMITIDAS = {
+    "empresas": ("certificado_senha",),
+    "locais_escrituracao": ("certificado_senha",),
+}
+# Colunas enviadas transformadas (senha_replica = hash_password)
+PROJETADAS = {
+    "usuarios": {"password_text": "senha_replica(username, password_text) AS password_text"},
+}
+# Cadastros copiados pelo log de alterações em vez dos digestos (chave = id)
+INCREMENTAIS = tuple(tabela for tabela, chave in REPLICADAS if tabela in CDC_TABELAS and chave == "id")
+LOTE_ALTERACOES = 2000      # alterações por resposta de "alteracoes"
+
+# Tipos de evento enviados pelos terminais
+VENDA = "VENDA"
+CANCELAMENTO = "CANCELAMENTO"
+CONVERSAO_FISCAL = "CONVERSAO_FISCAL"
+MOV_CAIXA = "MOV_CAIXA"
+FECHAMENTO_CAIXA = "FECHAMENTO_CAIXA"
+LACUNA = "LACUNA"
+
+# Gravações aceitas só do terminal cadastrado com o hostname do "hello", em nome dele
+OPS_TERMINAL = ("enviar", "reservar_numeros", "abrir_caixa", "salvar_cliente")
+
+TOLERANCIA = 0.005
+
+
+class StoreError(Exception):
+    """Pedido recusado pelo servidor da loja ('codigo' identifica o motivo)."""
+
+    def __init__(self, mensagem, codigo="ERRO"):
+        super().__init__(mensagem)
+        self.codigo = codigo
+
+
+def encode(mensagem):
+    return (json.dumps(mensagem, default=str, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def proof(chave, desafio):
+    """Resposta ao desafio do "hello": HMAC-SHA256 da chave da loja (a chave não trafega)."""
+    return hmac.new(chave.encode("utf-8"), desafio.encode("utf-8"), "sha256").hexdigest()
+
+
+def _is_transient(erro):
+    """Banco ocupado/indisponível: o terminal tenta de novo em vez de descartar."""
+    msg = str(erro).lower()
+    return "locked" in msg or "busy" in msg or "unable to open" in msg or "disk i/o" in msg
+
+
+# --- LEITURA: PÁGINAS DE CADASTRO E CATÁLOGO ---
+
+def _linhas(cur):
+    return {"colunas": [d[0] for d in cur.description], "linhas": [list(r) for r in cur.fetchall()]}
+
+
+def _senha_replica(username, senha):
+    return hash_password(username, senha) if senha else senha
+
+
+def projection(cur, tabela):
+    """Colunas de 'tabela' enviadas aos terminais: sem OMITIDAS, com PROJETADAS."""
+    cur.connection.create_function("senha_replica", 2, _senha_replica, deterministic=True)
+    cur.execute(f"PRAGMA table_info({tabela})")
+    expressoes = PROJETADAS.get(tabela, {})
+    return ", ".join(expressoes.get(row['name'], row['name']) for row in cur.fetchall()
+                     if row['name'] not in OMITIDAS.get(tabela, ()))
+
+
+def page_digests(cur, tabela):
+    """{pagina: digesto} das linhas de 'tabela' (pagina = chave // TAMANHO_PAGINA)."""
+    chave = CHAVES[tabela]
+    cur.execute(f"SELECT {projection(cur, tabela)} FROM {tabela} ORDER BY {chave}")
+    indice = [d[0] for d in cur.description].index(chave)
+    digestos, pagina, h = {}, None, None
+    for row in cur:
+        p = row[indice] // TAMANHO_PAGINA
+        if p != pagina:
+            if h is not None:
+                digestos[pagina] = h.hexdigest()
+            pagina, h = p, hashlib.sha1()
+        h.update(json.dumps(list(row), default=str).encode("utf-8"))
+    if h is not None:
+        digestos[pagina] = h.hexdigest()
+    return digestos
+
+
+def read_page(cur, tabela, pagina):
+    """Linhas de uma página de 'tabela': {"colunas", "linhas"}."""
+    chave = CHAVES[tabela]
+    inicio = pagina * TAMANHO_PAGINA
+    cur.execute(f"SELECT {projection(cur, tabela)} FROM {tabela} WHERE {chave} BETWEEN ? AND ? ORDER BY {chave}",
+                (inicio, inicio + TAMANHO_PAGINA - 1))
+    return _linhas(cur)
+
+
+def _selecionar_em(cur, sql, ids):
+    """Executa 'sql' (com {ids}) em lotes de LOTE_IN ids e junta as linhas."""
+    resultado = None
+    for inicio in range(0, len(ids), LOTE_IN):
+        lote = ids[inicio:inicio + LOTE_IN]
+        cur.execute(sql.format(ids=", ".join("?" for _ in lote)), lote)
+        parte = _linhas(cur)
+        if resultado is None:
+            resultado = parte
+        else:
+            resultado["linhas"].extend(parte["linhas"])
+    return resultado or {"colunas": [], "linhas": []}
+
+
+def catalog_payload(cur, ids):
+    """
+    Estado atual dos produtos 'ids' com preços e códigos alternativos:
+    {"ids", "produtos", "precos", "codigos", "removidos"} (removidos =
+    ids que não existem mais).
+    """
+    ids = sorted(set(ids))
+    produtos = _selecionar_em(cur, "SELECT * FROM produtos WHERE id IN ({ids})", ids)
+    indice = produtos["colunas"].index("id") if produtos["colunas"] else 0
+    encontrados = {linha[indice] for linha in produtos["linhas"]}
+    return {
+        "ids": ids,
+        "produtos": produtos,
+        "precos": _selecionar_em(cur, "SELECT * FROM produto_tabela_preco WHERE id_produto IN ({ids})", ids),
+        "codigos": _selecionar_em(cur, "SELECT * FROM produto_codigos_alternativos WHERE id_produto IN ({ids})", ids),
+        "removidos": [i for i in ids if i not in encontrados],
+    }
+
+
+# --- GRAVAÇÃO: EVENTOS DOS TERMINAIS ---
+
+def _conflito(cur, terminal_id, evento_id, tipo, detalhe):
+    logger.warning(f"Conflito {tipo} (terminal {terminal_id}, evento {evento_id}): {detalhe}")
+    cur.execute("""
+        INSERT INTO replicacao_conflitos (terminal_id, evento_id, tipo, detalhe)
+        VALUES (?, ?, ?, ?)
+    """, (terminal_id, evento_id, tipo, json.dumps(detalhe, default=str)))
+
+
+def _conferir_estoque(cur, terminal_id, evento_id, venda_id, d):
+    """Compensação de vendas anteriores a um inventário e registro de saldos negativos."""
+    deltas = dict(sale_persistence.aggregate_stock_deltas(d['itens']))
+    if not deltas:
+        return
+    ids = sorted(deltas)
+    marcadores = ", ".join("?" for _ in ids)
+
+    cur.execute(f"""
+        SELECT id_produto, MIN(data_movimento) AS data_inventario
+        FROM estoque_movimentos
+        WHERE id_produto IN ({marcadores}) AND id_deposito = ?
+          AND data_movimento > ? AND documento_tipo = 'INVENTARIO'
+        GROUP BY id_produto
+    """, (*ids, d['deposito_id'], d['data_venda']))
+    for row in cur.fetchall():
+        stock_ledger.record_movements(
+            cur, stock_ledger.AJUSTE, d['deposito_id'], [(row['id_produto'], -deltas[row['id_produto']])],
+            'REPLICACAO', venda_id, user_id=d['venda'][0], data=row['data_inventario'],
+            observacao=f"Venda N° {d['numero']} do terminal {terminal_id} anterior ao inventário"
+        )
+        _conflito(cur, terminal_id, evento_id, "VENDA_ANTES_DO_INVENTARIO",
+                  {"venda_id": venda_id, "produto_id": row['id_produto'], "inventario": row['data_inventario']})
+
+    cur.execute(f"""
+        SELECT id_produto, quantidade FROM estoque
+        WHERE id_deposito = ? AND id_produto IN ({marcadores}) AND quantidade < 0
+    """, (d['deposito_id'], *ids))
+    negativos = {row['id_produto']: row['quantidade'] for row in cur.fetchall()}
+    if negativos:
+        _conflito(cur, terminal_id, evento_id, "ESTOQUE_NEGATIVO",
+                  {"venda_id": venda_id, "deposito_id": d['deposito_id'], "saldos": negativos})
+
+
+def _aplicar_venda(cur, terminal_id, evento_id, d):
+    cur.execute("SELECT 1 FROM vendas WHERE journal_id = ?", (d['journal_id'],))
+    if cur.fetchone():
+        return
+    cur.execute("SELECT id FROM vendas WHERE terminal_id = ? AND numero_venda_terminal = ?",
+                (d['terminal_id'], d['numero']))
+    duplicadas = [row['id'] for row in cur.fetchall()]
+
+    venda_id, _ = sale_persistence.insert_sale(
+        cur, tuple(d['venda']), d['itens'], d['pagamentos'], d['deposito_id'],
+        data_venda=d['data_venda'], journal_id=d['journal_id']
+    )
+    cur.execute(
+        "UPDATE terminais_pdv SET numero_nfe_atual = MAX(COALESCE(numero_nfe_atual, 0), ?) WHERE id = ?",
+        (d['numero'], d['terminal_id'])
+    )
+    if duplicadas:
+        _conflito(cur, terminal_id, evento_id, "NUMERO_DUPLICADO",
+                  {"venda_id": venda_id, "numero": d['numero'], "vendas_existentes": duplicadas})
+    _conferir_estoque(cur, terminal_id, evento_id, venda_id, d)
+
+
+def _venda_do_evento(cur, journal_id):
+    cur.execute("SELECT * FROM vendas WHERE journal_id = ?", (journal_id,))
+    venda = cur.fetchone()
+    if venda is None:
+        raise ValueError(f"Venda {journal_id} não encontrada no servidor.")
+    return venda
+
+
+def _aplicar_cancelamento(cur, terminal_id, evento_id, d):
+    venda = _venda_do_evento(cur, d['journal_id'])
+    if venda['status'] == 'CANCELADA':
+        return
+    sale_persistence.cancel_sale(cur, venda, d['user_id'], d['motivo'], d['deposito_id'])
+
+
+def _aplicar_conversao_fiscal(cur, terminal_id, evento_id, d):
+    venda = _venda_do_evento(cur, d['journal_id'])
+    cur.execute("""
+        UPDATE vendas SET tipo_documento = 'FISCAL', numero_venda_terminal = ? WHERE id = ?
+    """, (d['numero'], venda['id']))
+    cur.execute(
+        "UPDATE terminais_pdv SET numero_nfe_atual = MAX(COALESCE(numero_nfe_atual, 0), ?) WHERE id = ?",
+        (d['numero'], venda['terminal_id'])
+    )
+
+
+def _aplicar_mov_caixa(cur, terminal_id, evento_id, d):
+    cash_session.record_movement(cur, d['caixa_id'], d['user_id'], d['terminal_id'], d['tipo'],
+                                 d['valor'], d['motivo'], d['autorizador_id'], d['data'])
+
+
+def _aplicar_fechamento(cur, terminal_id, evento_id, d):
+    cur.execute("SELECT status, terminal_id FROM caixa_sessoes WHERE id = ?", (d['caixa_id'],))
+    sessao = cur.fetchone()
+    if sessao is None:
+        raise ValueError(f"Sessão de caixa {d['caixa_id']} não encontrada no servidor.")
+    if sessao['status'] == 'FECHADO':
+        return
+    cur.execute("SELECT * FROM terminais_pdv WHERE id = ?", (sessao['terminal_id'],))
+    terminal = dict(cur.fetchone())
+
+    totais = session_totals.expected_closing_totals(session_totals.read_session_totals(cur, d['caixa_id']))
+    divergentes = {
+        forma: (valor, totais.get(forma, 0.0)) for forma, valor in d['totais'].items()
+        if abs(valor - totais.get(forma, 0.0)) > TOLERANCIA
+    }
+    if divergentes:
+        _conflito(cur, terminal_id, evento_id, "TOTAIS_DIVERGENTES",
+                  {"caixa_id": d['caixa_id'], "terminal_x_servidor": divergentes})
+    cash_session.close_session(cur, d['caixa_id'], terminal, d['conferencia'], d['autorizador_id'],
+                               totais, d['data_fechamento'])
+
+
+def _aplicar_lacuna(cur, terminal_id, evento_id, d):
+    cur.execute("""
+        INSERT INTO sequencias_lacunas (sequencia, serie, numero_inicio, numero_fim, motivo)
+        VALUES (?, ?, ?, ?, ?)
+    """, (d['sequencia'], d['serie'], d['numero_inicio'], d['numero_fim'], d['motivo']))
+
+
+APLICAR = {
+    VENDA: _aplicar_venda,
+    CANCELAMENTO: _aplicar_cancelamento,
+    CONVERSAO_FISCAL: _aplicar_conversao_fiscal,
+    MOV_CAIXA: _aplicar_mov_caixa,
+    FECHAMENTO_CAIXA: _aplicar_fechamento,
+    LACUNA: _aplicar_lacuna,
+}
+
+
+def apply_events(terminal_id, eventos):
+    """
+    Aplica um lote de eventos [{"id", "tipo", "dados"}] do terminal numa
+    transação. Retorna os ids confirmados (aplicados, já recebidos ou
+    rejeitados e registrados). Erros transitórios desfazem o lote e sobem.
+    """
+    conn = get_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        cur = conn.cursor()
+        confirmados = []
+        for evento in eventos:
+            cur.execute("SELECT 1 FROM replicacao_recebidos WHERE evento_id = ?", (evento['id'],))
+            if not cur.fetchone():
+                cur.execute("SAVEPOINT evento")
+                try:
+                    APLICAR[evento['tipo']](cur, terminal_id, evento['id'], evento['dados'])
+                    cur.execute("RELEASE evento")
+                except Exception as e:
+                    cur.execute("ROLLBACK TO evento")
+                    cur.execute("RELEASE evento")
+                    if _is_transient(e):
+                        raise
+                    logger.error(f"Evento {evento['tipo']} {evento['id']} do terminal {terminal_id} rejeitado: {e}", exc_info=True)
+                    _conflito(cur, terminal_id, evento['id'], "REJEITADO", {"erro": str(e), "evento": evento})
+                cur.execute("""
+                    INSERT INTO replicacao_recebidos (evento_id, terminal_id, tipo) VALUES (?, ?, ?)
+                """, (evento['id'], terminal_id, evento.get('tipo')))
+            confirmados.append(evento['id'])
+        conn.commit()
+        return confirmados
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+# --- OPERAÇÕES ---
+
+class StoreServer:
+    """Serviço TCP (asyncio) do servidor da loja sobre o banco central."""
+
+    def __init__(self, host=None, porta=PORTA_PADRAO, chave=None):
+        self.host = host or os.environ.get(ENV_HOST) or HOST_PADRAO
+        self.porta = porta
+        self._chave = chave or os.environ.get(ENV_CHAVE)
+        if not self._chave:
+            raise StoreError(f"Defina a chave da loja ({ENV_CHAVE}) no servidor e nos terminais.", "CONFIGURACAO")
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="StoreServerDB")
+        self._digestos = {}  # tabela -> (instante, {pagina: digesto})
+        self._ops = {
+            "hello": self._op_hello,
+            "paginas": self._op_paginas,
+            "pagina": self._op_pagina,
+            "catalogo_inicio": self._op_catalogo_inicio,
+            "catalogo_produtos": self._op_catalogo_produtos,
+            "catalogo": self._op_catalogo,
+            "alteracoes_inicio": self._op_alteracoes_inicio,
+            "alteracoes": self._op_alteracoes,
+            "enviar": self._op_enviar,
+            "reservar_numeros": self._op_reservar_numeros,
+            "abrir_caixa": self._op_abrir_caixa,
+            "salvar_cliente": self._op_salvar_cliente,
+        }
+
+    # --- REDE ---
+
+    async def serve_forever(self, pronto=None):
+        servidor = await asyncio.start_server(self._atender, self.host, self.porta, limit=LIMITE_LINHA)
+        enderecos = ", ".join(str(s.getsockname()) for s in servidor.sockets)
+        logger.info(f"Servidor da loja ouvindo em {enderecos}.")
+        if self.host in ("0.0.0.0", "::"):
+            logger.warning("Servidor da loja ouvindo em todas as interfaces: configure a da rede da loja (--host).")
+        if pronto is not None:
+            pronto.set()
+        async with servidor:
+            await servidor.serve_forever()
+
+    async def _atender(self, reader, writer):
+        origem = writer.get_extra_info("peername")
+        loop = asyncio.get_running_loop()
+        sessao = {"desafio": None, "autenticada": False, "hostname": None}
+        try:
+            while True:
+                linha = await reader.readline()
+                if not linha:
+                    break
+                try:
+                    pedido = json.loads(linha)
+                    resposta = None if sessao["autenticada"] else self._autenticar(sessao, pedido, origem)
+                    if resposta is None:
+                        op = self._ops.get(pedido.get("op"))
+                        if op is None:
+                            resposta = {"ok": False, "erro": f"Operação desconhecida: {pedido.get('op')}", "codigo": "ERRO"}
+                        else:
+                            resposta = await loop.run_in_executor(self._executor, self._executar, op, pedido, sessao)
+                except (json.JSONDecodeError, AttributeError) as e:
+                    resposta = {"ok": False, "erro": f"Mensagem inválida: {e}", "codigo": "ERRO"}
+                writer.write(encode(resposta))
+                await writer.drain()
+                if resposta.get("codigo") == "NAO_AUTORIZADO":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError) as e:
+            logger.warning(f"Conexão com {origem} encerrada: {e}")
+        finally:
+            writer.close()
+
+    def _autenticar(self, sessao, pedido, origem):
+        """
+        "hello" de conexão nova: sem "prova", devolve um desafio; com ela,
+        confere o HMAC da chave e libera a conexão (retorna None para seguir
+        com o "hello"). Qualquer outro pedido antes disso é recusado.
+        """
+        if pedido.get("op") != "hello":
+            return {"ok": False, "erro": "Conexão não autenticada.", "codigo": "NAO_AUTORIZADO"}
+        if "prova" not in pedido:
+            sessao["desafio"] = secrets.token_hex(16)
+            return {"ok": True, "desafio": sessao["desafio"]}
+        desafio, sessao["desafio"] = sessao["desafio"], None
+        if desafio is None or not hmac.compare_digest(str(pedido["prova"]), proof(self._chave, desafio)):
+            logger.warning(f"Conexão de {origem} recusada: chave da loja inválida.")
+            return {"ok": False, "erro": "Chave da loja inválida.", "codigo": "NAO_AUTORIZADO"}
+        sessao["autenticada"] = True
+        sessao["hostname"] = pedido.get("hostname")
+        return None
+
+    def _conferir_terminal(self, pedido, sessao):
+        """Gravação só da máquina cadastrada como terminal ativo, e em nome desse terminal."""
+        conn = get_connection()
+        try:
+            terminal = conn.execute("SELECT id FROM terminais_pdv WHERE hostname = ? AND status = 1",
+                                    (sessao["hostname"],)).fetchone()
+        finally:
+            conn.close()
+        if terminal is None:
+            raise StoreError(f"Máquina '{sessao['hostname']}' não é um terminal ativo da loja.", "TERMINAL")
+        declarados = {pedido.get("terminal_id")}
+        if pedido.get("op") == "enviar":
+            declarados |= {evento["dados"].get("terminal_id") for evento in pedido["eventos"]}
+        outros = declarados - {None, terminal['id']}
+        if outros:
+            raise StoreError(f"Máquina '{sessao['hostname']}' (terminal {terminal['id']}) "
+                             f"gravando pelo terminal {sorted(outros)}.", "TERMINAL")
+        if pedido.get("op") == "enviar":
+            pedido["terminal_id"] = terminal['id']
+
+    def _executar(self, op, pedido, sessao):
+        try:
+            if pedido.get("op") in OPS_TERMINAL:
+                self._conferir_terminal(pedido, sessao)
+            return {"ok": True, **op(pedido)}
+        except StoreError as e:
+            return {"ok": False, "erro": str(e), "codigo": e.codigo}
+        except Exception as e:
+            transitorio = _is_transient(e)
+            if not transitorio:
+                logger.error(f"Erro na operação '{pedido.get('op')}': {e}", exc_info=True)
+            return {"ok": False, "erro": str(e), "codigo": "TRANSITORIO" if transitorio else "ERRO"}
+
+    # --- LEITURA ---
+
+    def _op_hello(self, pedido):
+        conn = get_connection()
+        try:
+            return {"versao_schema": get_schema_version(conn), "servidor": socket.gethostname()}
+        finally:
+            conn.close()
+
+    def _tabela(self, pedido):
+        tabela = pedido.get("tabela")
+        if tabela not in CHAVES:
+            raise StoreError(f"Tabela não replicada: {tabela}")
+        return tabela
+
+    def _op_paginas(self, pedido):
+        tabela = self._tabela(pedido)
+        instante, digestos = self._digestos.get(tabela, (0.0, None))
+        if digestos is None or time.monotonic() - instante > VALIDADE_DIGESTOS:
+            conn = get_connection()
+            try:
+                digestos = page_digests(conn.cursor(), tabela)
+            finally:
+                conn.close()
+            self._digestos[tabela] = (time.monotonic(), digestos)
+        return {"paginas": digestos}
+
+    def _op_pagina(self, pedido):
+        tabela = self._tabela(pedido)
+        conn = get_connection()
+        try:
+            return read_page(conn.cursor(), tabela, int(pedido["pagina"]))
+        finally:
+            conn.close()
+
+    def _op_catalogo_inicio(self, pedido):
+        conn = get_connection()
+        try:
+            return {"seq": conn.execute("SELECT COALESCE(MAX(seq), 0) FROM catalogo_alteracoes").fetchone()[0]}
+        finally:
+            conn.close()
+
+    def _op_catalogo_produtos(self, pedido):
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT id FROM produtos WHERE id > ? ORDER BY id LIMIT ?",
+                        (pedido.get("apos_id", 0), pedido.get("limite", 500)))
+            ids = [row['id'] for row in cur.fetchall()]
+            return {**catalog_payload(cur, ids), "ultimo_id": ids[-1] if ids else None}
+        finally:
+            conn.close()
+
+    def _op_catalogo(self, pedido):
+        limite = pedido.get("limite", 2000)
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            if pedido.get("consumidor"):
+                # 'desde' já está aplicado na cópia do terminal
+                save_catalog_consumer_position(cur, pedido["consumidor"], pedido["desde"])
+                conn.commit()
+            horizonte = catalog_changes_horizon(cur)
+            if pedido["desde"] < horizonte:
+                raise StoreError(f"Posição {pedido['desde']} do catálogo já descartada (até {horizonte}).", "EXPIRADO")
+            cur.execute("SELECT seq, produto_id FROM catalogo_alteracoes WHERE seq > ? ORDER BY seq LIMIT ?",
+                        (pedido["desde"], limite))
+            alteracoes = cur.fetchall()
+            if not alteracoes:
+                return {"ate": pedido["desde"], "mais": False, "ids": []}
+            return {**catalog_payload(cur, [row['produto_id'] for row in alteracoes]),
+                    "ate": alteracoes[-1]['seq'], "mais": len(alteracoes) == limite}
+        finally:
+            conn.close()
+
+    def _op_alteracoes_inicio(self, pedido):
+        conn = get_connection()
+        try:
+            return {"versao": changes_position(conn.cursor())}
+        finally:
+            conn.close()
+
+    def _op_alteracoes(self, pedido):
+        tabela = self._tabela(pedido)
+        if tabela not in INCREMENTAIS:
+            raise StoreError(f"Tabela sem log de alterações: {tabela}")
+        desde = pedido["desde"]
+        limite = pedido.get("limite", LOTE_ALTERACOES)
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            if pedido.get("consumidor"):
+                # 'desde' já está aplicado na cópia do terminal
+                save_consumer_position(cur, pedido["consumidor"], desde)
+                conn.commit()
+            try:
+                alteracoes = get_changes(cur, desde, (tabela,), limite)
+            except ChangeCursorExpired as e:
+                raise StoreError(str(e), "EXPIRADO")
+            if not alteracoes:
+                return {"ate": desde, "mais": False, "colunas": [], "linhas": [], "excluidos": []}
+            # Estado atual das linhas alteradas; as que não existem mais foram excluídas
+            ids = sorted({a["chave"] for a in alteracoes})
+            dados = _selecionar_em(cur, f"SELECT {projection(cur, tabela)} FROM {tabela} WHERE id IN ({{ids}})", ids)
+            indice = dados["colunas"].index("id") if dados["colunas"] else 0
+            presentes = {linha[indice] for linha in dados["linhas"]}
+            return {**dados, "excluidos": [i for i in ids if i not in presentes],
+                    "ate": alteracoes[-1]["versao"], "mais": len(alteracoes) == limite}
+        finally:
+            conn.close()
+
+    # --- GRAVAÇÃO ---
+
+    def _op_enviar(self, pedido):
+        return {"confirmados": apply_events(pedido["terminal_id"], pedido["eventos"])}
+
+    def _op_reservar_numeros(self, pedido):
+        terminal_id = pedido["terminal_id"]
+        tamanho = max(1, min(int(pedido["tamanho"]), TAMANHO_BLOCO_MAXIMO))
+        conn = get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            cur = conn.cursor()
+            cur.execute("UPDATE terminais_pdv SET numero_nfe_atual = COALESCE(numero_nfe_atual, 0) + ? WHERE id = ?",
+                        (tamanho, terminal_id))
+            if cur.rowcount == 0:
+                raise StoreError(f"Terminal {terminal_id} não cadastrado no servidor.")
+            cur.execute("SELECT numero_nfe_atual FROM terminais_pdv WHERE id = ?", (terminal_id,))
+            fim = cur.fetchone()[0]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        logger.info(f"Terminal {terminal_id}: números {fim - tamanho + 1}-{fim} reservados.")
+        return {"inicio": fim - tamanho + 1, "fim": fim}
+
+    def _op_abrir_caixa(self, pedido):
+        conn = get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            cur = conn.cursor()
+            # Pedido repetido (resposta perdida): devolve a sessão já aberta
+            cur.execute("""
+                SELECT id, valor_inicial FROM caixa_sessoes
+                WHERE user_id = ? AND terminal_id = ? AND status = 'ABERTO'
+            """, (pedido["user_id"], pedido["terminal_id"]))
+            aberta = cur.fetchone()
+            if aberta:
+                conn.rollback()
+                return {"caixa_id": aberta['id'], "valor_inicial": aberta['valor_inicial']}
+            caixa_id = cash_session.open_session(cur, pedido["user_id"], pedido["terminal_id"], pedido["valor_inicial"])
+            conn.commit()
+            return {"caixa_id": caixa_id, "valor_inicial": pedido["valor_inicial"]}
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _op_salvar_cliente(self, pedido):
+        dados = pedido["dados"]
+        cliente_id = pedido.get("id")
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute("PRAGMA table_info(clientes)")
+            colunas = {row['name'] for row in cur.fetchall()} - {"id"}
+            invalidas = set(dados) - colunas
+            if invalidas:
+                raise StoreError(f"Campos inválidos para clientes: {sorted(invalidas)}")
+            campos = list(dados)
+            try:
+                if cliente_id:
+                    cur.execute(f"UPDATE clientes SET {', '.join(f'{c} = ?' for c in campos)} WHERE id = ?",
+                                (*dados.values(), cliente_id))
+                else:
+                    cur.execute(f"INSERT INTO clientes ({', '.join(campos)}) VALUES ({', '.join('?' for _ in campos)})",
+                                tuple(dados.values()))
+                    cliente_id = cur.lastrowid
+                conn.commit()
+            except sqlite3.IntegrityError as e:
+                conn.rollback()
+                raise StoreError(str(e), "DUPLICADO")
+            self._digestos.pop("clientes", None)
+            cur.execute(f"SELECT {projection(cur, 'clientes')} FROM clientes WHERE id = ?", (cliente_id,))
+            return {"id": cliente_id, **_linhas(cur)}
+        finally:
+            conn.close()
+
+
+# --- CONFLITOS ---
+
+def pending_conflicts(cur, terminal_id=None):
+    """Conflitos não resolvidos: [{"id", "terminal_id", "evento_id", "tipo", "detalhe", "registrado_em"}]."""
+    query = """
+        SELECT id, terminal_id, evento_id, tipo, detalhe, registrado_em
+        FROM replicacao_conflitos WHERE resolvido_em IS NULL
+    """
+    params = ()
+    if terminal_id is not None:
+        query += " AND terminal_id = ?"
+        params = (terminal_id,)
+    cur.execute(query + " ORDER BY terminal_id, id", params)
+    return [dict(row) for row in cur.fetchall()]
+
+
+def _opcao(nome, padrao):
+    if nome in sys.argv[1:-1]:
+        return sys.argv[sys.argv.index(nome) + 1]
+    return padrao
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - [%(name)s] - %(message)s")
+    create_tables()
+    if "--conflitos" in sys.argv:
+        conn = get_connection()
+        try:
+            conflitos = pending_conflicts(conn.cursor())
+        finally:
+            conn.close()
+        for c in conflitos:
+            print(f"[{c['id']}] terminal {c['terminal_id']} {c['tipo']} ({c['registrado_em']}): {c['detalhe']}")
+        if not conflitos:
+            print("Nenhum conflito pendente.")
+    else:
+        try:
+            servidor = StoreServer(_opcao("--host", None), int(_opcao("--porta", PORTA_PADRAO)))
+        except StoreError as e:
+            print(e)
+            sys.exit(1)
+        try:
+            asyncio.run(servidor.serve_forever())
+        except KeyboardInterrupt:
+            pass
@@ -153,11 +153,20 @@ class TerminalForm(QWidget):
         
         self.habilita_nao_fiscal_check = QCheckBox("Habilitar Vendas Não-Fiscais (F9)")
         self.habilita_nao_fiscal_check.setChecked(True)
+        self.gravacao_assincrona_check = QCheckBox("Gravação Assíncrona de Vendas (disco lento / banco em rede)")
+        self.gravacao_assincrona_check.setToolTip(
+            "A venda é registrada em um diário local e o caixa segue imediatamente;\n"
+            "a gravação no banco é feita em segundo plano e retomada na próxima abertura do PDV em caso de queda.")
         
         self.serie_fiscal_input = QSpinBox()
         self.serie_fiscal_input.setRange(1, 999)
-        self.proximo_numero_venda_input = QSpinBox()
-        self.proximo_numero_venda_input.setRange(1, 999999999)
+        # Contador dos blocos de números reservados pelos PDVs (sequence_service): só avança
+        self.ultimo_numero_reservado_input = QSpinBox()
+        self.ultimo_numero_reservado_input.setRange(0, 999999999)
+        self.ultimo_numero_reservado_input.setToolTip(
+            "Fim do último bloco de números de venda reservado pelos PDVs deste terminal.\n"
+            "A próxima reserva começa no número seguinte. Pode ser aumentado (pular números), nunca reduzido.")
+        self._numero_nfe_carregado = None
         
         self.lbl_ambiente_herdado = QLineEdit(readOnly=True)
         self.lbl_ambiente_herdado.setText("Herdado (Homologação)")
@@ -167,11 +176,13 @@ class TerminalForm(QWidget):
         self.impressora_nome_input = QLineEdit()
         self.impressora_modelo_input = QLineEdit()
         self.impressora_porta_input = QLineEdit()
-        self.impressora_porta_input.setPlaceholderText("Ex: COM3, USB001, 192.168.0.50:9100")
+        self.impressora_porta_input.setPlaceholderText("Ex: COM3, /dev/usb/lp0, 192.168.0.50:9100")
         self.impressora_tipo_combo = QComboBox()
         self.impressora_tipo_combo.addItems(["USB", "Serial", "IP", "Bluetooth"])
         self.impressora_largura_combo = QComboBox()
         self.impressora_largura_combo.addItems(["80mm", "58mm"])
+        self.impressora_modo_combo = QComboBox()
+        self.impressora_modo_combo.addItems(["Driver do Windows (PDF)", "ESC/POS direto (térmica)"])
         
         self.tabs = QTabWidget()
         tab_geral = QWidget()
@@ -238,16 +249,17 @@ class TerminalForm(QWidget):
         layout_geral.addWidget(self.status_combo, 17, 1)
         
         layout_geral.addWidget(self.habilita_nao_fiscal_check, 18, 1)
+        layout_geral.addWidget(self.gravacao_assincrona_check, 19, 1)
         
         layout_geral.setColumnStretch(1, 1)
-        layout_geral.setRowStretch(19, 1) # Index 19
+        layout_geral.setRowStretch(20, 1) # Index 20
         
         # --- Abas Fiscais e Impressora (Inalteradas) ---
         layout_fiscal = QGridLayout(tab_fiscal)
         layout_fiscal.addWidget(QLabel("Série Fiscal (NFC-e):"), 0, 0)
         layout_fiscal.addWidget(self.serie_fiscal_input, 0, 1)
-        layout_fiscal.addWidget(QLabel("Próximo Nº NFC-e:"), 1, 0)
-        layout_fiscal.addWidget(self.proximo_numero_venda_input, 1, 1)
+        layout_fiscal.addWidget(QLabel("Último Nº NFC-e Reservado:"), 1, 0)
+        layout_fiscal.addWidget(self.ultimo_numero_reservado_input, 1, 1)
         layout_fiscal.addWidget(QLabel("Ambiente Emissão:"), 0, 2)
         layout_fiscal.addWidget(self.lbl_ambiente_herdado, 0, 3) 
         layout_fiscal.addWidget(QLabel("CSC (Herdado do Local):"), 1, 2)
@@ -267,8 +279,10 @@ class TerminalForm(QWidget):
         layout_imp.addWidget(self.impressora_porta_input, 3, 1)
         layout_imp.addWidget(QLabel("Largura do Papel:"), 4, 0)
         layout_imp.addWidget(self.impressora_largura_combo, 4, 1)
+        layout_imp.addWidget(QLabel("Modo de Impressão:"), 5, 0)
+        layout_imp.addWidget(self.impressora_modo_combo, 5, 1)
         layout_imp.setColumnStretch(1, 1)
-        layout_imp.setRowStretch(5, 1)
+        layout_imp.setRowStretch(6, 1)
         
         # Botões do formulário
         form_btn_layout = QHBoxLayout()
@@ -544,15 +558,18 @@ class TerminalForm(QWidget):
         self.servidor_prevenda_input.clear()
         self.status_combo.setCurrentIndex(0)
         self.habilita_nao_fiscal_check.setChecked(True)
+        self.gravacao_assincrona_check.setChecked(False)
         
         self.serie_fiscal_input.setValue(1)
-        self.proximo_numero_venda_input.setValue(1)
+        self.ultimo_numero_reservado_input.setValue(0)
+        self._numero_nfe_carregado = None
         
         self.impressora_nome_input.clear()
         self.impressora_modelo_input.clear()
         self.impressora_porta_input.clear()
         self.impressora_tipo_combo.setCurrentIndex(0)
         self.impressora_largura_combo.setCurrentIndex(0)
+        self.impressora_modo_combo.setCurrentIndex(0)
         
         self.lbl_ambiente_herdado.setText("(Selecione um local)")
         self.lbl_csc_herdado.clear()
@@ -687,10 +704,12 @@ class TerminalForm(QWidget):
             self.servidor_prevenda_input.setText(data['servidor_pre_venda'])
             self.status_combo.setCurrentIndex(0 if data['status'] == 1 else 1)
             self.habilita_nao_fiscal_check.setChecked(bool(data['habilita_nao_fiscal']))
+            self.gravacao_assincrona_check.setChecked(bool(data['gravacao_assincrona']))
             
             # Aba Fiscal
             self.serie_fiscal_input.setValue(data['serie_fiscal'] or 1)
-            self.proximo_numero_venda_input.setValue(data['numero_nfe_atual'] or 1)
+            self._numero_nfe_carregado = data['numero_nfe_atual'] or 0
+            self.ultimo_numero_reservado_input.setValue(self._numero_nfe_carregado)
             
             # Aba Impressora
             self.impressora_nome_input.setText(data['impressora_nome'])
@@ -698,6 +717,7 @@ class TerminalForm(QWidget):
             self.impressora_porta_input.setText(data['impressora_endereco_conexao'])
             self.impressora_tipo_combo.setCurrentIndex(data['impressora_tipo_conexao'] - 1 if data['impressora_tipo_conexao'] else 0)
             self.impressora_largura_combo.setCurrentIndex(0 if data['impressora_largura_papel'] == 80 else 1)
+            self.impressora_modo_combo.setCurrentIndex(data['impressora_modo_impressao'] - 1 if data['impressora_modo_impressao'] else 0)
             
             self.btn_excluir.setEnabled(True)
             
@@ -763,24 +783,39 @@ class TerminalForm(QWidget):
             "servidor_pre_venda": self.servidor_prevenda_input.text().strip(),
             "status": 1 if self.status_combo.currentIndex() == 0 else 2,
             "habilita_nao_fiscal": 1 if self.habilita_nao_fiscal_check.isChecked() else 0,
+            "gravacao_assincrona": 1 if self.gravacao_assincrona_check.isChecked() else 0,
             
             "serie_fiscal": self.serie_fiscal_input.value(),
-            "numero_nfe_atual": self.proximo_numero_venda_input.value(),
+            "numero_nfe_atual": self.ultimo_numero_reservado_input.value(),
             
             "impressora_nome": self.impressora_nome_input.text().strip(),
             "impressora_modelo": self.impressora_modelo_input.text().strip(),
             "impressora_endereco_conexao": self.impressora_porta_input.text().strip(),
             "impressora_tipo_conexao": self.impressora_tipo_combo.currentIndex() + 1,
             "impressora_largura_papel": 80 if self.impressora_largura_combo.currentIndex() == 0 else 58,
+            "impressora_modo_impressao": self.impressora_modo_combo.currentIndex() + 1,
         }
         
+        if self.current_terminal_id:
+            # Um PDV em execução pode ter reservado blocos depois que o cadastro foi
+            # carregado: o contador só é gravado se alterado, e nunca para trás
+            if data["numero_nfe_atual"] == self._numero_nfe_carregado:
+                del data["numero_nfe_atual"]
+            elif data["numero_nfe_atual"] < (self._numero_nfe_carregado or 0):
+                QMessageBox.warning(self, "Numeração",
+                    f"O último número reservado ({self._numero_nfe_carregado}) não pode ser reduzido:\n"
+                    "os números já reservados pelos PDVs seriam emitidos de novo.")
+                return
+
         conn = get_connection()
         try:
             cur = conn.cursor()
             if self.current_terminal_id:
                 # UPDATE
                 data["id"] = self.current_terminal_id
-                fields_to_update = [f"{key} = :{key}" for key in data.keys() if key != 'id']
+                fields_to_update = [f"{key} = :{key}" for key in data.keys() if key not in ('id', 'numero_nfe_atual')]
+                if "numero_nfe_atual" in data:
+                    fields_to_update.append("numero_nfe_atual = MAX(COALESCE(numero_nfe_atual, 0), :numero_nfe_atual)")
                 query = f"UPDATE terminais_pdv SET {', '.join(fields_to_update)} WHERE id = :id"
                 params = data
                 msg = "Terminal atualizado com sucesso!"
@@ -9,6 +9,7 @@ from PyQt5.QtGui import QFont, QColor
 from PyQt5.QtCore import Qt, QPoint
 from database.db import get_connection
 from . import printing_service 
+from . import session_totals
 
 class ZReportView(QDialog):
     """
@@ -193,13 +194,16 @@ class ZReportView(QDialog):
             # --- Dados para o Relatório Sintético ---
             cur_sintetico = conn.cursor()
             
+            # Totais acumulados da sessão (modules/session_totals.py)
+            totais = session_totals.get_session_totals(self.caixa_id)
+            
             # Totais Válidos (FINALIZADA)
-            total_subtotal = sum(v['subtotal'] for v in vendas if v['status'] == 'FINALIZADA')
-            total_descontos = sum((v['desconto_itens'] + v['desconto_geral']) for v in vendas if v['status'] == 'FINALIZADA')
-            total_liquido = sum(v['total_final'] for v in vendas if v['status'] == 'FINALIZADA')
+            total_subtotal = totais['total_bruto']
+            total_descontos = totais['total_descontos']
+            total_liquido = totais['total_liquido']
             
             # Total Cancelado (Informativo)
-            total_cancelado = sum(v['total_final'] for v in vendas if v['status'] == 'CANCELADA')
+            total_cancelado = totais['total_cancelado']
 
             # 1. Sessão e Empresa
             cur_sintetico.execute("SELECT * FROM caixa_sessoes WHERE id = ?", (self.caixa_id,))
@@ -217,14 +221,7 @@ class ZReportView(QDialog):
             info_operador = cur_sintetico.fetchone()
 
             # 4. Pagamentos (APENAS DE VENDAS VÁLIDAS)
-            cur_sintetico.execute("""
-                SELECT vp.forma, SUM(vp.valor) as total_forma
-                FROM vendas_pagamentos vp
-                JOIN vendas v ON vp.venda_id = v.id
-                WHERE v.caixa_id = ? AND v.status = 'FINALIZADA'
-                GROUP BY vp.forma
-            """, (self.caixa_id,))
-            pagamentos = cur_sintetico.fetchall()
+            pagamentos = totais['formas']
 
             # Monta o texto
             report_lines = []
@@ -256,13 +253,13 @@ class ZReportView(QDialog):
             add_divider()
             
             add_line(f"<b>{'MEIOS DE PAGAMENTO':<30}{'R$':>18}</b>")
-            for pg in pagamentos:
-                add_line(f"{pg['forma']:<30}{pg['total_forma']:>18.2f}")
+            for forma, total_forma in pagamentos.items():
+                add_line(f"{forma:<30}{total_forma:>18.2f}")
             add_divider()
 
             add_line(f"<b>{'CONFERÊNCIA DE CAIXA':<30}{'R$':>18}</b>")
             add_line(f"{'1. Suprimento (Abertura)':<30}{sessao['valor_inicial']:>18.2f}")
-            total_dinheiro_vendas = next((p['total_forma'] for p in pagamentos if p['forma'] == 'Dinheiro'), 0.0)
+            total_dinheiro_vendas = pagamentos.get('Dinheiro', 0.0)
             add_line(f"{'2. Vendas em Dinheiro':<30}{total_dinheiro_vendas:>18.2f}")
             
             data_conf = self.conferencia_data
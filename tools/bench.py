@@ -0,0 +1,79 @@
+# tools/bench.py
+"""
+Apoio aos scripts de medição (tools/bench_*.py).
+
+Cada script cria um banco temporário com o esquema completo
+(scratch_database), semeia os próprios dados e imprime as medições;
+o banco da loja não é tocado. Executar a partir da raiz do projeto:
+    python -m tools.bench_<assunto> [opções]
+"""
+import io
+import os
+import time
+import tempfile
+from contextlib import contextmanager, redirect_stdout
+from database.db import get_connection, use_database, create_tables
+
+
+@contextmanager
+def scratch_database():
+    """Banco temporário com o esquema e as migrações; retorna o caminho."""
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "bench.db")
+        with use_database(caminho):
+            with redirect_stdout(io.StringIO()):  # mensagens das migrações
+                create_tables()
+            yield caminho
+
+
+def seed_terminal():
+    """Terminal deste computador com caixa aberto e um produto (ids em dict)."""
+    from modules.sequence_service import create_check_terminal
+
+    conn = get_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        ids = create_check_terminal(conn.cursor())
+        conn.commit()
+        return ids
+    finally:
+        conn.close()
+
+
+def seed_sale_items(cur, linhas):
+    """'linhas' itens de venda (5 por venda) para as medições de exportação."""
+    cur.executemany("INSERT INTO vendas (id, data_venda, numero_venda_terminal, subtotal, total_final, total_pago, status) "
+                    "VALUES (?, ?, ?, 0, 0, 0, 'FINALIZADA')",
+                    ((i, f"2025-{1 + i % 12:02d}-{1 + i % 28:02d} 10:{i % 60:02d}:00", i) for i in range(1, linhas // 5 + 2)))
+    cur.executemany("""
+        INSERT INTO vendas_itens (venda_id, codigo_barras, descricao, quantidade, preco_unitario, total_item)
+        VALUES (?, ?, ?, ?, 9.9, ?)
+    """, ((1 + i // 5, f"789{i % 9999:010d}", f"PRODUTO DESCRICAO {i % 3000}", 1.0 + i % 3, 9.9 * (1 + i % 3))
+          for i in range(linhas)))
+
+
+def timed(fn, repeticoes=1):
+    """Executa fn 'repeticoes' vezes; retorna (tempos em ms, último resultado)."""
+    tempos, resultado = [], None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = fn()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return tempos, resultado
+
+
+def percentiles(tempos):
+    """{"p50", "p99", "media"} de uma lista de tempos."""
+    ordenados = sorted(tempos)
+    return {
+        "p50": ordenados[len(ordenados) // 2],
+        "p99": ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.99))],
+        "media": sum(ordenados) / len(ordenados),
+    }
+
+
+def report(rotulo, tempos, unidade="ms"):
+    """Linha com p50/p99/média dos tempos (em ms; unidade 'us' converte)."""
+    escala = 1000 if unidade == "us" else 1
+    p = {k: v * escala for k, v in percentiles(tempos).items()}
+    print(f"{rotulo:40s} p50 {p['p50']:10.3f} {unidade}  p99 {p['p99']:10.3f} {unidade}  média {p['media']:10.3f} {unidade}")
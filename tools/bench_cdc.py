@@ -0,0 +1,97 @@
+# tools/bench_cdc.py
+"""
+Custo do log de alterações (CDC, migração 18 de database/db.py) na
+gravação da venda: a transação do finalize_sale (sale_persistence.
+insert_sale e contador do terminal) com e sem os gatilhos trg_cdc_*,
+em rodadas alternadas no mesmo banco temporário. Mostra também quantos
+registros uma venda gera no log e o tempo de compact_changes.
+
+    python -m tools.bench_cdc [VENDAS_POR_RODADA]
+"""
+import sys
+import random
+from statistics import median
+from collections import Counter
+from database.db import get_connection, changes_position, get_changes, compact_changes
+from modules import sale_persistence
+from .bench import scratch_database, seed_terminal, timed, percentiles
+
+RODADAS = 6
+PRODUTOS = 2000
+
+
+def main(vendas_por_rodada):
+    with scratch_database():
+        t = seed_terminal()
+        conn = get_connection()
+        try:
+            conn.execute("BEGIN")
+            conn.executemany("INSERT INTO produtos (nome, active) VALUES (?, 1)", ((f"P{i}",) for i in range(PRODUTOS)))
+            conn.execute("INSERT INTO estoque (id_produto, id_deposito, quantidade) SELECT id, ?, 1000000 FROM produtos",
+                         (t["deposito_id"],))
+            conn.commit()
+            gatilhos = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_cdc_%'").fetchall()
+        finally:
+            conn.close()
+
+        rnd = random.Random(1)
+        numero = 0
+
+        def venda():
+            nonlocal numero
+            numero += 1
+            itens = [{"produto_id": rnd.randint(1, PRODUTOS), "codigo_barras": "x", "descricao": "P", "quantidade": 1.0,
+                      "preco_unitario": 2.5, "desconto_item": 0.0} for _ in range(5)]
+            conn = get_connection()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                cur = conn.cursor()
+                sale_persistence.insert_sale(cur, (t["user_id"], None, t["caixa_id"], t["empresa_id"], t["local_id"],
+                                                   t["terminal_id"], numero, 12.5, 0.0, 0.0, 12.5, 12.5, 0.0, "FISCAL"),
+                                             itens, [{"forma": "Pix", "valor": 12.5}], t["deposito_id"])
+                cur.execute("UPDATE terminais_pdv SET numero_nfe_atual = MAX(COALESCE(numero_nfe_atual, 0), ?) WHERE id = ?",
+                            (numero, t["terminal_id"]))
+                conn.commit()
+            finally:
+                conn.close()
+
+        def cdc(ligado):
+            conn = get_connection()
+            try:
+                for nome, sql in gatilhos:
+                    conn.execute(f"DROP TRIGGER IF EXISTS {nome}")
+                    if ligado:
+                        conn.execute(sql)
+                conn.commit()
+            finally:
+                conn.close()
+
+        timed(venda, 200)  # aquecimento
+        resultados = {True: [], False: []}
+        for _ in range(RODADAS):
+            for ligado in (True, False):
+                cdc(ligado)
+                resultados[ligado].append(percentiles(timed(venda, vendas_por_rodada)[0]))
+        cdc(True)
+
+        print(f"{len(gatilhos)} gatilhos CDC, {RODADAS} rodadas x {vendas_por_rodada} vendas de 5 itens (medianas das rodadas)")
+        for ligado in (True, False):
+            p50 = median(r["p50"] for r in resultados[ligado])
+            media = median(r["media"] for r in resultados[ligado])
+            print(f"{'com CDC' if ligado else 'sem CDC':8s} p50 {p50:.3f} ms  média {media:.3f} ms")
+
+        conn = get_connection()
+        try:
+            cur = conn.cursor()
+            posicao = changes_position(cur)
+            venda()
+            print("registros de uma venda:", dict(Counter((a["tabela"], a["op"]) for a in get_changes(cur, posicao))))
+            tempos, resultado = timed(lambda: compact_changes(cur))
+            conn.commit()
+            print(f"compact_changes: {tempos[0]:.1f} ms, {resultado}")
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 300)
@@ -0,0 +1,68 @@
+# tools/bench_connections.py
+"""
+Latência da leitura de um código no PDV (busca do produto e da imagem,
+cada uma na sua conexão, como o SalesForm) com uma conexão nova por
+chamada (sqlite3.connect + PRAGMA foreign_keys, o get_connection()
+anterior ao pool) e com o pool de database/db.py, no mesmo banco
+semeado com PRODUTOS produtos (padrão 50.000).
+
+    python -m tools.bench_connections [PRODUTOS]
+"""
+import sys
+import sqlite3
+from database.db import get_connection
+from .bench import scratch_database, timed, report
+
+LEITURAS = 2000
+
+SQL_BUSCA = """
+    SELECT p.id as produto_id, p.ean, p.codigo_interno, p.nome as descricao,
+           p.unidade, ptp.preco_vendadecimal as preco_venda
+    FROM produtos p
+    JOIN produto_tabela_preco ptp ON ptp.id_produto = p.id AND ptp.id_tabela = ?
+    WHERE p.active = 1 AND p.id IN (
+        SELECT id FROM produtos WHERE ean = ?
+        UNION ALL SELECT id FROM produtos WHERE codigo_interno = ?
+        UNION ALL SELECT id_produto FROM produto_codigos_alternativos WHERE codigo = ?
+    )
+    LIMIT 1
+"""
+
+
+def main(produtos):
+    with scratch_database() as caminho:
+        conn = get_connection()
+        try:
+            conn.execute("BEGIN")
+            conn.executemany("INSERT INTO produtos (id, nome, ean, codigo_interno, active, unidade) VALUES (?, ?, ?, ?, 1, 'UN')",
+                             ((i, f"P{i}", f"789{i:010d}", f"B{i}") for i in range(1, produtos + 1)))
+            conn.executemany("INSERT INTO produto_tabela_preco (id_produto, id_tabela, preco_vendadecimal) VALUES (?, 1, 9.9)",
+                             ((i,) for i in range(1, produtos + 1)))
+            conn.commit()
+        finally:
+            conn.close()
+
+        def conexao_por_chamada():
+            conn = sqlite3.connect(caminho)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA foreign_keys = ON;")
+            return conn
+
+        codigos = [f"789{(i * 37) % produtos + 1:010d}" for i in range(LEITURAS)]
+        print(f"{produtos} produtos, {LEITURAS} leituras")
+        for rotulo, conectar in (("conexão por chamada", conexao_por_chamada), ("pool (get_connection)", get_connection)):
+            def leitura():
+                codigo = next(fila)
+                conn = conectar()
+                produto = conn.execute(SQL_BUSCA, (1, codigo, codigo, codigo)).fetchone()
+                conn.close()
+                conn = conectar()
+                conn.execute("SELECT caminho_imagem FROM produtos WHERE id = ?", (produto['produto_id'],)).fetchone()
+                conn.close()
+            fila = iter(codigos)
+            tempos, _ = timed(leitura, LEITURAS)
+            report(rotulo, tempos, "us")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000)
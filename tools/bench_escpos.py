@@ -0,0 +1,57 @@
+# tools/bench_escpos.py
+"""
+Cupom de venda pelo caminho PDF (reportlab, arquivo temporário para o
+driver) e pelo caminho ESC/POS (modules/escpos.py), com o envio dos
+bytes por TCP a uma impressora de rede falsa (escpos.EscPosDumpServer).
+Usa os dados de um terminal semeado num banco temporário.
+
+    python -m tools.bench_escpos [ITENS]
+"""
+import os
+import sys
+import tempfile
+from modules import escpos
+from modules.printing_service import render_receipt_pdf, render_receipt_escpos
+from modules.print_spooler import TcpBackend
+from .bench import scratch_database, seed_terminal, timed, report
+
+REPETICOES = 30
+
+
+def main(itens):
+    with scratch_database():
+        t = seed_terminal()
+        venda = {
+            "venda_id": 1, "user_id": t["user_id"], "cliente_id": None, "empresa_id": t["empresa_id"],
+            "local_id": t["local_id"], "terminal_id": t["terminal_id"], "numero_venda_terminal": 7,
+            "cart_items": [{"produto_id": t["produto_id"], "codigo_barras": "7891000100103", "descricao": f"Pão de Açúcar {i}",
+                            "quantidade": 1.0, "preco_unitario": 2.5, "desconto_item": 0.0, "total_item": 2.5}
+                           for i in range(itens)],
+            "pagamentos": [{"forma": "Dinheiro", "valor": 2.5 * itens + 10}],
+            "subtotal": 2.5 * itens, "desconto_itens": 0.0, "desconto_geral": 0.0, "total_final": 2.5 * itens,
+            "troco": 10.0, "tipo_documento": "FISCAL",
+        }
+
+        def pdf_em_arquivo():
+            dados = render_receipt_pdf(dict(venda))
+            with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+                f.write(dados)
+            os.remove(f.name)
+            return dados
+
+        servidor = escpos.EscPosDumpServer("127.0.0.1", 0)
+        impressora = TcpBackend("127.0.0.1", servidor.endereco[1])
+        try:
+            print(f"cupom com {itens} itens, {REPETICOES} repetições")
+            tempos, pdf = timed(pdf_em_arquivo, REPETICOES)
+            report(f"PDF + arquivo temporário ({len(pdf)} bytes)", tempos)
+            tempos, dados = timed(lambda: render_receipt_escpos(dict(venda), 48), REPETICOES)
+            report(f"ESC/POS ({len(dados)} bytes)", tempos)
+            tempos, _ = timed(lambda: impressora.send(0, render_receipt_escpos(dict(venda), 48)), REPETICOES)
+            report("ESC/POS + envio TCP", tempos)
+        finally:
+            servidor.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 15)
@@ -0,0 +1,89 @@
+# tools/bench_finalize_sale.py
+"""
+Tempo de gravação de uma venda por tamanho do carrinho: os passos de
+modules/sale_persistence.insert_sale executados um comando por item e
+por pagamento, como o finalize_sale gravava, contra insert_sale
+(executemany e estoque agregado por produto), ambos no pool de conexões.
+
+    python -m tools.bench_finalize_sale [TAMANHO ...]
+"""
+import sys
+import random
+from statistics import median
+from database.db import get_connection
+from modules import sale_persistence, sales_facts, session_totals, stock_ledger
+from .bench import scratch_database, seed_terminal, timed
+
+PRODUTOS = 20_000
+VENDAS_POR_TAMANHO = 60
+PAGAMENTOS = [{"forma": "Dinheiro", "valor": 5.0}, {"forma": "Cartão", "valor": 5.0, "tipo_cartao": "Débito"}]
+
+
+def por_linha(cur, venda, itens, deposito_id):
+    """Os mesmos passos de insert_sale, um comando por item e por pagamento."""
+    cur.execute(sale_persistence.SQL_INSERT_VENDA, (*venda, None, None))
+    venda_id = cur.lastrowid
+    for item in itens:
+        cur.execute(sale_persistence.SQL_INSERT_ITEM, (
+            venda_id, item['produto_id'], item['codigo_barras'], item['descricao'], item['quantidade'],
+            item['preco_unitario'], item['desconto_item'], item['preco_unitario'] * item['quantidade'] - item['desconto_item']
+        ))
+    sales_facts.record_sale(cur, venda_id)
+    for item in itens:
+        stock_ledger.record_movements(cur, stock_ledger.VENDA, deposito_id, [(item['produto_id'], -item['quantidade'])],
+                                      'VENDA', venda_id, user_id=venda[0])
+    for pag in PAGAMENTOS:
+        cur.execute(sale_persistence.SQL_INSERT_PAGAMENTO,
+                    (venda_id, pag['forma'], pag['valor'], None, None, None, pag.get('tipo_cartao'), 1))
+    session_totals.record_sale(cur, venda[2], *venda[7:11], PAGAMENTOS)
+
+
+def em_lote(cur, venda, itens, deposito_id):
+    sale_persistence.insert_sale(cur, venda, itens, PAGAMENTOS, deposito_id)
+
+
+def main(tamanhos):
+    with scratch_database():
+        t = seed_terminal()
+        conn = get_connection()
+        try:
+            conn.execute("BEGIN")
+            conn.executemany("INSERT INTO produtos (nome, active) VALUES (?, 1)", ((f"P{i}",) for i in range(PRODUTOS)))
+            conn.execute("INSERT INTO estoque (id_produto, id_deposito, quantidade) SELECT id, ?, 1000 FROM produtos", (t["deposito_id"],))
+            conn.commit()
+        finally:
+            conn.close()
+
+        rnd = random.Random(3)
+        numero = 0
+
+        def gravar(fn, itens):
+            nonlocal numero
+            numero += 1
+            venda = (t["user_id"], None, t["caixa_id"], t["empresa_id"], t["local_id"], t["terminal_id"], numero,
+                     10.0, 0.0, 0.0, 10.0, 10.0, 0.0, "FISCAL")
+            conn = get_connection()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                fn(conn.cursor(), venda, itens, t["deposito_id"])
+                conn.commit()
+            finally:
+                conn.close()
+
+        print(f"{'itens':>6} {'por linha (ms)':>15} {'em lote (ms)':>13}   mediana de {VENDAS_POR_TAMANHO} vendas")
+        for tamanho in tamanhos:
+            medianas = []
+            for fn in (por_linha, em_lote):
+                tempos = []
+                for _ in range(VENDAS_POR_TAMANHO):
+                    # Produtos repetidos no carrinho, como num cupom de supermercado
+                    itens = [{"produto_id": rnd.randint(1, PRODUTOS) if rnd.random() > 0.2 else 42, "codigo_barras": "x",
+                              "descricao": "P", "quantidade": 1.0, "preco_unitario": 2.5, "desconto_item": 0.0}
+                             for _ in range(tamanho)]
+                    tempos += timed(lambda: gravar(fn, itens))[0]
+                medianas.append(median(tempos))
+            print(f"{tamanho:>6} {medianas[0]:>15.2f} {medianas[1]:>13.2f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10, 50, 150, 300, 600])
@@ -0,0 +1,91 @@
+# tools/bench_financial_kpis.py
+"""
+Tempo de carga do dashboard financeiro com LANCAMENTOS lançamentos
+(padrão 1.000.000, 3 empresas): as seis consultas do
+load_dashboard_data anterior (STRFTIME nas colunas) contra
+modules/financial_kpis sem cache e com cache, e o tempo da primeira
+carga depois de uma baixa (cache invalidado pela versão dos dados).
+
+    python -m tools.bench_financial_kpis [LANCAMENTOS]
+"""
+import sys
+import random
+from datetime import date, timedelta
+from database.db import get_connection
+from modules import financial_kpis
+from .bench import scratch_database, timed, report
+
+CONSULTAS_ANTERIORES = [
+    "SELECT SUM(saldo_atual) FROM contas_financeiras WHERE empresa_id = 1 AND active = 1",
+    "SELECT SUM(valor_previsto - IFNULL(valor_pago, 0)) FROM lancamentos_financeiros "
+    "WHERE tipo = 'A PAGAR' AND status != 'PAGO' AND data_vencimento < DATE('now')",
+    "SELECT SUM(valor_previsto - IFNULL(valor_pago, 0)) FROM lancamentos_financeiros "
+    "WHERE status != 'PAGO' AND data_vencimento = DATE('now')",
+    "SELECT SUM(valor_previsto - IFNULL(valor_pago, 0)) FROM lancamentos_financeiros "
+    "WHERE tipo = 'A RECEBER' AND status != 'PAGO' AND STRFTIME('%Y-%m', data_vencimento) = STRFTIME('%Y-%m', 'now')",
+    "SELECT data_vencimento, SUM(CASE WHEN tipo = 'A RECEBER' THEN (valor_previsto - IFNULL(valor_pago, 0)) ELSE 0 END), "
+    "SUM(CASE WHEN tipo = 'A PAGAR' THEN (valor_previsto - IFNULL(valor_pago, 0)) ELSE 0 END) FROM lancamentos_financeiros "
+    "WHERE status != 'PAGO' AND data_vencimento BETWEEN DATE('now') AND DATE('now', '+30 days') GROUP BY data_vencimento",
+    "SELECT c.nome, SUM(l.valor_pago) FROM lancamentos_financeiros l JOIN categorias_financeiras c ON l.categoria_id = c.id "
+    "WHERE l.tipo = 'A PAGAR' AND l.status = 'PAGO' AND STRFTIME('%Y-%m', l.data_pagamento) = STRFTIME('%Y-%m', 'now') "
+    "GROUP BY c.nome ORDER BY 2 DESC LIMIT 10",
+]
+
+
+def seed(cur, lancamentos):
+    rnd = random.Random(7)
+    hoje = date.today()
+    cur.executemany("INSERT INTO categorias_financeiras (id, nome, tipo) VALUES (?, ?, 'DESPESA')",
+                    ((100 + k, f"Bench {k}") for k in range(1, 9)))
+    cur.executemany("INSERT INTO titulos_financeiros (id, empresa_id, tipo, valor_total) VALUES (?, ?, 'A PAGAR', 0)",
+                    ((t, 1 + t % 3) for t in range(1, 2001)))
+
+    def linhas():
+        for i in range(lancamentos):
+            vencimento = hoje - timedelta(days=rnd.randint(-60, 5 * 365))
+            aberto = vencimento > hoje - timedelta(days=20) or rnd.random() < 0.03
+            status = ('PENDENTE' if vencimento >= hoje else rnd.choice(('PENDENTE', 'VENCIDO'))) if aberto else 'PAGO'
+            yield (1 + i % 2000, rnd.choice(('A PAGAR', 'A RECEBER')), 101 + i % 8, round(rnd.uniform(10, 900), 2),
+                   vencimento.isoformat(), status, None if aberto else vencimento.isoformat(), None if aberto else 100.0)
+    cur.executemany("""
+        INSERT INTO lancamentos_financeiros
+        (titulo_id, tipo, categoria_id, valor_previsto, data_vencimento, status, data_pagamento, valor_pago)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, linhas())
+
+
+def main(lancamentos):
+    with scratch_database():
+        conn = get_connection()
+        try:
+            conn.execute("PRAGMA foreign_keys = OFF")
+            conn.execute("BEGIN")
+            seed(conn.cursor(), lancamentos)
+            conn.commit()
+            conn.execute("ANALYZE")
+            cur = conn.cursor()
+            abertos = cur.execute("SELECT COUNT(*) FROM lancamentos_financeiros WHERE status != 'PAGO'").fetchone()[0]
+            print(f"{lancamentos} lançamentos, {abertos} em aberto")
+            report("6 consultas anteriores (todas empresas)",
+                   timed(lambda: [cur.execute(sql).fetchall() for sql in CONSULTAS_ANTERIORES], 5)[0])
+        finally:
+            conn.close()
+
+        report("KPIs sem cache", timed(lambda: financial_kpis.get_dashboard_kpis(1, usar_cache=False), 10)[0])
+        report("KPIs com cache", timed(lambda: financial_kpis.get_dashboard_kpis(1), 50)[0])
+
+        conn = get_connection()
+        try:
+            conn.execute("""
+                UPDATE lancamentos_financeiros SET status = 'PAGO', valor_pago = valor_previsto, data_pagamento = date('now')
+                WHERE id = (SELECT MIN(id) FROM lancamentos_financeiros WHERE status = 'VENCIDO')
+            """)
+            conn.commit()
+        finally:
+            conn.close()
+        kpis = financial_kpis.get_dashboard_kpis(1)
+        print(f"depois de uma baixa: cache {kpis['tempos']['cache']}, {kpis['tempos']['total_ms']:.1f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
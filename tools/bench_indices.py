@@ -0,0 +1,92 @@
+# tools/bench_indices.py
+"""
+Planos e tempos das consultas do PDV, Relatório Z, relatórios e
+financeiro sem os índices secundários e com os índices da migração 2
+(database/db.py), num banco semeado com VENDAS vendas (padrão 1.000.000).
+
+    python -m tools.bench_indices [VENDAS]
+"""
+import sys
+import random
+from database.db import get_connection, _migration_002_indices
+from .bench import scratch_database, timed
+
+CONSULTAS = {
+    "fechamento (pagamentos por forma)": (
+        "SELECT vp.forma, SUM(vp.valor) FROM vendas_pagamentos vp JOIN vendas v ON vp.venda_id = v.id "
+        "WHERE v.caixa_id = ? AND v.status = 'FINALIZADA' GROUP BY vp.forma", (1234,)),
+    "relatório Z analítico": (
+        "SELECT v.id, COUNT(vi.id) FROM vendas v LEFT JOIN clientes c ON v.cliente_id = c.id "
+        "LEFT JOIN vendas_itens vi ON v.id = vi.venda_id WHERE v.caixa_id = ? GROUP BY v.id ORDER BY v.data_venda", (1234,)),
+    "vendas por produto (1 dia)": (
+        "SELECT COUNT(*) FROM vendas_itens vi JOIN vendas v ON vi.venda_id = v.id "
+        "WHERE v.data_venda BETWEEN ? AND ? AND v.status = 'FINALIZADA'", ("2025-03-05 00:00:00", "2025-03-05 23:59:59")),
+    "fluxo de caixa (saldo anterior)": (
+        "SELECT SUM(valor) FROM movimentacoes_contas WHERE conta_id = ? AND data_movimento < ?", (3, "2025-02-01")),
+    "busca por EAN": ("SELECT id FROM produtos WHERE ean = ?", ("7890000123456",)),
+}
+
+
+def _data(i):
+    return f"2025-{1 + i % 12:02d}-{1 + i % 28:02d}"
+
+
+def seed(cur, vendas):
+    rnd = random.Random(1)
+    sessoes = max(1, vendas // 200)
+    cur.executemany("""
+        INSERT INTO caixa_sessoes (id, user_id, terminal_id, valor_inicial, status, data_abertura)
+        VALUES (?, 1, ?, 100, 'FECHADO', ?)
+    """, ((i, 1 + i % 20, f"{_data(i)} 08:00:00") for i in range(1, sessoes + 1)))
+    cur.executemany("""
+        INSERT INTO vendas (id, caixa_id, terminal_id, numero_venda_terminal, data_venda, subtotal, total_final, total_pago, status)
+        VALUES (?, ?, ?, ?, ?, 10, 10, 10, ?)
+    """, ((i, 1 + i % sessoes, 1 + i % 20, i, f"{_data(i)} 10:00:00", 'FINALIZADA' if i % 50 else 'CANCELADA')
+          for i in range(1, vendas + 1)))
+    cur.executemany("""
+        INSERT INTO vendas_itens (venda_id, produto_id, codigo_barras, descricao, quantidade, preco_unitario, total_item)
+        VALUES (?, 1, '789', 'X', 1, 5, 5)
+    """, ((1 + i // 2,) for i in range(2 * vendas)))
+    cur.executemany("INSERT INTO vendas_pagamentos (venda_id, forma, valor) VALUES (?, ?, 10)",
+                    ((i, rnd.choice(('Dinheiro', 'Pix', 'Cartão'))) for i in range(1, vendas + 1)))
+    cur.executemany("""
+        INSERT INTO movimentacoes_contas (conta_id, tipo_movimento, valor, data_movimento) VALUES (?, 'ENTRADA', 1, ?)
+    """, ((1 + i % 10, _data(i)) for i in range(vendas // 3)))
+    cur.executemany("INSERT INTO produtos (nome, ean, codigo_interno) VALUES (?, ?, ?)",
+                    ((f"P{i}", f"789{i:010d}", f"B{i}") for i in range(vendas // 5)))
+
+
+def run(conn, rotulo):
+    print(f"--- {rotulo}")
+    for nome, (sql, params) in CONSULTAS.items():
+        plano = " | ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+        tempos, _ = timed(lambda: conn.execute(sql, params).fetchall())
+        print(f"{nome:36s} {tempos[0]:10.2f} ms  {plano}")
+
+
+def main(vendas):
+    with scratch_database():
+        conn = get_connection()
+        try:
+            conn.execute("PRAGMA foreign_keys = OFF")
+            conn.execute("BEGIN")
+            seed(conn.cursor(), vendas)
+            indices = [row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL")]
+            for nome in indices:
+                conn.execute(f"DROP INDEX {nome}")
+            conn.commit()
+            conn.execute("ANALYZE")
+            run(conn, f"{vendas} vendas, sem índices secundários")
+
+            conn.execute("BEGIN")
+            _migration_002_indices(conn.cursor())
+            conn.commit()
+            conn.execute("ANALYZE")
+            run(conn, "com os índices da migração 2")
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,95 @@
+# tools/bench_pdf_report.py
+"""
+Tempo de geração de relatório PDF com 10.000 e 100.000 linhas de itens
+de venda: uma única Table do reportlab com todas as linhas (export_to_pdf
+anterior) contra modules/pdf_report.render_pdf (uma Table por página,
+linhas lidas do cursor), e render_pdf em outro processo
+(PdfRenderProcess) com o tempo até o primeiro aviso de progresso.
+
+    python -m tools.bench_pdf_report [LINHAS ...] [--sem-anterior]
+"""
+import os
+import sys
+import time
+import tempfile
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, Paragraph
+from database.db import get_connection
+from modules import pdf_report
+from .bench import scratch_database, seed_sale_items
+
+CABECALHOS = ["Data/Hora", "Nº Venda", "Código", "Descrição", "Qtd.", "Vl. Unit.", "Vl. Total"]
+FORMATOS = [None, None, None, None, "{:.2f}", "R$ {:.2f}", "R$ {:.2f}"]
+
+
+def _consulta(linhas):
+    return f"""
+        SELECT v.data_venda, v.numero_venda_terminal, vi.codigo_barras, vi.descricao,
+               vi.quantidade, vi.preco_unitario, vi.total_item
+        FROM vendas_itens vi JOIN vendas v ON vi.venda_id = v.id
+        ORDER BY vi.id LIMIT {linhas}
+    """
+
+
+def anterior(path, db_path, linhas):
+    rows = list(pdf_report.iter_query_rows(db_path, _consulta(linhas), (), FORMATOS))
+    doc = SimpleDocTemplate(path, pagesize=landscape(A4), rightMargin=inch / 2, leftMargin=inch / 2,
+                            topMargin=inch / 2, bottomMargin=inch / 2)
+    tabela = Table([CABECALHOS] + rows, repeatRows=1)
+    tabela.setStyle(pdf_report.ESTILO_TABELA)
+    doc.build([Paragraph("Vendas por Produto", getSampleStyleSheet()['h1']), tabela])
+
+
+def em_blocos(path, db_path, linhas):
+    pdf_report.render_pdf(path, CABECALHOS, pdf_report.iter_query_rows(db_path, _consulta(linhas), (), FORMATOS),
+                          "Vendas por Produto")
+
+
+def em_processo(path, db_path, linhas):
+    processo = pdf_report.PdfRenderProcess(path, CABECALHOS, ("consulta", db_path, _consulta(linhas), (), FORMATOS),
+                                           "Vendas por Produto")
+    inicio = time.perf_counter()
+    processo.start()
+    primeiro, fim = None, None
+    while fim is None:
+        for mensagem in processo.poll():
+            if mensagem[0] == "progresso":
+                primeiro = primeiro or time.perf_counter() - inicio
+            else:
+                fim = mensagem
+        time.sleep(0.05)
+    processo.join()
+    if fim[0] != "concluido":
+        raise RuntimeError(f"Geração em outro processo: {fim}")
+    return f"primeira página em {primeiro:.2f} s"
+
+
+def main(tamanhos, caminhos):
+    with scratch_database() as db_path:
+        conn = get_connection()
+        try:
+            conn.execute("PRAGMA foreign_keys = OFF")
+            conn.execute("BEGIN")
+            seed_sale_items(conn.cursor(), max(tamanhos))
+            conn.commit()
+        finally:
+            conn.close()
+
+        with tempfile.TemporaryDirectory() as pasta:
+            for linhas in tamanhos:
+                for rotulo, gerar in caminhos:
+                    path = os.path.join(pasta, f"{gerar.__name__}.pdf")
+                    inicio = time.perf_counter()
+                    obs = gerar(path, db_path, linhas)
+                    duracao = time.perf_counter() - inicio
+                    print(f"{linhas:>7} linhas  {rotulo:32s} {duracao:7.1f} s  {os.path.getsize(path) / 2**20:5.1f} MiB"
+                          + (f"  ({obs})" if obs else ""))
+
+
+if __name__ == "__main__":
+    caminhos = [("uma Table por página", em_blocos), ("uma Table por página, processo", em_processo)]
+    if "--sem-anterior" not in sys.argv:
+        caminhos.insert(0, ("uma Table com todas as linhas", anterior))
+    main([int(a) for a in sys.argv[1:] if not a.startswith("--")] or [10_000, 100_000], caminhos)
@@ -0,0 +1,78 @@
+# tools/bench_product_lookup.py
+"""
+Latência p50/p99 da leitura de um código (EAN, código interno ou código
+alternativo) num catálogo de SKUS produtos (padrão 200.000): consulta
+antiga do SalesForm.search_product (LEFT JOIN triplo com OR e GROUP BY),
+índice em memória (modules/product_lookup.py) e a consulta de reserva
+do índice.
+
+    python -m tools.bench_product_lookup [SKUS]
+"""
+import sys
+import random
+from database.db import get_connection
+from modules.product_lookup import ProductLookupIndex
+from .bench import scratch_database, timed, report
+
+LEITURAS = 2000
+
+SQL_ANTIGA = """
+    SELECT p.id as produto_id, p.ean, p.codigo_interno, p.nome as descricao, p.unidade, ptp.preco_vendadecimal as preco_venda
+    FROM produtos p
+    LEFT JOIN produto_tabela_preco ptp ON p.id = ptp.id_produto
+    LEFT JOIN produto_codigos_alternativos pca ON p.id = pca.id_produto
+    WHERE (p.ean = ? OR p.codigo_interno = ? OR pca.codigo = ?) AND p.active = 1 AND ptp.id_tabela = ?
+    GROUP BY p.id LIMIT 1
+"""
+
+
+def main(skus):
+    with scratch_database():
+        conn = get_connection()
+        try:
+            conn.execute("BEGIN")
+            conn.executemany("INSERT INTO produtos (id, nome, ean, codigo_interno, active, unidade) VALUES (?, ?, ?, ?, 1, 'UN')",
+                             ((i, f"P{i}", f"789{i:010d}", f"B{i}") for i in range(1, skus + 1)))
+            conn.executemany("INSERT INTO produto_tabela_preco (id_produto, id_tabela, preco_vendadecimal) VALUES (?, 1, 9.9)",
+                             ((i,) for i in range(1, skus + 1)))
+            conn.executemany("INSERT INTO produto_codigos_alternativos (id_produto, tipo, codigo) VALUES (?, 'GTIN14', ?)",
+                             ((i, f"1789{i:010d}") for i in range(1, skus + 1, 4)))
+            conn.commit()
+            conn.execute("ANALYZE")
+        finally:
+            conn.close()
+
+        rnd = random.Random(1)
+        codigos = []
+        for _ in range(LEITURAS):
+            i, tipo = rnd.randint(1, skus), rnd.random()
+            if tipo < 0.7:
+                codigos.append(f"789{i:010d}")
+            elif tipo < 0.9:
+                codigos.append(f"B{i}")
+            else:
+                codigos.append(f"1789{(i - 1) // 4 * 4 + 1:010d}")
+
+        def consulta_antiga(codigo):
+            conn = get_connection()
+            try:
+                return conn.execute(SQL_ANTIGA, (codigo, codigo, codigo, 1)).fetchone()
+            finally:
+                conn.close()
+
+        indice = ProductLookupIndex(1)
+        tempos, _ = timed(indice.build)
+        print(f"{skus} SKUs; carga do índice {tempos[0]:.0f} ms, {len(indice._produtos)} produtos")
+
+        for rotulo, buscar, amostra in (
+            ("consulta antiga (JOIN triplo com OR)", consulta_antiga, codigos[:100]),
+            ("índice em memória", indice.lookup, codigos),
+            ("consulta de reserva do índice", indice._lookup_sql, codigos[:1000]),
+        ):
+            fila = iter(amostra)
+            tempos, _ = timed(lambda: buscar(next(fila)), len(amostra))
+            report(rotulo, tempos, "us")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
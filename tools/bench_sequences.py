@@ -0,0 +1,170 @@
+# tools/bench_sequences.py
+"""
+Disputa pela numeração com vários terminais simulados (processos)
+gravando no mesmo banco temporário:
+
+- vendas: contador terminais_pdv.numero_nfe_atual lido e gravado na
+  transação de cada venda (finalize_sale anterior) contra a numeração
+  por blocos (modules/sequence_service.TerminalSequence);
+- códigos internos: UPDATE sequencias SET valor = valor + 1 por código
+  (ProductBaseForm._generate_sku anterior) contra ProcessSequence.
+
+Mostra vazão, latências e se houve número repetido.
+
+    python -m tools.bench_sequences [TERMINAIS]
+"""
+import sys
+import time
+import random
+import multiprocessing
+import traceback
+from database.db import get_connection, get_pool, use_database
+from modules import sale_persistence, sequence_service
+from .bench import scratch_database, percentiles
+
+VENDAS_POR_TERMINAL = 150
+CODIGOS_POR_PROCESSO = 200
+PRODUTOS = 5000
+
+
+def _aguardar(inicio):
+    while time.time() < inicio:
+        time.sleep(0.001)
+
+
+def terminal(db_path, terminal_id, modo, fila, inicio):
+    """Processo de um terminal: VENDAS_POR_TERMINAL vendas de 5 itens."""
+    try:
+        fila.put(_vender(db_path, terminal_id, modo, inicio))
+    except Exception:
+        fila.put(("erro", traceback.format_exc()))
+
+
+def _vender(db_path, terminal_id, modo, inicio):
+    with use_database(db_path):
+        rnd = random.Random(terminal_id)
+        numeracao = sequence_service.TerminalSequence(terminal_id) if modo == "bloco" else None
+        _aguardar(inicio)
+        tempos = []
+        for _ in range(VENDAS_POR_TERMINAL):
+            itens = [{"produto_id": rnd.randint(1, PRODUTOS), "codigo_barras": "x", "descricao": "P", "quantidade": 1.0,
+                      "preco_unitario": 2.0, "desconto_item": 0.0} for _ in range(5)]
+            t0 = time.perf_counter()
+            # Como no PosController: o número do bloco é lido antes da transação da venda
+            numero = numeracao.peek() if numeracao else None
+            conn = get_connection()
+            try:
+                cur = conn.cursor()
+                conn.execute("BEGIN IMMEDIATE")
+                if not numeracao:
+                    cur.execute("SELECT numero_nfe_atual FROM terminais_pdv WHERE id = ?", (terminal_id,))
+                    numero = cur.fetchone()[0] + 1
+                sale_persistence.insert_sale(cur, (1, None, terminal_id, 1, 1, terminal_id, numero, 10.0, 0.0, 0.0,
+                                                   10.0, 10.0, 0.0, "FISCAL"),
+                                             itens, [{"forma": "Dinheiro", "valor": 10.0}], 1)
+                if not numeracao:
+                    cur.execute("UPDATE terminais_pdv SET numero_nfe_atual = ? WHERE id = ?", (numero, terminal_id))
+                conn.commit()
+            finally:
+                conn.close()
+            if numeracao:
+                numeracao.advance(numero)
+            tempos.append((time.perf_counter() - t0) * 1000)
+        return tempos, []
+
+
+def codigos(db_path, modo, fila, inicio):
+    """Processo de cadastro: CODIGOS_POR_PROCESSO códigos internos."""
+    try:
+        fila.put(_gerar_codigos(db_path, modo, inicio))
+    except Exception:
+        fila.put(("erro", traceback.format_exc()))
+
+
+def _gerar_codigos(db_path, modo, inicio):
+    with use_database(db_path):
+        _aguardar(inicio)
+        tempos, numeros = [], []
+        for _ in range(CODIGOS_POR_PROCESSO):
+            t0 = time.perf_counter()
+            if modo == "bloco":
+                numeros.append(sequence_service.process_sequence("COD_BENCH", 1000).take())
+            else:
+                conn = get_connection()
+                try:
+                    cur = conn.cursor()
+                    cur.execute("UPDATE sequencias SET valor = valor + 1 WHERE nome = 'COD_BENCH'")
+                    cur.execute("SELECT valor FROM sequencias WHERE nome = 'COD_BENCH'")
+                    numeros.append(cur.fetchone()[0])
+                    conn.commit()
+                finally:
+                    conn.close()
+            tempos.append((time.perf_counter() - t0) * 1000)
+        if modo == "bloco":
+            sequence_service.process_sequence("COD_BENCH").release()
+        return tempos, numeros
+
+
+def _rodar(alvo, argumentos):
+    # Conexões do pool não podem ser herdadas pelos processos filhos
+    get_pool().close_all()
+    fila = multiprocessing.Queue()
+    inicio = time.time() + 1.0
+    processos = [multiprocessing.Process(target=alvo, args=(*a, fila, inicio)) for a in argumentos]
+    for p in processos:
+        p.start()
+    resultados = [fila.get() for _ in processos]
+    for p in processos:
+        p.join()
+    erros = [r[1] for r in resultados if r[0] == "erro"]
+    if erros:
+        raise RuntimeError(f"{len(erros)} processo(s) falharam:\n{erros[0]}")
+    duracao = time.time() - inicio
+    tempos = [t for r in resultados for t in r[0]]
+    return tempos, [n for r in resultados for n in r[1]], duracao
+
+
+def _linha(rotulo, tempos, duracao, unidade, extra):
+    p = percentiles(tempos)
+    print(f"{rotulo:24s} {len(tempos) / duracao:8.0f} {unidade}/s  p50 {p['p50']:7.2f} ms  p99 {p['p99']:7.2f} ms  {extra}")
+
+
+def main(terminais):
+    print(f"{terminais} terminais x {VENDAS_POR_TERMINAL} vendas; {terminais} processos x {CODIGOS_POR_PROCESSO} códigos")
+    for modo in ("linha", "bloco"):
+        with scratch_database() as db_path:
+            conn = get_connection()
+            try:
+                conn.execute("PRAGMA foreign_keys = OFF")
+                conn.execute("BEGIN")
+                conn.executemany("INSERT INTO produtos (id, nome, active) VALUES (?, ?, 1)",
+                                 ((i, f"P{i}") for i in range(1, PRODUTOS + 1)))
+                conn.execute("INSERT INTO locais_escrituracao (id, empresa_id, nome_local) VALUES (1, 1, 'Bench')")
+                for t in range(1, terminais + 1):
+                    conn.execute("""
+                        INSERT INTO terminais_pdv (id, empresa_id, local_id, nome_terminal, hostname, numero_nfe_atual, serie_fiscal)
+                        VALUES (?, 1, 1, ?, ?, 100, ?)
+                    """, (t, f"T{t}", f"bench-{t}", t))
+                    conn.execute("INSERT INTO caixa_sessoes (id, user_id, terminal_id, valor_inicial, status) VALUES (?, 1, ?, 0, 'ABERTO')",
+                                 (t, t))
+                conn.execute("INSERT INTO sequencias (nome, valor, prefixo) VALUES ('COD_BENCH', 999, '')")
+                conn.commit()
+            finally:
+                conn.close()
+
+            tempos, _, duracao = _rodar(terminal, [(db_path, t, modo) for t in range(1, terminais + 1)])
+            conn = get_connection()
+            try:
+                repetidos = conn.execute("""
+                    SELECT COUNT(*) FROM (SELECT 1 FROM vendas GROUP BY terminal_id, numero_venda_terminal HAVING COUNT(*) > 1)
+                """).fetchone()[0]
+            finally:
+                conn.close()
+            _linha(f"vendas ({modo})", tempos, duracao, "vendas", f"números repetidos: {repetidos}")
+
+            tempos, numeros, duracao = _rodar(codigos, [(db_path, modo) for _ in range(terminais)])
+            _linha(f"códigos ({modo})", tempos, duracao, "códigos", f"únicos: {len(set(numeros)) == len(numeros)}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 6)
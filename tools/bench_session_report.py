@@ -0,0 +1,82 @@
+# tools/bench_session_report.py
+"""
+Tempo da consulta do relatório de vendas por caixa
+(modules/relatorio_vendas_caixa.py) por número de sessões: consulta das
+sessões seguida de duas consultas por sessão (N+1, o load_report
+anterior) contra a consulta única do relatório (SQL_SESSOES, totais
+lidos de 'caixa_totais'). Cada tamanho usa um banco temporário com 20
+terminais e VENDAS_POR_SESSAO vendas por sessão.
+
+    python -m tools.bench_session_report [SESSOES ...]
+"""
+import sys
+from database.db import get_connection, rebuild_caixa_totais
+from modules.relatorio_vendas_caixa import SQL_SESSOES
+from .bench import scratch_database, timed
+
+VENDAS_POR_SESSAO = 30
+PERIODO = ("2025-01-01 00:00:00", "2025-12-31 23:59:59")
+
+
+def seed(cur, sessoes):
+    cur.executemany("""
+        INSERT INTO terminais_pdv (id, empresa_id, local_id, nome_terminal, hostname) VALUES (?, 1, 1, ?, ?)
+    """, ((t, f"T{t}", f"bench-{t}") for t in range(1, 21)))
+    cur.executemany("""
+        INSERT INTO caixa_sessoes (id, user_id, terminal_id, valor_inicial, status, data_abertura, data_fechamento, diferenca)
+        VALUES (?, 1, ?, 100, 'FECHADO', datetime('2025-01-01', ?), datetime('2025-01-01', ?, '+8 hours'), 0)
+    """, ((s, s % 20 + 1, f"+{s * 364 // sessoes} days", f"+{s * 364 // sessoes} days") for s in range(1, sessoes + 1)))
+    cur.executemany("""
+        INSERT INTO vendas (user_id, caixa_id, terminal_id, subtotal, total_final, total_pago, status) VALUES (1, ?, ?, 10, 10, 10, ?)
+    """, ((s, s % 20 + 1, 'CANCELADA' if k == 0 else 'FINALIZADA') for s in range(1, sessoes + 1) for k in range(VENDAS_POR_SESSAO)))
+    cur.executemany("""
+        INSERT INTO caixa_movimentacoes (caixa_id, user_id, terminal_id, tipo, valor) VALUES (?, 1, ?, ?, ?)
+    """, ((s, s % 20 + 1, tipo, valor) for s in range(1, sessoes + 1) for tipo, valor in (('SANGRIA', 50), ('SUPRIMENTO', 20))))
+    rebuild_caixa_totais(cur)
+
+
+def n_mais_um(conn):
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT cs.id FROM caixa_sessoes cs
+        JOIN terminais_pdv t ON cs.terminal_id = t.id
+        JOIN usuarios u ON cs.user_id = u.id
+        WHERE cs.data_abertura BETWEEN ? AND ? ORDER BY cs.data_abertura DESC
+    """, PERIODO)
+    linhas = []
+    for sessao in cur.fetchall():
+        cur_vendas = conn.cursor()
+        cur_vendas.execute("SELECT SUM(total_final) FROM vendas WHERE caixa_id = ?", (sessao['id'],))
+        total_vendas = cur_vendas.fetchone()[0] or 0.0
+        cur_movs = conn.cursor()
+        cur_movs.execute("SELECT tipo, SUM(valor) FROM caixa_movimentacoes WHERE caixa_id = ? GROUP BY tipo", (sessao['id'],))
+        total_movs = sum(valor if tipo == 'SUPRIMENTO' else -valor for tipo, valor in cur_movs.fetchall())
+        linhas.append((sessao['id'], total_vendas, total_movs))
+    return linhas
+
+
+def consulta_unica(conn):
+    return [(row['id'], row['total_vendas'], row['total_movs'])
+            for row in conn.execute(SQL_SESSOES + " ORDER BY cs.data_abertura DESC", PERIODO)]
+
+
+def main(tamanhos):
+    print(f"{'sessões':>8} {'N+1 (ms)':>10} {'consulta única (ms)':>20}  totais iguais")
+    for sessoes in tamanhos:
+        with scratch_database():
+            conn = get_connection()
+            try:
+                conn.execute("PRAGMA foreign_keys = OFF")
+                conn.execute("BEGIN")
+                seed(conn.cursor(), sessoes)
+                conn.commit()
+                conn.execute("ANALYZE")
+                t_antigo, antigo = timed(lambda: n_mais_um(conn), 3)
+                t_novo, novo = timed(lambda: consulta_unica(conn), 3)
+            finally:
+                conn.close()
+        print(f"{sessoes:>8} {min(t_antigo):>10.1f} {min(t_novo):>20.1f}  {antigo == novo}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [500, 2000, 7300])
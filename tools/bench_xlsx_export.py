@@ -0,0 +1,88 @@
+# tools/bench_xlsx_export.py
+"""
+Memória e vazão da exportação XLSX de LINHAS itens de venda (padrão
+500.000): caminho anterior (linhas como texto, como lidas da
+QTableWidget, planilha normal do openpyxl e larguras por todas as
+células) contra modules/report_exporter.write_xlsx alimentado pelo
+cursor (iter_query, modo write-only, larguras pela amostra inicial).
+Com --memoria, o pico de alocações Python (tracemalloc, que deixa a
+exportação várias vezes mais lenta) no lugar do tempo.
+
+    python -m tools.bench_xlsx_export [LINHAS] [--so-nova] [--memoria]
+"""
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+import openpyxl
+from openpyxl.utils import get_column_letter
+from database.db import get_connection
+from modules.report_exporter import write_xlsx, iter_query
+from .bench import scratch_database, seed_sale_items
+
+CABECALHOS = ["Data/Hora", "Nº Venda", "Código", "Descrição", "Qtd.", "Vl. Unit.", "Vl. Total"]
+
+SQL = """
+    SELECT v.data_venda, v.numero_venda_terminal, vi.codigo_barras, vi.descricao,
+           vi.quantidade, vi.preco_unitario, vi.total_item
+    FROM vendas_itens vi JOIN vendas v ON vi.venda_id = v.id
+    ORDER BY v.data_venda DESC, v.numero_venda_terminal DESC
+"""
+
+
+def anterior(path):
+    conn = get_connection()
+    try:
+        data = [[r[0], str(r[1]), r[2], r[3], f"{r[4]:.2f}", f"R$ {r[5]:.2f}", f"R$ {r[6]:.2f}"] for r in conn.execute(SQL)]
+    finally:
+        conn.close()
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(CABECALHOS)
+    for row in data:
+        ws.append(row)
+    for i, coluna in enumerate(ws.columns):
+        ws.column_dimensions[get_column_letter(i + 1)].width = max(len(str(c.value) or "") for c in coluna) + 5
+    wb.save(path)
+    return len(data)
+
+
+def nova(path):
+    return write_xlsx(path, CABECALHOS, iter_query(SQL), "Vendas por Produto")
+
+
+def main(linhas, caminhos, memoria=False):
+    with scratch_database():
+        conn = get_connection()
+        try:
+            conn.execute("PRAGMA foreign_keys = OFF")
+            conn.execute("BEGIN")
+            seed_sale_items(conn.cursor(), linhas)
+            conn.commit()
+        finally:
+            conn.close()
+
+        with tempfile.TemporaryDirectory() as pasta:
+            for rotulo, exportar in caminhos:
+                path = os.path.join(pasta, f"{exportar.__name__}.xlsx")
+                if memoria:
+                    tracemalloc.start()
+                    total = exportar(path)
+                    pico = tracemalloc.get_traced_memory()[1]
+                    tracemalloc.stop()
+                    print(f"{rotulo:34s} {total} linhas, pico {pico / 2**20:7.1f} MiB")
+                    continue
+                inicio = time.perf_counter()
+                total = exportar(path)
+                duracao = time.perf_counter() - inicio
+                print(f"{rotulo:34s} {total} linhas em {duracao:6.1f} s ({total / duracao:9,.0f} linhas/s), "
+                      f"arquivo {os.path.getsize(path) / 2**20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    argumentos = [a for a in sys.argv[1:] if not a.startswith("--")]
+    caminhos = [("write-only pelo cursor", nova)]
+    if "--so-nova" not in sys.argv:
+        caminhos.insert(0, ("anterior (planilha em memória)", anterior))
+    main(int(argumentos[0]) if argumentos else 500_000, caminhos, "--memoria" in sys.argv)